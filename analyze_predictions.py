@@ -1,4 +1,6 @@
 import json
+import argparse
+from profiling import Profiler, add_profile_arguments
 
 def analyze_predictions(file_path):
     try:
@@ -34,4 +36,10 @@ def analyze_predictions(file_path):
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    analyze_predictions('predictions.jsonl')
+    parser = argparse.ArgumentParser(description='Files changed by each prediction')
+    parser.add_argument('file', nargs='?', default='predictions.jsonl')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = Profiler.from_args(args, phase="analyze")
+    analyze_predictions(args.file)
+    profiler.finish()
@@ -1,11 +1,15 @@
 import json
 import os
-from datasets import load_dataset
+import argparse
+from dataset_snapshot import DatasetSnapshot, load_problems
+from profiling import Profiler, add_profile_arguments
 
-def audit_progress():
+def audit_progress(profiler=None):
     predictions_file = 'predictions.jsonl'
+    profiler = profiler or Profiler(None)
     
     # Load all completed instances
+    profiler.begin("predictions")
     completed = set()
     if os.path.exists(predictions_file):
         with open(predictions_file, 'r', encoding='utf-8') as f:
@@ -18,8 +22,13 @@ def audit_progress():
                         pass
     
     # Load dataset
+    profiler.begin("dataset")
     print("Loading dataset...")
-    dataset = load_dataset('AmazonScience/SWE-PolyBench', split='test')
+    snapshot = DatasetSnapshot()
+    if not snapshot.exists:
+        load_problems()  # first use: snapshot from HuggingFace
+        snapshot = DatasetSnapshot()
+    instance_ids = snapshot.instance_ids
     
     range_start = 200
     range_end = 299
@@ -27,9 +36,10 @@ def audit_progress():
     print(f"\nAudit for indices {range_start} to {range_end}:")
     print("-" * 30)
     
+    profiler.begin("audit")
     missing = []
     for i in range(range_start, range_end + 1):
-        iid = dataset[i]['instance_id']
+        iid = instance_ids[i]
         if iid not in completed:
             missing.append({'index': i, 'instance_id': iid})
             
@@ -42,4 +52,8 @@ def audit_progress():
     print("Results saved to missing_problems.json")
 
 if __name__ == "__main__":
-    audit_progress()
+    parser = argparse.ArgumentParser(description='List instances of the range missing from predictions.jsonl')
+    add_profile_arguments(parser)
+    profiler = Profiler.from_args(parser.parse_args())
+    audit_progress(profiler)
+    profiler.finish()
@@ -16,9 +16,11 @@ import argparse
 import traceback
 from threading import Thread
 from pathlib import Path
-from datasets import load_dataset
 import sys
 import hashlib
+from unified_diff import parse_patch
+from profiling import Profiler, add_profile_arguments
+from dataset_snapshot import load_problems
 
 init(autoreset=True)
 
@@ -248,7 +250,9 @@ def main():
     parser.add_argument('--model-name', default='cora')
     parser.add_argument('--start', type=int, default=0)
     parser.add_argument('--end', type=int, default=300)
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
     
     WORKING_FOLDER = "swe_polybench_workspace"
     PREDICTIONS_FILE = "predictions.jsonl"
@@ -259,8 +263,7 @@ def main():
     # Load Data
     try:
         print("Loading dataset...")
-        dataset = load_dataset("AmazonScience/SWE-PolyBench", split="test")
-        full_dataset = [dict(item) for item in dataset]
+        full_dataset = load_problems()
     except Exception as e:
         print(f"Failed to load dataset: {e}")
         return
@@ -274,6 +277,7 @@ def main():
             
         problem = full_dataset[i]
         instance_id = problem["instance_id"]
+        profiler.begin("schedule")
         
         # 1. Check if done
         completed_ids = get_completed_instances(PREDICTIONS_FILE)
@@ -289,11 +293,13 @@ def main():
         repo_path = os.path.join(WORKING_FOLDER, instance_id.replace("/", "_"))
         
         # Clone
+        profiler.begin("clone", instance_id)
         if not clone_repo(problem["repo"], problem["base_commit"], repo_path):
             print(f"{Fore.RED}❌ Clone/Reset failed. Skipping.{Style.RESET_ALL}")
             continue
             
         # Clipboard
+        profiler.begin("prompt", instance_id)
         prompt = format_problem(problem)
         copy_to_clipboard(prompt)
         with open("current_problem.txt", "w", encoding="utf-8") as f:
@@ -307,6 +313,7 @@ def main():
         
         # Manual Input Loop
         final_diff = None
+        profiler.suspend()  # waiting for the operator
         while True:
             try:
                 first_line = input(f"\n{Fore.YELLOW}Input > {Style.RESET_ALL}")
@@ -316,7 +323,8 @@ def main():
                     break
                     
                 if first_line.strip().upper() == 'REPO':
-                    diff = get_git_diff(repo_path)
+                    with profiler.phase("diff", instance_id):
+                        diff = get_git_diff(repo_path)
                     if diff.strip():
                         print(f"{Fore.GREEN}✓ Found changes ({len(diff)} bytes).{Style.RESET_ALL}")
                         if input("Save this? (y/n) > ").lower() == 'y':
@@ -333,13 +341,28 @@ def main():
                     if line.strip() == 'EOF':
                         break
                     lines.append(line)
-                final_diff = '\n'.join(lines)
-                break
+                pasted = '\n'.join(lines) + '\n'
+                
+                # Pasted patches are where truncation and CRLF damage come from
+                with profiler.phase("validate", instance_id):
+                    patch = parse_patch(pasted, strict=False)
+                if patch.valid:
+                    print(f"{Fore.GREEN}✓ Valid diff ({patch.summary()}){Style.RESET_ALL}")
+                    final_diff = pasted
+                    break
+                print(f"{Fore.RED}❌ Pasted patch is malformed:{Style.RESET_ALL}")
+                for message in patch.errors[:5]:
+                    print(f"{Fore.RED}   {message}{Style.RESET_ALL}")
+                if input("Save anyway? (y/n) > ").lower() == 'y':
+                    final_diff = pasted
+                    break
+                print("Paste the patch again, or type REPO / SKIP.")
                 
             except KeyboardInterrupt:
                 print("\nInterrupted.")
                 return
 
+        profiler.begin("cleanup", instance_id)
         if final_diff is not None:
             # Save
             prediction = {
@@ -354,6 +377,8 @@ def main():
             
         # Cleanup
         reset_git_repo(repo_path, problem["base_commit"])
+    
+    profiler.finish()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,469 @@
+"""
+Per-commit lexical code index (BM25) for prompt enrichment
+
+Indexes the source files of a repository at one base commit and ranks them
+against a problem statement, so the prompt can point the agent at likely
+files and symbols instead of leaving it to search a fresh checkout.
+
+  swe_polybench_code_index/
+    <owner>__<name>/<base_commit>.json.gz   one index per (repo, base_commit)
+
+An index for a new commit starts from the most recent index of the same repo
+and re-reads only the paths `git diff --name-only <previous> <commit>` reports
+(or, when the previous commit is not in a shallow workspace, the paths whose
+blob ids changed). File contents come from the object database, so the
+working tree may already be modified.
+
+  python code_index.py build  swe_polybench_workspace/sveltejs__svelte-605 <commit> --repo sveltejs/svelte
+  python code_index.py query  swe_polybench_workspace/sveltejs__svelte-605 <commit> "each block key" -k 10
+  python code_index.py bench  /path/to/repo --commits <c1> <c2> <c3> --query "problem text"
+"""
+
+import os
+import re
+import json
+import gzip
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from threading import Lock, Thread
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_INDEX_DIR = "swe_polybench_code_index"
+KEEP_PER_REPO = 4              # most recent indexes kept per repo
+MAX_FILE_BYTES = 512 * 1024    # larger blobs are generated/minified more often than not
+PATH_BOOST = 3                 # path components count as this many occurrences
+MAX_SYMBOLS_PER_FILE = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+GIT_TIMEOUT = 120
+
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts", ".vue", ".svelte",
+    ".java", ".kt", ".scala", ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".rb", ".php",
+}
+SKIP_DIRS = {"node_modules", "dist", "build", "out", "vendor", "third_party", "__pycache__", ".git", "target"}
+SKIP_SUFFIXES = (".min.js", ".bundle.js", ".d.ts.map")
+
+STOPWORDS = set("""
+a an and are as at be been but by can could do does for from has have how if in into is it its
+not of on or should so that the their then there these this to was we were when which will with
+would you your i me my our us also any all get set use using used new null none true false undefined
+return returns function def class const let var import export default public private protected static
+void int string self this else elif while try catch except finally throw raise async await yield
+""".split())
+
+IDENT_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]+")
+SUBWORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+DECLARATION_RE = re.compile(
+    r"^[ \t]*(?:(?:export|default|declare|abstract|async|public|private|protected|static|final|sealed|data|pub)[ \t]+)*"
+    r"(?:def|class|function\*?|interface|type|enum|struct|trait|fn|func|fun|object|record)[ \t]+([A-Za-z_$][\w$]*)", re.M)
+PYTHON_DEF_RE = re.compile(r"^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+([A-Za-z_]\w*)", re.M)
+# const foo = (...) => / const foo = function
+JS_FUNCTION_VALUE_RE = re.compile(
+    r"^[ \t]*(?:export[ \t]+)?(?:const|let|var)[ \t]+([A-Za-z_$][\w$]*)[ \t]*=[ \t]*(?:async[ \t]*)?"
+    r"(?:function\b|\([^)\n]*\)[ \t]*=>|[A-Za-z_$][\w$]*[ \t]*=>)", re.M)
+# Java/C#/TS class members with a visibility modifier: public Foo bar(
+MEMBER_RE = re.compile(r"^[ \t]+(?:public|private|protected)[ \t]+(?:[\w<>\[\],.? \t]+[ \t]+)?([A-Za-z_$][\w$]*)[ \t]*\(", re.M)
+JS_EXTENSIONS = {".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts", ".vue", ".svelte"}
+SYMBOL_RES = {".py": [PYTHON_DEF_RE]}
+SYMBOL_RES.update((ext, [DECLARATION_RE, JS_FUNCTION_VALUE_RE, MEMBER_RE]) for ext in JS_EXTENSIONS)
+SYMBOL_RES.update((ext, [DECLARATION_RE, MEMBER_RE]) for ext in (".java", ".kt", ".scala", ".cs", ".php"))
+DEFAULT_SYMBOL_RES = [DECLARATION_RE]
+
+_split_cache = {}
+_repo_locks = {}
+_repo_locks_guard = Lock()
+_recent = {}   # repo -> last CodeIndex used in this process
+
+
+# ========================== TOKENIZING ==========================
+
+def split_identifier(ident):
+    """'parseHTMLTemplate_v2' -> ['parsehtmltemplate_v2', 'parse', 'html', 'template', 'v2']"""
+    terms = _split_cache.get(ident)
+    if terms is None:
+        low = ident.lower().strip("_$")
+        terms = [low] if len(low) > 1 and low not in STOPWORDS else []
+        parts = []
+        for chunk in ident.split("_"):
+            parts.extend(SUBWORD_RE.findall(chunk))
+        if len(parts) > 1:
+            for part in parts:
+                part = part.lower()
+                if len(part) > 1 and part not in STOPWORDS and part != low:
+                    terms.append(part)
+        if len(_split_cache) < 500000:
+            _split_cache[ident] = terms
+    return terms
+
+
+def term_counts(text, weight=1):
+    """Bag of lowercased identifier terms and their sub-words."""
+    counts = Counter()
+    for ident, n in Counter(IDENT_RE.findall(text)).items():
+        for term in split_identifier(ident):
+            counts[term] += n * weight
+    return counts
+
+
+def extract_symbols(text, path=""):
+    symbols = []
+    seen = set()
+    for symbol_re in SYMBOL_RES.get(os.path.splitext(path)[1].lower(), DEFAULT_SYMBOL_RES):
+        for name in symbol_re.findall(text):
+            if name not in seen and name.lower() not in STOPWORDS:
+                seen.add(name)
+                symbols.append(name)
+    return symbols[:MAX_SYMBOLS_PER_FILE]
+
+
+def is_indexable(path, size):
+    if size is None or size > MAX_FILE_BYTES:
+        return False
+    if path.endswith(SKIP_SUFFIXES) or os.path.splitext(path)[1].lower() not in SOURCE_EXTENSIONS:
+        return False
+    return not any(part in SKIP_DIRS for part in path.split("/")[:-1])
+
+
+# ========================== GIT ACCESS ==========================
+
+def git(repo_path, *args):
+    return subprocess.run(["git", *args], cwd=repo_path, capture_output=True, timeout=GIT_TIMEOUT)
+
+
+def list_tree(repo_path, commit):
+    """{path: (blob, size)} for every indexable file at commit."""
+    result = git(repo_path, "ls-tree", "-r", "-l", "-z", "--full-tree", commit)
+    if result.returncode != 0:
+        raise RuntimeError(f"git ls-tree {commit} failed: {result.stderr.decode(errors='replace').strip()}")
+    tree = {}
+    for record in result.stdout.split(b"\0"):
+        if not record:
+            continue
+        meta, _, path = record.partition(b"\t")
+        mode, kind, blob, size = meta.split()
+        if kind != b"blob" or mode == b"160000":
+            continue
+        path = path.decode("utf-8", errors="surrogateescape")
+        size = int(size) if size != b"-" else None
+        if is_indexable(path, size):
+            tree[path] = (blob.decode(), size)
+    return tree
+
+
+def changed_paths(repo_path, previous, commit):
+    """Paths changed between two commits, or None if previous isn't in this repo."""
+    result = git(repo_path, "diff", "--name-only", "--no-renames", "-z", previous, commit)
+    if result.returncode != 0:
+        return None
+    return {p.decode("utf-8", errors="surrogateescape") for p in result.stdout.split(b"\0") if p}
+
+
+def read_blobs(repo_path, blobs):
+    """Yield (blob, text) for each blob id via one `git cat-file --batch` process."""
+    if not blobs:
+        return
+    process = subprocess.Popen(["git", "cat-file", "--batch"], cwd=repo_path,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            process.stdin.write("".join(blob + "\n" for blob in blobs).encode())
+        finally:
+            process.stdin.close()
+
+    # Ids are written from a thread so a large response can't block the request pipe
+    feeder = Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        for blob in blobs:
+            header = process.stdout.readline().split()
+            if len(header) < 3:
+                continue   # "<id> missing"
+            data = process.stdout.read(int(header[2]))
+            process.stdout.read(1)
+            if b"\0" in data[:8000]:
+                continue   # binary
+            yield blob, data.decode("utf-8", errors="replace")
+    finally:
+        process.stdout.close()
+        process.wait()
+        feeder.join()
+
+
+# ========================== INDEX ==========================
+
+def repo_key(repo):
+    return repo.replace("/", "__")
+
+
+def repo_lock(repo):
+    with _repo_locks_guard:
+        return _repo_locks.setdefault(repo, Lock())
+
+
+class CodeIndex:
+    """BM25 index over one repository snapshot; docs map path -> [blob, length, tf, symbols]"""
+
+    def __init__(self, data):
+        self.data = data
+        self.repo = data["repo"]
+        self.commit = data["commit"]
+        self.docs = data["docs"]
+        self.df = data["df"]
+        self.total_len = data["total_len"]
+
+    @classmethod
+    def empty(cls, repo, commit):
+        return cls({"repo": repo, "commit": commit, "docs": {}, "df": {}, "total_len": 0})
+
+    # ------------------------------------------------------------------ build
+
+    def _remove(self, path):
+        doc = self.docs.pop(path, None)
+        if doc is None:
+            return
+        self.total_len -= doc[1]
+        for term in doc[2]:
+            n = self.df.get(term, 0) - 1
+            if n > 0:
+                self.df[term] = n
+            else:
+                self.df.pop(term, None)
+
+    def _add(self, path, blob, text):
+        tf = term_counts(text)
+        length = sum(tf.values())
+        tf.update(term_counts(path.replace("/", " ").replace(".", " "), PATH_BOOST))
+        self.docs[path] = [blob, length, dict(tf), extract_symbols(text, path)]
+        self.total_len += length
+        for term in tf:
+            self.df[term] = self.df.get(term, 0) + 1
+
+    def update(self, repo_path, commit, paths=None, tree=None):
+        """Re-index paths (None = everything) so the index reflects commit."""
+        tree = tree if tree is not None else list_tree(repo_path, commit)
+        if paths is None:
+            paths = set(self.docs) | set(tree)
+        else:
+            # Blob ids also catch files that left/entered the indexable set
+            paths = set(paths) | {p for p in self.docs if p not in tree}
+        wanted = {}
+        for path in paths:
+            self._remove(path)
+            if path in tree:
+                wanted.setdefault(tree[path][0], []).append(path)
+        for blob, text in read_blobs(repo_path, list(wanted)):
+            for path in wanted[blob]:
+                self._add(path, blob, text)
+        self.commit = self.data["commit"] = commit
+        self.data["total_len"] = self.total_len
+        return len(wanted)
+
+    @classmethod
+    def build(cls, repo, repo_path, commit, previous=None):
+        """Full build, or incremental from previous (a CodeIndex of the same repo)."""
+        start = time.time()
+        tree = list_tree(repo_path, commit)
+        if previous is None:
+            index, mode, paths = cls.empty(repo, commit), "full", None
+        else:
+            # A copy: other workers may still be querying previous (docs entries are replaced, never edited)
+            index, mode = cls(dict(previous.data, docs=dict(previous.docs), df=dict(previous.df))), "incremental"
+            paths = changed_paths(repo_path, previous.commit, commit)
+            if paths is None:
+                # Previous commit not in this (shallow) workspace: compare blob ids instead
+                mode = "incremental-blobs"
+                paths = {p for p, (blob, _) in tree.items() if p not in index.docs or index.docs[p][0] != blob}
+        previous_commit = index.commit if previous is not None else None
+        reindexed = index.update(repo_path, commit, paths, tree)
+        index.data.update(built=datetime.now().isoformat(), mode=mode, previous=previous_commit,
+                          reindexed=reindexed, seconds=round(time.time() - start, 3))
+        return index
+
+    # -------------------------------------------------------------- persist
+
+    @staticmethod
+    def index_path(index_dir, repo, commit):
+        return os.path.join(index_dir, repo_key(repo), f"{commit}.json.gz")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, index_dir=DEFAULT_INDEX_DIR):
+        path = self.index_path(index_dir, self.repo, self.commit)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=3) as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        prune(os.path.dirname(path))
+        return path
+
+    # ---------------------------------------------------------------- query
+
+    def query(self, text, k=10, symbols_per_file=5):
+        """Top-k [{path, score, symbols}] for a problem statement."""
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        idf = {}
+        for term in term_counts(text):
+            df = self.df.get(term)
+            if df:
+                idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        avg_len = max(self.total_len / n_docs, 1)
+        query_terms = idf.keys()
+        scored = []
+        for path, (blob, length, tf, symbols) in self.docs.items():
+            common = query_terms & tf.keys()
+            if not common:
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+            score = 0.0
+            for term in common:
+                f = tf[term]
+                score += idf[term] * f * (BM25_K1 + 1) / (f + norm)
+            scored.append((score, path))
+        scored.sort(reverse=True)
+
+        hits = []
+        for score, path in scored[:k]:
+            symbols = self.docs[path][3]
+            ranked = []
+            for position, name in enumerate(symbols):
+                weight = sum(idf.get(term, 0) for term in split_identifier(name))
+                if weight:
+                    ranked.append((-weight, position, name))
+            ranked.sort()
+            hits.append({"path": path, "score": round(score, 2),
+                         "symbols": [name for _, _, name in ranked[:symbols_per_file]]})
+        return hits
+
+
+def prune(repo_dir, keep=KEEP_PER_REPO):
+    files = sorted((os.path.join(repo_dir, name) for name in os.listdir(repo_dir) if name.endswith(".json.gz")),
+                   key=os.path.getmtime, reverse=True)
+    for path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def latest_index(index_dir, repo):
+    repo_dir = os.path.join(index_dir, repo_key(repo))
+    if not os.path.isdir(repo_dir):
+        return None
+    files = [os.path.join(repo_dir, name) for name in os.listdir(repo_dir) if name.endswith(".json.gz")]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def index_for_commit(repo, repo_path, commit, index_dir=DEFAULT_INDEX_DIR):
+    """Load or build the index for (repo, commit), reusing the repo's previous index when there is one."""
+    with repo_lock(repo):
+        recent = _recent.get(repo)
+        if recent is not None and recent.commit == commit:
+            recent.data["mode"] = "memory"
+            return recent
+        path = CodeIndex.index_path(index_dir, repo, commit)
+        index = None
+        if os.path.exists(path):
+            try:
+                index = CodeIndex.load(path)
+                index.data["mode"] = "cached"
+            except (OSError, ValueError, KeyError):
+                index = None   # corrupt: rebuild
+        if index is None:
+            previous = recent
+            if previous is None:
+                latest = latest_index(index_dir, repo)
+                if latest:
+                    try:
+                        previous = CodeIndex.load(latest)
+                    except (OSError, ValueError, KeyError):
+                        previous = None
+            index = CodeIndex.build(repo, repo_path, commit, previous)
+            index.save(index_dir)
+        _recent[repo] = index
+        return index
+
+
+# ========================== CLI ==========================
+
+def print_hits(hits):
+    for hit in hits:
+        symbols = f"  [{', '.join(hit['symbols'])}]" if hit["symbols"] else ""
+        print(f"{hit['score']:>8.2f}  {hit['path']}{symbols}")
+
+
+def bench(repo_path, repo, commits, query_text, index_dir, repeat):
+    previous = None
+    print(f"{'commit':<12} {'mode':<18} {'files':>7} {'reindexed':>9} {'build s':>8} {'query ms':>9} {'size KiB':>9}")
+    for commit in commits:
+        index = CodeIndex.build(repo, repo_path, commit, previous)
+        size = os.path.getsize(index.save(index_dir)) / 1024
+        start = time.perf_counter()
+        for _ in range(repeat):
+            hits = index.query(query_text)
+        query_ms = (time.perf_counter() - start) * 1000 / repeat
+        print(f"{commit[:12]:<12} {index.data['mode']:<18} {len(index.docs):>7} {index.data['reindexed']:>9} "
+              f"{index.data['seconds']:>8.2f} {query_ms:>9.1f} {size:>9.0f}")
+        previous = index
+    start = time.perf_counter()
+    CodeIndex.load(CodeIndex.index_path(index_dir, repo, commits[-1]))
+    print(f"-- load from disk: {time.perf_counter() - start:.2f}s")
+    print_hits(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-commit BM25 code index')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('build', 'Build (or update) the index for a commit'),
+                            ('query', 'Rank files of a commit against some text')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('repo_path')
+        sub.add_argument('commit')
+        sub.add_argument('--repo', default=None, help='owner/name (default: repo_path folder name)')
+        if name == 'query':
+            sub.add_argument('text')
+            sub.add_argument('-k', type=int, default=10)
+
+    bench_parser = subparsers.add_parser('bench', help='Time full + incremental builds and queries')
+    bench_parser.add_argument('repo_path')
+    bench_parser.add_argument('--commits', nargs='+', required=True, help='Commits in the order to index them')
+    bench_parser.add_argument('--repo', default=None)
+    bench_parser.add_argument('--query', default='fix crash when parsing empty input', dest='query_text')
+    bench_parser.add_argument('--repeat', type=int, default=5)
+
+    args = parser.parse_args()
+    repo = args.repo or os.path.basename(os.path.abspath(args.repo_path))
+
+    if args.command == 'bench':
+        index_dir = tempfile.mkdtemp(prefix="code_index_bench_")
+        try:
+            bench(args.repo_path, repo, args.commits, args.query_text, index_dir, args.repeat)
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+        return
+
+    commit = git(args.repo_path, "rev-parse", args.commit).stdout.decode().strip() or args.commit
+    index = index_for_commit(repo, args.repo_path, commit, args.index_dir)
+    if args.command == 'build':
+        print(f"✓ {repo}@{commit[:12]}: {len(index.docs)} files ({index.data.get('mode')}, "
+              f"{index.data.get('reindexed', 0)} re-indexed in {index.data.get('seconds', 0)}s)")
+    else:
+        print_hits(index.query(args.text, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Local SWE-PolyBench snapshot tagged with a revision and per-row hashes
+
+The runners read problems from this snapshot instead of calling
+load_dataset() from scratch. A refresh compares a new revision of the
+dataset (from the Hub, or from a local JSONL/JSON export) with the cached
+one by instance_id and row hash, and only appends rows that are new or
+changed; unchanged rows stay where they are.
+
+Positions in swe_polybench_state.json and missing_problems.json belong to
+the revision they were written under. After a refresh they are remapped
+through instance_id, so --resume and process_missing.py keep pointing at
+the same problems even when upstream inserts, drops or reorders rows.
+
+Layout of swe_polybench_dataset/:
+
+  rows[.<gen>].jsonl   append-only row store; compaction writes the next generation
+                       when half of it is dead, switches the manifest, then deletes the old one
+  manifest.json        revision, source, store file, [instance_id, sha256, offset, length] in dataset order
+  orders/<rev>.json    instance_ids of every revision seen, to remap old positions
+
+  python dataset_snapshot.py status
+  python dataset_snapshot.py refresh                                   # from the Hub
+  python dataset_snapshot.py refresh --from swe_polybench_v2.jsonl --revision v2
+  python dataset_snapshot.py remap --state swe_polybench_state.json --missing missing_problems.json
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+from selection_index import SelectionIndex, DATASET_NAME, DATASET_SPLIT, INDEXED_FIELDS, \
+    DEFAULT_INDEX_FILE as SELECTION_INDEX_FILE
+
+DEFAULT_SNAPSHOT_DIR = "swe_polybench_dataset"
+DEFAULT_STORE = "rows.jsonl"
+STATE_FILE = "swe_polybench_state.json"
+MISSING_FILE = "missing_problems.json"
+
+
+def row_hash(row):
+    """Content hash of one dataset row (key order and JSON spacing don't matter)."""
+    text = json.dumps(row, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def rows_fingerprint(entries):
+    """Content of a revision's rows in order: any changed, added, removed or moved row changes it."""
+    return "sha256:" + hashlib.sha256("".join(entry[1] for entry in entries).encode()).hexdigest()[:16]
+
+
+def safe_name(text):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in text)
+
+
+def write_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+class DatasetSnapshot:
+    """Rows of one dataset revision, stored once per distinct content"""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_DIR):
+        self.path = path
+        self.manifest_file = os.path.join(path, "manifest.json")
+        self.manifest = None
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    @property
+    def exists(self):
+        return self.manifest is not None
+
+    @property
+    def rows_file(self):
+        store = self.manifest.get("store", DEFAULT_STORE) if self.manifest else DEFAULT_STORE
+        return os.path.join(self.path, store)
+
+    @property
+    def revision(self):
+        return self.manifest["revision"] if self.manifest else None
+
+    @property
+    def fingerprint(self):
+        return rows_fingerprint(self.manifest["rows"]) if self.manifest else None
+
+    @property
+    def instance_ids(self):
+        return [entry[0] for entry in self.manifest["rows"]] if self.manifest else []
+
+    def positions(self):
+        return {entry[0]: position for position, entry in enumerate(self.manifest["rows"])}
+
+    def __len__(self):
+        return len(self.manifest["rows"]) if self.manifest else 0
+
+    # -------------------------------------------------------------- reading
+
+    def rows(self, positions=None):
+        """Problems as dicts, in dataset order (or in the order of positions)."""
+        entries = self.manifest["rows"]
+        wanted = [entries[p] for p in positions] if positions is not None else entries
+        problems = []
+        with open(self.rows_file, "rb") as f:
+            for _, _, offset, length in wanted:
+                f.seek(offset)
+                problems.append(json.loads(f.read(length)))
+        return problems
+
+    def order(self, revision):
+        """instance_ids of an earlier revision, if it was ever refreshed into this snapshot."""
+        path = os.path.join(self.path, "orders", safe_name(revision) + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # -------------------------------------------------------------- refresh
+
+    def refresh(self, rows, revision=None, source=None):
+        """Bring the snapshot to a new revision, appending only new or changed rows.
+
+        Returns the diff against the previous revision.
+        """
+        os.makedirs(os.path.join(self.path, "orders"), exist_ok=True)
+        old_entries = self.manifest["rows"] if self.manifest else []
+        old_by_id = {entry[0]: entry for entry in old_entries}
+        stored = {entry[1]: (entry[2], entry[3]) for entry in old_entries}
+        old_positions = {entry[0]: position for position, entry in enumerate(old_entries)}
+
+        diff = {"added": [], "changed": [], "removed": [], "moved": 0, "unchanged": 0, "appended": 0, "appended_bytes": 0}
+        entries = []
+        with open(self.rows_file, "ab") as f:
+            for position, row in enumerate(rows):
+                instance_id = row["instance_id"]
+                digest = row_hash(row)
+                if digest not in stored:
+                    data = (json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                    stored[digest] = (f.tell(), len(data) - 1)
+                    f.write(data)
+                    diff["appended"] += 1
+                    diff["appended_bytes"] += len(data)
+                entries.append([instance_id, digest, *stored[digest]])
+                old = old_by_id.get(instance_id)
+                if old is None:
+                    diff["added"].append(instance_id)
+                elif old[1] != digest:
+                    diff["changed"].append(instance_id)
+                else:
+                    diff["unchanged"] += 1
+                if old is not None and old_positions[instance_id] != position:
+                    diff["moved"] += 1
+        new_ids = {entry[0] for entry in entries}
+        diff["removed"] = [entry[0] for entry in old_entries if entry[0] not in new_ids]
+
+        # Revision of a local export without a name: the content itself
+        revision = revision or rows_fingerprint(entries)
+        previous = self.revision
+        if previous == revision:
+            previous = self.manifest.get("previous_revision")
+        live = sum(entry[3] + 1 for entry in {e[1]: e for e in entries}.values())
+        store = os.path.basename(self.rows_file)
+        self.manifest = {
+            "dataset": DATASET_NAME, "split": DATASET_SPLIT,
+            "revision": revision, "previous_revision": previous,
+            "source": source, "updated": datetime.now().isoformat(),
+            "store": store, "rows": entries,
+        }
+        write_json(os.path.join(self.path, "orders", safe_name(revision) + ".json"), [e[0] for e in entries])
+        write_json(self.manifest_file, self.manifest)
+        if os.path.getsize(self.rows_file) > 2 * live:
+            self.compact()
+        diff["revision"], diff["previous_revision"] = revision, previous
+        return diff
+
+    def compact(self):
+        """Copy the rows the current revision uses into the next store generation.
+
+        The manifest only switches to the new store once it is complete, so a
+        crash at any point leaves a manifest whose offsets match its store.
+        """
+        old_file = self.rows_file
+        generation = self.manifest.get("generation", 0) + 1
+        new_store = f"rows.{generation}.jsonl"
+        new_file = os.path.join(self.path, new_store)
+        moved = {}
+        entries = []
+        with open(old_file, "rb") as src, open(new_file, "wb") as dst:
+            for instance_id, digest, offset, length in self.manifest["rows"]:
+                if digest not in moved:
+                    src.seek(offset)
+                    data = src.read(length + 1)
+                    moved[digest] = (dst.tell(), length)
+                    dst.write(data)
+                entries.append([instance_id, digest, *moved[digest]])
+            dst.flush()
+            os.fsync(dst.fileno())
+        write_json(self.manifest_file, dict(self.manifest, store=new_store, generation=generation, rows=entries))
+        self.manifest.update(store=new_store, generation=generation, rows=entries)
+        # The old store, plus any left behind by a compaction that crashed after switching
+        for name in os.listdir(self.path):
+            if name.startswith("rows.") and name.endswith(".jsonl") and name != new_store:
+                os.remove(os.path.join(self.path, name))
+
+
+# ========================== SOURCES ==========================
+
+def hub_revision():
+    """Commit sha of the dataset repository on the Hub, if huggingface_hub can tell."""
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().dataset_info(DATASET_NAME).sha
+    except Exception:
+        return None
+
+
+def hub_rows():
+    """(rows, revision) of the dataset as published on the Hub."""
+    from datasets import load_dataset
+    dataset = load_dataset(DATASET_NAME, split=DATASET_SPLIT)
+    revision = hub_revision() or getattr(dataset, "_fingerprint", None)
+    return (dict(item) for item in dataset), revision
+
+
+def file_rows(path):
+    """Rows of a local export: JSONL (one row per line) or a JSON list."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def selection_index_from(snapshot):
+    """Selection index whose positions follow the snapshot's row order."""
+    columns = {field: [] for field in INDEXED_FIELDS}
+    for row in snapshot.rows():
+        for field in INDEXED_FIELDS:
+            columns[field].append(row.get(field))
+    return SelectionIndex.from_columns(snapshot.instance_ids, columns,
+                                       {"dataset": DATASET_NAME, "split": DATASET_SPLIT, "revision": snapshot.revision,
+                                        "fingerprint": snapshot.fingerprint})
+
+
+def rebuild_selection_index(snapshot, index_file=SELECTION_INDEX_FILE):
+    index = selection_index_from(snapshot)
+    index.save(index_file)
+    return index
+
+
+def refresh(snapshot, from_file=None, revision=None, state_file=STATE_FILE, missing_file=MISSING_FILE):
+    """Refresh from the Hub or a local file, then remap positional state; returns the diff."""
+    if from_file:
+        rows, source = file_rows(from_file), os.path.abspath(from_file)
+    else:
+        rows, hub = hub_rows()
+        revision, source = revision or hub, f"hub:{DATASET_NAME}"
+    previous_ids = snapshot.instance_ids
+    diff = snapshot.refresh(rows, revision, source)
+    rebuild_selection_index(snapshot)
+    if previous_ids:
+        diff["remapped"] = remap_files(snapshot, state_file, missing_file, previous_ids)
+    return diff
+
+
+def open_snapshot(snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """The local snapshot; the first call creates it from the Hub."""
+    snapshot = DatasetSnapshot(snapshot_dir)
+    if not snapshot.exists:
+        rows, revision = hub_rows()
+        snapshot.refresh(rows, revision, f"hub:{DATASET_NAME}")
+    return snapshot
+
+
+def load_problems(positions=None, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """Problems from the local snapshot (created from the Hub on first use)."""
+    return open_snapshot(snapshot_dir).rows(positions)
+
+
+# ========================== REMAPPING ==========================
+
+def remap_position(position, old_ids, new_positions, forward=True):
+    """Where a position of the old order lives now; a removed row maps to its next (or previous) survivor."""
+    if position is None or not old_ids or position < 0:
+        return position
+    if position >= len(old_ids):
+        return len(new_positions) - 1
+    step = 1 if forward else -1
+    i = position
+    while 0 <= i < len(old_ids):
+        if old_ids[i] in new_positions:
+            return new_positions[old_ids[i]]
+        i += step
+    return len(new_positions) if forward else -1
+
+
+def remap_state(state, snapshot, old_ids=None):
+    """Rewrite the runner state's positions for the snapshot's revision; returns True if anything moved."""
+    new_positions = snapshot.positions()
+    if old_ids is None:
+        saved = state.get("dataset_revision")
+        old_ids = snapshot.order(saved) if saved and saved != snapshot.revision else None
+    before = (state.get("last_instance_index"), dict(state.get("range") or {}))
+
+    last_id = state.get("last_instance_id")
+    if last_id in new_positions:
+        # The id is authoritative, whatever revision the index was written under
+        state["last_instance_index"] = new_positions[last_id]
+    elif old_ids is not None:
+        # Last row was dropped: resume right after its predecessor
+        state["last_instance_index"] = remap_position(state.get("last_instance_index"), old_ids, new_positions,
+                                                      forward=False)
+    if old_ids is not None and state.get("range"):
+        state["range"]["start"] = remap_position(state["range"].get("start"), old_ids, new_positions)
+        state["range"]["end"] = remap_position(state["range"].get("end"), old_ids, new_positions, forward=False)
+    state["dataset_revision"] = snapshot.revision
+    return before != (state.get("last_instance_index"), dict(state.get("range") or {}))
+
+
+def remap_missing(entries, snapshot):
+    """Re-index missing_problems.json entries by instance_id; rows gone upstream are dropped."""
+    new_positions = snapshot.positions()
+    kept, dropped = [], []
+    for entry in entries:
+        if entry["instance_id"] in new_positions:
+            kept.append(dict(entry, index=new_positions[entry["instance_id"]]))
+        else:
+            dropped.append(entry["instance_id"])
+    return kept, dropped
+
+
+def remap_files(snapshot, state_file=STATE_FILE, missing_file=MISSING_FILE, old_ids=None):
+    """Remap the state and missing-problems files in place; returns what changed."""
+    report = {}
+    if state_file and os.path.exists(state_file):
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        before = state.get("last_instance_index")
+        if remap_state(state, snapshot, old_ids):
+            report["state"] = f"last index {before} -> {state['last_instance_index']}"
+        write_json(state_file, state)
+    if missing_file and os.path.exists(missing_file):
+        with open(missing_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        kept, dropped = remap_missing(entries, snapshot)
+        old_index = {entry["instance_id"]: entry["index"] for entry in entries}
+        moved = sum(1 for entry in kept if old_index[entry["instance_id"]] != entry["index"])
+        if kept != entries:
+            write_json(missing_file, kept)
+            report["missing"] = f"{moved} re-indexed, {len(dropped)} dropped (no longer in the dataset)"
+    return report
+
+
+def describe(diff):
+    return (f"{diff['previous_revision'] or '(none)'} -> {diff['revision']}: {len(diff['added'])} added, "
+            f"{len(diff['changed'])} changed, {len(diff['removed'])} removed, {diff['moved']} moved, "
+            f"{diff['unchanged']} unchanged; {diff['appended']} rows ({diff['appended_bytes'] / 1024:.1f} KiB) written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local dataset snapshot with revisions and row hashes')
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='Revision and size of the snapshot')
+
+    refresh_parser = subparsers.add_parser('refresh', help='Update to a new revision, only writing changed rows')
+    refresh_parser.add_argument('--from', dest='from_file', default=None, help='Local JSONL/JSON export instead of the Hub')
+    refresh_parser.add_argument('--revision', default=None, help='Name of the revision (default: Hub sha or content hash)')
+    for sub in (refresh_parser, subparsers.add_parser('remap', help='Remap positional state to the current revision')):
+        sub.add_argument('--state', default=STATE_FILE)
+        sub.add_argument('--missing', default=MISSING_FILE)
+
+    args = parser.parse_args()
+    snapshot = DatasetSnapshot(args.snapshot)
+
+    if args.command == 'status':
+        if not snapshot.exists:
+            print(f"No snapshot in {args.snapshot} (created on first load, or: dataset_snapshot.py refresh)")
+            return
+        m = snapshot.manifest
+        print(f"{m['dataset']} [{m['split']}] revision {m['revision']} ({len(snapshot)} rows, "
+              f"{os.path.getsize(snapshot.rows_file) / 1024 / 1024:.1f} MiB store)")
+        print(f"source: {m['source']}; updated {m['updated']}; previous revision {m.get('previous_revision')}")
+    elif args.command == 'refresh':
+        diff = refresh(snapshot, args.from_file, args.revision, args.state, args.missing)
+        print(f"✓ {describe(diff)}")
+        for name in ("added", "changed", "removed"):
+            if diff[name]:
+                print(f"  {name}: {', '.join(diff[name][:10])}{' ...' if len(diff[name]) > 10 else ''}")
+        for name, message in diff.get("remapped", {}).items():
+            print(f"  remapped {name}: {message}")
+    else:
+        report = remap_files(snapshot, args.state, args.missing)
+        for name, message in report.items():
+            print(f"✓ remapped {name}: {message}")
+        if not report:
+            print("✓ Nothing to remap")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Evaluation results store: reports, predictions, runner state and metadata in one SQLite file
+
+Loads the official evaluation reports, predictions.jsonl, swe_polybench_state.json
+and the dataset metadata into indexed tables so they can be joined instead of
+grepped:
+
+  instances        instance_id, position, repo, language, task_category, base_commit
+  predictions      latest patch per (model, instance_id) with size/files/lines
+  results          per (run_id, instance_id): status, resolved, FAIL_TO_PASS / PASS_TO_PASS counts
+  runs             run_id -> model, source, ingest time
+  runner_events    failed instances and clone errors recorded by the runner
+
+Reports may be a summary file ({"resolved_ids": [...], "unresolved_ids": [...]}),
+per-instance reports ({instance_id: {"resolved": true, "tests_status": {...}}}),
+JSONL records with instance_id/resolved, or a directory of any of these.
+
+  python eval_store.py ingest --report logs/run_evaluation/run1 --run run1 --model cora
+  python eval_store.py ingest --predictions predictions.jsonl --state swe_polybench_state.json --metadata
+  python eval_store.py rates --by language
+  python eval_store.py patch-size --run run1
+  python eval_store.py clone-errors
+  python eval_store.py sql "SELECT status, COUNT(*) FROM results GROUP BY status"
+  python eval_store.py bench --runs 5
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+
+from predictions_index import patch_stats
+from profiling import Profiler, add_profile_arguments
+from selection_index import SelectionIndex, DEFAULT_INDEX_FILE as SELECTION_INDEX_FILE
+
+DEFAULT_DB_FILE = "swe_polybench_eval.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    instance_id TEXT PRIMARY KEY,
+    position INTEGER,
+    repo TEXT,
+    language TEXT,
+    task_category TEXT,
+    base_commit TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_instances_language ON instances (language);
+CREATE INDEX IF NOT EXISTS idx_instances_category ON instances (task_category);
+CREATE INDEX IF NOT EXISTS idx_instances_repo ON instances (repo);
+CREATE TABLE IF NOT EXISTS predictions (
+    model TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    patch_bytes INTEGER NOT NULL,
+    files_touched INTEGER NOT NULL,
+    lines_added INTEGER NOT NULL,
+    lines_removed INTEGER NOT NULL,
+    has_changes INTEGER NOT NULL,
+    source TEXT,
+    PRIMARY KEY (model, instance_id)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_instance ON predictions (instance_id);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    model TEXT,
+    source TEXT,
+    ingested TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    resolved INTEGER NOT NULL,
+    f2p_passed INTEGER,
+    f2p_failed INTEGER,
+    p2p_passed INTEGER,
+    p2p_failed INTEGER,
+    PRIMARY KEY (run_id, instance_id)
+);
+CREATE INDEX IF NOT EXISTS idx_results_instance ON results (instance_id);
+CREATE TABLE IF NOT EXISTS runner_events (
+    instance_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    repo TEXT,
+    reason TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (instance_id, kind, timestamp)
+);
+CREATE INDEX IF NOT EXISTS idx_runner_events_kind ON runner_events (kind, instance_id);
+"""
+
+# Summary report lists, most specific first; an instance keeps the first status it is found in
+REPORT_STATUS_KEYS = [
+    ("resolved_ids", "resolved"),
+    ("unresolved_ids", "unresolved"),
+    ("error_ids", "error"),
+    ("empty_patch_ids", "empty_patch"),
+    ("incomplete_ids", "incomplete"),
+]
+PATCH_SIZE_BUCKETS = [(0, "empty"), (1024, "<1 KiB"), (4096, "1-4 KiB"), (16384, "4-16 KiB"),
+                      (65536, "16-64 KiB"), (None, ">64 KiB")]
+
+
+# ========================== REPORT PARSING ==========================
+
+def test_counts(tests_status, key):
+    group = (tests_status or {}).get(key) or {}
+    return len(group.get("success") or []), len(group.get("failure") or [])
+
+
+def result_row(instance_id, report):
+    """(instance_id, status, resolved, f2p_passed, f2p_failed, p2p_passed, p2p_failed) from one report."""
+    resolved = bool(report.get("resolved"))
+    status = report.get("status") or ("resolved" if resolved else "unresolved")
+    if report.get("patch_is_None") or report.get("patch_exists") is False:
+        status = "empty_patch"
+    tests_status = report.get("tests_status")
+    f2p = test_counts(tests_status, "FAIL_TO_PASS") if tests_status else (None, None)
+    p2p = test_counts(tests_status, "PASS_TO_PASS") if tests_status else (None, None)
+    return (instance_id, status, int(resolved)) + f2p + p2p
+
+
+def parse_report(data):
+    """Yield result rows from a decoded report of any supported shape."""
+    if isinstance(data, list):
+        for record in data:
+            if isinstance(record, dict) and record.get("instance_id"):
+                yield result_row(record["instance_id"], record)
+        return
+    if not isinstance(data, dict):
+        return
+    if any(key in data for key, _ in REPORT_STATUS_KEYS):
+        seen = set()
+        for key, status in REPORT_STATUS_KEYS:
+            for instance_id in data.get(key) or []:
+                if instance_id not in seen:
+                    seen.add(instance_id)
+                    yield (instance_id, status, int(status == "resolved"), None, None, None, None)
+        return
+    if data.get("instance_id"):
+        yield result_row(data["instance_id"], data)
+        return
+    for instance_id, report in data.items():
+        if isinstance(report, dict) and ("resolved" in report or "tests_status" in report):
+            yield result_row(instance_id, report)
+
+
+def iter_report_rows(path):
+    """Result rows from a report file or every .json/.jsonl file under a directory."""
+    if os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith((".json", ".jsonl")):
+                    yield from iter_report_rows(os.path.join(root, name))
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    try:
+                        yield from parse_report(json.loads(line))
+                    except ValueError:
+                        continue
+        else:
+            try:
+                yield from parse_report(json.load(f))
+            except ValueError:
+                return
+
+
+# ========================== STORE ==========================
+
+class EvalStore:
+    """SQLite tables for evaluation results and the data they are joined with"""
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ----------------------------------------------------------------- ingest
+
+    def ingest_report(self, path, run_id=None, model=None, replace=True):
+        """Store the rows found in path as results of run_id.
+
+        replace clears the run's earlier results first; without it the rows are
+        added to the run (an instance already in it takes the new row).
+        """
+        run_id = run_id or os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        if model is None:
+            models = [row[0] for row in self.conn.execute("SELECT DISTINCT model FROM predictions")]
+            model = models[0] if len(models) == 1 else None
+        rows = {}
+        for row in iter_report_rows(path):
+            known = rows.get(row[0])
+            # Per-instance reports (with test counts) win over summary lists
+            if known is None or (known[3] is None and row[3] is not None):
+                rows[row[0]] = row
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+            self.conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  ((run_id,) + row for row in rows.values()))
+            self.conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                              (run_id, model, os.path.abspath(path), datetime.now().isoformat()))
+        return run_id, len(rows)
+
+    def ingest_predictions(self, predictions_file):
+        """Latest line per (model, instance_id) wins, as in the evaluation harness."""
+        path = os.path.abspath(predictions_file)
+        rows = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not entry.get("instance_id"):
+                    continue
+                patch = entry.get("model_patch") or ""
+                patch_bytes = len(patch.encode("utf-8")) if patch.strip() else 0
+                files, added, removed = patch_stats(patch.split("\n"))
+                model = entry.get("model_name_or_path", "")
+                rows[(model, entry["instance_id"])] = (model, entry["instance_id"], patch_bytes, files, added,
+                                                       removed, int(patch_bytes > 0), path)
+        with self.conn:
+            self.conn.execute("DELETE FROM predictions WHERE source = ?", (path,))
+            self.conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows.values())
+        return len(rows)
+
+    def ingest_state(self, state_file):
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        rows = []
+        for entry in state.get("failed_instances", []):
+            reason = entry.get("reason", "")
+            kind = "clone_error" if reason.startswith("Clone error") else "failed"
+            rows.append((entry["instance_id"], kind, None, reason, entry.get("timestamp")))
+        for entry in state.get("cloning_errors", []):
+            rows.append((entry["instance_id"], "clone_error", entry.get("repo"), entry.get("error"),
+                         entry.get("timestamp")))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO runner_events VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def ingest_metadata(self, rows):
+        """rows: (instance_id, position, repo, language, task_category, base_commit)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM instances")
+            self.conn.executemany("INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return self.conn.execute("SELECT COUNT(*) FROM instances").fetchone()[0]
+
+    # ---------------------------------------------------------------- queries
+
+    def latest_run(self):
+        row = self.conn.execute("SELECT run_id FROM runs ORDER BY ingested DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def resolve_rates(self, run_id, by="language"):
+        """(group, benchmark instances, evaluated, resolved, rate over evaluated, rate over benchmark)."""
+        if by not in ("language", "task_category", "repo"):
+            raise ValueError(f"Cannot group by '{by}'")
+        return self.conn.execute(
+            f"""SELECT COALESCE(i.{by}, 'Unknown') AS grp,
+                       COUNT(*) AS total,
+                       COUNT(r.instance_id) AS evaluated,
+                       COALESCE(SUM(r.resolved), 0) AS resolved,
+                       ROUND(100.0 * SUM(r.resolved) / NULLIF(COUNT(r.instance_id), 0), 1),
+                       ROUND(100.0 * COALESCE(SUM(r.resolved), 0) / COUNT(*), 1)
+                FROM instances i LEFT JOIN results r ON r.instance_id = i.instance_id AND r.run_id = ?
+                GROUP BY grp ORDER BY total DESC""",
+            (run_id,)
+        ).fetchall()
+
+    def patch_size_rates(self, run_id):
+        """(bucket, evaluated, resolved, rate, avg files touched) by patch size of the run's model."""
+        cases = " ".join(f"WHEN p.patch_bytes < {limit} THEN {n}" for n, (limit, _) in enumerate(PATCH_SIZE_BUCKETS)
+                         if limit)
+        rows = self.conn.execute(
+            f"""SELECT CASE WHEN COALESCE(p.patch_bytes, 0) = 0 THEN 0 {cases} ELSE {len(PATCH_SIZE_BUCKETS) - 1} END AS bucket,
+                       COUNT(*), SUM(r.resolved), ROUND(100.0 * SUM(r.resolved) / COUNT(*), 1),
+                       ROUND(AVG(p.files_touched), 1)
+                FROM results r
+                JOIN runs ON runs.run_id = r.run_id
+                LEFT JOIN predictions p ON p.instance_id = r.instance_id AND p.model = runs.model
+                WHERE r.run_id = ?
+                GROUP BY bucket ORDER BY bucket""",
+            (run_id,)
+        ).fetchall()
+        return [(PATCH_SIZE_BUCKETS[row[0]][1],) + tuple(row[1:]) for row in rows]
+
+    def clone_error_impact(self, run_id):
+        """Per repo: instances, instances with a clone error, and how those fared in the run."""
+        return self.conn.execute(
+            """WITH errored AS (SELECT DISTINCT instance_id FROM runner_events WHERE kind = 'clone_error')
+               SELECT COALESCE(i.repo, 'Unknown') AS grp,
+                      COUNT(*) AS total,
+                      COUNT(e.instance_id) AS clone_errors,
+                      SUM(e.instance_id IS NOT NULL AND r.instance_id IS NULL) AS never_evaluated,
+                      SUM(e.instance_id IS NOT NULL AND r.resolved = 1) AS resolved_after_error,
+                      ROUND(100.0 * SUM(e.instance_id IS NULL AND r.resolved = 1)
+                            / NULLIF(SUM(e.instance_id IS NULL AND r.instance_id IS NOT NULL), 0), 1)
+                FROM instances i
+                LEFT JOIN errored e ON e.instance_id = i.instance_id
+                LEFT JOIN results r ON r.instance_id = i.instance_id AND r.run_id = ?
+                GROUP BY grp HAVING clone_errors > 0 OR COUNT(r.instance_id) > 0
+                ORDER BY clone_errors DESC, total DESC""",
+            (run_id,)
+        ).fetchall()
+
+
+# ========================== METADATA ==========================
+
+def metadata_from_dataset():
+    """Metadata from the local dataset snapshot, at the positions the runners use."""
+    from dataset_snapshot import open_snapshot
+    return [(row["instance_id"], position, row.get("repo"), row.get("language"), row.get("task_category"),
+             row.get("base_commit")) for position, row in enumerate(open_snapshot().rows())]
+
+
+def metadata_from_selection_index(index_file=SELECTION_INDEX_FILE):
+    """Same rows (without base_commit) from the cached selection index, for offline use."""
+    index = SelectionIndex.load(index_file)
+    fields = {field: [None] * index.rows for field in ("repo", "language", "task_category")}
+    for field, values in fields.items():
+        for value, positions in index.postings[field].items():
+            for position in positions:
+                values[position] = value
+    return [(iid, position, fields["repo"][position], fields["language"][position],
+             fields["task_category"][position], None) for position, iid in enumerate(index.instance_ids)]
+
+
+# ========================== BENCHMARK ==========================
+
+def benchmark(runs, instances=2110):
+    """Time the analytics queries over a synthetic full-benchmark store."""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        store = EvalStore(path)
+        rng = random.Random(0)
+        languages = ["JavaScript", "TypeScript", "Python", "Java"]
+        categories = ["Bug Fix", "Feature", "Refactoring"]
+        repos = [f"org{i}/repo{i}" for i in range(21)]
+        ids = [f"repo__proj-{i}" for i in range(instances)]
+        start = time.perf_counter()
+        store.ingest_metadata((iid, n, rng.choice(repos), rng.choice(languages), rng.choice(categories), None)
+                              for n, iid in enumerate(ids))
+        with store.conn:
+            for run in range(runs):
+                model = f"model-{run}"
+                sizes = {iid: rng.choice([0, rng.randint(200, 200000)]) for iid in ids}
+                store.conn.executemany("INSERT INTO predictions VALUES (?, ?, ?, ?, 0, 0, ?, 'bench')",
+                                       ((model, iid, size, rng.randint(1, 8), int(size > 0))
+                                        for iid, size in sizes.items()))
+                store.conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, NULL, NULL, NULL, NULL)",
+                                       ((f"run-{run}", iid, "resolved" if ok else "unresolved", ok)
+                                        for iid in ids for ok in [int(sizes[iid] > 0 and rng.random() < 0.3)]))
+                store.conn.execute("INSERT INTO runs VALUES (?, ?, 'bench', ?)",
+                                   (f"run-{run}", model, datetime.now().isoformat()))
+            store.conn.executemany("INSERT OR IGNORE INTO runner_events VALUES (?, 'clone_error', NULL, 'bench', ?)",
+                                   ((rng.choice(ids), str(n)) for n in range(instances // 20)))
+        load_time = time.perf_counter() - start
+
+        run_id = f"run-{runs - 1}"
+        print(f"Instances: {instances}, runs: {runs} (load {load_time * 1000:.0f} ms)")
+        for name, query in [
+            ("rates by language", lambda: store.resolve_rates(run_id, "language")),
+            ("rates by category", lambda: store.resolve_rates(run_id, "task_category")),
+            ("rates by repo", lambda: store.resolve_rates(run_id, "repo")),
+            ("patch size", lambda: store.patch_size_rates(run_id)),
+            ("clone errors", lambda: store.clone_error_impact(run_id)),
+        ]:
+            start = time.perf_counter()
+            query()
+            print(f"  {name:<18} {(time.perf_counter() - start) * 1000:.1f} ms")
+        store.close()
+    finally:
+        os.remove(path)
+
+
+# ========================== CLI ==========================
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) if rows else len(str(h))
+              for i, h in enumerate(headers)]
+    print("  ".join(f"{h:<{w}}" if i == 0 else f"{h:>{w}}" for i, (h, w) in enumerate(zip(headers, widths))))
+    for row in rows:
+        print("  ".join(f"{str(v):<{w}}" if i == 0 else f"{str(v):>{w}}" for i, (v, w) in enumerate(zip(row, widths))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluation results store and analytics')
+    parser.add_argument('--db', default=DEFAULT_DB_FILE)
+    add_profile_arguments(parser)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Load reports, predictions, runner state and metadata')
+    ingest_parser.add_argument('--report', action='append', default=[], help='Report file or directory (repeatable)')
+    ingest_parser.add_argument('--run', default=None, help='Run id for --report (default: report file name)')
+    ingest_parser.add_argument('--model', default=None, help='Model the report evaluated (default: the only model ingested)')
+    ingest_parser.add_argument('--predictions', action='append', default=[])
+    ingest_parser.add_argument('--state', default=None)
+    ingest_parser.add_argument('--metadata', action='store_true',
+                               help='Load dataset metadata (falls back to the selection index when offline)')
+
+    for name, help_text in (('rates', 'Resolve rate by language, category or repo'),
+                            ('patch-size', 'Resolve rate by patch size'),
+                            ('clone-errors', 'How clone errors affected each repo')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--run', default=None, help='Run id (default: most recently ingested)')
+        if name == 'rates':
+            sub.add_argument('--by', choices=['language', 'task_category', 'repo'], default='language')
+
+    sql_parser = subparsers.add_parser('sql', help='Run a read-only SQL query')
+    sql_parser.add_argument('query')
+
+    bench_parser = subparsers.add_parser('bench', help='Time the analytics queries over synthetic runs')
+    bench_parser.add_argument('--runs', type=int, default=5)
+
+    args = parser.parse_args()
+    Profiler.from_args(args, phase=args.command)  # written at exit
+
+    if args.command == 'bench':
+        benchmark(args.runs)
+        return
+
+    store = EvalStore(args.db)
+    start = time.perf_counter()
+
+    if args.command == 'ingest':
+        if args.metadata:
+            try:
+                rows = list(metadata_from_dataset())
+            except Exception as e:
+                print(f"⚠️  Dataset unavailable ({e}); using {SELECTION_INDEX_FILE}")
+                rows = metadata_from_selection_index()
+            print(f"instances: {store.ingest_metadata(rows)} rows")
+        for predictions_file in args.predictions:
+            print(f"{predictions_file}: {store.ingest_predictions(predictions_file)} predictions")
+        if args.state:
+            print(f"{args.state}: {store.ingest_state(args.state)} runner events")
+        for i, report in enumerate(args.report):
+            # Several reports under one --run make up that run together
+            run_id, count = store.ingest_report(report, args.run, args.model, replace=args.run is None or i == 0)
+            print(f"{report}: {count} results as run '{run_id}'")
+    elif args.command == 'sql':
+        store.conn.execute("PRAGMA query_only = ON")
+        cursor = store.conn.execute(args.query)
+        print_table([d[0] for d in cursor.description or []], cursor.fetchall())
+    else:
+        run_id = args.run or store.latest_run()
+        if run_id is None:
+            print("❌ No evaluation report ingested yet (eval_store.py ingest --report ...)")
+            store.close()
+            return
+        print(f"Run: {run_id}")
+        if args.command == 'rates':
+            print_table([args.by, "instances", "evaluated", "resolved", "% evaluated", "% benchmark"],
+                        store.resolve_rates(run_id, args.by))
+        elif args.command == 'patch-size':
+            print_table(["patch size", "evaluated", "resolved", "% resolved", "avg files"],
+                        store.patch_size_rates(run_id))
+        else:
+            print_table(["repo", "instances", "clone errors", "never evaluated", "resolved after error",
+                         "% resolved w/o error"], store.clone_error_impact(run_id))
+
+    print(f"-- {(time.perf_counter() - start) * 1000:.1f} ms")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
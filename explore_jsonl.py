@@ -1,4 +1,6 @@
 import json
+import argparse
+from profiling import Profiler, add_profile_arguments
 
 def explore():
     try:
@@ -17,4 +19,8 @@ def explore():
         print(f"Error: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='diff --git lines of each prediction')
+    add_profile_arguments(parser)
+    profiler = Profiler.from_args(parser.parse_args(), phase="explore")
     explore()
+    profiler.finish()
@@ -0,0 +1,290 @@
+"""
+Coalesced base-commit fetches into the local repo cache
+
+Instead of one `git fetch origin <base_commit>` per instance, the planner
+collects the base commits of a whole range (or of the next prefetch window),
+groups them by repo, checks which ones the repo cache already has (one
+cat-file call per repo) and fetches only the missing ones with a single
+`git fetch origin <sha>:<ref> <sha>:<ref> ...` per repo, so there is one
+negotiation per repo instead of one per instance. Workspaces are then
+created from the cache (see clone_from_repo_cache in swe_polybench_tester.py).
+
+A sha the server refuses ("not our ref") fails the whole request, so it is
+dropped and the rest retried; refused shas then get one fetch of all
+branches, like repo_bundles.py does. Any other failure (network, stall) is
+reported and the commits are tried again on the next call. --depth only
+applies to a cache that is still empty or already shallow, so it never cuts
+the history of a complete cache.
+
+  python fetch_planner.py plan  --start 200 --end 300
+  python fetch_planner.py fetch --start 200 --end 300 --depth 50
+  python fetch_planner.py bench /path/to/repo --commits 40      # per-commit vs coalesced against a local bare repo
+"""
+
+import os
+import re
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REMOTE_TEMPLATE = "https://github.com/{repo}.git"   # also {owner} and {name}, e.g. /srv/mirrors/{owner}__{name}.git
+FETCH_BATCH = 200        # shas per fetch command (keeps Windows command lines short)
+MAX_REFUSED = 5          # refused shas dropped and retried before falling back to branches
+GIT_TIMEOUT = 3600
+
+NOT_OUR_REF_RE = re.compile(r"not our ref ([0-9a-f]{40})")
+
+
+def git(path, *args, input_text=None, timeout=GIT_TIMEOUT):
+    return subprocess.run(["git", *args], cwd=path, input=input_text, capture_output=True, text=True,
+                          errors="replace", timeout=timeout)
+
+
+def commit_ref(base_commit):
+    """Ref that pins a base commit inside the repo cache and its bundles."""
+    return f"refs/polybench/{base_commit}"
+
+
+def group_commits(problems):
+    """Base commits per repo, in first-seen order."""
+    grouped = {}
+    for problem in problems:
+        commits = grouped.setdefault(problem["repo"], [])
+        if problem["base_commit"] not in commits:
+            commits.append(problem["base_commit"])
+    return grouped
+
+
+def missing_commits(path, commits):
+    """Commits absent from a repository, checked with one cat-file call."""
+    if not commits:
+        return []
+    result = git(path, "cat-file", "--batch-check", input_text="".join(f"{c}^{{commit}}\n" for c in commits))
+    if result.returncode != 0:
+        return list(commits)
+    # One output line per input line; absent objects come back as "<name> missing"
+    lines = result.stdout.splitlines()
+    return [c for c, line in zip(commits, lines) if line.endswith(" missing")]
+
+
+def pin_commits(path, commits):
+    if commits:
+        git(path, "update-ref", "--stdin", input_text="".join(f"update {commit_ref(c)} {c}\n" for c in commits))
+
+
+def describe(stats):
+    fallback = f" (+{stats['fallback']} via branches)" if stats["fallback"] else ""
+    failed = f", {stats['failed']} failed to fetch" if stats["failed"] else ""
+    return (f"{stats['wanted']} base commits in {stats['repos']} repos: {stats['present']} cached, "
+            f"{stats['fetched']} fetched{fallback}, {stats['unavailable']} unavailable{failed}; "
+            f"{stats['round_trips']} round trips instead of {stats['per_instance_round_trips']} "
+            f"({stats['seconds']:.1f}s)")
+
+
+class FetchPlanner:
+    """Fetches base commits into bare per-repo caches, one request per repo"""
+
+    def __init__(self, cache_dir, remote_template=REMOTE_TEMPLATE, depth=None, transfer=None, log=print):
+        self.cache_dir = cache_dir
+        self.remote_template = remote_template
+        self.depth = depth
+        # transfer(cmd, cwd) -> CompletedProcess or None; the runner passes its stall-aware wrapper
+        self.transfer = transfer or (lambda cmd, cwd: subprocess.run(
+            cmd, cwd=cwd, capture_output=True, text=True, errors="replace", timeout=GIT_TIMEOUT))
+        self.log = log
+        self.repos = set()
+        self.unavailable = set()   # (repo, commit) already given up on this session
+        self.stats = {"repos": 0, "wanted": 0, "present": 0, "fetched": 0, "fallback": 0, "unavailable": 0,
+                      "failed": 0, "round_trips": 0, "per_instance_round_trips": 0, "seconds": 0.0}
+
+    def remote_url(self, repo):
+        owner, _, name = repo.partition("/")
+        return self.remote_template.format(repo=repo, owner=owner, name=name)
+
+    def cache_path(self, repo):
+        return os.path.join(self.cache_dir, repo.replace("/", "__") + ".git")
+
+    def ensure_cache(self, repo):
+        """Create the bare cache repository for a repo if needed."""
+        path = self.cache_path(repo)
+        if not os.path.isdir(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            git(os.getcwd(), "init", "-q", "--bare", path)
+            git(path, "remote", "add", "origin", self.remote_url(repo))
+        return path
+
+    def _fetch(self, path, args):
+        self.stats["round_trips"] += 1
+        return self.transfer(["git", "fetch", *args], path)
+
+    def _depth_args(self, path):
+        """--depth for a new or already shallow cache; a complete history is never made shallow."""
+        if not self.depth:
+            return []
+        shallow = git(path, "rev-parse", "--is-shallow-repository").stdout.strip() == "true"
+        empty = not git(path, "for-each-ref", "--count=1").stdout.strip()
+        return ["--depth", str(self.depth)] if shallow or empty else []
+
+    def _fetch_shas(self, path, shas):
+        """One request for all shas; refused ones are dropped and the rest retried.
+
+        Returns (refused shas, whether a request failed for any other reason).
+        """
+        depth = self._depth_args(path)
+        pending = list(shas)
+        all_refused = set()
+        for _ in range(MAX_REFUSED + 1):
+            if not pending:
+                break
+            refused = set()
+            failed = False
+            for i in range(0, len(pending), FETCH_BATCH):
+                batch = pending[i:i + FETCH_BATCH]
+                result = self._fetch(path, ["--no-tags", *depth, "origin"] + [f"+{c}:{commit_ref(c)}" for c in batch])
+                if result is None:
+                    failed = True  # stalled or timed out
+                elif result.returncode != 0:
+                    batch_refused = NOT_OUR_REF_RE.findall(result.stderr or "")
+                    refused.update(batch_refused)
+                    failed = failed or not batch_refused
+            all_refused |= refused
+            if failed or not refused:
+                return all_refused, failed
+            pending = [c for c in missing_commits(path, pending) if c not in refused]
+        return all_refused, False
+
+    def fetch_repo(self, repo, commits):
+        """Make commits available in the repo's cache; returns the ones that could not be fetched."""
+        start = time.time()
+        path = self.ensure_cache(repo)
+        missing = [c for c in missing_commits(path, commits) if (repo, c) not in self.unavailable]
+        known_bad = [c for c in commits if (repo, c) in self.unavailable]
+        self.repos.add(repo)
+        self.stats["repos"] = len(self.repos)
+        self.stats["wanted"] += len(commits)
+        self.stats["present"] += len(commits) - len(missing) - len(known_bad)
+        self.stats["per_instance_round_trips"] += len(missing)
+
+        failed = []
+        if missing:
+            self.log(f"  → {repo}: fetching {len(missing)} of {len(commits)} base commits together")
+            refused, fetch_failed = self._fetch_shas(path, missing)
+            still_missing = missing_commits(path, missing)
+            self.stats["fetched"] += len(missing) - len(still_missing)
+            if still_missing and refused:
+                # The server refuses fetch-by-sha for these; fall back to all branches and tags
+                self.log(f"  → {repo}: fetching all branches for {len(still_missing)} commits")
+                result = self._fetch(path, ["--tags", "origin", "+refs/heads/*:refs/heads/*"])
+                fetch_failed = fetch_failed or result is None or result.returncode != 0
+                after = missing_commits(path, still_missing)
+                self.stats["fallback"] += len(still_missing) - len(after)
+                still_missing = after
+            if still_missing and fetch_failed:
+                # Not a verdict on the commits: leave them to be tried again
+                self.log(f"  → {repo}: fetch failed, {len(still_missing)} commits still missing")
+                failed, still_missing = still_missing, []
+            missing = still_missing
+
+        self.stats["failed"] += len(failed)
+        self.stats["unavailable"] += len(missing)
+        self.unavailable.update((repo, c) for c in missing)
+        missing += known_bad + failed
+        pin_commits(path, [c for c in commits if c not in missing])
+        self.stats["seconds"] += time.time() - start
+        return missing
+
+    def prefetch(self, problems):
+        """Fetch every base commit problems need; returns {repo: unavailable commits}."""
+        unavailable = {}
+        for repo, commits in group_commits(problems).items():
+            missing = self.fetch_repo(repo, commits)
+            if missing:
+                unavailable[repo] = missing
+        return unavailable
+
+
+# ========================== BENCHMARK ==========================
+
+def pack_size(path):
+    stats = dict(line.split(": ", 1) for line in git(path, "count-objects", "-v").stdout.splitlines() if ": " in line)
+    return int(stats.get("size-pack", 0)) + int(stats.get("size", 0))
+
+
+def bench(source, count, depth=None):
+    """Per-commit fetches vs one coalesced fetch of count commits from a local bare repo."""
+    source = os.path.abspath(source)
+    # Oldest first, so each per-instance fetch really has something new to get
+    history = git(source, "rev-list", "--all", "--reverse").stdout.split()
+    if not history:
+        raise RuntimeError(f"No commits in {source}")
+    step = max(1, len(history) // count)
+    commits = history[::step][:count]
+    problems = [{"repo": "bench/repo", "base_commit": c} for c in commits]
+
+    root = tempfile.mkdtemp(prefix="fetch_bench_")
+    results = {}
+    try:
+        for mode in ("per_instance", "coalesced"):
+            # file:// so --depth is honoured like against a real server
+            planner = FetchPlanner(os.path.join(root, mode), remote_template="file://" + source, depth=depth, log=lambda msg: None)
+            start = time.perf_counter()
+            if mode == "per_instance":
+                for problem in problems:
+                    planner.prefetch([problem])
+            else:
+                planner.prefetch(problems)
+            results[mode] = dict(planner.stats, seconds=time.perf_counter() - start,
+                                 kib=pack_size(planner.cache_path("bench/repo")))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{len(commits)} commits of {len(history)} from {source}" + (f" (depth {depth})" if depth else ""))
+    print(f"{'mode':<14} {'round trips':>11} {'seconds':>8} {'cache KiB':>10} {'unavailable':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<14} {r['round_trips']:>11} {r['seconds']:>8.2f} {r['kib']:>10} {r['unavailable']:>11}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch base commits into the repo cache, one request per repo')
+    parser.add_argument('--cache-dir', default="swe_polybench_repo_cache")
+    parser.add_argument('--remote-template', default=REMOTE_TEMPLATE,
+                        help='Remote URL for a repo; {repo}, {owner} and {name} are substituted')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('plan', 'Show what a range needs from each remote'),
+                            ('fetch', 'Fetch the missing base commits of a range')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--start', type=int, required=True, help='First instance (1-indexed)')
+        sub.add_argument('--end', type=int, required=True, help='Last instance (1-indexed)')
+        sub.add_argument('--depth', type=int, default=None)
+
+    bench_parser = subparsers.add_parser('bench', help='Per-commit vs coalesced fetches from a local repo')
+    bench_parser.add_argument('source', help='Local repository to fetch from')
+    bench_parser.add_argument('--commits', type=int, default=40)
+    bench_parser.add_argument('--depth', type=int, default=None)
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        bench(args.source, args.commits, args.depth)
+        return
+
+    from swe_polybench_tester import load_dataset_swe_polybench
+    problems = load_dataset_swe_polybench()[args.start - 1:args.end]
+    planner = FetchPlanner(args.cache_dir, args.remote_template, args.depth)
+    if args.command == 'plan':
+        for repo, commits in sorted(group_commits(problems).items()):
+            path = planner.cache_path(repo)
+            missing = missing_commits(path, commits) if os.path.isdir(path) else commits
+            print(f"{repo:<40} {len(commits):>5} commits, {len(missing):>5} to fetch")
+        return
+
+    unavailable = planner.prefetch(problems)
+    for repo, commits in sorted(unavailable.items()):
+        print(f"✗ {repo}: {len(commits)} commits unavailable")
+    print(f"✓ {describe(planner.stats)}")
+
+
+if __name__ == "__main__":
+    main()
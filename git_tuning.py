@@ -0,0 +1,341 @@
+"""
+Git performance profile for workspaces and repo cache mirrors
+
+Each knob (untracked cache, builtin fsmonitor, split index, skip-hash index,
+preloaded index, commit-graph, pack bitmaps) is tried on its own: the
+operations the runner repeats are timed before and after, and a knob is only
+kept if it makes them measurably faster. Decisions are made once per repo and
+stored in swe_polybench_git_profile.json; every later workspace of that repo
+just gets the kept settings applied and read back.
+
+The fsmonitor knob starts a daemon per workspace: stop_fsmonitor() must run
+before a workspace is deleted, and GitProfiles.stop_daemons() at the end of
+a session stops any still running.
+
+Workspace timings cover the capture/reset cycle (status, add -A + diff
+--cached + reset, clean -n); mirror timings cover history walks
+(rev-list --count --all, rev-list --objects for one pinned commit).
+
+  python git_tuning.py bench swe_polybench_workspace/microsoft__vscode-1234 --repo microsoft/vscode
+  python git_tuning.py mirror swe_polybench_repo_cache/microsoft__vscode.git
+  python git_tuning.py show
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+import subprocess
+from threading import Lock, Event
+from datetime import datetime
+
+PROFILE_FILE = "swe_polybench_git_profile.json"
+PROFILE_VERSION = 1
+MIN_GAIN = 0.05          # a knob must cut total time by at least 5%...
+MIN_GAIN_SECONDS = 0.005  # ...and by more than timer noise
+BENCH_REPEAT = 3
+GIT_TIMEOUT = 600
+
+
+def git(path, *args, timeout=GIT_TIMEOUT):
+    return subprocess.run(["git", *args], cwd=path, capture_output=True, text=True,
+                          errors="replace", timeout=timeout)
+
+
+def git_version():
+    try:
+        out = git(".", "version").stdout.split()[2]
+        return tuple(int(p) for p in out.split(".")[:3] if p.isdigit())
+    except Exception:
+        return (0,)
+
+
+def fsmonitor_supported():
+    """The builtin daemon exists on Windows/macOS (and Linux since git 2.47 builds)."""
+    try:
+        return "fsmonitor--daemon" in git(".", "version", "--build-options").stdout
+    except Exception:
+        return False
+
+
+def stop_fsmonitor(path):
+    """Stop the workspace's fsmonitor daemon if it is configured to use one."""
+    if git(path, "config", "--get", "core.fsmonitor").stdout.strip() != "true":
+        return False
+    git(path, "fsmonitor--daemon", "stop")
+    return True
+
+
+def remove_bitmaps(path):
+    for bitmap in glob.glob(os.path.join(git_dir(path), "objects", "pack", "*.bitmap")):
+        os.remove(bitmap)
+
+
+def git_dir(path):
+    result = git(path, "rev-parse", "--git-dir")
+    return os.path.join(path, result.stdout.strip()) if result.returncode == 0 else path
+
+
+# ========================== KNOBS ==========================
+
+# config: settings written with git config; apply/revert: git commands (or callables taking the path)
+WORKSPACE_KNOBS = [
+    {"name": "untracked_cache", "config": {"core.untrackedCache": "true"},
+     "apply": [["update-index", "--untracked-cache"]], "revert": [["update-index", "--no-untracked-cache"]]},
+    {"name": "fsmonitor", "config": {"core.fsmonitor": "true"}, "available": fsmonitor_supported,
+     "apply": [["fsmonitor--daemon", "start"]], "revert": [["fsmonitor--daemon", "stop"]]},
+    {"name": "split_index", "config": {"core.splitIndex": "true"},
+     "apply": [["update-index", "--split-index"]], "revert": [["update-index", "--no-split-index"]]},
+    {"name": "skip_hash", "config": {"index.skipHash": "true"}, "available": lambda: git_version() >= (2, 40),
+     "apply": [["update-index", "--force-write-index"]], "revert": [["update-index", "--force-write-index"]]},
+    {"name": "preload_index", "config": {"core.preloadIndex": "true"}},
+    {"name": "commit_graph", "config": {"core.commitGraph": "true", "fetch.writeCommitGraph": "true"},
+     "apply": [["commit-graph", "write", "--reachable"]]},
+]
+
+MIRROR_KNOBS = [
+    {"name": "commit_graph", "config": {"core.commitGraph": "true", "fetch.writeCommitGraph": "true"},
+     "apply": [["commit-graph", "write", "--reachable", "--changed-paths"]]},
+    {"name": "bitmaps", "config": {"repack.writeBitmaps": "true", "pack.useBitmaps": "true"},
+     "apply": [["repack", "-a", "-d", "-b", "-q"]], "revert": [remove_bitmaps]},
+]
+KNOBS = {"workspace": WORKSPACE_KNOBS, "mirror": MIRROR_KNOBS}
+
+
+def run_steps(path, steps):
+    for step in steps:
+        if callable(step):
+            step(path)
+        else:
+            git(path, *step)
+
+
+def apply_knob(path, knob):
+    for key, value in knob["config"].items():
+        git(path, "config", key, value)
+    run_steps(path, knob.get("apply", []))
+
+
+def revert_knob(path, knob):
+    run_steps(path, knob.get("revert", []))
+    for key in knob["config"]:
+        git(path, "config", "--unset", key)
+
+
+def knob_applied(path, knob):
+    return all(git(path, "config", "--get", key).stdout.strip() == value for key, value in knob["config"].items())
+
+
+# ========================== MEASURING ==========================
+
+def workspace_ops(path):
+    def capture_cycle():
+        git(path, "add", "-A")
+        git(path, "diff", "--cached", "--quiet")
+        git(path, "reset", "-q", "HEAD")
+    return {
+        "status": lambda: git(path, "status", "--porcelain"),
+        "add_diff_reset": capture_cycle,
+        "clean": lambda: git(path, "clean", "-nd"),
+    }
+
+
+def mirror_ops(path):
+    refs = git(path, "for-each-ref", "--count=1", "--format=%(objectname)", "refs/polybench/").stdout.split()
+    head = refs[0] if refs else "HEAD"
+    return {
+        "rev_list_all": lambda: git(path, "rev-list", "--count", "--all"),
+        "objects_one_commit": lambda: git(path, "rev-list", "--objects", "--count", "--use-bitmap-index", head),
+    }
+
+
+def measure(ops, repeat=BENCH_REPEAT):
+    """Best-of-repeat seconds per operation."""
+    timings = {}
+    for name, op in ops.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            op()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = round(best, 4)
+    return timings
+
+
+def tune(path, kind="workspace", repeat=BENCH_REPEAT, log=print):
+    """Try each knob on top of the ones already kept; returns the decision record."""
+    ops = workspace_ops(path) if kind == "workspace" else mirror_ops(path)
+    # Start from stock settings so earlier profiles don't skew the baseline
+    for knob in KNOBS[kind]:
+        if knob_applied(path, knob):
+            revert_knob(path, knob)
+    before = measure(ops, repeat)
+    current = before
+    kept, rejected, unavailable = [], {}, []
+    for knob in KNOBS[kind]:
+        available = knob.get("available")
+        if available and not available():
+            unavailable.append(knob["name"])
+            continue
+        apply_knob(path, knob)
+        trial = measure(ops, repeat)
+        saved = sum(current.values()) - sum(trial.values())
+        gain = saved / max(sum(current.values()), 1e-9)
+        if gain >= MIN_GAIN and saved >= MIN_GAIN_SECONDS:
+            kept.append(knob["name"])
+            current = trial
+        else:
+            revert_knob(path, knob)
+            rejected[knob["name"]] = round(100 * gain, 1)
+        log(f"  {knob['name']:<16} {100 * gain:+6.1f}%  {'kept' if knob['name'] in kept else 'reverted'}")
+    return {
+        "version": PROFILE_VERSION,
+        "kind": kind,
+        "kept": kept,
+        "rejected": rejected,
+        "unavailable": unavailable,
+        "before": before,
+        "after": current,
+        "git_version": ".".join(str(p) for p in git_version()),
+        "decided": datetime.now().isoformat(),
+    }
+
+
+# ========================== PROFILES ==========================
+
+class GitProfiles:
+    """Per-repo knob decisions, measured once and applied to every later workspace"""
+
+    def __init__(self, profile_file=PROFILE_FILE):
+        self.profile_file = profile_file
+        self.lock = Lock()
+        self.measuring = {}    # key -> Event set once the thread measuring it is done
+        self.profiles = self.load()
+        self.watched = set()   # workspaces whose fsmonitor daemon this session started
+
+    def load(self):
+        if os.path.exists(self.profile_file):
+            try:
+                with open(self.profile_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def save(self):
+        tmp_file = self.profile_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.profiles, f, indent=2)
+        os.replace(tmp_file, self.profile_file)
+
+    def get(self, key):
+        profile = self.profiles.get(key)
+        return profile if profile and profile.get("version") == PROFILE_VERSION else None
+
+    def ensure(self, key, path, kind="workspace", reapply=False, log=print):
+        """Apply the stored profile for key to path (measuring it first if there is none).
+
+        reapply re-runs the kept knobs' commands even when their settings are
+        already there (e.g. rewrite bitmaps after a mirror fetched new packs).
+        Returns (profile, measured, not_applied) where not_applied lists kept
+        knobs whose settings did not read back.
+        """
+        # One thread measures a key; others wanting it wait, other keys go ahead
+        while True:
+            with self.lock:
+                profile = self.get(key)
+                done = self.measuring.get(key)
+                if profile is not None:
+                    break
+                if done is None:
+                    done = self.measuring[key] = Event()   # this thread measures it
+                    break
+            done.wait()
+
+        measured = profile is None
+        if measured:
+            try:
+                log(f"  → Measuring git settings for {key}...")
+                profile = tune(path, kind, log=log)
+                with self.lock:
+                    self.profiles[key] = profile
+                    self.save()
+            finally:
+                with self.lock:
+                    del self.measuring[key]
+                done.set()
+        else:
+            for knob in KNOBS[kind]:
+                if knob["name"] in profile["kept"] and (reapply or not knob_applied(path, knob)):
+                    apply_knob(path, knob)
+        if kind == "workspace" and "fsmonitor" in profile["kept"]:
+            with self.lock:
+                self.watched.add(os.path.abspath(path))
+        not_applied = [k["name"] for k in KNOBS[kind] if k["name"] in profile["kept"] and not knob_applied(path, k)]
+        return profile, measured, not_applied
+
+
+    def forget(self, path):
+        """Stop path's fsmonitor daemon before the workspace is deleted."""
+        with self.lock:
+            self.watched.discard(os.path.abspath(path))
+        return stop_fsmonitor(path)
+
+    def stop_daemons(self):
+        """Stop the fsmonitor daemons of workspaces that still exist (end of session)."""
+        with self.lock:
+            paths, self.watched = self.watched, set()
+        for path in paths:
+            if os.path.isdir(path):
+                stop_fsmonitor(path)
+
+
+def describe(profile):
+    before = sum(profile["before"].values()) * 1000
+    after = sum(profile["after"].values()) * 1000
+    kept = ", ".join(profile["kept"]) or "stock settings"
+    return f"{kept} ({before:.0f} → {after:.0f} ms per cycle)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure and apply git performance settings')
+    parser.add_argument('--profiles', default=PROFILE_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = subparsers.add_parser('bench', help='Re-measure every knob on a workspace and store the result')
+    bench_parser.add_argument('path')
+    bench_parser.add_argument('--repo', default=None, help='owner/name the decision is stored under')
+    bench_parser.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+
+    mirror_parser = subparsers.add_parser('mirror', help='Tune a bare repo cache mirror')
+    mirror_parser.add_argument('path')
+    mirror_parser.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+
+    subparsers.add_parser('show', help='Stored decisions')
+
+    args = parser.parse_args()
+    profiles = GitProfiles(args.profiles)
+
+    if args.command == 'show':
+        for key, profile in sorted(profiles.profiles.items()):
+            print(f"{key:<55} {describe(profile)}")
+        return
+
+    kind = "workspace" if args.command == 'bench' else "mirror"
+    key = (args.repo or os.path.basename(os.path.abspath(args.path))) if kind == "workspace" \
+        else "mirror:" + os.path.abspath(args.path)
+    print(f"Tuning {args.path} ({kind})")
+    profile = tune(args.path, kind, args.repeat)
+    for op, seconds in profile["before"].items():
+        print(f"  {op:<20} {seconds * 1000:8.1f} ms → {profile['after'][op] * 1000:8.1f} ms")
+    if profile["unavailable"]:
+        print(f"  unavailable here: {', '.join(profile['unavailable'])}")
+    profiles.profiles[key] = profile
+    profiles.save()
+    print(f"✓ {key}: {describe(profile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+Headless SWE-PolyBench runner
+
+Library API for the runner's core workflow without input() prompts or the
+clipboard:
+
+    prepare workspace -> render prompt -> run agent -> capture diff -> save -> reset
+
+Agents plug in through AgentExecutor. SubprocessExecutor launches a local
+command-line agent per instance with a timeout and resource limits, and
+HeadlessRunner runs many of them concurrently.
+
+    runner = HeadlessRunner(SubprocessExecutor(["my-agent", "--prompt", "{prompt_file}"]),
+                            model_name="my-agent", max_workers=4, on_event=print_event)
+    results = runner.run(problems)
+
+CLI:
+    python headless_runner.py --agent-cmd "python agent.py {prompt_file}" --start 1 --end 20 --workers 4
+"""
+
+import os
+import sys
+import time
+import shlex
+import argparse
+import subprocess
+import traceback
+from abc import ABC, abstractmethod
+from threading import Lock, Event
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from colorama import Fore, Style
+
+from patch_store import PatchStore
+from session_metrics import SessionMetrics, MetricsServer, TextfileExporter
+from trajectory_archive import TrajectoryArchive
+from selection_index import SelectionIndex
+from resource_accounting import ResourceAccountant, wrap_command
+from swe_polybench_tester import (
+    CloneFailureCache,
+    DiffCapture,
+    METRICS_FILE,
+    clone_repo_with_retry,
+    capture_git_diff,
+    reset_git_repo,
+    format_problem,
+    find_relevant_files,
+    find_impacted_tests,
+    IMPACTED_TESTS_SHOWN,
+    start_sparse_expander,
+    finish_sparse_expander,
+    restore_checkpoint,
+    start_checkpointer,
+    finish_checkpointer,
+    discard_checkpoint,
+    CHECKPOINT_INTERVAL,
+    make_fetch_planner,
+    prefetch_base_commits,
+    CODE_CONTEXT_FILES,
+    validate_patch_capture,
+    save_prediction,
+    save_prediction_streaming,
+    save_instance_metrics,
+    get_completed_instances,
+    load_dataset_swe_polybench,
+    kill_process_tree,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Applies rlimits then execs the agent; used instead of preexec_fn, which is not thread safe
+LIMIT_LAUNCHER = (
+    "import os, sys, resource\n"
+    "mem, cpu = int(sys.argv[1]), int(sys.argv[2])\n"
+    "if mem: resource.setrlimit(resource.RLIMIT_AS, (mem, mem))\n"
+    "if cpu: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "os.execvp(sys.argv[3], sys.argv[3:])\n"
+)
+
+# Events passed to on_event(event, payload); payload always has "instance_id"
+EVENTS = (
+    "instance_started",
+    "workspace_ready",
+    "prompt_rendered",
+    "agent_started",
+    "agent_finished",
+    "diff_captured",
+    "prediction_saved",
+    "instance_failed",
+    "instance_finished",
+)
+
+
+# ========================== EXECUTORS ==========================
+
+class AgentExecutor(ABC):
+    """Runs an agent against a prepared workspace"""
+
+    @abstractmethod
+    def run(self, problem, workspace, prompt_file, log_file):
+        """Let the agent edit workspace; return a result dict.
+
+        The dict must contain "status" ("completed", "failed" or "timeout")
+        and may add anything else (returncode, seconds, ...). "unsaved": True
+        means the edits are not to be captured: the runner checkpoints them
+        instead, so the next run of the instance picks them up.
+        """
+
+
+class SubprocessExecutor(AgentExecutor):
+    """Launches a command-line agent as a subprocess per instance
+
+    The command is a list (or string) where {workspace}, {prompt_file} and
+    {instance_id} are substituted. The prompt is also fed on stdin.
+    stdout/stderr go to log_file, which becomes the trajectory.
+    """
+
+    def __init__(self, command, timeout=1800, memory_limit_mb=None, cpu_limit_seconds=None, env=None):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.env = env
+        if resource is None and (memory_limit_mb or cpu_limit_seconds):
+            print(f"{Fore.YELLOW}⚠️  Resource limits are not supported on this platform, only the timeout applies{Style.RESET_ALL}")
+
+    def _wrap_limits(self, cmd):
+        """Prefix cmd with the rlimit launcher when limits are set."""
+        if resource is None or not (self.memory_limit_mb or self.cpu_limit_seconds):
+            return cmd
+        memory = (self.memory_limit_mb or 0) * 1024 * 1024
+        return [sys.executable, "-c", LIMIT_LAUNCHER, str(memory), str(self.cpu_limit_seconds or 0)] + cmd
+
+    def run(self, problem, workspace, prompt_file, log_file):
+        values = {
+            "workspace": os.path.abspath(workspace),
+            "prompt_file": os.path.abspath(prompt_file),
+            "instance_id": problem["instance_id"],
+        }
+        cmd = self._wrap_limits([part.format(**values) for part in self.command])
+        env = dict(os.environ, **(self.env or {}))
+        env.update({
+            "SWE_INSTANCE_ID": values["instance_id"],
+            "SWE_WORKSPACE": values["workspace"],
+            "SWE_PROMPT_FILE": values["prompt_file"],
+        })
+
+        posix = sys.platform != "win32"
+        start = time.time()
+        with open(prompt_file, "rb") as stdin, open(log_file, "wb") as log:
+            process = subprocess.Popen(
+                wrap_command(cmd),
+                cwd=workspace,
+                stdin=stdin,
+                stdout=log,
+                stderr=log,
+                env=env,
+                start_new_session=posix
+            )
+            try:
+                returncode = process.wait(timeout=self.timeout)
+                status = "completed" if returncode == 0 else "failed"
+            except subprocess.TimeoutExpired:
+                kill_process_tree(process)
+                process.wait()
+                returncode = process.returncode
+                status = "timeout"
+
+        return {
+            "status": status,
+            "returncode": returncode,
+            "seconds": round(time.time() - start, 2),
+            "command": cmd,
+        }
+
+
+# ========================== RUNNER ==========================
+
+class HeadlessRunner:
+    """Drives instances through the runner workflow, optionally in parallel"""
+
+    def __init__(self, executor, model_name="cora", working_folder="swe_polybench_workspace",
+                 predictions_file="predictions.jsonl", patch_store=None, max_workers=1,
+                 on_event=None, keep_failed_agent_patches=True, skip_completed=True, session_metrics=None,
+                 code_context=CODE_CONTEXT_FILES, sparse=False, prefetch=False, resources="auto",
+                 checkpoint_interval=CHECKPOINT_INTERVAL, impacted_tests=IMPACTED_TESTS_SHOWN):
+        self.executor = executor
+        self.model_name = model_name
+        self.working_folder = working_folder
+        self.predictions_file = predictions_file
+        self.patch_store = PatchStore(patch_store) if isinstance(patch_store, str) else patch_store
+        self.max_workers = max_workers
+        self.callbacks = [on_event] if on_event else []
+        self.keep_failed_agent_patches = keep_failed_agent_patches
+        self.skip_completed = skip_completed
+        self.session_metrics = session_metrics
+        self.code_context = code_context
+        self.sparse = sparse
+        self.prefetch = prefetch
+        self.checkpoint_interval = checkpoint_interval
+        self.impacted_tests = impacted_tests
+        # getrusage deltas are only per instance when instances don't overlap
+        self.accountant = ResourceAccountant(resources, exclusive=max_workers <= 1) if resources != "off" else None
+        self._pending = 0
+
+        self.prompts_dir = os.path.join(working_folder, "prompts")
+        self.logs_dir = os.path.join(working_folder, "agent_logs")
+        os.makedirs(self.prompts_dir, exist_ok=True)
+        os.makedirs(self.logs_dir, exist_ok=True)
+
+        self.trajectories = TrajectoryArchive(os.path.join(working_folder, "trajectories"))
+        self.clone_cache = CloneFailureCache()
+        self._save_lock = Lock()
+        self._cache_lock = Lock()
+        self._event_lock = Lock()
+        self._stopping = Event()
+
+    def stop(self):
+        """Prepare no more workspaces; instances already past that point run to the end."""
+        self._stopping.set()
+
+    def add_listener(self, callback):
+        self.callbacks.append(callback)
+
+    def emit(self, event, instance_id, **payload):
+        payload["instance_id"] = instance_id
+        payload["event"] = event
+        payload["timestamp"] = datetime.now().isoformat()
+        with self._event_lock:
+            for callback in self.callbacks:
+                try:
+                    callback(event, payload)
+                except Exception:
+                    traceback.print_exc()
+
+    def completed(self):
+        if self.patch_store:
+            return self.patch_store.completed(self.model_name)
+        return get_completed_instances(self.predictions_file, self.model_name)
+
+    def _save(self, instance_id, capture):
+        with self._save_lock:
+            if self.patch_store:
+                self.patch_store.add_prediction_file(instance_id, self.model_name,
+                                                     capture.path if capture.has_changes else None)
+            elif capture.has_changes:
+                save_prediction_streaming(self.predictions_file,
+                                          {"instance_id": instance_id, "model_name_or_path": self.model_name},
+                                          capture)
+            else:
+                save_prediction(self.predictions_file,
+                                {"instance_id": instance_id, "model_name_or_path": self.model_name, "model_patch": ""})
+
+    def run_instance(self, problem):
+        """Run one instance end to end; returns a result dict (None once the runner is stopping)."""
+        if self._stopping.is_set():
+            return None
+        instance_id = problem["instance_id"]
+        repo = problem["repo"]
+        base_commit = problem["base_commit"]
+        repo_path = os.path.join(self.working_folder, instance_id.replace("/", "_"))
+        metrics = {
+            "instance_id": instance_id,
+            "repo": repo,
+            "model": self.model_name,
+            "started": datetime.now().isoformat()
+        }
+        result = {"instance_id": instance_id, "status": None, "workspace": repo_path}
+        if self.session_metrics:
+            with self._event_lock:
+                self._pending -= 1
+                self.session_metrics.set_queue_depth(self._pending)
+        self.emit("instance_started", instance_id, repo=repo)
+        usage = self.accountant.instance(instance_id, repo_path) if self.accountant else None
+
+        # 1. Prepare workspace
+        with self._cache_lock:
+            defer_reason = self.clone_cache.should_defer(repo, base_commit)
+        if defer_reason:
+            result.update(status="clone_deferred", error=defer_reason)
+            self.emit("instance_failed", instance_id, stage="clone", error=defer_reason)
+            return result
+        clone_start = time.time()
+        if usage:
+            usage.begin("clone")
+        try:
+            clone_repo_with_retry(repo, base_commit, repo_path, metrics=metrics,
+                                  sparse_problem=problem if self.sparse else None)
+            with self._cache_lock:
+                self.clone_cache.record_success(repo, base_commit)
+        except Exception as e:
+            failure_class = getattr(e, "failure_class", "unknown")
+            with self._cache_lock:
+                self.clone_cache.record_failure(repo, base_commit, failure_class, str(e))
+            metrics.update(clone_seconds=round(time.time() - clone_start, 2), outcome=f"clone_error:{failure_class}")
+            if usage:
+                usage.record(metrics)
+            save_instance_metrics(METRICS_FILE, metrics, self.session_metrics)
+            result.update(status="clone_error", error=str(e), failure_class=failure_class)
+            self.emit("instance_failed", instance_id, stage="clone", error=str(e), failure_class=failure_class)
+            return result
+        metrics["clone_seconds"] = round(time.time() - clone_start, 2)
+        self.emit("workspace_ready", instance_id, workspace=repo_path, seconds=metrics["clone_seconds"],
+                  sparse_dirs=metrics.get("sparse_dirs"))
+        # Edits of an earlier, interrupted run of this instance
+        restore_checkpoint(repo_path, instance_id, base_commit, metrics)
+
+        capture = DiffCapture()
+        try:
+            # 2. Render prompt (outside the workspace so it never shows up in the diff)
+            if usage:
+                usage.begin("prompt")
+            relevant_files = find_relevant_files(problem, repo_path, self.code_context, metrics)
+            prompt = format_problem(problem, relevant_files)
+            prompt_file = os.path.join(self.prompts_dir, f"{instance_id}.txt")
+            with open(prompt_file, "w", encoding="utf-8") as f:
+                f.write(prompt)
+            self.emit("prompt_rendered", instance_id, prompt_file=prompt_file, relevant_files=len(relevant_files))
+
+            # 3. Run agent
+            log_file = os.path.join(self.logs_dir, f"{instance_id}.log")
+            self.emit("agent_started", instance_id, workspace=repo_path)
+            if usage:
+                usage.begin("agent")
+            expander = start_sparse_expander(repo_path, base_commit, log_file)
+            checkpointer = start_checkpointer(repo_path, base_commit, instance_id, self.checkpoint_interval)
+            agent_result = None
+            try:
+                agent_result = self.executor.run(problem, repo_path, prompt_file, log_file)
+            finally:
+                # Edits that are not captured now (interrupted, or the executor says so) go to a last checkpoint
+                finish_checkpointer(checkpointer, metrics, final=agent_result is None or agent_result.get("unsaved"))
+                # Directories the agent wrote into or named must be in the cone before git add -A
+                finish_sparse_expander(expander, metrics)
+            metrics["agent_seconds"] = agent_result.get("seconds")
+            metrics["agent_status"] = agent_result["status"]
+            result["agent"] = agent_result
+            self.emit("agent_finished", instance_id, **agent_result)
+
+            if agent_result.get("unsaved") or (agent_result["status"] != "completed"
+                                               and not self.keep_failed_agent_patches):
+                result["status"] = f"agent_{agent_result['status']}"
+                self.emit("instance_failed", instance_id, stage="agent", error=agent_result["status"])
+                return result
+
+            # 4. Capture diff
+            if usage:
+                usage.begin("diff")
+            diff_start = time.time()
+            capture = capture_git_diff(repo_path)
+            metrics["diff_seconds"] = round(time.time() - diff_start, 3)
+            if capture.aborted:
+                result.update(status="patch_too_large")
+                self.emit("instance_failed", instance_id, stage="diff", error="patch exceeds size cap")
+                return result
+            is_valid, validation_msg = validate_patch_capture(capture)
+            metrics.update(diff_bytes=capture.size, diff_sha256=capture.sha256, diff_truncated=capture.truncated)
+            result["impacted_tests"] = (find_impacted_tests(problem, repo_path, capture, metrics)
+                                        if self.impacted_tests > 0 else [])
+            self.emit("diff_captured", instance_id, size=capture.size, sha256=capture.sha256,
+                      valid=is_valid, validation=validation_msg, truncated=capture.truncated,
+                      impacted_tests=len(result["impacted_tests"]))
+
+            if agent_result["status"] != "completed" and not capture.has_changes:
+                # Nothing to keep; leave the instance open for another run
+                result["status"] = f"agent_{agent_result['status']}"
+                self.emit("instance_failed", instance_id, stage="agent", error=agent_result["status"])
+                return result
+
+            # 5. Save
+            self._save(instance_id, capture)
+            discard_checkpoint(repo_path, instance_id)
+            self.emit("prediction_saved", instance_id, has_changes=capture.has_changes)
+            if os.path.exists(log_file):
+                self.trajectories.add_file(instance_id, log_file, kind="log")
+
+            metrics["outcome"] = "solved" if capture.has_changes else "empty"
+            result.update(status=metrics["outcome"], diff_bytes=capture.size, sha256=capture.sha256)
+            return result
+        except Exception as e:
+            result.update(status="error", error=str(e))
+            self.emit("instance_failed", instance_id, stage="run", error=str(e))
+            return result
+        finally:
+            # 6. Reset (before saving metrics so its cost is accounted too)
+            capture.cleanup()
+            metrics.setdefault("outcome", result["status"])
+            if usage:
+                with usage.phase("reset"):
+                    reset_git_repo(repo_path, base_commit)
+                result["resources"] = usage.record(metrics)["total"]
+            else:
+                reset_git_repo(repo_path, base_commit)
+            save_instance_metrics(METRICS_FILE, metrics, self.session_metrics)
+            self.emit("instance_finished", instance_id, status=result["status"])
+
+    def run(self, problems):
+        """Run every problem not already completed; returns result dicts in completion order."""
+        if self.skip_completed:
+            done = self.completed()
+            problems = [p for p in problems if p["instance_id"] not in done]
+        self._pending = len(problems)
+        if self.prefetch and problems:
+            # One fetch per repo for the whole run instead of one per instance
+            prefetch_base_commits(make_fetch_planner(), problems)
+        if self.session_metrics:
+            self.session_metrics.set_queue_depth(self._pending)
+
+        results = []
+        if self.max_workers <= 1:
+            for problem in problems:
+                if self._stopping.is_set():
+                    break
+                results.append(self.run_instance(problem))
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Queued instances still reach run_instance after stop(), which then returns None
+            futures = [pool.submit(self.run_instance, problem) for problem in problems]
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    results.append(result)
+        return results
+
+
+# ========================== CLI ==========================
+
+def print_event(event, payload):
+    """Default listener: one colored line per event."""
+    color = Fore.RED if event == "instance_failed" else Fore.GREEN if event == "instance_finished" else Fore.CYAN
+    details = {k: v for k, v in payload.items() if k not in ("event", "instance_id", "timestamp", "command")}
+    print(f"{color}[{payload['timestamp'][11:19]}] {payload['instance_id']}: {event} {details}{Style.RESET_ALL}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless SWE-PolyBench runner with a command-line agent')
+    parser.add_argument('--agent-cmd', required=True,
+                        help='Agent command; {workspace}, {prompt_file}, {instance_id} are substituted')
+    parser.add_argument('--model-name', default='cora')
+    parser.add_argument('--start', type=int, required=True, help='First instance (1-indexed)')
+    parser.add_argument('--end', type=int, required=True, help='Last instance (1-indexed)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=1800, help='Agent timeout per instance (seconds)')
+    parser.add_argument('--memory-limit-mb', type=int, default=None)
+    parser.add_argument('--cpu-limit', type=int, default=None, help='Agent CPU seconds limit')
+    parser.add_argument('--patch-store', default=None)
+    parser.add_argument('--where', default=None, help='Metadata filter, e.g. "language=TypeScript,task_category=Bug Fix"')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve live metrics on 127.0.0.1:PORT/metrics')
+    parser.add_argument('--metrics-textfile', default=None, help='Periodically write live metrics to this file')
+    parser.add_argument('--code-context', type=int, default=CODE_CONTEXT_FILES,
+                        help='Relevant files listed in each prompt (0 = off)')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Check out only directories relevant to each problem, expanding on demand')
+    parser.add_argument('--resources', choices=['auto', 'cgroup', 'proc', 'psutil', 'off'], default='auto',
+                        help='Per-instance CPU/memory/I/O/disk accounting backend')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Fetch every base commit into the repo cache up front, one request per repo')
+    parser.add_argument('--checkpoint-interval', type=int, default=CHECKPOINT_INTERVAL,
+                        help='Seconds between checkpoints of the agent\'s edits (0 = off)')
+    parser.add_argument('--impacted-tests', type=int, default=IMPACTED_TESTS_SHOWN, metavar='N',
+                        help='After capture, find the test files that import the patched files (0 = off)')
+    args = parser.parse_args()
+
+    if args.where:
+        positions = SelectionIndex.load_or_build().select(args.where, args.start - 1, args.end - 1)
+        problems = load_dataset_swe_polybench(positions) if positions else []
+    else:
+        dataset = load_dataset_swe_polybench()
+        problems = dataset[args.start - 1:args.end]
+
+    executor = SubprocessExecutor(args.agent_cmd, timeout=args.timeout,
+                                  memory_limit_mb=args.memory_limit_mb, cpu_limit_seconds=args.cpu_limit)
+    session_metrics = None
+    exporters = []
+    if args.metrics_port is not None or args.metrics_textfile:
+        session_metrics = SessionMetrics("swe_polybench_workspace")
+        session_metrics.start_disk_sampler()
+        if args.metrics_port is not None:
+            exporters.append(MetricsServer(session_metrics, args.metrics_port))
+            print(f"{Fore.CYAN}📈 Live metrics: {exporters[-1].url}{Style.RESET_ALL}")
+        if args.metrics_textfile:
+            exporters.append(TextfileExporter(session_metrics, args.metrics_textfile))
+
+    runner = HeadlessRunner(executor, model_name=args.model_name, patch_store=args.patch_store,
+                            max_workers=args.workers, on_event=print_event, session_metrics=session_metrics,
+                            code_context=args.code_context, sparse=args.sparse,
+                            prefetch=args.prefetch, resources=args.resources,
+                            checkpoint_interval=args.checkpoint_interval, impacted_tests=args.impacted_tests)
+    try:
+        results = runner.run(problems)
+    finally:
+        # Or the HTTP server and the exporter/sampler threads outlive the run
+        for exporter in exporters:
+            exporter.stop()
+        if session_metrics:
+            session_metrics.stop()
+
+    by_status = {}
+    for result in results:
+        by_status[result["status"]] = by_status.get(result["status"], 0) + 1
+    print(f"\n{Fore.CYAN}📊 {len(results)} instances: {by_status}{Style.RESET_ALL}")
+    if runner.accountant:
+        for line in runner.accountant.summary_lines():
+            print(f"{Fore.CYAN}   {line}{Style.RESET_ALL}")
+        runner.accountant.close()
+
+
+if __name__ == "__main__":
+    main()
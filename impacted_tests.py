@@ -0,0 +1,479 @@
+"""
+Impacted-test selection from static imports
+
+For one (repo, base_commit) this records the imports of every JS/TS, Python
+and Java file, resolves them against the files that exist at that commit, and
+answers "which test files (transitively) import what this patch touches?".
+Running just those tests is a quick sanity check of a captured patch before
+it is submitted.
+
+  swe_polybench_test_impact/
+    <owner>__<name>/<base_commit>.json.gz   raw imports per file (resolved when loaded)
+
+Like code_index.py, an index for a new commit starts from the repo's most
+recent index and re-scans only the paths that changed between the commits.
+Imports are stored unresolved, so added or deleted files are picked up by the
+resolver without re-scanning their importers.
+
+  python impacted_tests.py patch swe_polybench_workspace/sveltejs__svelte-605 <commit> fix.patch --repo sveltejs/svelte
+  python impacted_tests.py files /path/to/repo HEAD src/compiler/parse/index.ts
+  python impacted_tests.py bench /path/to/repo --commits <c1> <c2>
+"""
+
+import os
+import re
+import json
+import gzip
+import time
+import shutil
+import argparse
+import tempfile
+import posixpath
+from threading import Lock
+from collections import deque
+from datetime import datetime
+
+from code_index import list_tree, changed_paths, read_blobs, repo_key, prune, latest_index, git
+from unified_diff import parse_patch, parse_lines
+
+DEFAULT_INDEX_DIR = "swe_polybench_test_impact"
+
+JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts", ".vue", ".svelte")
+PY_EXTENSIONS = (".py",)
+JAVA_EXTENSIONS = (".java",)
+SCAN_EXTENSIONS = set(JS_EXTENSIONS + PY_EXTENSIONS + JAVA_EXTENSIONS)
+
+JS_IMPORT_RE = re.compile(r"""(?:\bfrom|\bimport|\brequire\s*\(|\bimport\s*\()\s*['"]([^'"\n]+)['"]""")
+PY_IMPORT_RE = re.compile(r"^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+([^\n#;]+)|import[ \t]+([^\n#;]+))", re.M)
+JAVA_IMPORT_RE = re.compile(r"^[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+(?:\.\*)?)[ \t]*;", re.M)
+JAVA_PACKAGE_RE = re.compile(r"^[ \t]*package[ \t]+([\w.]+)[ \t]*;", re.M)
+JAVA_TYPE_RE = re.compile(r"\b[A-Z][A-Za-z0-9_]*\b")
+
+TEST_NAME_RE = re.compile(
+    r"(?:\.(?:test|spec|e2e)\.[a-z]+$"        # foo.test.ts, foo.spec.js
+    r"|^test_[^/]*\.py$|_test\.py$"            # test_foo.py, foo_test.py
+    r"|(?:Test|Tests|IT|TestCase)\.java$)"     # FooTest.java
+)
+TEST_SUBJECT_RE = re.compile(r"^test_|_test$|\.(?:test|spec|e2e)$|(?:Test|Tests|IT|TestCase)$")
+
+_repo_locks = {}
+_repo_locks_guard = Lock()
+_recent = {}   # repo -> last ImpactIndex used in this process
+
+
+def is_test_path(path):
+    name = path.rsplit("/", 1)[-1]
+    return bool(TEST_NAME_RE.search(name)) or "/__tests__/" in "/" + path
+
+
+def language_of(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in JS_EXTENSIONS:
+        return "js"
+    if ext in PY_EXTENSIONS:
+        return "py"
+    if ext in JAVA_EXTENSIONS:
+        return "java"
+    return None
+
+
+# ========================== SCANNING ==========================
+
+def scan_imports(path, text):
+    """[specs, java_package, java_type_refs] for one file; specs are unresolved."""
+    language = language_of(path)
+    specs = []
+    package = None
+    type_refs = []
+    if language == "js":
+        specs = sorted(set(JS_IMPORT_RE.findall(text)))
+    elif language == "py":
+        found = set()
+        for module, names, plain in PY_IMPORT_RE.findall(text):
+            if plain:
+                for part in plain.split(","):
+                    name = part.strip().split(" ")[0]
+                    if name:
+                        found.add(name)
+            else:
+                found.add(module)
+                # "from pkg import mod" may import a submodule
+                for part in names.strip("()\\ \t").split(","):
+                    name = part.strip().split(" ")[0]
+                    if name.isidentifier():
+                        found.add(module + name if module.endswith(".") else f"{module}.{name}")
+        specs = sorted(found)
+    elif language == "java":
+        specs = sorted(set(JAVA_IMPORT_RE.findall(text)))
+        match = JAVA_PACKAGE_RE.search(text)
+        package = match.group(1) if match else ""
+        # Same-package classes are used without an import
+        type_refs = sorted(set(JAVA_TYPE_RE.findall(text)))
+    return [specs, package, type_refs]
+
+
+# ========================== RESOLVING ==========================
+
+class ImportGraph:
+    """Resolved import edges for one snapshot, plus the reverse (importers) map"""
+
+    def __init__(self, files):
+        self.paths = set(files)
+        self.by_stem = {}       # "src/a/b" -> ["src/a/b.ts", ...]
+        self.by_basename = {}   # "b" -> ["src/a/b", ...] (stems)
+        self.java_classes = {}  # ("com.foo", "Bar") -> [path]
+        self.tests_by_subject = {}   # "parse" -> test paths named after it
+        for path in self.paths:
+            stem = os.path.splitext(path)[0]
+            self.by_stem.setdefault(stem, []).append(path)
+            self.by_basename.setdefault(stem.rsplit("/", 1)[-1], []).append(stem)
+            if is_test_path(path):
+                subject = TEST_SUBJECT_RE.sub("", stem.rsplit("/", 1)[-1]).lower()
+                self.tests_by_subject.setdefault(subject, []).append(path)
+        for path, (_, specs, package, _) in files.items():
+            if package is not None:
+                name = os.path.splitext(path.rsplit("/", 1)[-1])[0]
+                self.java_classes.setdefault((package, name), []).append(path)
+        self._suffix_cache = {}
+
+        self.deps = {}
+        self.importers = {}
+        for path, (_, specs, package, type_refs) in files.items():
+            resolved = set()
+            for spec in specs:
+                resolved.update(self.resolve(path, spec))
+            if package is not None:
+                for name in type_refs:
+                    resolved.update(self.java_classes.get((package, name), ()))
+            resolved.discard(path)
+            self.deps[path] = resolved
+            for dep in resolved:
+                self.importers.setdefault(dep, set()).add(path)
+
+    def _with_extensions(self, stem, extensions):
+        return [p for p in self.by_stem.get(stem, ()) if p.endswith(extensions)]
+
+    def _by_suffix(self, module_path, extensions):
+        """Files whose extension-less path ends with module_path (path aliases, src/ roots)."""
+        key = (module_path, extensions)
+        if key not in self._suffix_cache:
+            found = []
+            for stem in self.by_basename.get(module_path.rsplit("/", 1)[-1], ()):
+                if stem == module_path or stem.endswith("/" + module_path):
+                    found.extend(self._with_extensions(stem, extensions))
+            self._suffix_cache[key] = found
+        return self._suffix_cache[key]
+
+    def resolve(self, importer, spec):
+        language = language_of(importer)
+        if language == "js":
+            return self._resolve_js(importer, spec)
+        if language == "py":
+            return self._resolve_python(importer, spec)
+        if language == "java":
+            return self._resolve_java(spec)
+        return []
+
+    def _resolve_js(self, importer, spec):
+        spec = spec.split("?", 1)[0]
+        if spec.startswith("."):
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+            if target in self.paths:
+                return [target]
+            stem = os.path.splitext(target)[0] if target.endswith(JS_EXTENSIONS) else target
+            return self._with_extensions(stem, JS_EXTENSIONS) or self._with_extensions(stem + "/index", JS_EXTENSIONS)
+        if "/" not in spec:
+            return []   # bare package name: an external dependency
+        if spec.startswith("@"):
+            spec = spec.split("/", 1)[1]   # @scope/pkg/x -> pkg/x (monorepo packages)
+        return self._by_suffix(spec, JS_EXTENSIONS) or self._by_suffix(spec + "/index", JS_EXTENSIONS)
+
+    def _resolve_python(self, importer, spec):
+        if spec.startswith("."):
+            dots = len(spec) - len(spec.lstrip("."))
+            base = posixpath.dirname(importer)
+            for _ in range(dots - 1):
+                base = posixpath.dirname(base)
+            rest = spec[dots:].replace(".", "/")
+            module_path = posixpath.join(base, rest) if rest else base
+            return (self._with_extensions(module_path, PY_EXTENSIONS)
+                    or self._with_extensions(module_path + "/__init__", PY_EXTENSIONS))
+        module_path = spec.replace(".", "/")
+        found = (self._with_extensions(module_path, PY_EXTENSIONS)
+                 or self._with_extensions(module_path + "/__init__", PY_EXTENSIONS))
+        if found:
+            return found
+        # src/ layouts; a lone top-level name only matches a package, not any same-named module
+        if "/" in module_path:
+            found = self._by_suffix(module_path, PY_EXTENSIONS)
+        return found or self._by_suffix(module_path + "/__init__", PY_EXTENSIONS)
+
+    def _resolve_java(self, spec):
+        if spec.endswith(".*"):
+            package = spec[:-2]
+            return [p for (pkg, _), paths in self.java_classes.items() if pkg == package for p in paths]
+        parts = spec.split(".")
+        # com.foo.Bar, com.foo.Bar.Inner, or a static member com.foo.Bar.baz
+        while len(parts) > 1:
+            found = self.java_classes.get((".".join(parts[:-1]), parts[-1]))
+            if found:
+                return found
+            parts.pop()
+        return self._by_suffix(spec.replace(".", "/"), JAVA_EXTENSIONS)
+
+    # ------------------------------------------------------------------ query
+
+    def impacted_tests(self, changed, max_depth=None):
+        """{test_path: depth} for tests reaching a changed file through imports (0 = changed itself)."""
+        tests = {}
+        seen = set()
+        queue = deque()
+        for path in changed:
+            queue.append((path, 0))
+            seen.add(path)
+        while queue:
+            path, depth = queue.popleft()
+            if is_test_path(path):
+                tests.setdefault(path, depth)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for importer in self.importers.get(path, ()):
+                if importer not in seen:
+                    seen.add(importer)
+                    queue.append((importer, depth + 1))
+        return tests
+
+    def tests_named_after(self, path):
+        """Fallback for files no test imports: foo.ts -> foo.test.ts, test_foo.py, FooTest.java."""
+        stem = os.path.splitext(path.rsplit("/", 1)[-1])[0].lower()
+        return list(self.tests_by_subject.get(stem, ()))
+
+
+# ========================== INDEX ==========================
+
+def repo_lock(repo):
+    with _repo_locks_guard:
+        return _repo_locks.setdefault(repo, Lock())
+
+
+class ImpactIndex:
+    """Per-commit import records (files map path -> [blob, specs, java_package, java_type_refs])"""
+
+    def __init__(self, data):
+        self.data = data
+        self.repo = data["repo"]
+        self.commit = data["commit"]
+        self.files = data["files"]
+        self._graph = None
+
+    @classmethod
+    def empty(cls, repo, commit):
+        return cls({"repo": repo, "commit": commit, "files": {}})
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = ImportGraph(self.files)
+        return self._graph
+
+    def update(self, repo_path, commit, paths=None, tree=None):
+        """Re-scan paths (None = everything) so the index reflects commit."""
+        tree = tree if tree is not None else scan_tree(repo_path, commit)
+        if paths is None:
+            paths = set(self.files) | set(tree)
+        else:
+            paths = set(paths) | {p for p in self.files if p not in tree}
+        wanted = {}
+        for path in paths:
+            self.files.pop(path, None)
+            if path in tree:
+                wanted.setdefault(tree[path][0], []).append(path)
+        for blob, text in read_blobs(repo_path, list(wanted)):
+            for path in wanted[blob]:
+                self.files[path] = [blob] + scan_imports(path, text)
+        self.commit = self.data["commit"] = commit
+        self._graph = None
+        return len(wanted)
+
+    @classmethod
+    def build(cls, repo, repo_path, commit, previous=None):
+        """Full build, or incremental from previous (an ImpactIndex of the same repo)."""
+        start = time.time()
+        tree = scan_tree(repo_path, commit)
+        if previous is None:
+            index, mode, paths = cls.empty(repo, commit), "full", None
+        else:
+            # A copy: other workers may still be querying previous (update() replaces entries, never edits them)
+            index, mode = cls(dict(previous.data, files=dict(previous.files))), "incremental"
+            paths = changed_paths(repo_path, previous.commit, commit)
+            if paths is None:
+                mode = "incremental-blobs"
+                paths = {p for p, (blob, _) in tree.items() if p not in index.files or index.files[p][0] != blob}
+        previous_commit = index.commit if previous is not None else None
+        rescanned = index.update(repo_path, commit, paths, tree)
+        index.data.update(built=datetime.now().isoformat(), mode=mode, previous=previous_commit,
+                          rescanned=rescanned, seconds=round(time.time() - start, 3))
+        return index
+
+    @staticmethod
+    def index_path(index_dir, repo, commit):
+        return os.path.join(index_dir, repo_key(repo), f"{commit}.json.gz")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, index_dir=DEFAULT_INDEX_DIR):
+        path = self.index_path(index_dir, self.repo, self.commit)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=3) as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        prune(os.path.dirname(path))
+        return path
+
+    # ------------------------------------------------------------------ query
+
+    def tests_for_paths(self, changed, max_depth=None):
+        """Sorted [(test_path, depth)]; depth None marks a name-based guess for an unreached file."""
+        graph = self.graph
+        tests = {}
+        for path in changed:
+            found = graph.impacted_tests([path], max_depth)
+            if not found:
+                # No test imports it (dynamic imports, fixtures): fall back to naming conventions
+                found = dict.fromkeys(graph.tests_named_after(path))
+            for test, depth in found.items():
+                current = tests.get(test, -1)
+                if current == -1 or (depth is not None and (current is None or depth < current)):
+                    tests[test] = depth
+        return sorted(tests.items(), key=lambda item: (item[1] is None, item[1] or 0, item[0]))
+
+    def tests_for_patch(self, patch, max_depth=None):
+        return self.tests_for_paths(patch_paths(patch), max_depth)
+
+
+def scan_tree(repo_path, commit):
+    return {p: entry for p, entry in list_tree(repo_path, commit).items()
+            if os.path.splitext(p)[1].lower() in SCAN_EXTENSIONS}
+
+
+def patch_paths(patch):
+    """Old and new paths of every file in patch text or an iterable of lines."""
+    parsed = parse_patch(patch, strict=False) if isinstance(patch, str) else parse_lines(patch)
+    paths = set()
+    for file_patch in parsed.files:
+        if file_patch.status == "deleted" and is_test_path(file_patch.old_path or ""):
+            continue   # nothing left to run
+        for path in (file_patch.old_path, file_patch.new_path):
+            if path and path != "/dev/null":
+                paths.add(path)
+    return paths
+
+
+def index_for_commit(repo, repo_path, commit, index_dir=DEFAULT_INDEX_DIR):
+    """Load or build the index for (repo, commit), reusing the repo's previous index when there is one."""
+    with repo_lock(repo):
+        recent = _recent.get(repo)
+        if recent is not None and recent.commit == commit:
+            recent.data["mode"] = "memory"
+            return recent
+        path = ImpactIndex.index_path(index_dir, repo, commit)
+        index = None
+        if os.path.exists(path):
+            try:
+                index = ImpactIndex.load(path)
+                index.data["mode"] = "cached"
+            except (OSError, ValueError, KeyError):
+                index = None
+        if index is None:
+            previous = recent
+            if previous is None:
+                latest = latest_index(index_dir, repo)
+                if latest:
+                    try:
+                        previous = ImpactIndex.load(latest)
+                    except (OSError, ValueError, KeyError):
+                        previous = None
+            index = ImpactIndex.build(repo, repo_path, commit, previous)
+            index.save(index_dir)
+        _recent[repo] = index
+        return index
+
+
+# ========================== CLI ==========================
+
+def print_tests(tests):
+    for test, depth in tests:
+        print(f"{'name' if depth is None else depth:>5}  {test}")
+    print(f"-- {len(tests)} test files")
+
+
+def bench(repo_path, repo, commits, index_dir):
+    previous = None
+    print(f"{'commit':<12} {'mode':<18} {'files':>7} {'rescanned':>9} {'build s':>8} {'graph s':>8} {'query ms':>9}")
+    for commit in commits:
+        index = ImpactIndex.build(repo, repo_path, commit, previous)
+        index.save(index_dir)
+        start = time.perf_counter()
+        graph = index.graph
+        graph_seconds = time.perf_counter() - start
+        sources = sorted(p for p in index.files if not is_test_path(p))[:200]
+        start = time.perf_counter()
+        for path in sources:
+            index.tests_for_paths([path])
+        query_ms = (time.perf_counter() - start) * 1000 / max(len(sources), 1)
+        print(f"{commit[:12]:<12} {index.data['mode']:<18} {len(index.files):>7} {index.data['rescanned']:>9} "
+              f"{index.data['seconds']:>8.2f} {graph_seconds:>8.2f} {query_ms:>9.2f}")
+        previous = index
+    edges = sum(len(deps) for deps in graph.deps.values())
+    tests = sum(1 for p in index.files if is_test_path(p))
+    print(f"-- {edges} import edges, {tests} test files")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Impacted-test selection from static imports')
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('patch', 'Tests impacted by a patch file'),
+                            ('files', 'Tests impacted by changes to the given paths')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('repo_path')
+        sub.add_argument('commit')
+        sub.add_argument('targets', nargs='+', help='Patch file' if name == 'patch' else 'Changed paths')
+        sub.add_argument('--repo', default=None, help='owner/name (default: repo_path folder name)')
+        sub.add_argument('--max-depth', type=int, default=None, help='Follow at most this many import hops')
+
+    bench_parser = subparsers.add_parser('bench', help='Time full + incremental builds and lookups')
+    bench_parser.add_argument('repo_path')
+    bench_parser.add_argument('--commits', nargs='+', required=True)
+    bench_parser.add_argument('--repo', default=None)
+
+    args = parser.parse_args()
+    repo = args.repo or os.path.basename(os.path.abspath(args.repo_path))
+
+    if args.command == 'bench':
+        index_dir = tempfile.mkdtemp(prefix="test_impact_bench_")
+        try:
+            bench(args.repo_path, repo, args.commits, index_dir)
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+        return
+
+    commit = git(args.repo_path, "rev-parse", args.commit).stdout.decode().strip() or args.commit
+    index = index_for_commit(repo, args.repo_path, commit, args.index_dir)
+    if args.command == 'patch':
+        changed = set()
+        for patch_file in args.targets:
+            with open(patch_file, "r", encoding="utf-8", errors="replace", newline="") as f:
+                changed |= patch_paths(f)
+    else:
+        changed = set(args.targets)
+    print_tests(index.tests_for_paths(changed, args.max_depth))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""
+Localization metrics: did a prediction change the files and lines the gold patch changes?
+
+Every prediction and the dataset's reference patch for its instance are
+parsed once (unified_diff.py) into flat integer columns:
+
+  files   one row per (instance, file)                   -> file precision / recall
+  hunks   first..last changed line of each hunk          -> hunk precision / recall
+  blocks  each run of changed lines inside a hunk        -> line precision / recall / overlap
+
+Line numbers are pre-image (base commit) lines, so both patches live on the
+same axis; a pure insertion counts as the line it is inserted before.
+(file, line) pairs are packed into one int64 (file id * 2^32 + line), which
+turns all instances into a single sorted axis: overlap tests are one
+searchsorted and the line intersections one cumulative-sum sweep over all
+instances at once. NumPy is used when installed; otherwise the same
+numbers come from a merge over the sorted columns in plain Python.
+
+Hunk precision is the share of predicted hunks that overlap some gold hunk,
+hunk recall the share of gold hunks overlapped by a prediction; line
+overlap is |changed lines in both| / |changed lines in either|.
+
+  python localization.py gold --out gold_patches.jsonl             # cache reference patches once
+  python localization.py score predictions.jsonl --out localization.csv
+  python localization.py score predictions.jsonl --model cora --store patch_store
+  python localization.py bench --instances 5000
+"""
+
+import os
+import csv
+import json
+import time
+import random
+import argparse
+from array import array
+
+from unified_diff import parse_patch
+from patch_store import PatchStore
+from selection_index import DATASET_NAME, DATASET_SPLIT
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_GOLD_FILE = "gold_patches.jsonl"
+LINE_STRIDE = 1 << 32   # packed coordinate: file id * stride + line
+
+METRICS = ["file_precision", "file_recall", "hunk_precision", "hunk_recall",
+           "line_precision", "line_recall", "line_overlap"]
+COLUMNS = ["instance_id", "model", "gold_files", "pred_files", "file_precision", "file_recall",
+           "gold_hunks", "pred_hunks", "hunk_precision", "hunk_recall",
+           "gold_lines", "pred_lines", "line_precision", "line_recall", "line_overlap"]
+
+
+# ========================== PARSING ==========================
+
+def hunk_blocks(hunk):
+    """Pre-image [start, end) of each run of changed lines in a hunk."""
+    line = hunk.old_start if hunk.old_count else hunk.old_start + 1
+    blocks = []
+    start = None
+    removed = 0
+    for body in hunk.lines + [" "]:
+        first = body[:1]
+        if first == "-" or first == "+":
+            if start is None:
+                start, removed = line, 0
+            if first == "-":
+                removed += 1
+                line += 1
+        elif first != "\\":
+            if start is not None:
+                # Replaced lines, or the line a pure insertion goes before
+                blocks.append((start, start + max(removed, 1)))
+                start = None
+            line += 1
+    return blocks
+
+
+def patch_locations(text):
+    """{pre-image path: [[(start, end) per block] per hunk]} of a patch (malformed tails are skipped)."""
+    locations = {}
+    if not text or not text.strip():
+        return locations
+    for f in parse_patch(text, keep_lines=True, strict=False).files:
+        path = f.old_path or f.new_path
+        if path is None:
+            continue
+        hunks = locations.setdefault(path, [])
+        for hunk in f.hunks:
+            blocks = hunk_blocks(hunk)
+            if blocks:
+                hunks.append(blocks)
+    return locations
+
+
+class LocationColumns:
+    """Flat int64 columns for one side (predictions or gold) of every scored row"""
+
+    def __init__(self):
+        self.file_row = array("q")
+        self.file_key = array("q")
+        self.hunk_row = array("q")
+        self.hunk_start = array("q")
+        self.hunk_end = array("q")
+        self.block_start = array("q")
+        self.block_end = array("q")
+
+    def add(self, row, locations, keys):
+        for path, hunks in locations.items():
+            key = keys.setdefault((row, path), len(keys))
+            self.file_row.append(row)
+            self.file_key.append(key)
+            base = key * LINE_STRIDE
+            for blocks in hunks:
+                self.hunk_row.append(row)
+                self.hunk_start.append(base + blocks[0][0])
+                self.hunk_end.append(base + blocks[-1][1])
+                for start, end in blocks:
+                    self.block_start.append(base + start)
+                    self.block_end.append(base + end)
+
+
+# ========================== INTERVAL KERNELS ==========================
+
+def merge_np(starts, ends):
+    """Sorted, disjoint union of [start, end) intervals."""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] > reach[:-1]
+    # A merged interval ends where the running end stood just before the next one starts
+    last = np.append(np.flatnonzero(new)[1:] - 1, len(starts) - 1)
+    return starts[new], reach[last]
+
+
+def overlapping_np(starts, ends, union_starts, union_ends):
+    """For each interval, whether it overlaps the (merged) union."""
+    if not len(union_starts):
+        return np.zeros(len(starts), dtype=bool)
+    # Last union interval starting before our end; unions are disjoint so its end is the furthest
+    i = np.searchsorted(union_starts, ends, side="left") - 1
+    return (i >= 0) & (union_ends[np.maximum(i, 0)] > starts)
+
+
+def intersection_np(a, b, key_row, rows):
+    """Per-row length of the intersection of two merged unions."""
+    coords = np.concatenate([a[0], a[1], b[0], b[1]])
+    if not len(coords):
+        return np.zeros(rows)
+    steps = np.concatenate([np.ones(len(a[0]), dtype=np.int64), -np.ones(len(a[1]), dtype=np.int64),
+                            np.ones(len(b[0]), dtype=np.int64), -np.ones(len(b[1]), dtype=np.int64)])
+    order = np.argsort(coords, kind="stable")
+    coords, depth = coords[order], np.cumsum(steps[order])
+    inside = (depth[:-1] == 2) * np.diff(coords)
+    return np.bincount(key_row[coords[:-1] // LINE_STRIDE], weights=inside, minlength=rows)
+
+
+def score_np(pred, gold, key_row, rows):
+    col = lambda values: np.frombuffer(values, dtype=np.int64) if len(values) else np.zeros(0, dtype=np.int64)
+    count = lambda row, weights=None: np.bincount(col(row), weights=weights, minlength=rows)
+    key_row = np.asarray(key_row, dtype=np.int64)
+
+    out = {
+        "pred_files": count(pred.file_row), "gold_files": count(gold.file_row),
+        "file_hits": count(pred.file_row, np.isin(col(pred.file_key), col(gold.file_key))),
+        "pred_hunks": count(pred.hunk_row), "gold_hunks": count(gold.hunk_row),
+    }
+    pred_hunks = merge_np(col(pred.hunk_start), col(pred.hunk_end))
+    gold_hunks = merge_np(col(gold.hunk_start), col(gold.hunk_end))
+    out["pred_hunk_hits"] = count(pred.hunk_row, overlapping_np(col(pred.hunk_start), col(pred.hunk_end), *gold_hunks))
+    out["gold_hunk_hits"] = count(gold.hunk_row, overlapping_np(col(gold.hunk_start), col(gold.hunk_end), *pred_hunks))
+
+    for name, side in (("pred", pred), ("gold", gold)):
+        merged = merge_np(col(side.block_start), col(side.block_end))
+        out[name + "_union"] = merged
+        out[name + "_lines"] = (np.bincount(key_row[merged[0] // LINE_STRIDE], weights=merged[1] - merged[0],
+                                            minlength=rows) if len(merged[0]) else np.zeros(rows))
+    out["both_lines"] = intersection_np(out.pop("pred_union"), out.pop("gold_union"), key_row, rows)
+    return {name: [int(v) for v in values] for name, values in out.items()}
+
+
+def merge_py(starts, ends):
+    merged_starts, merged_ends = [], []
+    for start, end in sorted(zip(starts, ends)):
+        if merged_ends and start <= merged_ends[-1]:
+            merged_ends[-1] = max(merged_ends[-1], end)
+        else:
+            merged_starts.append(start)
+            merged_ends.append(end)
+    return merged_starts, merged_ends
+
+
+def overlapping_py(starts, ends, union_starts, union_ends):
+    from bisect import bisect_left
+    hits = []
+    for start, end in zip(starts, ends):
+        i = bisect_left(union_starts, end) - 1
+        hits.append(i >= 0 and union_ends[i] > start)
+    return hits
+
+
+def score_py(pred, gold, key_row, rows):
+    def count(row, weights=None):
+        totals = [0] * rows
+        for i, r in enumerate(row):
+            totals[r] += 1 if weights is None else weights[i]
+        return totals
+
+    gold_keys = set(gold.file_key)
+    out = {
+        "pred_files": count(pred.file_row), "gold_files": count(gold.file_row),
+        "file_hits": count(pred.file_row, [key in gold_keys for key in pred.file_key]),
+        "pred_hunks": count(pred.hunk_row), "gold_hunks": count(gold.hunk_row),
+    }
+    pred_hunks = merge_py(pred.hunk_start, pred.hunk_end)
+    gold_hunks = merge_py(gold.hunk_start, gold.hunk_end)
+    out["pred_hunk_hits"] = count(pred.hunk_row, overlapping_py(pred.hunk_start, pred.hunk_end, *gold_hunks))
+    out["gold_hunk_hits"] = count(gold.hunk_row, overlapping_py(gold.hunk_start, gold.hunk_end, *pred_hunks))
+
+    unions = {}
+    for name, side in (("pred", pred), ("gold", gold)):
+        unions[name] = merge_py(side.block_start, side.block_end)
+        lines = [0] * rows
+        for start, end in zip(*unions[name]):
+            lines[key_row[start // LINE_STRIDE]] += end - start
+        out[name + "_lines"] = lines
+    both = [0] * rows
+    (a_starts, a_ends), (b_starts, b_ends) = unions["pred"], unions["gold"]
+    i = j = 0
+    while i < len(a_starts) and j < len(b_starts):
+        low, high = max(a_starts[i], b_starts[j]), min(a_ends[i], b_ends[j])
+        if low < high:
+            both[key_row[low // LINE_STRIDE]] += high - low
+        if a_ends[i] < b_ends[j]:
+            i += 1
+        else:
+            j += 1
+    out["both_lines"] = both
+    return out
+
+
+# ========================== SCORING ==========================
+
+def ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def build_columns(predictions, gold_patches):
+    """Parse both sides once; returns (scored rows, pred columns, gold columns, row of each file key)."""
+    pred, gold = LocationColumns(), LocationColumns()
+    keys = {}
+    scored = []
+    gold_cache = {}
+    for model, instance_id, patch in predictions:
+        if instance_id not in gold_patches:
+            continue
+        row = len(scored)
+        scored.append((instance_id, model))
+        if instance_id not in gold_cache:
+            gold_cache[instance_id] = patch_locations(gold_patches[instance_id])
+        gold.add(row, gold_cache[instance_id], keys)
+        pred.add(row, patch_locations(patch), keys)
+
+    key_row = [0] * len(keys)
+    for (row, _), key in keys.items():
+        key_row[key] = row
+    return scored, pred, gold, key_row
+
+
+def score(predictions, gold_patches, use_numpy=True, columns=None):
+    """Localization table rows for [(model, instance_id, patch)] against {instance_id: gold patch}."""
+    scored, pred, gold, key_row = columns or build_columns(predictions, gold_patches)
+    kernel = score_np if use_numpy and np is not None else score_py
+    c = kernel(pred, gold, key_row, len(scored))
+
+    table = []
+    for row, (instance_id, model) in enumerate(scored):
+        table.append({
+            "instance_id": instance_id, "model": model,
+            "gold_files": c["gold_files"][row], "pred_files": c["pred_files"][row],
+            "file_precision": ratio(c["file_hits"][row], c["pred_files"][row]),
+            "file_recall": ratio(c["file_hits"][row], c["gold_files"][row]),
+            "gold_hunks": c["gold_hunks"][row], "pred_hunks": c["pred_hunks"][row],
+            "hunk_precision": ratio(c["pred_hunk_hits"][row], c["pred_hunks"][row]),
+            "hunk_recall": ratio(c["gold_hunk_hits"][row], c["gold_hunks"][row]),
+            "gold_lines": c["gold_lines"][row], "pred_lines": c["pred_lines"][row],
+            "line_precision": ratio(c["both_lines"][row], c["pred_lines"][row]),
+            "line_recall": ratio(c["both_lines"][row], c["gold_lines"][row]),
+            "line_overlap": ratio(c["both_lines"][row], c["pred_lines"][row] + c["gold_lines"][row] - c["both_lines"][row]),
+        })
+    return table
+
+
+def load_predictions(predictions_files=(), store_dir=None, model=None):
+    """Latest (model, instance_id, patch) per model and instance."""
+    latest = {}
+    for predictions_file in predictions_files:
+        with open(predictions_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                name = entry.get("model_name_or_path", "")
+                if entry.get("instance_id") and (not model or name == model):
+                    latest[(name, entry["instance_id"])] = entry.get("model_patch") or ""
+    if store_dir:
+        store = PatchStore(store_dir)
+        for entry in store.entries(model):
+            patch = store.read_text(entry["sha256"]) if entry["size"] else ""
+            latest[(entry["model_name_or_path"], entry["instance_id"])] = patch
+    return [(name, instance_id, patch) for (name, instance_id), patch in latest.items()]
+
+
+def gold_from_dataset():
+    """{instance_id: reference patch} straight from the dataset (two columns only)."""
+    from datasets import load_dataset
+    dataset = load_dataset(DATASET_NAME, split=DATASET_SPLIT)
+    columns = dataset.select_columns(["instance_id", "patch"])
+    return dict(zip(columns["instance_id"], columns["patch"]))
+
+
+def load_gold(gold_file=DEFAULT_GOLD_FILE):
+    """Reference patches from a cached gold file, else from the dataset."""
+    if not os.path.exists(gold_file):
+        return gold_from_dataset()
+    gold = {}
+    with open(gold_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                gold[entry["instance_id"]] = entry["patch"]
+    return gold
+
+
+def write_table(table, out_file):
+    tmp_file = out_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(table)
+    os.replace(tmp_file, out_file)
+
+
+def summary_lines(table):
+    lines = []
+    for model in sorted({row["model"] for row in table}):
+        rows = [row for row in table if row["model"] == model]
+        lines.append(f"{model}: {len(rows)} instances, "
+                     f"{sum(1 for r in rows if r['file_precision'] == 1 and r['file_recall'] == 1)} with exactly the gold files, "
+                     f"{sum(1 for r in rows if not r['pred_files'])} empty")
+        for metric in METRICS:
+            values = [r[metric] for r in rows if r[metric] is not None]
+            mean = sum(values) / len(values) if values else 0
+            lines.append(f"  {metric:<15} {mean:6.3f}  (n={len(values)})")
+    return lines
+
+
+# ========================== BENCHMARK ==========================
+
+def synthetic_patch(rng, files, hunks):
+    parts = []
+    for f in range(files):
+        path = f"src/module_{f}.js"
+        parts.append(f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n")
+        line = 1
+        for _ in range(hunks):
+            line += rng.randint(5, 200)
+            parts.append(f"@@ -{line},7 +{line},7 @@\n   a\n   b\n   c\n-  old\n+  new\n   d\n   e\n   f\n")
+    return "".join(parts)
+
+
+def benchmark(instances):
+    """Parse + score time for synthetic predictions against synthetic gold patches."""
+    rng = random.Random(7)
+    gold = {}
+    predictions = []
+    for i in range(instances):
+        instance_id = f"repo__x-{i}"
+        # The gold patch's first files, with the same seed, plus other hunks or an empty prediction
+        seed = rng.randrange(1 << 30)
+        gold[instance_id] = synthetic_patch(random.Random(seed), rng.randint(1, 4), rng.randint(1, 4))
+        choice = rng.random()
+        if choice < 0.1:
+            patch = ""
+        elif choice < 0.6:
+            patch = synthetic_patch(random.Random(seed), rng.randint(1, 3), rng.randint(1, 5))
+        else:
+            patch = synthetic_patch(rng, rng.randint(1, 4), rng.randint(1, 4))
+        predictions.append(("bench", instance_id, patch))
+
+    start = time.perf_counter()
+    columns = build_columns(predictions, gold)
+    print(f"{instances} instances, {len(columns[2].hunk_row)} gold / {len(columns[1].hunk_row)} predicted hunks; "
+          f"parsed in {time.perf_counter() - start:.2f}s")
+    results = {}
+    for kernel in (["numpy"] if np is not None else []) + ["python"]:
+        start = time.perf_counter()
+        results[kernel] = score(predictions, gold, use_numpy=kernel == "numpy", columns=columns)
+        print(f"  {kernel:<6} metrics in {time.perf_counter() - start:.3f}s")
+    if len(results) == 2:
+        print(f"  numpy and python tables identical: {results['numpy'] == results['python']}")
+    for line in summary_lines(results["python"]):
+        print(line)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='File/hunk/line localization of predictions against gold patches')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = subparsers.add_parser('score', help='Per-instance localization table')
+    score_parser.add_argument('predictions', nargs='*', default=[], help='predictions.jsonl files')
+    score_parser.add_argument('--store', default=None, help='Also read a patch store')
+    score_parser.add_argument('--model', default=None)
+    score_parser.add_argument('--gold', default=DEFAULT_GOLD_FILE,
+                              help='Cached reference patches (from the dataset if the file does not exist)')
+    score_parser.add_argument('--out', default='localization.csv')
+    score_parser.add_argument('--no-numpy', action='store_true', help='Use the pure-Python kernels')
+
+    gold_parser = subparsers.add_parser('gold', help='Cache the dataset reference patches as JSONL')
+    gold_parser.add_argument('--out', default=DEFAULT_GOLD_FILE)
+
+    bench_parser = subparsers.add_parser('bench', help='Time parsing and scoring on synthetic patches')
+    bench_parser.add_argument('--instances', type=int, default=5000)
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        benchmark(args.instances)
+        return
+
+    if args.command == 'gold':
+        gold = gold_from_dataset()
+        with open(args.out, "w", encoding="utf-8") as f:
+            for instance_id, patch in gold.items():
+                f.write(json.dumps({"instance_id": instance_id, "patch": patch}) + "\n")
+        print(f"✓ {len(gold)} reference patches written to {args.out}")
+        return
+
+    predictions = load_predictions(args.predictions or ["predictions.jsonl"], args.store, args.model)
+    gold = load_gold(args.gold)
+    start = time.perf_counter()
+    table = score(predictions, gold, use_numpy=not args.no_numpy)
+    seconds = time.perf_counter() - start
+    write_table(table, args.out)
+    missing = len(predictions) - len(table)
+    print(f"✓ {len(table)} predictions scored in {seconds:.2f}s "
+          f"({'numpy' if np is not None and not args.no_numpy else 'python'}) -> {args.out}"
+          + (f"; {missing} without a gold patch" if missing else ""))
+    for line in summary_lines(table):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Content-addressed, compressed patch store
+
+  patch_store/
+    objects/ab/abcdef...gz     one compressed object per distinct normalized patch
+    manifest.jsonl             instance_id + model_name_or_path -> sha256 (last line wins)
+
+Identical patches (retries, re-runs under another model name) are stored once.
+predictions.jsonl for evaluation is produced on demand by a streaming export.
+
+  python patch_store.py ingest predictions.jsonl
+  python patch_store.py export --out predictions.jsonl [--model cora]
+  python patch_store.py bench predictions.jsonl
+"""
+
+import os
+import gzip
+import json
+import time
+import codecs
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_STORE_DIR = "patch_store"
+MANIFEST_NAME = "manifest.jsonl"
+CHUNK_SIZE = 64 * 1024
+
+
+def normalize_patch(text):
+    """Canonical form used for hashing: exactly one trailing newline, empty if blank."""
+    if not text or not text.strip():
+        return ""
+    return text.rstrip("\n") + "\n"
+
+
+def write_prediction_line(f, entry, text_chunks):
+    """Write one predictions.jsonl line, JSON-escaping the patch chunk by chunk."""
+    entry = {k: v for k, v in entry.items() if k != "model_patch"}
+    entry["model_patch"] = ""
+    head = json.dumps(entry)
+    f.write(head[:-2])
+    for text in text_chunks:
+        f.write(json.dumps(text)[1:-1])
+    f.write('"}\n')
+
+
+class PatchStore:
+    """Stores each distinct patch once and maps (instance_id, model) to its hash"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, codec=None):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.manifest_file = os.path.join(store_dir, MANIFEST_NAME)
+        self.codec = codec or ("zst" if zstandard else "gz")
+        if self.codec == "zst" and zstandard is None:
+            raise RuntimeError("zstd codec requested but the zstandard package is not installed")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    # ---------------------------------------------------------------- objects
+
+    def _object_path(self, sha256, codec=None):
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.{codec or self.codec}")
+
+    def find_object(self, sha256):
+        """Return the path of a stored object in any codec, or None."""
+        for codec in ("zst", "gz"):
+            path = self._object_path(sha256, codec)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _open_writer(self, raw):
+        if self.codec == "zst":
+            return zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0)
+
+    def _put_stream(self, chunks):
+        """Compress byte chunks into a temp object, hashing on the way; dedupe on rename."""
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix="obj_", dir=self.objects_dir)
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                writer = self._open_writer(raw)
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    writer.write(chunk)
+                    size += len(chunk)
+                writer.close()
+            sha256 = hasher.hexdigest()
+            if self.find_object(sha256):
+                os.remove(tmp_path)
+            else:
+                final_path = self._object_path(sha256)
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return sha256, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_text(self, text):
+        """Store a patch string; returns (sha256, size) of the normalized patch."""
+        data = normalize_patch(text).encode("utf-8")
+        return self._put_stream(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+    def put_file(self, path):
+        """Store a patch file (e.g. a DiffCapture spool) without loading it whole.
+
+        git diff output is already in normalized form, so it is hashed as is.
+        """
+        def chunks():
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        return self._put_stream(chunks())
+
+    def open_object(self, sha256):
+        """Open a stored object for streaming reads (binary, decompressed)."""
+        path = self.find_object(sha256)
+        if path is None:
+            raise KeyError(f"Patch object {sha256} missing from {self.objects_dir}")
+        if path.endswith(".zst"):
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return gzip.open(path, "rb")
+
+    def iter_text(self, sha256):
+        """Yield a stored patch as decoded text chunks."""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with self.open_object(sha256) as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield decoder.decode(chunk)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def read_text(self, sha256):
+        return "".join(self.iter_text(sha256))
+
+    # --------------------------------------------------------------- manifest
+
+    def record(self, instance_id, model_name_or_path, sha256, size):
+        """Append a manifest line pointing (instance_id, model) at an object."""
+        entry = {
+            "instance_id": instance_id,
+            "model_name_or_path": model_name_or_path,
+            "sha256": sha256,
+            "size": size,
+            "timestamp": datetime.now().isoformat()
+        }
+        with open(self.manifest_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+        return entry
+
+    def add_prediction(self, instance_id, model_name_or_path, patch_text):
+        sha256, size = self.put_text(patch_text)
+        return self.record(instance_id, model_name_or_path, sha256, size)
+
+    def add_prediction_file(self, instance_id, model_name_or_path, patch_path):
+        if patch_path is None:
+            return self.add_prediction(instance_id, model_name_or_path, "")
+        sha256, size = self.put_file(patch_path)
+        return self.record(instance_id, model_name_or_path, sha256, size)
+
+    def entries(self, model=None):
+        """Latest manifest entry per (instance_id, model), in first-seen order."""
+        latest = {}
+        if not os.path.exists(self.manifest_file):
+            return []
+        with open(self.manifest_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if model and entry["model_name_or_path"] != model:
+                    continue
+                latest[(entry["instance_id"], entry["model_name_or_path"])] = entry
+        return list(latest.values())
+
+    def completed(self, model=None):
+        """Same shape as get_completed_instances, without reading any patch."""
+        return {
+            entry["instance_id"]: {"has_changes": entry["size"] > 0, "sha256": entry["sha256"], "size": entry["size"]}
+            for entry in self.entries(model)
+        }
+
+    # ----------------------------------------------------------------- export
+
+    def export_jsonl(self, out_file, model=None):
+        """Stream an evaluation-ready predictions.jsonl; returns number of lines."""
+        count = 0
+        tmp_file = out_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for entry in self.entries(model):
+                write_prediction_line(
+                    f,
+                    {"instance_id": entry["instance_id"], "model_name_or_path": entry["model_name_or_path"]},
+                    self.iter_text(entry["sha256"]) if entry["size"] else []
+                )
+                count += 1
+        os.replace(tmp_file, out_file)
+        return count
+
+    def ingest_jsonl(self, predictions_file):
+        """Import an existing predictions.jsonl; returns number of entries."""
+        count = 0
+        with open(predictions_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not entry.get("instance_id"):
+                    continue
+                self.add_prediction(entry["instance_id"], entry.get("model_name_or_path", ""), entry.get("model_patch", ""))
+                count += 1
+        return count
+
+    def disk_usage(self):
+        total = 0
+        for root, _, files in os.walk(self.store_dir):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+
+
+# ========================== BENCHMARK ==========================
+
+def scan_jsonl_completed(predictions_file):
+    """The runner's current scan: parse every line including the patch."""
+    completed = {}
+    with open(predictions_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                completed[entry["instance_id"]] = bool(entry.get("model_patch", "").strip())
+    return completed
+
+
+def best_of(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(predictions_file, codec=None):
+    """Compare storage size and scan time of predictions.jsonl vs the patch store."""
+    work_dir = tempfile.mkdtemp(prefix="patch_store_bench_")
+    try:
+        store = PatchStore(os.path.join(work_dir, "store"), codec=codec)
+        start = time.perf_counter()
+        count = store.ingest_jsonl(predictions_file)
+        ingest_time = time.perf_counter() - start
+
+        jsonl_bytes = os.path.getsize(predictions_file)
+        store_bytes = store.disk_usage()
+        objects = sum(len(files) for _, _, files in os.walk(store.objects_dir))
+
+        scan_jsonl = best_of(lambda: scan_jsonl_completed(predictions_file))
+        scan_store = best_of(lambda: store.completed())
+        out_file = os.path.join(work_dir, "export.jsonl")
+        export_time = best_of(lambda: store.export_jsonl(out_file), repeat=3)
+
+        print(f"Predictions:          {count} lines, {objects} distinct patches ({store.codec})")
+        print(f"predictions.jsonl:    {jsonl_bytes / 1024:.1f} KiB")
+        print(f"patch store:          {store_bytes / 1024:.1f} KiB ({store_bytes / max(jsonl_bytes, 1):.1%} of JSONL)")
+        print(f"completed scan JSONL: {scan_jsonl * 1000:.2f} ms")
+        print(f"completed scan store: {scan_store * 1000:.2f} ms")
+        print(f"ingest:               {ingest_time * 1000:.1f} ms")
+        print(f"export to JSONL:      {export_time * 1000:.1f} ms")
+        return {
+            "entries": count, "objects": objects,
+            "jsonl_bytes": jsonl_bytes, "store_bytes": store_bytes,
+            "scan_jsonl": scan_jsonl, "scan_store": scan_store, "export": export_time
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Content-addressed patch store for SWE-PolyBench predictions')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--codec', choices=['gz', 'zst'], default=None)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Import an existing predictions.jsonl')
+    ingest_parser.add_argument('predictions_file')
+
+    export_parser = subparsers.add_parser('export', help='Write evaluation-ready predictions.jsonl')
+    export_parser.add_argument('--out', default='predictions.jsonl')
+    export_parser.add_argument('--model', default=None)
+
+    bench_parser = subparsers.add_parser('bench', help='Compare against the plain JSONL layout')
+    bench_parser.add_argument('predictions_file')
+
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        benchmark(args.predictions_file, args.codec)
+        return
+
+    store = PatchStore(args.store, codec=args.codec)
+    if args.command == 'ingest':
+        count = store.ingest_jsonl(args.predictions_file)
+        print(f"✓ Ingested {count} predictions into {args.store}")
+    else:
+        count = store.export_jsonl(args.out, args.model)
+        print(f"✓ Exported {count} predictions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
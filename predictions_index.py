@@ -0,0 +1,351 @@
+"""
+Multi-model predictions index for comparing runs
+
+Indexes predictions by (model, instance_id, attempt) in a SQLite summary
+table (patch size, files touched, lines added/removed, has_changes,
+timestamp). Sources are predictions.jsonl files and patch store manifests;
+rebuilds are incremental (only lines appended since the last build are read);
+a predictions file rewritten in place has its rows dropped and is read again.
+
+  python predictions_index.py build predictions.jsonl other_model.jsonl --store patch_store
+  python predictions_index.py summary
+  python predictions_index.py only cora other-model        # solved by A but not B
+  python predictions_index.py deltas cora other-model --limit 20
+  python predictions_index.py bench --rows 50000
+"""
+
+import os
+import json
+import hashlib
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+from patch_store import PatchStore
+
+DEFAULT_INDEX_FILE = "predictions_index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    model TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    sha256 TEXT,
+    patch_bytes INTEGER NOT NULL,
+    files_touched INTEGER NOT NULL,
+    lines_added INTEGER NOT NULL,
+    lines_removed INTEGER NOT NULL,
+    has_changes INTEGER NOT NULL,
+    timestamp TEXT,
+    source TEXT,
+    PRIMARY KEY (model, instance_id, attempt)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_instance ON predictions (instance_id, model);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    head TEXT
+);
+-- Latest attempt per (model, instance_id), kept in step with predictions on insert
+CREATE TABLE IF NOT EXISTS latest (
+    model TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    sha256 TEXT,
+    patch_bytes INTEGER NOT NULL,
+    files_touched INTEGER NOT NULL,
+    lines_added INTEGER NOT NULL,
+    lines_removed INTEGER NOT NULL,
+    has_changes INTEGER NOT NULL,
+    timestamp TEXT,
+    source TEXT,
+    PRIMARY KEY (model, instance_id)
+);
+CREATE INDEX IF NOT EXISTS idx_latest_instance ON latest (instance_id, model);
+CREATE TRIGGER IF NOT EXISTS predictions_latest AFTER INSERT ON predictions
+BEGIN
+    INSERT OR REPLACE INTO latest SELECT * FROM predictions
+    WHERE model = NEW.model AND instance_id = NEW.instance_id AND attempt = NEW.attempt;
+END;
+"""
+
+
+def patch_stats(lines):
+    """Count files touched and lines added/removed from an iterable of patch lines."""
+    files = 0
+    added = 0
+    removed = 0
+    for line in lines:
+        if line.startswith("diff --git "):
+            files += 1
+        elif line.startswith("+") and not line.startswith("+++ "):
+            added += 1
+        elif line.startswith("-") and not line.startswith("--- "):
+            removed += 1
+    return files, added, removed
+
+
+def iter_lines(text_chunks):
+    """Split decoded text chunks into lines, joining lines that span chunks."""
+    pending = ""
+    for chunk in text_chunks:
+        pending += chunk
+        lines = pending.split("\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+class PredictionsIndex:
+    """SQLite-backed summary of predictions across models and attempts"""
+
+    def __init__(self, index_file=DEFAULT_INDEX_FILE):
+        self.index_file = index_file
+        self.conn = sqlite3.connect(index_file)
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sources)")}
+        for column, kind in [("size", "INTEGER"), ("mtime", "REAL"), ("head", "TEXT")]:
+            if column not in columns:  # index built before rewrites were detected
+                self.conn.execute(f"ALTER TABLE sources ADD COLUMN {column} {kind}")
+
+    def close(self):
+        self.conn.close()
+
+    def _next_attempt(self, model, instance_id):
+        row = self.conn.execute(
+            "SELECT COALESCE(MAX(attempt), 0) FROM predictions WHERE model = ? AND instance_id = ?",
+            (model, instance_id)
+        ).fetchone()
+        return row[0] + 1
+
+    def add(self, model, instance_id, sha256, patch_bytes, stats, timestamp, source):
+        files, added, removed = stats
+        self.conn.execute(
+            "INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (model, instance_id, self._next_attempt(model, instance_id), sha256, patch_bytes,
+             files, added, removed, int(patch_bytes > 0), timestamp, source)
+        )
+
+    def _source_offset(self, path):
+        row = self.conn.execute("SELECT offset FROM sources WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_source_offset(self, path, offset, size=None, mtime=None, head=None):
+        self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)", (path, offset, size, mtime, head))
+
+    def _was_rewritten(self, path, size, mtime, head):
+        """True when path no longer starts with what was indexed from it (not just appended to)."""
+        row = self.conn.execute("SELECT offset, size, mtime, head FROM sources WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return False
+        offset, old_size, old_mtime, old_head = row
+        if old_size is None:
+            return offset > size  # recorded before size/mtime/head were kept
+        return size < old_size or (size == old_size and mtime != old_mtime) or head != old_head
+
+    def _drop_source(self, path):
+        """Remove the rows indexed from path; latest falls back to other sources' attempts."""
+        self.conn.execute("DELETE FROM latest WHERE source = ?", (path,))
+        self.conn.execute("DELETE FROM predictions WHERE source = ?", (path,))
+        self.conn.execute(
+            """INSERT OR IGNORE INTO latest SELECT * FROM predictions p
+               WHERE attempt = (SELECT MAX(attempt) FROM predictions q
+                                WHERE q.model = p.model AND q.instance_id = p.instance_id)"""
+        )
+        self.conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def ingest_jsonl(self, predictions_file):
+        """Index lines appended to a predictions.jsonl since the last build."""
+        path = os.path.abspath(predictions_file)
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            head = hashlib.sha256(f.readline()).hexdigest()
+        if self._was_rewritten(path, stat.st_size, stat.st_mtime, head):
+            self._drop_source(path)
+        offset = self._source_offset(path)
+        count = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # partial line still being written
+                offset += len(raw)
+                if not raw.strip():
+                    continue
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if not entry.get("instance_id"):
+                    continue
+                patch = entry.get("model_patch") or ""
+                patch_bytes = len(patch.encode("utf-8")) if patch.strip() else 0
+                self.add(entry.get("model_name_or_path", ""), entry["instance_id"], None, patch_bytes,
+                         patch_stats(patch.split("\n")), entry.get("timestamp"), path)
+                count += 1
+        self._set_source_offset(path, offset, stat.st_size, stat.st_mtime, head)
+        self.conn.commit()
+        return count
+
+    def ingest_store(self, store_dir):
+        """Index manifest lines of a patch store appended since the last build."""
+        store = PatchStore(store_dir)
+        path = os.path.abspath(store.manifest_file)
+        if not os.path.exists(path):
+            return 0
+        offset = self._source_offset(path)
+        count = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                offset += len(raw)
+                entry = json.loads(raw)
+                if entry["size"]:
+                    stats = patch_stats(iter_lines(store.iter_text(entry["sha256"])))
+                else:
+                    stats = (0, 0, 0)
+                self.add(entry["model_name_or_path"], entry["instance_id"], entry["sha256"], entry["size"],
+                         stats, entry.get("timestamp"), path)
+                count += 1
+        self._set_source_offset(path, offset)
+        self.conn.commit()
+        return count
+
+    # ---------------------------------------------------------------- queries
+
+    def summary(self):
+        return self.conn.execute(
+            """SELECT model, COUNT(*), SUM(has_changes), SUM(patch_bytes), AVG(files_touched)
+               FROM latest GROUP BY model ORDER BY model"""
+        ).fetchall()
+
+    def solved_only_by(self, model_a, model_b):
+        """Instances where model_a has a non-empty patch and model_b has none."""
+        return [row[0] for row in self.conn.execute(
+            """SELECT a.instance_id FROM latest a
+               LEFT JOIN latest b ON b.instance_id = a.instance_id AND b.model = ?
+               WHERE a.model = ? AND a.has_changes = 1 AND COALESCE(b.has_changes, 0) = 0
+               ORDER BY a.instance_id""",
+            (model_b, model_a)
+        )]
+
+    def largest_deltas(self, model_a, model_b, limit=20):
+        """Instances attempted by both models, ordered by patch size difference."""
+        return self.conn.execute(
+            """SELECT a.instance_id, a.patch_bytes, b.patch_bytes, a.patch_bytes - b.patch_bytes AS delta,
+                      a.files_touched, b.files_touched
+               FROM latest a JOIN latest b ON b.instance_id = a.instance_id
+               WHERE a.model = ? AND b.model = ?
+               ORDER BY ABS(delta) DESC LIMIT ?""",
+            (model_a, model_b, limit)
+        ).fetchall()
+
+
+# ========================== BENCHMARK ==========================
+
+def benchmark(rows):
+    """Time the comparison queries over a synthetic multi-model table."""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        index = PredictionsIndex(path)
+        rng = random.Random(0)
+        models = ["cora", "model-b", "model-c"]
+        instances = [f"repo__proj-{i}" for i in range(rows // len(models))]
+        start = time.perf_counter()
+        index.conn.executemany(
+            "INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((m, iid, 1 + (rng.random() < 0.1), None, size, rng.randint(1, 8), 0, 0, int(size > 0), None, "bench")
+             for m in models for iid in instances
+             for size in [rng.choice([0, rng.randint(200, 200000)])])
+        )
+        index.conn.commit()
+        load_time = time.perf_counter() - start
+
+        timings = {}
+        for name, query in [
+            ("summary", lambda: index.summary()),
+            ("only A not B", lambda: index.solved_only_by("cora", "model-b")),
+            ("largest deltas", lambda: index.largest_deltas("cora", "model-b", 20)),
+        ]:
+            start = time.perf_counter()
+            query()
+            timings[name] = time.perf_counter() - start
+
+        print(f"Rows: {len(models) * len(instances)} (load {load_time * 1000:.0f} ms)")
+        for name, elapsed in timings.items():
+            print(f"  {name:<16} {elapsed * 1000:.1f} ms")
+        index.close()
+        return timings
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index and compare predictions across models')
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index predictions files and patch stores')
+    build_parser.add_argument('predictions_files', nargs='*', default=['predictions.jsonl'])
+    build_parser.add_argument('--store', action='append', default=[], help='Patch store directory (repeatable)')
+
+    subparsers.add_parser('summary', help='Per-model totals')
+
+    only_parser = subparsers.add_parser('only', help='Instances solved by model A but not model B')
+    only_parser.add_argument('model_a')
+    only_parser.add_argument('model_b')
+
+    deltas_parser = subparsers.add_parser('deltas', help='Largest patch size differences between two models')
+    deltas_parser.add_argument('model_a')
+    deltas_parser.add_argument('model_b')
+    deltas_parser.add_argument('--limit', type=int, default=20)
+
+    bench_parser = subparsers.add_parser('bench', help='Time queries over synthetic rows')
+    bench_parser.add_argument('--rows', type=int, default=50000)
+
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        benchmark(args.rows)
+        return
+
+    index = PredictionsIndex(args.index)
+    start = time.perf_counter()
+
+    if args.command == 'build':
+        for predictions_file in args.predictions_files:
+            if os.path.exists(predictions_file):
+                print(f"{predictions_file}: {index.ingest_jsonl(predictions_file)} new rows")
+        for store_dir in args.store:
+            print(f"{store_dir}: {index.ingest_store(store_dir)} new rows")
+
+    elif args.command == 'summary':
+        print(f"{'Model':<30} {'Rows':>6} {'Changes':>8} {'Bytes':>12} {'Files':>6}")
+        for model, count, changes, total_bytes, avg_files in index.summary():
+            print(f"{model:<30} {count:>6} {changes:>8} {total_bytes:>12} {avg_files or 0:>6.1f}")
+
+    elif args.command == 'only':
+        instance_ids = index.solved_only_by(args.model_a, args.model_b)
+        for instance_id in instance_ids:
+            print(instance_id)
+        print(f"-- {len(instance_ids)} instances with a patch from {args.model_a} but not {args.model_b}")
+
+    elif args.command == 'deltas':
+        print(f"{'Instance':<40} {args.model_a[:10]:>10} {args.model_b[:10]:>10} {'Delta':>10}")
+        for instance_id, bytes_a, bytes_b, delta, _, _ in index.largest_deltas(args.model_a, args.model_b, args.limit):
+            print(f"{instance_id:<40} {bytes_a:>10} {bytes_b:>10} {delta:>+10}")
+
+    print(f"-- {(time.perf_counter() - start) * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Opt-in Python profiling for the runners and the analysis scripts (--profile)
+
+Time is attributed to the current phase (setup, clone, prompt, diff, ...)
+and, inside the runner loop, to the current instance. Two views are kept:
+
+  - cProfile, one profile per (instance, phase), for exact call counts and
+    per-function times (pstats files; open with snakeviz or pstats)
+  - a sampler that records the main thread's stack every few milliseconds,
+    written as collapsed stacks (flamegraph.pl, speedscope, inferno)
+
+Files under the profile directory:
+
+  profile.pstats            everything
+  <phase>.pstats            one phase, all instances
+  profile.collapsed         sampled stacks, the phase as root frame
+  instances/<id>.<phase>.pstats, instances/<id>.collapsed
+
+A top-N of the hottest functions is printed at exit. Only the main thread
+is profiled; time in git/agent subprocesses shows up as waiting in
+subprocess calls (see resource_accounting.py for their CPU and memory).
+
+  python swe_polybench_tester.py --loop --profile
+  python audit_progress.py --profile /tmp/audit_profile --profile-top 40
+  flamegraph.pl swe_polybench_profile/profile.collapsed > session.svg
+"""
+
+import os
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from collections import Counter
+
+DEFAULT_PROFILE_DIR = "swe_polybench_profile"
+PROFILE_TOP = 25
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, default=None, metavar='DIR',
+                        help=f'Profile Python time per phase/instance into DIR (default {DEFAULT_PROFILE_DIR})')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP, metavar='N',
+                        help='Hot functions listed at exit with --profile')
+
+
+def frame_label(code):
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ",")
+
+
+def safe_name(text):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in text)
+
+
+class Profiler:
+    """Per-phase cProfile plus stack sampling; a Profiler(None) does nothing"""
+
+    def __init__(self, out_dir, top=PROFILE_TOP, interval=SAMPLE_INTERVAL):
+        self.out_dir = out_dir
+        self.enabled = bool(out_dir)
+        self.top = top
+        self.interval = interval
+        self.phase_stats = {}        # phase -> pstats.Stats over all instances
+        self.stacks = Counter()      # "phase;frame;...;frame" -> samples
+        self._profiles = {}          # phase -> cProfile.Profile of the current instance
+        self._instance_stacks = Counter()
+        self._scope = (None, None)   # (instance_id, phase) being measured; phase None = suspended
+        self._active = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._main_thread = None
+        self._finished = False
+        self.started = None
+
+    @classmethod
+    def from_args(cls, args, phase="setup"):
+        """Profiler for --profile/--profile-top, already measuring phase."""
+        profiler = cls(args.profile, top=args.profile_top)
+        profiler.start(phase)
+        return profiler
+
+    def start(self, phase="setup"):
+        if not self.enabled:
+            return self
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.started = time.time()
+        self._main_thread = threading.get_ident()
+        # Early returns and Ctrl+C in the scripts still get their profile written
+        atexit.register(self.finish)
+        self.begin(phase)
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    # -------------------------- scoping --------------------------
+
+    def begin(self, phase, instance_id=None):
+        """Attribute time from now on to phase (of instance_id); phase None suspends."""
+        if not self.enabled or self._finished:
+            return
+        if self._active:
+            self._active.disable()
+            self._active = None
+        if instance_id != self._scope[0]:
+            self._flush_instance()
+        with self._lock:
+            self._scope = (instance_id, phase)
+        if phase is None:
+            return
+        profile = self._profiles.get(phase)
+        if profile is None:
+            profile = self._profiles[phase] = cProfile.Profile()
+        self._active = profile
+        profile.enable()
+
+    def suspend(self):
+        """Stop measuring (e.g. while waiting for a human) until the next begin()."""
+        self.begin(None, self._scope[0])
+
+    @contextmanager
+    def phase(self, name, instance_id=None):
+        previous = self._scope
+        self.begin(name, instance_id if instance_id is not None else previous[0])
+        try:
+            yield self
+        finally:
+            self.begin(previous[1], previous[0])
+
+    def _flush_instance(self):
+        """Fold the finished instance's profiles into the phase totals and write its files."""
+        instance_id = self._scope[0]
+        profiles, self._profiles = self._profiles, {}
+        if instance_id is not None:
+            os.makedirs(os.path.join(self.out_dir, "instances"), exist_ok=True)
+        with self._lock:
+            stacks, self._instance_stacks = self._instance_stacks, Counter()
+        for phase, profile in profiles.items():
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                continue  # phase entered but no call recorded
+            if phase in self.phase_stats:
+                self.phase_stats[phase].add(stats)
+            else:
+                self.phase_stats[phase] = pstats.Stats(profile)
+            if instance_id is not None:
+                path = os.path.join(self.out_dir, "instances", f"{safe_name(instance_id)}.{safe_name(phase)}.pstats")
+                if os.path.exists(path):
+                    stats.add(path)  # instance retried later in the session
+                stats.dump_stats(path)
+        if instance_id is not None and stacks:
+            path = os.path.join(self.out_dir, "instances", f"{safe_name(instance_id)}.collapsed")
+            with open(path, "a", encoding="utf-8") as f:
+                for stack, count in stacks.items():
+                    f.write(f"{stack} {count}\n")
+
+    # -------------------------- sampling --------------------------
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread)
+            with self._lock:
+                phase = self._scope[1]
+            if frame is None or phase is None:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack = ";".join([phase] + labels[::-1])
+            with self._lock:
+                self.stacks[stack] += 1
+                if self._scope[0] is not None:
+                    self._instance_stacks[stack] += 1
+
+    # -------------------------- output --------------------------
+
+    def finish(self):
+        """Stop profiling, write pstats/collapsed files and print the hot functions."""
+        if not self.enabled or self._finished:
+            return
+        self.begin(None)
+        self._flush_instance()
+        self._finished = True
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+        combined = None
+        for phase, stats in self.phase_stats.items():
+            stats.dump_stats(os.path.join(self.out_dir, f"{safe_name(phase)}.pstats"))
+            if combined is None:
+                combined = pstats.Stats(os.path.join(self.out_dir, f"{safe_name(phase)}.pstats"))
+            else:
+                combined.add(stats)
+        if combined:
+            combined.dump_stats(os.path.join(self.out_dir, "profile.pstats"))
+        with open(os.path.join(self.out_dir, "profile.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        for line in self.summary_lines(combined):
+            print(line)
+        sys.stdout.flush()
+
+    def summary_lines(self, combined=None):
+        lines = [f"Profile written to {self.out_dir}/ ({time.time() - self.started:.1f}s session, "
+                 f"{sum(self.stacks.values())} stack samples)"]
+        if not self.phase_stats:
+            return lines
+        lines.append(f"{'phase':<12} {'seconds':>9}")
+        for phase, stats in sorted(self.phase_stats.items(), key=lambda item: -item[1].total_tt):
+            lines.append(f"{phase:<12} {stats.total_tt:>9.2f}")
+        if combined is None or self.top <= 0:
+            return lines
+        combined.sort_stats("tottime")
+        lines.append(f"Top {self.top} functions by own time:")
+        lines.append(f"{'own s':>8} {'cum s':>8} {'calls':>9}  function")
+        for func in combined.fcn_list[:self.top]:
+            _, calls, own, cumulative, _ = combined.stats[func]
+            filename, line, name = func
+            where = f"{os.path.basename(filename)}:{line}({name})" if filename != "~" else name
+            lines.append(f"{own:>8.3f} {cumulative:>8.3f} {calls:>9}  {where}")
+        return lines
@@ -0,0 +1,189 @@
+"""
+Export / import git bundles to seed the local repo cache between machines
+
+  python repo_bundles.py export --start 200 --end 300 --out bundles/
+  python repo_bundles.py import bundles/
+
+Export writes one bundle per repository containing every base commit needed
+for the dataset range (1-indexed, like the runner) plus bundles.json.
+Import loads the bundles into REPO_CACHE_DIR, which clone_repo_with_retry
+checks before contacting GitHub.
+"""
+
+import os
+import json
+import argparse
+from colorama import Fore, Style
+
+from git_tuning import GitProfiles, describe as describe_git_profile
+from fetch_planner import FetchPlanner, group_commits, missing_commits, commit_ref
+
+from swe_polybench_tester import (
+    REPO_CACHE_DIR,
+    FETCH_TIMEOUT,
+    CLONE_TIMEOUT,
+    run_git_command,
+    run_git_transfer,
+    repo_cache_path,
+    load_dataset_swe_polybench,
+)
+
+MANIFEST_NAME = "bundles.json"
+BUNDLE_TIMEOUT = 1800
+
+
+def ensure_repo_cache(repo, cache_dir=REPO_CACHE_DIR):
+    """Create the bare cache repository for a repo if needed."""
+    return FetchPlanner(cache_dir).ensure_cache(repo)
+
+
+def object_count(cache_path):
+    """Loose plus packed objects in a cache repository (0 if git cannot tell)."""
+    result = run_git_command(["git", "count-objects", "-v"], cache_path, timeout=60)
+    if result is None or result.returncode != 0:
+        return 0
+    stats = dict(line.split(": ", 1) for line in result.stdout.splitlines() if ": " in line)
+    return int(stats.get("count", 0)) + int(stats.get("in-pack", 0))
+
+
+def tune_repo_cache(cache_path, objects_before=None):
+    """Measure commit-graph/bitmap settings once per mirror; rewrite them after new objects arrive.
+
+    objects_before is object_count() from before the fetch; the rewrite (a full
+    repack) only runs when the count has grown since.
+    """
+    key = "mirror:" + os.path.abspath(cache_path)
+    reapply = objects_before is not None and object_count(cache_path) > objects_before
+    try:
+        profile, measured, _ = GitProfiles().ensure(key, cache_path, kind="mirror", reapply=reapply)
+    except Exception as e:
+        print(f"{Fore.YELLOW}  ⚠️  Could not tune {cache_path}: {e}{Style.RESET_ALL}")
+        return None
+    if measured:
+        print(f"{Fore.GREEN}  ✓ Mirror git profile: {describe_git_profile(profile)}{Style.RESET_ALL}")
+    return profile
+
+
+def fill_repo_cache(repo, commits, cache_dir=REPO_CACHE_DIR):
+    """Fetch any commits the cache lacks from GitHub (one request) and pin them with refs.
+
+    Returns the list of commits that could not be obtained.
+    """
+    planner = FetchPlanner(cache_dir, transfer=lambda cmd, cwd: run_git_transfer(cmd, cwd, CLONE_TIMEOUT),
+                           log=lambda msg: print(f"{Fore.CYAN}{msg}{Style.RESET_ALL}"))
+    objects_before = object_count(planner.ensure_cache(repo))
+    missing = planner.fetch_repo(repo, commits)
+    tune_repo_cache(planner.cache_path(repo), objects_before)
+    return missing
+
+
+def commits_by_repo(dataset, start, end):
+    """Group base commits needed for dataset[start:end+1] by repo."""
+    return group_commits(dataset[start:end + 1])
+
+
+def export_bundles(start, end, out_dir, cache_dir=REPO_CACHE_DIR):
+    """Write one bundle per repo covering every base commit in the range."""
+    dataset = load_dataset_swe_polybench()
+    grouped = commits_by_repo(dataset, start, end)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {"range": {"start": start + 1, "end": end + 1}, "repos": {}}
+    for repo, commits in sorted(grouped.items()):
+        print(f"{Fore.YELLOW}📦 {repo}: {len(commits)} base commits{Style.RESET_ALL}")
+        missing = fill_repo_cache(repo, commits, cache_dir)
+        available = [c for c in commits if c not in missing]
+        if missing:
+            print(f"{Fore.RED}  ✗ {len(missing)} commits unavailable, left out of bundle{Style.RESET_ALL}")
+        if not available:
+            continue
+
+        bundle_name = repo.replace("/", "__") + ".bundle"
+        bundle_path = os.path.abspath(os.path.join(out_dir, bundle_name))
+        # Refs go through stdin to stay under Windows command line limits
+        result = run_git_command(
+            ["git", "bundle", "create", bundle_path, "--stdin"],
+            repo_cache_path(repo, cache_dir),
+            timeout=BUNDLE_TIMEOUT,
+            input_text="\n".join(commit_ref(c) for c in available) + "\n"
+        )
+        if result is None or result.returncode != 0:
+            print(f"{Fore.RED}  ✗ Bundle failed: {result.stderr.strip() if result else 'timeout'}{Style.RESET_ALL}")
+            continue
+
+        manifest["repos"][repo] = {
+            "bundle": bundle_name,
+            "commits": available,
+            "missing": missing,
+            "size": os.path.getsize(bundle_path)
+        }
+        print(f"{Fore.GREEN}  ✓ {bundle_name} ({os.path.getsize(bundle_path) / 1024 / 1024:.1f} MiB){Style.RESET_ALL}")
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{Fore.GREEN}✓ Exported {len(manifest['repos'])} bundles to {out_dir}{Style.RESET_ALL}")
+    return manifest
+
+
+def import_bundles(in_dir, cache_dir=REPO_CACHE_DIR):
+    """Load every bundle listed in the manifest into the repo cache."""
+    with open(os.path.join(in_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    imported = 0
+    for repo, entry in sorted(manifest["repos"].items()):
+        bundle_path = os.path.abspath(os.path.join(in_dir, entry["bundle"]))
+        cache_path = ensure_repo_cache(repo, cache_dir)
+        print(f"{Fore.YELLOW}📥 {repo} ← {entry['bundle']}{Style.RESET_ALL}")
+
+        result = run_git_command(["git", "bundle", "verify", "-q", bundle_path], cache_path, timeout=BUNDLE_TIMEOUT)
+        if result is None or result.returncode != 0:
+            print(f"{Fore.RED}  ✗ Bundle failed verification: {result.stderr.strip() if result else 'timeout'}{Style.RESET_ALL}")
+            continue
+
+        objects_before = object_count(cache_path)
+        result = run_git_command(
+            ["git", "fetch", "--no-tags", bundle_path, "+refs/polybench/*:refs/polybench/*"],
+            cache_path,
+            timeout=FETCH_TIMEOUT
+        )
+        if result is None or result.returncode != 0:
+            print(f"{Fore.RED}  ✗ Import failed: {result.stderr.strip() if result else 'timeout'}{Style.RESET_ALL}")
+            continue
+
+        still_missing = missing_commits(cache_path, entry["commits"])
+        if still_missing:
+            print(f"{Fore.RED}  ✗ {len(still_missing)} commits missing after import{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}  ✓ {len(entry['commits'])} base commits available offline{Style.RESET_ALL}")
+        tune_repo_cache(cache_path, objects_before)
+        imported += 1
+
+    print(f"{Fore.GREEN}✓ Imported {imported}/{len(manifest['repos'])} bundles into {cache_dir}{Style.RESET_ALL}")
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the SWE-PolyBench repo cache with git bundles')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export bundles for a dataset range')
+    export_parser.add_argument('--start', type=int, required=True, help='First instance (1-indexed)')
+    export_parser.add_argument('--end', type=int, required=True, help='Last instance (1-indexed)')
+    export_parser.add_argument('--out', default='bundles')
+    export_parser.add_argument('--cache-dir', default=REPO_CACHE_DIR)
+
+    import_parser = subparsers.add_parser('import', help='Import bundles into the repo cache')
+    import_parser.add_argument('bundle_dir')
+    import_parser.add_argument('--cache-dir', default=REPO_CACHE_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_bundles(args.start - 1, args.end - 1, args.out, args.cache_dir)
+    else:
+        import_bundles(args.bundle_dir, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
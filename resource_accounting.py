@@ -0,0 +1,501 @@
+"""
+Per-instance, per-phase resource accounting
+
+Each phase of an instance (clone, prompt, agent, diff, reset) records:
+
+  cpu_seconds          CPU time of the phase's subprocesses: git children, the agent
+                       and everything it spawns (test runs, builds, ...)
+  runner_cpu_seconds   CPU time of the runner thread itself (code index, patch checks)
+  peak_rss_bytes       highest combined resident memory of those subprocesses
+  read_bytes           storage reads
+  write_bytes          storage writes
+  disk_delta_bytes     change in workspace size over the phase
+
+Backends, best first:
+
+  cgroup  cgroup v2 with a writable subtree. Subprocesses the runner starts go into
+          a child cgroup per phase (a one-line sh launcher writes its pid to
+          cgroup.procs and execs the real command). CPU comes from cpu.stat;
+          memory.peak and io.stat are used when those controllers are delegated,
+          otherwise memory and I/O are sampled from the cgroup's member processes.
+  proc    /proc sampling of processes working in the workspace (cwd or an argument
+          inside it) and their descendants. When one instance runs at a time,
+          getrusage(RUSAGE_CHILDREN) deltas cover git commands too short to sample.
+  psutil  the same sampling through psutil where /proc does not exist.
+
+Phases whose processes the runner does not start (the interactive tester's agent
+running in an IDE) are always sampled.
+
+  python resource_accounting.py probe       # which backend this machine gets
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from threading import Thread, Event, Lock, local
+from contextlib import contextmanager
+
+from session_metrics import directory_size
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLE_INTERVAL = 0.25
+CGROUP_MOUNTS = ("/sys/fs/cgroup", "/sys/fs/cgroup/unified")
+CGROUP_LAUNCHER = 'echo $$ > "$0" 2>/dev/null; exec "$@"'
+ADDITIVE_FIELDS = ("seconds", "cpu_seconds", "runner_cpu_seconds", "read_bytes", "write_bytes", "disk_delta_bytes")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_current = local()
+
+
+def wrap_command(cmd):
+    """Route a subprocess into the calling thread's current phase (cgroup backend only)."""
+    phase = getattr(_current, "phase", None)
+    return phase.wrap(cmd) if phase is not None else cmd
+
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(num_bytes) < 1024 or unit == "GiB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+# ========================== CGROUP ==========================
+
+def cgroup_base():
+    """Writable cgroup v2 directory of this process, or None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        with open("/proc/self/cgroup", "r") as f:
+            own = next((line.split("::", 1)[1].strip() for line in f if line.startswith("0::")), None)
+    except OSError:
+        return None
+    if own is None:
+        return None
+    for mount in CGROUP_MOUNTS:
+        if not os.path.exists(os.path.join(mount, "cgroup.controllers")):
+            continue
+        path = os.path.join(mount, own.lstrip("/"))
+        if os.path.isdir(path) and os.access(path, os.W_OK):
+            return path
+    return None
+
+
+def read_keyed(path):
+    """'key value' lines of a cgroup file as a dict of ints."""
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1].isdigit():
+                    values[parts[0]] = int(parts[1])
+    except OSError:
+        pass
+    return values
+
+
+def read_io_stat(path):
+    """Summed rbytes/wbytes over all devices in io.stat, or None without the io controller."""
+    if not os.path.exists(path):
+        return None
+    read_bytes = write_bytes = 0
+    with open(path, "r") as f:
+        for line in f:
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "rbytes":
+                    read_bytes += int(value)
+                elif key == "wbytes":
+                    write_bytes += int(value)
+    return read_bytes, write_bytes
+
+
+def enable_controllers(path):
+    # Only possible where the parent delegates them; stats fall back to sampling otherwise
+    for controller in ("memory", "io"):
+        try:
+            with open(os.path.join(path, "cgroup.subtree_control"), "w") as f:
+                f.write(f"+{controller}")
+        except OSError:
+            pass
+
+
+def remove_cgroup(path):
+    try:
+        os.rmdir(path)
+        return True
+    except OSError:
+        return False
+
+
+# ========================== PROCESS SAMPLING ==========================
+
+def read_keyed_colon(path):
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().isdigit():
+                    values[key] = int(value)
+    except OSError:
+        pass
+    return values
+
+
+def proc_snapshot():
+    """{pid: (ppid, cwd, args, rss, cpu_seconds, read_bytes, write_bytes)} from /proc or psutil."""
+    processes = {}
+    if os.path.isdir("/proc/self"):
+        ticks = os.sysconf("SC_CLK_TCK")
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            base = f"/proc/{entry}"
+            try:
+                with open(base + "/stat", "r") as f:
+                    stat = f.read().rsplit(")", 1)[1].split()
+                cwd = os.readlink(base + "/cwd")
+                with open(base + "/cmdline", "rb") as f:
+                    args = f.read().decode("utf-8", "replace").split("\0")
+                io = read_keyed_colon(base + "/io")
+            except OSError:
+                continue
+            processes[int(entry)] = (int(stat[1]), cwd, args, int(stat[21]) * PAGE_SIZE,
+                                     (int(stat[11]) + int(stat[12])) / ticks,
+                                     io.get("read_bytes", 0), io.get("write_bytes", 0))
+    elif psutil is not None:
+        for proc in psutil.process_iter(["pid", "ppid", "cwd", "cmdline", "memory_info", "cpu_times", "io_counters"]):
+            info = proc.info
+            if not info.get("cwd"):
+                continue
+            io = info.get("io_counters")
+            cpu = info.get("cpu_times")
+            processes[info["pid"]] = (info["ppid"], info["cwd"], info.get("cmdline") or [],
+                                      info["memory_info"].rss if info.get("memory_info") else 0,
+                                      (cpu.user + cpu.system) if cpu else 0.0,
+                                      getattr(io, "read_bytes", 0), getattr(io, "write_bytes", 0))
+    return processes
+
+
+def inside(path, root):
+    return path == root or path.startswith(root + os.sep)
+
+
+def workspace_processes(processes, workspace):
+    """Pids working in workspace (cwd or an argument inside it) plus their descendants."""
+    matched = set()
+    for pid, (_, cwd, args, *_rest) in processes.items():
+        if pid == os.getpid():
+            continue
+        if inside(cwd, workspace) or any(
+                arg and inside(os.path.normpath(os.path.join(cwd, arg)), workspace) for arg in args[1:]):
+            matched.add(pid)
+    children = {}
+    for pid, entry in processes.items():
+        children.setdefault(entry[0], []).append(pid)
+    stack = list(matched)
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in matched:
+                matched.add(child)
+                stack.append(child)
+    return matched
+
+
+# ========================== METERS ==========================
+
+class PhaseMeter:
+    """Measures one phase of one instance"""
+
+    def __init__(self, usage, name, external=False):
+        self.usage = usage
+        self.name = name
+        self.cgroup = None
+        if usage.accountant.backend == "cgroup" and not external:
+            self.cgroup = usage.accountant.new_cgroup(f"{usage.slug}-{name}-{len(usage.meters)}")
+        self.sampled = usage.accountant.backend in ("proc", "psutil", "cgroup")
+        self.rusage = usage.accountant.exclusive and not external and resource is not None
+        self._seen = {}          # pid -> (cpu, read, write), last sample
+        self._peak_rss = 0
+        self._stop = Event()
+        self._thread = None
+
+    def wrap(self, cmd):
+        if self.cgroup is None:
+            return cmd
+        return ["sh", "-c", CGROUP_LAUNCHER, os.path.join(self.cgroup, "cgroup.procs")] + list(cmd)
+
+    def _members(self):
+        if self.cgroup is not None:
+            try:
+                with open(os.path.join(self.cgroup, "cgroup.procs"), "r") as f:
+                    return {int(pid) for pid in f.read().split()}
+            except OSError:
+                return set()
+        return None
+
+    def sample(self):
+        processes = proc_snapshot()
+        members = self._members()
+        if members is None:
+            members = workspace_processes(processes, self.usage.workspace)
+        rss = 0
+        for pid in members:
+            entry = processes.get(pid)
+            if entry is None:
+                continue
+            rss += entry[3]
+            self._seen[pid] = entry[4:7]
+        self._peak_rss = max(self._peak_rss, rss)
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            try:
+                self.sample()
+            except Exception:
+                pass
+
+    def start(self):
+        self.started = time.time()
+        self.runner_cpu = time.thread_time()
+        self.disk = self.usage.disk_size()
+        self.children = resource.getrusage(resource.RUSAGE_CHILDREN) if self.rusage else None
+        if self.sampled:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            try:
+                self.sample()
+            except Exception:
+                pass
+        cpu = sum(seen[0] for seen in self._seen.values())
+        read_bytes = sum(seen[1] for seen in self._seen.values())
+        write_bytes = sum(seen[2] for seen in self._seen.values())
+        peak_rss = self._peak_rss
+
+        if self.children is not None:
+            # Exact for everything the runner waited on, however short-lived
+            now = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = max(cpu, (now.ru_utime - self.children.ru_utime) + (now.ru_stime - self.children.ru_stime))
+            read_bytes = max(read_bytes, (now.ru_inblock - self.children.ru_inblock) * 512)
+            write_bytes = max(write_bytes, (now.ru_oublock - self.children.ru_oublock) * 512)
+            if now.ru_maxrss > self.children.ru_maxrss:
+                # ru_maxrss is KiB on Linux, bytes on macOS; only grows, so it only tells when a child set a new high
+                peak_rss = max(peak_rss, now.ru_maxrss * (1 if sys.platform == "darwin" else 1024))
+
+        if self.cgroup is not None:
+            cpu = read_keyed(os.path.join(self.cgroup, "cpu.stat")).get("usage_usec", 0) / 1e6
+            peak = os.path.join(self.cgroup, "memory.peak")
+            if os.path.exists(peak):
+                with open(peak, "r") as f:
+                    peak_rss = int(f.read().strip() or 0)
+            io = read_io_stat(os.path.join(self.cgroup, "io.stat"))
+            if io is not None:
+                read_bytes, write_bytes = io
+            self.usage.accountant.release_cgroup(self.cgroup)
+
+        disk = self.usage.disk_size(refresh=True)
+        return {
+            "seconds": round(time.time() - self.started, 3),
+            "cpu_seconds": round(cpu, 3),
+            "runner_cpu_seconds": round(time.thread_time() - self.runner_cpu, 3),
+            "peak_rss_bytes": peak_rss,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "disk_delta_bytes": disk - self.disk,
+        }
+
+
+def merge_usage(a, b):
+    if not a:
+        return dict(b)
+    merged = {key: round(a.get(key, 0) + b.get(key, 0), 3) for key in ADDITIVE_FIELDS}
+    merged["peak_rss_bytes"] = max(a.get("peak_rss_bytes", 0), b.get("peak_rss_bytes", 0))
+    return merged
+
+
+class InstanceUsage:
+    """Phases of one instance; record() the result into the instance metrics"""
+
+    def __init__(self, accountant, instance_id, workspace):
+        self.accountant = accountant
+        self.instance_id = instance_id
+        self.slug = instance_id.replace("/", "_")
+        self.workspace = os.path.realpath(workspace)
+        self.phases = {}
+        self.meters = []
+        self._open = None
+        self._disk = None
+
+    def disk_size(self, refresh=False):
+        # Phases are back to back, so one walk per boundary is enough
+        if self._disk is None or refresh:
+            self._disk = directory_size(self.workspace) if os.path.isdir(self.workspace) else 0
+        return self._disk
+
+    def begin(self, name, external=False):
+        """Start phase name, ending the running one (external: processes not started here)."""
+        self.end()
+        meter = PhaseMeter(self, name, external)
+        self.meters.append(meter)
+        meter.start()
+        self._open = meter
+        _current.phase = meter
+        return meter
+
+    def end(self):
+        meter, self._open = self._open, None
+        if meter is None:
+            return
+        _current.phase = None
+        try:
+            self.phases[meter.name] = merge_usage(self.phases.get(meter.name), meter.stop())
+        except Exception:
+            pass
+
+    @contextmanager
+    def phase(self, name, external=False):
+        """Account everything inside the block to phase name."""
+        self.begin(name, external)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def result(self):
+        total = {}
+        for usage in self.phases.values():
+            total = merge_usage(total, usage)
+        return {"backend": self.accountant.backend, "phases": self.phases, "total": total}
+
+    def record(self, metrics=None):
+        """Fold this instance into the session totals; adds "resources" to metrics."""
+        self.end()
+        result = self.result()
+        self.accountant.add(result)
+        if metrics is not None:
+            metrics["resources"] = result
+        return result
+
+
+class ResourceAccountant:
+    """Chooses a backend and keeps session totals per phase"""
+
+    def __init__(self, backend="auto", exclusive=True):
+        """exclusive: only one instance runs at a time (enables getrusage deltas)."""
+        self.exclusive = exclusive
+        self.lock = Lock()
+        self.totals = {}
+        self.instances = 0
+        self.cgroup_root = None
+        self.backend = self._choose(backend)
+
+    def _choose(self, backend):
+        if backend in ("auto", "cgroup"):
+            base = cgroup_base()
+            if base:
+                root = os.path.join(base, f"swe_polybench_{os.getpid()}")
+                try:
+                    os.makedirs(root, exist_ok=True)
+                    enable_controllers(base)
+                    enable_controllers(root)
+                    self.cgroup_root = root
+                    return "cgroup"
+                except OSError:
+                    pass
+            if backend == "cgroup":
+                print("cgroup v2 is not writable here, falling back to sampling")
+        if backend in ("auto", "cgroup", "proc") and os.path.isdir("/proc/self"):
+            return "proc"
+        if backend in ("auto", "cgroup", "proc", "psutil") and psutil is not None:
+            return "psutil"
+        return "basic"   # wall time, runner CPU and disk only (plus getrusage where it exists)
+
+    def new_cgroup(self, name):
+        path = os.path.join(self.cgroup_root, name)
+        try:
+            os.makedirs(path, exist_ok=True)
+            return path
+        except OSError:
+            return None
+
+    def release_cgroup(self, path):
+        # Processes the agent left running keep the cgroup alive; close() retries
+        remove_cgroup(path)
+
+    def instance(self, instance_id, workspace):
+        return InstanceUsage(self, instance_id, workspace)
+
+    def add(self, result):
+        with self.lock:
+            self.instances += 1
+            for name, usage in result["phases"].items():
+                self.totals[name] = merge_usage(self.totals.get(name), usage)
+
+    def summary_lines(self):
+        """Per-phase session summary (totals and per-instance averages)."""
+        with self.lock:
+            if not self.instances:
+                return []
+            n = self.instances
+            lines = [f"{'phase':<8} {'cpu s/inst':>10} {'runner s':>9} {'peak RSS':>10} {'read':>10} "
+                     f"{'written':>10} {'disk Δ/inst':>12}  ({n} instances, {self.backend})"]
+            for name, usage in self.totals.items():
+                lines.append(f"{name:<8} {usage['cpu_seconds'] / n:>10.2f} {usage['runner_cpu_seconds'] / n:>9.2f} "
+                             f"{format_bytes(usage['peak_rss_bytes']):>10} {format_bytes(usage['read_bytes']):>10} "
+                             f"{format_bytes(usage['write_bytes']):>10} {format_bytes(usage['disk_delta_bytes'] / n):>12}")
+            return lines
+
+    def close(self):
+        if self.cgroup_root and os.path.isdir(self.cgroup_root):
+            for name in os.listdir(self.cgroup_root):
+                path = os.path.join(self.cgroup_root, name)
+                if os.path.isdir(path):
+                    remove_cgroup(path)
+            remove_cgroup(self.cgroup_root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-instance resource accounting')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    probe_parser = subparsers.add_parser('probe', help='Show the backend and measure a sample command')
+    probe_parser.add_argument('--backend', default='auto', choices=['auto', 'cgroup', 'proc', 'psutil'])
+    args = parser.parse_args()
+
+    accountant = ResourceAccountant(args.backend)
+    print(f"Backend: {accountant.backend}" + (f" ({accountant.cgroup_root})" if accountant.cgroup_root else ""))
+    workspace = tempfile.mkdtemp(prefix="resource_probe_")
+    usage = accountant.instance("probe", workspace)
+    with usage.phase("sample"):
+        script = ("import os; b = bytearray(64 * 1024 * 1024); sum(range(3 * 10 ** 6)); "
+                  "open('blob', 'wb').write(os.urandom(8 * 1024 * 1024))")
+        subprocess.run(wrap_command([sys.executable, "-c", script]), cwd=workspace)
+    for key, value in usage.record()["phases"]["sample"].items():
+        print(f"  {key:<20} {value}")
+    accountant.close()
+    shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
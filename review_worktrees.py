@@ -0,0 +1,282 @@
+"""
+Review worktrees: saved predictions applied on top of their base commits
+
+For every selected prediction a linked worktree is added to the repo
+cache's bare repository (objects are shared, nothing is cloned), detached
+at the instance's base_commit, and the patch is applied to the working
+tree (new files marked intent-to-add), so `git diff` in the worktree
+shows the whole prediction. Base commits the cache lacks are fetched
+first, one request per repo (fetch_planner.py). Worktrees are created in
+parallel; a patch that does not apply is applied with --reject (the
+failed hunks land in *.rej files) and reported.
+
+  python review_worktrees.py create --ids sveltejs__svelte-605 sveltejs__svelte-607
+  python review_worktrees.py create --start 200 --end 250 --model cora --workers 8
+  python review_worktrees.py create --start 200 --end 250 --sparse      # only the patched directories
+  python review_worktrees.py list
+  python review_worktrees.py teardown                                  # all review worktrees at once
+
+Instance metadata (repo, base_commit, position) comes from the evaluation
+store when it has been ingested with --metadata, else from the dataset.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from colorama import Fore, Style
+
+from unified_diff import parse_patch
+from localization import load_predictions
+from fetch_planner import git, group_commits
+from sparse_workspace import set_sparse, dirs_for_paths, minimal_dirs
+from eval_store import DEFAULT_DB_FILE, metadata_from_dataset
+
+from swe_polybench_tester import (
+    make_fetch_planner,
+    repo_cache_path,
+    safe_rmtree,
+)
+
+DEFAULT_REVIEW_DIR = "swe_polybench_review"
+MANIFEST_NAME = "review.json"
+REVIEW_WORKERS = 8
+
+# `git worktree add` reads every other worktree's admin dir, so adds to one cache don't overlap
+_add_locks = {}
+_add_locks_guard = Lock()
+
+
+def safe_name(text):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in text)
+
+
+def load_metadata(db_file=DEFAULT_DB_FILE):
+    """{instance_id: (position, repo, base_commit)} from the eval store, else the dataset."""
+    if os.path.exists(db_file):
+        conn = sqlite3.connect(db_file)
+        try:
+            rows = conn.execute("SELECT instance_id, position, repo, base_commit FROM instances "
+                                "WHERE base_commit IS NOT NULL").fetchall()
+        except sqlite3.Error:
+            rows = []
+        conn.close()
+        if rows:
+            return {instance_id: (position, repo, commit) for instance_id, position, repo, commit in rows}
+    return {instance_id: (position, repo, commit)
+            for instance_id, position, repo, _, _, commit in metadata_from_dataset()}
+
+
+def select(predictions, metadata, ids=None, start=None, end=None):
+    """Review jobs for predictions matching the ids and/or 1-indexed dataset range."""
+    wanted = set(ids or [])
+    jobs = []
+    for model, instance_id, patch in predictions:
+        if instance_id not in metadata:
+            continue
+        position, repo, base_commit = metadata[instance_id]
+        if wanted and instance_id not in wanted:
+            continue
+        if start is not None and (position is None or position + 1 < start):
+            continue
+        if end is not None and (position is None or position + 1 > end):
+            continue
+        jobs.append({"instance_id": instance_id, "model": model, "repo": repo,
+                     "base_commit": base_commit, "patch": patch})
+    return jobs
+
+
+def read_manifest(root):
+    path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {entry["path"]: entry for entry in json.load(f)}
+
+
+def write_manifest(root, entries):
+    path = os.path.join(root, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sorted(entries.values(), key=lambda e: e["path"]), f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def patched_paths(patch):
+    """(every path the patch touches, files it creates)"""
+    paths, added = set(), []
+    for f in parse_patch(patch, strict=False).files:
+        paths.update(p for p in (f.old_path, f.new_path) if p)
+        if f.status == "added" and f.new_path:
+            added.append(f.new_path)
+    return paths, added
+
+
+def add_lock(cache_path):
+    with _add_locks_guard:
+        return _add_locks.setdefault(cache_path, Lock())
+
+
+def remove_worktree(cache_path, path):
+    git(cache_path, "worktree", "remove", "--force", os.path.abspath(path))
+    safe_rmtree(path)
+
+
+def job_entry(job, root):
+    """Manifest entry of a job, marked failed until the worktree is ready."""
+    entry = {key: job[key] for key in ("instance_id", "model", "repo", "base_commit")}
+    entry.update(path=os.path.join(root, safe_name(job["model"]), safe_name(job["instance_id"])),
+                 cache=os.path.abspath(repo_cache_path(job["repo"])), status="failed", message="")
+    return entry
+
+
+def create_worktree(job, root, sparse=False):
+    """Add one worktree at the job's base commit and apply its patch; returns the manifest entry."""
+    entry = job_entry(job, root)
+    cache_path, path = entry["cache"], entry["path"]
+    model_dir = os.path.dirname(path)
+    paths, added = patched_paths(job["patch"]) if job["patch"].strip() else (set(), [])
+    start = time.perf_counter()
+
+    with add_lock(cache_path):
+        if os.path.exists(path):
+            remove_worktree(cache_path, path)
+        result = git(cache_path, "worktree", "add", "-q", "--detach", "--no-checkout",
+                     os.path.abspath(path), job["base_commit"])
+        # Sparse settings go through the cache's shared config file, like worktree add
+        if result.returncode == 0 and sparse and paths:
+            set_sparse(path, minimal_dirs(dirs_for_paths(paths)))
+    if result.returncode != 0:
+        entry["message"] = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "git worktree add failed"
+        return entry
+
+    # HEAD already names the commit; --no-checkout left the index empty, so populate both
+    result = git(path, "reset", "-q", "--hard", job["base_commit"])
+    if result.returncode != 0:
+        entry["message"] = result.stderr.strip()
+        return entry
+
+    if not paths:
+        entry.update(status="empty", message="empty prediction (worktree left at the base commit)")
+    else:
+        patch_file = os.path.join(model_dir, safe_name(job["instance_id"]) + ".patch")
+        with open(patch_file, "w", encoding="utf-8", newline="") as f:
+            f.write(job["patch"])
+        apply = ["apply", "--whitespace=nowarn", os.path.abspath(patch_file)]
+        result = git(path, *apply)
+        if result.returncode == 0:
+            entry.update(status="applied", message=f"{len(paths)} files")
+        else:
+            # Apply what does apply and leave the rest as .rej files next to the targets
+            git(path, "apply", "--reject", *apply[1:])
+            lines = [l for l in result.stderr.splitlines() if l.startswith("error:")]
+            entry.update(status="partial", message="; ".join(lines[:3]) or result.stderr.strip())
+        # Not `git apply -N`: before git 2.40 it replaces the index instead of adding to it
+        created = [p for p in added if os.path.exists(os.path.join(path, p))]
+        if created:
+            git(path, "add", "--intent-to-add", "--", *created)
+    entry["seconds"] = round(time.perf_counter() - start, 2)
+    return entry
+
+
+def create(jobs, root=DEFAULT_REVIEW_DIR, workers=REVIEW_WORKERS, sparse=False):
+    """Create review worktrees for jobs in parallel; returns their manifest entries."""
+    os.makedirs(root, exist_ok=True)
+    start = time.perf_counter()
+    # Base commits the cache lacks: one fetch per repo before any worktree is made
+    planner = make_fetch_planner()
+    unavailable = planner.prefetch([{"repo": j["repo"], "base_commit": j["base_commit"]} for j in jobs])
+    fetch_seconds = time.perf_counter() - start
+
+    manifest = read_manifest(root)
+    entries = []
+    ready = []
+    for job in jobs:
+        if job["base_commit"] in unavailable.get(job["repo"], ()):
+            print(f"{Fore.RED}✗ {job['instance_id']}: base commit {job['base_commit'][:12]} not available{Style.RESET_ALL}")
+        else:
+            ready.append(job)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(create_worktree, job, root, sparse): job for job in ready}
+            for future in as_completed(futures):
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # Recorded like any other failure, so teardown still finds the worktree
+                    entry = job_entry(futures[future], root)
+                    entry["message"] = f"{type(e).__name__}: {e}"
+                entries.append(entry)
+                manifest[entry["path"]] = entry
+                color, mark = {"applied": (Fore.GREEN, "✓"), "empty": (Fore.YELLOW, "○"),
+                               "partial": (Fore.YELLOW, "⚠️ ")}.get(entry["status"], (Fore.RED, "✗"))
+                print(f"{color}{mark} {entry['instance_id']} [{entry['model']}] {entry['status']}: "
+                      f"{entry['message']}{Style.RESET_ALL}")
+    finally:
+        write_manifest(root, manifest)
+
+    counts = {}
+    for entry in entries:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(f"\n{Fore.CYAN}📂 {len(entries)} review worktrees in {root} "
+          f"({', '.join(f'{n} {s}' for s, n in sorted(counts.items())) or 'none'}) "
+          f"in {time.perf_counter() - start:.1f}s (fetch {fetch_seconds:.1f}s){Style.RESET_ALL}")
+    return entries
+
+
+def teardown(root=DEFAULT_REVIEW_DIR, workers=REVIEW_WORKERS):
+    """Delete every review worktree under root, then prune each cache repository once."""
+    manifest = read_manifest(root)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(safe_rmtree, [entry["path"] for entry in manifest.values()]))
+    caches = {entry["cache"] for entry in manifest.values()}
+    for cache_path in caches:
+        if os.path.isdir(cache_path):
+            git(cache_path, "worktree", "prune")
+    safe_rmtree(root)
+    print(f"{Fore.GREEN}✓ Removed {len(manifest)} review worktrees from {len(caches)} repo caches "
+          f"in {time.perf_counter() - start:.1f}s{Style.RESET_ALL}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Saved predictions as worktrees for review')
+    parser.add_argument('--root', default=DEFAULT_REVIEW_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('create', help='One worktree per prediction, patch applied')
+    create_parser.add_argument('predictions', nargs='*', default=[], help='predictions.jsonl files (default predictions.jsonl)')
+    create_parser.add_argument('--store', default=None, help='Also read a patch store')
+    create_parser.add_argument('--model', default=None)
+    create_parser.add_argument('--ids', nargs='+', default=None)
+    create_parser.add_argument('--start', type=int, default=None, help='First instance (1-indexed)')
+    create_parser.add_argument('--end', type=int, default=None, help='Last instance (1-indexed)')
+    create_parser.add_argument('--workers', type=int, default=REVIEW_WORKERS)
+    create_parser.add_argument('--sparse', action='store_true', help='Check out only the directories the patch touches')
+    create_parser.add_argument('--db', default=DEFAULT_DB_FILE, help='Eval store with instance metadata')
+
+    subparsers.add_parser('list', help='Show the review worktrees')
+    teardown_parser = subparsers.add_parser('teardown', help='Remove all review worktrees')
+    teardown_parser.add_argument('--workers', type=int, default=REVIEW_WORKERS)
+
+    args = parser.parse_args()
+    if args.command == 'create':
+        predictions = load_predictions(args.predictions or ["predictions.jsonl"], args.store, args.model)
+        jobs = select(predictions, load_metadata(args.db), args.ids, args.start, args.end)
+        if not jobs:
+            print(f"{Fore.YELLOW}No predictions match{Style.RESET_ALL}")
+            return
+        repos = group_commits(jobs)
+        print(f"{Fore.CYAN}🔍 {len(jobs)} predictions from {len(repos)} repos → {args.root}{Style.RESET_ALL}")
+        create(jobs, args.root, args.workers, args.sparse)
+    elif args.command == 'list':
+        for entry in sorted(read_manifest(args.root).values(), key=lambda e: (e["model"], e["instance_id"])):
+            print(f"{entry['status']:<8} {entry['model']:<12} {entry['instance_id']:<40} {entry['path']}")
+    else:
+        teardown(args.root, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Selection index over SWE-PolyBench metadata
+
+Maps language, repo, task_category (and instance_id) to sorted dataset
+positions, so slices like "TypeScript bug fixes from one repo" can be picked
+without loading or scanning the problems themselves. The index is built from
+the local dataset snapshot (dataset_snapshot.py), so its positions are the
+ones the runners use, stored as JSON, and rebuilt whenever the snapshot moves
+to another revision or its rows change under the same revision name.
+
+  python selection_index.py build
+  python selection_index.py values language
+  python selection_index.py query "language=TypeScript,task_category=Bug Fix"
+  python swe_polybench_tester.py --where "repo=microsoft/vscode|angular/angular" --loop
+
+Query syntax: comma-separated field=value clauses (all must match);
+value1|value2 matches either; values are case-insensitive and instance_id
+accepts shell-style wildcards (instance_id=sveltejs__svelte-7*).
+"""
+
+import os
+import json
+import bisect
+import fnmatch
+import argparse
+from datetime import datetime
+
+DATASET_NAME = "AmazonScience/SWE-PolyBench"
+DATASET_SPLIT = "test"
+DEFAULT_INDEX_FILE = "swe_polybench_selection_index.json"
+INDEXED_FIELDS = ("language", "repo", "task_category")
+
+
+class SelectionIndex:
+    """Posting lists (field -> value -> sorted positions) plus instance_ids by position"""
+
+    def __init__(self, data):
+        self.data = data
+        self.instance_ids = data["instance_ids"]
+        self.postings = data["postings"]
+        self._lowered = {
+            field: {value.lower(): value for value in values}
+            for field, values in self.postings.items()
+        }
+
+    @property
+    def rows(self):
+        return len(self.instance_ids)
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def from_columns(cls, instance_ids, columns, source=None):
+        postings = {field: {} for field in INDEXED_FIELDS}
+        for field in INDEXED_FIELDS:
+            for position, value in enumerate(columns[field]):
+                postings[field].setdefault(value or "Unknown", []).append(position)
+        return cls({
+            "source": source or {},
+            "built": datetime.now().isoformat(),
+            "instance_ids": list(instance_ids),
+            "postings": postings,
+        })
+
+    @classmethod
+    def build(cls):
+        """Build from the local dataset snapshot's metadata fields."""
+        import dataset_snapshot  # imports this module
+        return dataset_snapshot.selection_index_from(dataset_snapshot.open_snapshot())
+
+    @classmethod
+    def load(cls, index_file=DEFAULT_INDEX_FILE):
+        with open(index_file, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def load_or_build(cls, index_file=DEFAULT_INDEX_FILE, rebuild=False):
+        import dataset_snapshot
+        snapshot = dataset_snapshot.open_snapshot()
+        if not rebuild and os.path.exists(index_file):
+            try:
+                index = cls.load(index_file)
+                if index.matches(snapshot):
+                    return index
+            except (ValueError, KeyError):
+                pass  # corrupt index: rebuild
+        return dataset_snapshot.rebuild_selection_index(snapshot, index_file)
+
+    def matches(self, snapshot):
+        """Built from exactly the snapshot's rows; a revision name can be reused for other content."""
+        source = self.data["source"]
+        return (source.get("revision") == snapshot.revision and source.get("fingerprint") == snapshot.fingerprint
+                and self.rows == len(snapshot))
+
+    def save(self, index_file=DEFAULT_INDEX_FILE):
+        tmp_file = index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_file, index_file)
+
+    # ------------------------------------------------------------------ query
+
+    def values(self, field):
+        """(value, count) pairs for an indexed field, most common first."""
+        return sorted(((v, len(p)) for v, p in self.postings[field].items()), key=lambda item: (-item[1], item[0]))
+
+    def _match_field(self, field, wanted):
+        if field == "instance_id":
+            patterns = [w.strip() for w in wanted.split("|")]
+            return [i for i, iid in enumerate(self.instance_ids)
+                    if any(fnmatch.fnmatchcase(iid, p) for p in patterns)]
+        if field not in self.postings:
+            raise ValueError(f"Unknown field '{field}' (use one of: {', '.join(INDEXED_FIELDS + ('instance_id',))})")
+        positions = set()
+        for value in wanted.split("|"):
+            actual = self._lowered[field].get(value.strip().lower())
+            if actual is not None:
+                positions.update(self.postings[field][actual])
+        return sorted(positions)
+
+    def select(self, where, start=None, end=None):
+        """Dataset positions (0-indexed, ascending) matching where, limited to [start, end]."""
+        result = None
+        for clause in parse_where(where):
+            field, wanted = clause
+            positions = self._match_field(field, wanted)
+            result = positions if result is None else intersect_sorted(result, positions)
+            if not result:
+                break
+        if result is None:
+            result = list(range(self.rows))
+        lo = bisect.bisect_left(result, start) if start is not None else 0
+        hi = bisect.bisect_right(result, end) if end is not None else len(result)
+        return result[lo:hi]
+
+
+def parse_where(where):
+    """'language=TypeScript,task_category=Bug Fix' -> [(field, value), ...]"""
+    clauses = []
+    for part in (where or "").split(","):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError(f"Bad --where clause '{part.strip()}' (expected field=value)")
+        field, value = part.split("=", 1)
+        clauses.append((field.strip(), value.strip()))
+    return clauses
+
+
+def intersect_sorted(a, b):
+    """Intersection of two ascending position lists."""
+    if len(a) > len(b):
+        a, b = b, a
+    members = set(b)
+    return [x for x in a if x in members]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Metadata selection index for SWE-PolyBench')
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('build', help='(Re)build the index from the dataset metadata columns')
+
+    values_parser = subparsers.add_parser('values', help='List values of a field with counts')
+    values_parser.add_argument('field', choices=INDEXED_FIELDS)
+
+    query_parser = subparsers.add_parser('query', help='Print the positions matching a --where expression')
+    query_parser.add_argument('where')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = SelectionIndex.load_or_build(args.index, rebuild=True)
+        print(f"✓ Indexed {index.rows} instances into {args.index}")
+        return
+
+    index = SelectionIndex.load_or_build(args.index)
+    if args.command == 'values':
+        for value, count in index.values(args.field):
+            print(f"{count:>6}  {value}")
+    else:
+        try:
+            positions = index.select(args.where)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        for position in positions:
+            print(f"{position + 1:>6}  {index.instance_ids[position]}")
+        print(f"-- {len(positions)} of {index.rows} instances")
+
+
+if __name__ == "__main__":
+    main()
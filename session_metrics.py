@@ -0,0 +1,269 @@
+"""
+Live session metrics for long-running SWE-PolyBench sessions
+
+SessionMetrics aggregates the per-instance metrics the runners already write
+(clone/fetch/diff timings, outcomes, repo cache hits) into counters, gauges
+and histograms. They can be exposed while the session runs through:
+
+  - MetricsServer: local HTTP endpoint, /metrics (OpenMetrics text) and /metrics.json
+  - TextfileExporter: periodically rewritten .prom file (node_exporter textfile collector)
+"""
+
+import os
+import json
+import time
+from threading import Lock, Thread, Event
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, float("inf"))
+DISK_SAMPLE_INTERVAL = 300  # walking a large workspace is not free
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus/OpenMetrics style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in zip(self.buckets, self.counts)}
+        }
+
+
+def directory_size(path):
+    """Total size of the files under path (skips unreadable entries)."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class SessionMetrics:
+    """Thread-safe counters, gauges and histograms for one runner session"""
+
+    def __init__(self, workspace=None):
+        self.lock = Lock()
+        self.started = time.time()
+        self.workspace = workspace
+        self.instances = {}          # outcome -> count
+        self.failures = {}           # failure class -> count
+        self.repo_cache = {"hit": 0, "miss": 0}
+        self.bytes_received = 0
+        self.stalls = 0
+        self.queue_depth = 0
+        self.workspace_bytes = None
+        self.resources = {}          # phase -> summed cpu/io, max peak RSS (see resource_accounting.py)
+        self.histograms = {
+            "clone": Histogram(),
+            "fetch": Histogram(),
+            "diff": Histogram(),
+            "agent": Histogram(),
+        }
+        self._stop = Event()
+
+    # ------------------------------------------------------------- recording
+
+    def observe_instance(self, metrics):
+        """Fold one per-instance metrics record (see save_instance_metrics) in."""
+        with self.lock:
+            outcome = metrics.get("outcome", "unknown")
+            base_outcome = outcome.split(":")[0]
+            self.instances[base_outcome] = self.instances.get(base_outcome, 0) + 1
+            if ":" in outcome:
+                failure_class = outcome.split(":", 1)[1]
+                self.failures[failure_class] = self.failures.get(failure_class, 0) + 1
+            elif base_outcome not in ("solved", "empty"):
+                self.failures[base_outcome] = self.failures.get(base_outcome, 0) + 1
+
+            for key, name in (("clone_seconds", "clone"), ("diff_seconds", "diff"), ("agent_seconds", "agent")):
+                if metrics.get(key) is not None:
+                    self.histograms[name].observe(metrics[key])
+            for transfer in metrics.get("transfers", []):
+                if transfer["op"] in ("fetch", "cache-fetch"):
+                    self.histograms["fetch"].observe(transfer["seconds"])
+                self.bytes_received += transfer.get("bytes", 0)
+                self.stalls += int(bool(transfer.get("stalled")))
+            if metrics.get("repo_cache") in self.repo_cache:
+                self.repo_cache[metrics["repo_cache"]] += 1
+            for phase, usage in (metrics.get("resources") or {}).get("phases", {}).items():
+                totals = self.resources.setdefault(phase, {"cpu_seconds": 0.0, "read_bytes": 0, "write_bytes": 0,
+                                                           "disk_delta_bytes": 0, "peak_rss_bytes": 0})
+                for key in ("cpu_seconds", "read_bytes", "write_bytes", "disk_delta_bytes"):
+                    totals[key] += usage.get(key, 0)
+                totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], usage.get("peak_rss_bytes", 0))
+
+    def set_queue_depth(self, depth):
+        with self.lock:
+            self.queue_depth = depth
+
+    def sample_disk_usage(self):
+        if self.workspace and os.path.isdir(self.workspace):
+            size = directory_size(self.workspace)
+            with self.lock:
+                self.workspace_bytes = size
+
+    def start_disk_sampler(self, interval=DISK_SAMPLE_INTERVAL):
+        """Refresh workspace disk usage in the background."""
+        def loop():
+            while not self._stop.is_set():
+                self.sample_disk_usage()
+                self._stop.wait(interval)
+        Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------------------------------------------------- rendering
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            finished = sum(self.instances.values())
+            lookups = self.repo_cache["hit"] + self.repo_cache["miss"]
+            return {
+                "uptime_seconds": round(elapsed, 1),
+                "instances": dict(self.instances),
+                "instances_per_hour": round(finished / elapsed * 3600, 2) if elapsed > 0 else 0,
+                "failures": dict(self.failures),
+                "queue_depth": self.queue_depth,
+                "repo_cache": dict(self.repo_cache),
+                "repo_cache_hit_rate": round(self.repo_cache["hit"] / lookups, 3) if lookups else None,
+                "bytes_received": self.bytes_received,
+                "transfer_stalls": self.stalls,
+                "workspace_bytes": self.workspace_bytes,
+                "resources": {phase: dict(totals) for phase, totals in self.resources.items()},
+                "latency_seconds": {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+
+    def render_openmetrics(self):
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.extend(samples)
+
+        metric("swe_instances", "counter", "Finished instances by outcome.",
+               [f'swe_instances_total{{outcome="{k}"}} {v}' for k, v in sorted(snap["instances"].items())])
+        metric("swe_failures", "counter", "Failed instances by failure class.",
+               [f'swe_failures_total{{class="{k}"}} {v}' for k, v in sorted(snap["failures"].items())])
+        metric("swe_instances_per_hour", "gauge", "Session throughput.",
+               [f"swe_instances_per_hour {snap['instances_per_hour']}"])
+        metric("swe_queue_depth", "gauge", "Instances still queued.",
+               [f"swe_queue_depth {snap['queue_depth']}"])
+        metric("swe_repo_cache_lookups", "counter", "Workspace preparations served by the local repo cache.",
+               [f'swe_repo_cache_lookups_total{{result="{k}"}} {v}' for k, v in sorted(snap["repo_cache"].items())])
+        metric("swe_bytes_received", "counter", "Bytes received by clone/fetch.",
+               [f"swe_bytes_received_total {snap['bytes_received']}"])
+        metric("swe_transfer_stalls", "counter", "Clone/fetch transfers aborted as stalled.",
+               [f"swe_transfer_stalls_total {snap['transfer_stalls']}"])
+        if snap["resources"]:
+            phases = sorted(snap["resources"].items())
+            metric("swe_phase_cpu_seconds", "counter", "CPU seconds of runner subprocesses by instance phase.",
+                   [f'swe_phase_cpu_seconds_total{{phase="{p}"}} {r["cpu_seconds"]:.3f}' for p, r in phases])
+            metric("swe_phase_io_bytes", "counter", "Storage bytes read/written by instance phase.",
+                   [f'swe_phase_io_bytes_total{{phase="{p}",direction="{d}"}} {r[d + "_bytes"]}'
+                    for p, r in phases for d in ("read", "write")])
+            metric("swe_phase_peak_rss_bytes", "gauge", "Highest peak resident memory seen in a phase.",
+                   [f'swe_phase_peak_rss_bytes{{phase="{p}"}} {r["peak_rss_bytes"]}' for p, r in phases])
+        if snap["workspace_bytes"] is not None:
+            metric("swe_workspace_bytes", "gauge", "Disk used by the workspace folder.",
+                   [f"swe_workspace_bytes {snap['workspace_bytes']}"])
+
+        with self.lock:
+            for name, histogram in self.histograms.items():
+                samples = []
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    le = "+Inf" if bound == float("inf") else str(float(bound))
+                    samples.append(f'swe_{name}_seconds_bucket{{le="{le}"}} {count}')
+                samples.append(f"swe_{name}_seconds_sum {histogram.sum:.3f}")
+                samples.append(f"swe_{name}_seconds_count {histogram.count}")
+                metric(f"swe_{name}_seconds", "histogram", f"{name.capitalize()} latency.", samples)
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# ========================== EXPORTERS ==========================
+
+class MetricsServer:
+    """Serves /metrics (OpenMetrics) and /metrics.json on localhost"""
+
+    def __init__(self, session_metrics, port, host="127.0.0.1"):
+        metrics = session_metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(metrics.snapshot(), indent=2).encode("utf-8")
+                    content_type = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = metrics.render_openmetrics().encode("utf-8")
+                    content_type = OPENMETRICS_CONTENT_TYPE
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keep the runner console clean
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/metrics"
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class TextfileExporter:
+    """Rewrites an OpenMetrics text file every interval seconds (atomic rename)"""
+
+    def __init__(self, session_metrics, path, interval=15):
+        self.metrics = session_metrics
+        self.path = path
+        self.interval = interval
+        self._stop = Event()
+        Thread(target=self._loop, daemon=True).start()
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render_openmetrics())
+        os.replace(tmp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.write()
+            except OSError:
+                pass
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self.write()
@@ -0,0 +1,376 @@
+"""
+Offline session replay: project wall-clock time and disk peak per policy
+
+Replays recorded per-instance timings (swe_polybench_metrics.jsonl, plus
+clone errors from swe_polybench_state.json) through a discrete-event model of
+the runner: agent workers, network lanes for clones, a prefetcher that
+prepares workspaces ahead of the workers, an LRU local repo cache and a
+workspace eviction policy. Each policy combination gets a projected
+wall-clock time, throughput, disk peak and cache hit rate.
+
+  python session_replay.py fixture --count 300 --out replay_fixture.jsonl
+  python session_replay.py simulate --metrics replay_fixture.jsonl --workers 1 2 --prefetch 0 2 --order dataset by-repo
+  python session_replay.py simulate --cache-gb 0 20 --eviction keep delete
+"""
+
+import os
+import json
+import heapq
+import random
+import argparse
+import itertools
+from datetime import datetime
+from collections import OrderedDict
+
+DEFAULT_METRICS_FILE = "swe_polybench_metrics.jsonl"
+DEFAULT_STATE_FILE = "swe_polybench_state.json"
+
+# Model parameters used where the logs have nothing better
+DEFAULT_RESET_SECONDS = 2.0          # git reset/clean after an instance
+DEFAULT_WORKSPACE_BYTES = 200 * 1024 * 1024
+DEFAULT_NETWORK_RATE = 5 * 1024 * 1024   # bytes/s when no network clone was recorded
+LOCAL_FETCH_RATE = 200 * 1024 * 1024     # bytes/s for a workspace seeded from the repo cache
+LOCAL_SETUP_SECONDS = 1.5                # git init + checkout overhead on a cache hit
+CHECKOUT_FACTOR = 2.5                    # workspace size relative to the received pack
+
+ORDERS = ("dataset", "by-repo", "lpt")
+EVICTIONS = ("keep", "delete")
+
+
+# ========================== RECORDS ==========================
+
+def load_records(metrics_file=DEFAULT_METRICS_FILE, state_file=None):
+    """Per-instance timing records, last record per instance_id, in first-seen order."""
+    records = OrderedDict()
+    with open(metrics_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("instance_id"):
+                records[entry["instance_id"]] = entry
+
+    # Clone errors that never made it into the metrics log (older sessions)
+    if state_file and os.path.exists(state_file):
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        for error in state.get("cloning_errors", []):
+            if error["instance_id"] not in records:
+                records[error["instance_id"]] = {
+                    "instance_id": error["instance_id"],
+                    "repo": error.get("repo", ""),
+                    "outcome": "clone_error:unknown",
+                }
+    return list(records.values())
+
+
+def network_rate(records):
+    """Median observed network clone rate (bytes/s)."""
+    rates = []
+    for record in records:
+        for transfer in record.get("transfers", []):
+            if transfer.get("op") in ("clone", "fetch") and transfer.get("bytes") and transfer.get("seconds"):
+                rates.append(transfer["bytes"] / transfer["seconds"])
+    if not rates:
+        return DEFAULT_NETWORK_RATE
+    rates.sort()
+    return rates[len(rates) // 2]
+
+
+def build_jobs(records, reset_seconds=DEFAULT_RESET_SECONDS):
+    """Turn metrics records into the timing inputs the simulator needs."""
+    rate = network_rate(records)
+    known_clones = [r["clone_seconds"] for r in records if r.get("clone_seconds") and r.get("repo_cache") != "hit"]
+    default_clone = sorted(known_clones)[len(known_clones) // 2] if known_clones else 60.0
+
+    jobs = []
+    for position, record in enumerate(records):
+        pack_bytes = record.get("bytes_received")
+        if pack_bytes is None:
+            pack_bytes = sum(t.get("bytes", 0) for t in record.get("transfers", []))
+        outcome = record.get("outcome", "solved")
+
+        # A recorded cache hit says nothing about network time; estimate it from the pack size
+        if record.get("repo_cache") == "hit" or record.get("clone_seconds") is None:
+            clone_seconds = pack_bytes / rate + LOCAL_SETUP_SECONDS if pack_bytes else default_clone
+        else:
+            clone_seconds = record["clone_seconds"]
+
+        jobs.append({
+            "position": position,
+            "instance_id": record["instance_id"],
+            "repo": record.get("repo", ""),
+            "pack_bytes": pack_bytes,
+            "workspace_bytes": pack_bytes * CHECKOUT_FACTOR if pack_bytes else DEFAULT_WORKSPACE_BYTES,
+            "clone_seconds": clone_seconds,
+            "clone_fails": outcome.startswith("clone_error"),
+            "agent_seconds": (record.get("agent_seconds") or 0) + (record.get("diff_seconds") or 0),
+            "reset_seconds": record.get("reset_seconds", reset_seconds),
+        })
+    return jobs
+
+
+def recorded_wall_clock(records):
+    """Elapsed time of the recorded session (first start to last finish), if timestamps exist."""
+    starts = [r["started"] for r in records if r.get("started")]
+    ends = [r["finished"] for r in records if r.get("finished")]
+    if not starts or not ends:
+        return None
+    return (datetime.fromisoformat(max(ends)) - datetime.fromisoformat(min(starts))).total_seconds()
+
+
+def order_jobs(jobs, order):
+    if order == "by-repo":
+        # Keep dataset order inside a repo, repos in order of first appearance
+        first_seen = {}
+        for job in jobs:
+            first_seen.setdefault(job["repo"], job["position"])
+        return sorted(jobs, key=lambda j: (first_seen[j["repo"]], j["position"]))
+    if order == "lpt":
+        # Longest agent time first (uses recorded agent times, i.e. an oracle)
+        return sorted(jobs, key=lambda j: -j["agent_seconds"])
+    return list(jobs)
+
+
+# ========================== SIMULATOR ==========================
+
+class RepoCache:
+    """LRU set of repos held in the local repo cache, bounded by bytes"""
+
+    def __init__(self, capacity_bytes):
+        self.capacity = capacity_bytes
+        self.repos = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, repo):
+        if repo in self.repos:
+            self.repos.move_to_end(repo)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def insert(self, repo, size):
+        if self.capacity <= 0 or size > self.capacity or repo in self.repos:
+            return
+        while self.used + size > self.capacity:
+            _, evicted = self.repos.popitem(last=False)
+            self.used -= evicted
+        self.repos[repo] = size
+        self.used += size
+
+
+class SessionSimulator:
+    """Discrete-event model of one session under a policy configuration"""
+
+    def __init__(self, jobs, workers=1, prefetch=0, network_lanes=None, cache_bytes=0, eviction="keep"):
+        self.jobs = jobs
+        self.workers = workers
+        self.prefetch = prefetch
+        self.network_lanes = network_lanes or (workers + (1 if prefetch else 0))
+        self.cache = RepoCache(cache_bytes)
+        self.eviction = eviction
+
+    def prep_seconds(self, job):
+        if self.cache.lookup(job["repo"]) and not job["clone_fails"]:
+            return job["pack_bytes"] / LOCAL_FETCH_RATE + LOCAL_SETUP_SECONDS, True
+        return job["clone_seconds"], False
+
+    def run(self):
+        now = 0.0
+        events = []
+        sequence = itertools.count()
+        pending = list(reversed(self.jobs))   # pop() takes the next job in order
+        ready = []                             # prepared, waiting for a worker (completion order)
+
+        free_workers = self.workers
+        reserved_workers = 0                   # workers cloning their own workspace (no prefetch)
+        free_lanes = self.network_lanes
+        prepping = 0
+        workspace_disk = 0
+        peak_disk = 0
+        finished = 0
+        busy_seconds = 0.0
+
+        def schedule(delay, kind, job):
+            heapq.heappush(events, (now + delay, next(sequence), kind, job))
+
+        def disk_now():
+            return workspace_disk + self.cache.used
+
+        def dispatch():
+            nonlocal free_workers, reserved_workers, free_lanes, prepping, busy_seconds
+            # Start preparations
+            while pending and free_lanes > 0:
+                if self.prefetch:
+                    if prepping + len(ready) >= self.prefetch + free_workers:
+                        break
+                elif free_workers - reserved_workers <= 0:
+                    break
+                else:
+                    reserved_workers += 1
+                job = pending.pop()
+                seconds, _ = self.prep_seconds(job)
+                free_lanes -= 1
+                prepping += 1
+                schedule(seconds, "prep_done", job)
+            # Start agents on prepared workspaces
+            while ready and free_workers > 0:
+                job = ready.pop(0)
+                free_workers -= 1
+                if not self.prefetch:
+                    reserved_workers -= 1
+                busy_seconds += job["agent_seconds"]
+                schedule(job["agent_seconds"] + job["reset_seconds"], "agent_done", job)
+
+        dispatch()
+        while events:
+            now, _, kind, job = heapq.heappop(events)
+            if kind == "prep_done":
+                free_lanes += 1
+                prepping -= 1
+                if job["clone_fails"]:
+                    if not self.prefetch:
+                        reserved_workers -= 1
+                    finished += 1
+                else:
+                    workspace_disk += job["workspace_bytes"]
+                    self.cache.insert(job["repo"], job["pack_bytes"])
+                    ready.append(job)
+                peak_disk = max(peak_disk, disk_now())
+            elif kind == "agent_done":
+                free_workers += 1
+                finished += 1
+                if self.eviction == "delete":
+                    workspace_disk -= job["workspace_bytes"]
+            dispatch()
+
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            "wall_seconds": now,
+            "instances": finished,
+            "instances_per_hour": finished / now * 3600 if now else 0,
+            "peak_disk_bytes": peak_disk,
+            "cache_hit_rate": self.cache.hits / lookups if lookups else 0,
+            "worker_utilization": busy_seconds / (now * self.workers) if now else 0,
+        }
+
+
+def simulate_grid(jobs, workers_list, prefetch_list, orders, cache_gb_list, evictions, network_lanes=None):
+    """Run every policy combination; returns (config, result) pairs sorted by wall-clock."""
+    results = []
+    for workers, prefetch, order, cache_gb, eviction in itertools.product(
+            workers_list, prefetch_list, orders, cache_gb_list, evictions):
+        config = {"workers": workers, "prefetch": prefetch, "order": order, "cache_gb": cache_gb, "eviction": eviction}
+        simulator = SessionSimulator(order_jobs(jobs, order), workers, prefetch, network_lanes,
+                                     int(cache_gb * 1024 ** 3), eviction)
+        results.append((config, simulator.run()))
+    results.sort(key=lambda item: item[1]["wall_seconds"])
+    return results
+
+
+# ========================== FIXTURES ==========================
+
+def synthetic_records(count=300, repos=12, seed=0):
+    """Metrics-shaped records with plausible timings, for running the simulator offline."""
+    rng = random.Random(seed)
+    repo_names = [f"example-org/project-{i}" for i in range(repos)]
+    pack_sizes = {repo: int(rng.lognormvariate(18.5, 1.2)) for repo in repo_names}   # ~100 MiB median
+    weights = [1 / (rank + 1) for rank in range(repos)]                                # few repos dominate
+    rate = DEFAULT_NETWORK_RATE
+
+    records = []
+    for i in range(count):
+        repo = rng.choices(repo_names, weights)[0]
+        pack_bytes = pack_sizes[repo]
+        seconds = pack_bytes / (rate * rng.uniform(0.5, 1.5)) + rng.uniform(2, 8)
+        record = {
+            "instance_id": f"{repo.split('/')[1]}-{i}",
+            "index": i,
+            "repo": repo,
+            "clone_seconds": round(seconds, 2),
+            "transfers": [{"op": "clone", "bytes": pack_bytes, "seconds": round(seconds, 2)}],
+            "bytes_received": pack_bytes,
+        }
+        if rng.random() < 0.03:
+            record["outcome"] = "clone_error:network"
+        else:
+            record.update(
+                agent_seconds=round(rng.lognormvariate(6.4, 0.6), 2),   # ~10 min median
+                diff_seconds=round(rng.uniform(0.01, 0.2), 3),
+                outcome="solved" if rng.random() < 0.8 else "empty",
+            )
+        records.append(record)
+    return records
+
+
+# ========================== CLI ==========================
+
+def format_size(n):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded session timings under different policies')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fixture_parser = subparsers.add_parser('fixture', help='Write synthetic timing records')
+    fixture_parser.add_argument('--count', type=int, default=300)
+    fixture_parser.add_argument('--repos', type=int, default=12)
+    fixture_parser.add_argument('--seed', type=int, default=0)
+    fixture_parser.add_argument('--out', default='replay_fixture.jsonl')
+
+    sim_parser = subparsers.add_parser('simulate', help='Project wall-clock and disk peak per policy')
+    sim_parser.add_argument('--metrics', default=DEFAULT_METRICS_FILE)
+    sim_parser.add_argument('--state', default=DEFAULT_STATE_FILE)
+    sim_parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    sim_parser.add_argument('--prefetch', type=int, nargs='+', default=[0, 1, 2])
+    sim_parser.add_argument('--order', choices=ORDERS, nargs='+', default=['dataset', 'by-repo'])
+    sim_parser.add_argument('--cache-gb', type=float, nargs='+', default=[0, 20])
+    sim_parser.add_argument('--eviction', choices=EVICTIONS, nargs='+', default=['keep', 'delete'])
+    sim_parser.add_argument('--network-lanes', type=int, default=None,
+                            help='Concurrent clones (default: one per worker, plus one for the prefetcher)')
+    sim_parser.add_argument('--reset-seconds', type=float, default=DEFAULT_RESET_SECONDS)
+    sim_parser.add_argument('--top', type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == 'fixture':
+        records = synthetic_records(args.count, args.repos, args.seed)
+        with open(args.out, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        print(f"✓ Wrote {len(records)} synthetic records to {args.out}")
+        return
+
+    records = load_records(args.metrics, args.state)
+    if not records:
+        print(f"No records in {args.metrics}")
+        return
+    jobs = build_jobs(records, args.reset_seconds)
+    recorded = recorded_wall_clock(records)
+    print(f"Replaying {len(jobs)} instances from {args.metrics}"
+          + (f" (recorded session: {recorded / 3600:.2f} h)" if recorded else ""))
+
+    results = simulate_grid(jobs, args.workers, args.prefetch, args.order, args.cache_gb, args.eviction,
+                            args.network_lanes)
+    print(f"\n{'Workers':>7} {'Prefetch':>8} {'Order':<8} {'Cache':>7} {'Evict':<6} "
+          f"{'Wall (h)':>9} {'Inst/h':>7} {'Disk peak':>11} {'Hits':>6} {'Util':>6}")
+    for config, result in results[:args.top]:
+        print(f"{config['workers']:>7} {config['prefetch']:>8} {config['order']:<8} {config['cache_gb']:>5.0f}GB "
+              f"{config['eviction']:<6} {result['wall_seconds'] / 3600:>9.2f} {result['instances_per_hour']:>7.1f} "
+              f"{format_size(result['peak_disk_bytes']):>11} {result['cache_hit_rate']:>6.1%} "
+              f"{result['worker_utilization']:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Sparse-checkout workspaces for very large repositories
+
+Instead of writing the whole tree, a workspace checks out (cone mode) only:
+
+  - every root-level file (package.json, tsconfig, setup.cfg, ...), which cone mode always keeps
+  - directories of files the problem statement / hints mention (full paths, path
+    suffixes, or unambiguous file names)
+  - directories of the files code_index.py ranks highest for the problem
+
+When the agent reaches outside that set the workspace grows: SparseExpander
+polls for files the agent created or changed outside the cone and for repository
+paths named in the agent's log, and adds their directories with
+`git sparse-checkout add`. A last pass runs before the diff is captured,
+since `git add -A` silently skips paths outside the sparse set.
+
+  python sparse_workspace.py dirs  /path/to/repo <commit> --problem problem_207.json
+  python sparse_workspace.py bench /path/to/repo <commit> --problem problem_207.json
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from threading import Thread, Event, Lock
+
+from code_index import index_for_commit, DEFAULT_INDEX_DIR as CODE_INDEX_DIR
+
+RANKED_FILES = 10            # code_index hits whose directories are checked out
+MAX_SPARSE_FRACTION = 0.6    # above this share of files a sparse checkout isn't worth it
+MAX_RANKED_DIR_FRACTION = 0.15  # ranked hits don't pull in directories bigger than this
+EXPAND_INTERVAL = 5
+GIT_TIMEOUT = 600
+
+PATH_RE = re.compile(r"[\w@.+-]+(?:/[\w@.+-]+)+|[\w@+-]+\.[A-Za-z]{1,5}\b")
+
+
+def git(path, *args, timeout=GIT_TIMEOUT):
+    return subprocess.run(["git", *args], cwd=path, capture_output=True, text=True,
+                          errors="replace", timeout=timeout)
+
+
+def tree_files(repo_path, commit):
+    result = git(repo_path, "ls-tree", "-r", "--name-only", "-z", "--full-tree", commit)
+    if result.returncode != 0:
+        raise RuntimeError(f"git ls-tree {commit} failed: {result.stderr.strip()}")
+    return [p for p in result.stdout.split("\0") if p]
+
+
+def parent_dir(path):
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+
+def minimal_dirs(dirs):
+    """Drop directories already covered by an ancestor in the set (and the root)."""
+    kept = []
+    for d in sorted(d for d in set(dirs) if d):
+        if not kept or not (d == kept[-1] or d.startswith(kept[-1] + "/")):
+            kept.append(d)
+    return kept
+
+
+def in_cone(path, dirs):
+    """Whether cone-mode sparse checkout with dirs materializes path."""
+    parent = parent_dir(path)
+    if not parent:
+        return True
+    for d in dirs:
+        # Inside a listed directory, or a file directly in one of its ancestors
+        if path.startswith(d + "/") or d == parent or d.startswith(parent + "/"):
+            return True
+    return False
+
+
+class PathMatcher:
+    """Maps path-like text to files of a tree"""
+
+    def __init__(self, files):
+        self.files = set(files)
+        self.dirs = {parent_dir(p) for p in files}
+        self.by_name = {}
+        for path in files:
+            self.by_name.setdefault(path.rsplit("/", 1)[-1], []).append(path)
+
+    def match(self, token):
+        """Files (or a directory, as 'dir/') referred to by one path-like token."""
+        token = token.strip("./").split("#")[0].split(":")[0]
+        if not token:
+            return []
+        if token in self.files:
+            return [token]
+        if token in self.dirs:
+            return [token + "/"]
+        if "/" in token:
+            # Suffix of a real path: packages/foo/src/x.ts mentioned as src/x.ts
+            name = token.rsplit("/", 1)[-1]
+            found = [p for p in self.by_name.get(name, ()) if p.endswith("/" + token)]
+            if found:
+                return found[:3]
+            parts = token.split("/")
+            for start in range(1, len(parts) - 1):
+                suffix = "/".join(parts[start:])
+                if suffix in self.files or suffix in self.dirs:
+                    return [suffix if suffix in self.files else suffix + "/"]
+            return []
+        found = self.by_name.get(token, [])
+        return found if len(found) <= 3 else []
+
+    def paths_in(self, text):
+        found = set()
+        for token in set(PATH_RE.findall(text or "")):
+            found.update(self.match(token))
+        return found
+
+
+def dirs_for_paths(paths):
+    return {p[:-1] if p.endswith("/") else parent_dir(p) for p in paths}
+
+
+def dir_size(files, d):
+    return sum(1 for p in files if p.startswith(d + "/"))
+
+
+def relevant_dirs(problem_data, repo_path, commit, ranked=RANKED_FILES, files=None):
+    """Sparse directory set for a problem; None when a full checkout is the better deal."""
+    files = files if files is not None else tree_files(repo_path, commit)
+    matcher = PathMatcher(files)
+    text = "\n".join([problem_data.get("problem_statement") or "", problem_data.get("hints_text") or ""])
+    wanted = dirs_for_paths(matcher.paths_in(text))
+    if ranked:
+        try:
+            index = index_for_commit(problem_data.get("repo", "unknown"), repo_path, commit, CODE_INDEX_DIR)
+            hits = {parent_dir(hit["path"]) for hit in index.query(text, ranked)}
+        except Exception:
+            hits = set()
+        # A keyword hit directly under e.g. test/ must not drag the whole test suite in
+        limit = MAX_RANKED_DIR_FRACTION * len(files)
+        wanted |= {d for d in hits if d and dir_size(files, d) <= limit}
+    dirs = minimal_dirs(wanted)
+    covered = sum(1 for p in files if in_cone(p, dirs))
+    if covered > MAX_SPARSE_FRACTION * len(files):
+        return None
+    return dirs
+
+
+# ========================== WORKSPACE ==========================
+
+def is_sparse(repo_path):
+    return git(repo_path, "config", "--get", "core.sparseCheckout").stdout.strip() == "true"
+
+
+def sparse_dirs(repo_path):
+    return [d for d in git(repo_path, "sparse-checkout", "list").stdout.splitlines() if d]
+
+
+def set_sparse(repo_path, dirs):
+    """Restrict the workspace to dirs (works before the first checkout too)."""
+    result = git(repo_path, "sparse-checkout", "set", "--cone", "--", *dirs)
+    if result.returncode != 0:
+        raise RuntimeError(f"git sparse-checkout set failed: {result.stderr.strip()}")
+
+
+def disable_sparse(repo_path):
+    git(repo_path, "sparse-checkout", "disable")
+
+
+def expand(repo_path, paths, current=None):
+    """Add the directories of paths that are outside the sparse set; returns the added dirs."""
+    current = sparse_dirs(repo_path) if current is None else current
+    missing = minimal_dirs(d for d in dirs_for_paths(paths) if d and not in_cone(d + "/x", current))
+    if missing:
+        result = git(repo_path, "sparse-checkout", "add", "--", *missing)
+        if result.returncode != 0:
+            raise RuntimeError(f"git sparse-checkout add failed: {result.stderr.strip()}")
+    return missing
+
+
+def changed_outside(repo_path, dirs):
+    """Paths outside the cone that git status reports, tracked or not.
+
+    Writing a tracked file outside the cone clears its skip-worktree bit, so
+    it shows up modified (" M"), not untracked; rename sources count too.
+    """
+    result = git(repo_path, "status", "--porcelain", "-uall", "-z")
+    entries = result.stdout.split("\0")
+    paths = []
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        found = [entry[3:]]
+        if "R" in entry[:2] or "C" in entry[:2]:
+            found.append(entries[i])  # -z puts the source path in the next field
+            i += 1
+        paths.extend(p for p in found if p and not in_cone(p, dirs))
+    return paths
+
+
+class SparseExpander:
+    """Grows a sparse workspace while an agent works in it"""
+
+    def __init__(self, repo_path, commit, log_file=None, interval=EXPAND_INTERVAL):
+        self.repo_path = repo_path
+        self.log_file = log_file
+        self.interval = interval
+        self.matcher = PathMatcher(tree_files(repo_path, commit))
+        self.added = []
+        self._log_offset = 0
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                pass
+
+    def _log_paths(self):
+        if not self.log_file or not os.path.exists(self.log_file):
+            return set()
+        with open(self.log_file, "r", encoding="utf-8", errors="replace") as f:
+            f.seek(self._log_offset)
+            text = f.read()
+            self._log_offset = f.tell()
+        return self.matcher.paths_in(text)
+
+    def check(self):
+        """One expansion pass; returns the directories added."""
+        with self._lock:
+            current = sparse_dirs(self.repo_path)
+            wanted = set(changed_outside(self.repo_path, current)) | self._log_paths()
+            added = expand(self.repo_path, wanted, current)
+            self.added.extend(added)
+            return added
+
+    def stop(self):
+        """Stop polling and run the final pass (call before capturing the diff)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.check()
+
+
+# ========================== BENCHMARK ==========================
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def capture_cycle(path):
+    git(path, "add", "-A")
+    git(path, "diff", "--cached", "--quiet")
+    git(path, "reset", "-q", "HEAD")
+    git(path, "clean", "-nd")
+
+
+def bench(repo_path, commit, problem_data, repeat=5):
+    """Checkout time, files on disk and capture-cycle latency: full vs sparse workspace."""
+    files = tree_files(repo_path, commit)
+    start = time.perf_counter()
+    dirs = relevant_dirs(problem_data, repo_path, commit, files=files)
+    select_seconds = time.perf_counter() - start
+    if dirs is None:
+        print("Relevant directories cover most of the tree; the runner would use a full checkout")
+        return None
+    source = os.path.abspath(repo_path)
+    results = {}
+    root = tempfile.mkdtemp(prefix="sparse_bench_")
+    try:
+        for mode in ("full", "sparse"):
+            workspace = os.path.join(root, mode)
+            git(root, "init", "-q", workspace)
+            git(workspace, "fetch", "-q", "--no-tags", source, commit)
+            start = time.perf_counter()
+            if mode == "sparse":
+                set_sparse(workspace, dirs)
+            git(workspace, "checkout", "-q", "-f", commit)
+            checkout_seconds = time.perf_counter() - start
+            # ls-files -t tags skip-worktree (not materialized) entries with S
+            on_disk = sum(1 for line in git(workspace, "ls-files", "-t").stdout.splitlines() if line.startswith("H "))
+            # Files written in the same second as the index are re-hashed until it is rewritten
+            time.sleep(1)
+            git(workspace, "update-index", "-q", "--refresh")
+            cycle = min(timed(lambda: capture_cycle(workspace)) for _ in range(repeat))
+            results[mode] = {"checkout_s": checkout_seconds, "files": on_disk, "cycle_ms": cycle * 1000}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"Tree: {len(files)} files; sparse set: {len(dirs)} dirs (selected in {select_seconds:.2f}s)")
+    for d in dirs[:15]:
+        print(f"  {d}/")
+    print(f"{'mode':<8} {'files':>8} {'checkout s':>11} {'cycle ms':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['files']:>8} {r['checkout_s']:>11.2f} {r['cycle_ms']:>9.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sparse-checkout workspaces')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('dirs', 'Print the sparse directory set for a problem'),
+                            ('bench', 'Compare a full and a sparse checkout of a commit')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('repo_path')
+        sub.add_argument('commit')
+        sub.add_argument('--problem', required=True, help='JSON file with problem_statement (and hints_text, repo)')
+
+    args = parser.parse_args()
+    with open(args.problem, "r", encoding="utf-8") as f:
+        problem = json.load(f)
+    commit = git(args.repo_path, "rev-parse", args.commit).stdout.strip() or args.commit
+
+    if args.command == 'dirs':
+        dirs = relevant_dirs(problem, args.repo_path, commit)
+        if dirs is None:
+            print("(full checkout)")
+        for d in dirs or []:
+            print(f"{d}/")
+    else:
+        bench(args.repo_path, commit, problem)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,31 @@ import shutil
 from colorama import Fore, Style, init
 import argparse
 import traceback
-from threading import Thread
+from threading import Thread, Lock
 from pathlib import Path
-from datasets import load_dataset
 from datetime import datetime
 import sys
+import re
+import codecs
+import hashlib
+import tempfile
+import atexit
+from collections import deque
+from patch_store import PatchStore
+from session_metrics import SessionMetrics, MetricsServer, TextfileExporter
+from unified_diff import check_patch
+from trajectory_archive import TrajectoryArchive
+from selection_index import SelectionIndex, DEFAULT_INDEX_FILE as SELECTION_INDEX_FILE
+from code_index import index_for_commit, DEFAULT_INDEX_DIR as CODE_INDEX_DIR
+import impacted_tests
+from git_tuning import GitProfiles, describe as describe_git_profile, PROFILE_FILE as GIT_PROFILE_FILE, \
+    stop_fsmonitor
+import sparse_workspace
+import workspace_checkpoint
+from fetch_planner import FetchPlanner, commit_ref, describe as describe_fetch_plan
+from resource_accounting import ResourceAccountant, wrap_command
+from profiling import Profiler, add_profile_arguments
+from dataset_snapshot import DatasetSnapshot, load_problems, remap_state
 
 init(autoreset=True)
 
@@ -27,6 +47,61 @@ CLONE_TIMEOUT = 600  # 10 minutes for large repos
 FETCH_TIMEOUT = 300  # 5 minutes
 GIT_COMMAND_TIMEOUT = 60  # 1 minute for regular commands
 
+# Clone failure tracking
+CLONE_CACHE_FILE = "swe_polybench_clone_cache.json"
+NEGATIVE_CACHE_TTL = {
+    "network": 30 * 60,             # transient, try again soon
+    "missing_commit": 24 * 3600,
+    "long_path": 24 * 3600,
+    "auth": 6 * 3600,
+    "unknown": 2 * 3600,
+}
+CIRCUIT_BREAKER_THRESHOLD = 3   # consecutive failures before a repo is blocked
+CIRCUIT_BREAKER_COOLDOWN = 1800  # seconds before a blocked repo is tried again
+
+# Transfer stall detection (clone/fetch); CLONE_TIMEOUT/FETCH_TIMEOUT stay as hard caps
+STALL_WINDOW = 60         # seconds of low throughput before a transfer is aborted
+STALL_MIN_RATE = 1024     # bytes/s below which a transfer counts as stalled
+PROGRESS_POLL_INTERVAL = 1
+
+METRICS_FILE = "swe_polybench_metrics.jsonl"
+
+# Patch capture
+MAX_PATCH_BYTES = 5 * 1024 * 1024   # patches above this are truncated or rejected
+OVERSIZE_PATCH_MODE = "truncate"     # "truncate" (drop whole trailing files) or "abort"
+DIFF_CHUNK_SIZE = 64 * 1024
+LOCKFILE_PATHSPECS = [":!package-lock.json", ":!yarn.lock", ":!pnpm-lock.yaml"]
+
+# Local bare repos seeded from bundles (see repo_bundles.py); preferred over GitHub
+REPO_CACHE_DIR = "swe_polybench_repo_cache"
+
+# Base commits of the next N instances are fetched into the repo cache together, one
+# request per repo (see fetch_planner.py); 0 disables. PREFETCH_DEPTH mirrors the shallow clone
+PREFETCH_WINDOW = 0
+PREFETCH_DEPTH = 50
+
+# CPU, memory, I/O and disk per instance and phase (see resource_accounting.py):
+# "auto" picks cgroup v2, then /proc or psutil sampling; "off" disables
+RESOURCE_ACCOUNTING = "auto"
+
+# Git settings (untracked cache, split index, commit-graph, ...) measured once per repo
+# and kept only where they speed up status/diff/clean (see git_tuning.py); "off" disables
+GIT_PROFILE_MODE = "auto"
+
+# Check out only the directories relevant to each problem, growing on demand (see sparse_workspace.py)
+SPARSE_MODE = False
+
+# Relevant-file hints in the prompt (BM25 over the base commit, see code_index.py); 0 disables
+CODE_CONTEXT_FILES = 10
+
+# Tests importing the patched files, listed after capture (see impacted_tests.py); 0 disables
+IMPACTED_TESTS_SHOWN = 15
+TEST_IMPACT_DIR = impacted_tests.DEFAULT_INDEX_DIR
+
+# Seconds between checkpoints of the agent's edits, restored if the instance is interrupted
+# (see workspace_checkpoint.py); 0 disables
+CHECKPOINT_INTERVAL = workspace_checkpoint.CHECKPOINT_INTERVAL
+
 # ========================== WINDOWS LONG PATH SUPPORT ==========================
 
 def check_and_enable_longpaths():
@@ -84,6 +159,7 @@ class StateManager:
             "total_solved": 0,
             "failed_instances": [],
             "cloning_errors": [],
+            "deferred_instance_ids": [],
             "range": {"start": None, "end": None}
         }
     
@@ -99,8 +175,37 @@ class StateManager:
         """Update current progress"""
         self.state["last_instance_id"] = instance_id
         self.state["last_instance_index"] = instance_index
+        self.state["interrupted_instance_id"] = None
         self.save_state()
     
+    def mark_interrupted(self, instance_id, deferred=False):
+        """The current instance was left unfinished: resume starts with it again"""
+        if deferred:
+            self.mark_deferred(instance_id)  # it sits behind the resume point
+        elif self.state["last_instance_id"] == instance_id:
+            self.state["interrupted_instance_id"] = instance_id
+            self.save_state()
+    
+    def resume_index(self):
+        """First index to work on when resuming (the interrupted instance, if any)"""
+        last = self.state["last_instance_index"]
+        interrupted = self.state.get("interrupted_instance_id")
+        return last if interrupted and interrupted == self.state["last_instance_id"] else last + 1
+    
+    def mark_deferred(self, instance_id):
+        """Instance pushed to the end of the queue; resume re-queues it until it gets its retry"""
+        deferred = self.state.setdefault("deferred_instance_ids", [])
+        if instance_id not in deferred:
+            deferred.append(instance_id)
+            self.save_state()
+    
+    def clear_deferred(self, instance_id):
+        """The deferred instance got its retry"""
+        deferred = self.state.get("deferred_instance_ids", [])
+        if instance_id in deferred:
+            deferred.remove(instance_id)
+            self.save_state()
+    
     def mark_solved(self):
         """Mark an instance as solved"""
         self.state["total_solved"] += 1
@@ -137,6 +242,169 @@ class StateManager:
         """Check if we can resume from a previous session"""
         return self.state["last_instance_index"] >= 0
 
+# ========================== CLONE FAILURE TRACKING ==========================
+
+# Ordered: the first class whose pattern appears in git's stderr wins
+GIT_ERROR_PATTERNS = [
+    ("auth", [
+        "authentication failed",
+        "could not read username",
+        "could not read password",
+        "permission denied (publickey)",
+        "terminal prompts disabled",
+        "repository not found",
+        "returned error: 403",
+    ]),
+    ("long_path", [
+        "filename too long",
+        "path too long",
+        "name too long",
+    ]),
+    ("missing_commit", [
+        "not our ref",
+        "couldn't find remote ref",
+        "reference is not a tree",
+        "unknown revision",
+        "bad object",
+        "did not match any file",
+        "no such commit",
+    ]),
+    ("network", [
+        "could not resolve host",
+        "failed to connect",
+        "connection timed out",
+        "connection reset",
+        "connection refused",
+        "operation timed out",
+        "early eof",
+        "rpc failed",
+        "remote end hung up",
+        "transfer closed",
+        "transfer stalled",
+        "unable to access",
+        "ssl",
+        "gnutls",
+        "timed out",
+    ]),
+]
+
+TRANSIENT_FAILURES = {"network", "unknown"}
+
+
+class CloneError(Exception):
+    """Clone/fetch failure tagged with its failure class"""
+
+    def __init__(self, message, failure_class="unknown"):
+        super().__init__(message)
+        self.failure_class = failure_class
+
+
+def classify_git_error(result):
+    """Classify a failed git command result into a failure class."""
+    if result is None:
+        return "network"  # run_git_command returns None on timeout
+
+    text = (result.stderr or "").lower()
+    for failure_class, patterns in GIT_ERROR_PATTERNS:
+        if any(pattern in text for pattern in patterns):
+            return failure_class
+    return "unknown"
+
+
+class CloneFailureCache:
+    """Persistent negative cache of bad (repo, commit) pairs plus a per-repo circuit breaker"""
+
+    def __init__(self, cache_file=CLONE_CACHE_FILE):
+        self.cache_file = cache_file
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        """Load cache from file"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+            except:
+                pass
+        return {"commits": {}, "repos": {}}
+
+    def save_cache(self):
+        """Save cache to file"""
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump(self.cache, f, indent=2)
+        except:
+            pass
+
+    def reset(self):
+        """Forget all known-bad commits and close every breaker"""
+        self.cache = {"commits": {}, "repos": {}}
+        self.save_cache()
+
+    @staticmethod
+    def _key(repo, base_commit):
+        return f"{repo}@{base_commit}"
+
+    def known_bad(self, repo, base_commit):
+        """Return the cached failure entry for (repo, commit) if it has not expired"""
+        key = self._key(repo, base_commit)
+        entry = self.cache["commits"].get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= time.time():
+            del self.cache["commits"][key]
+            self.save_cache()
+            return None
+        return entry
+
+    def circuit_open(self, repo):
+        """Check whether the breaker for a repo is open (still cooling down)"""
+        breaker = self.cache["repos"].get(repo)
+        if not breaker or breaker.get("opened_at") is None:
+            return False
+        # After the cooldown the breaker is half-open: one attempt is let through
+        return time.time() - breaker["opened_at"] < CIRCUIT_BREAKER_COOLDOWN
+
+    def should_defer(self, repo, base_commit):
+        """Return a reason string if the instance should be deferred, else None"""
+        entry = self.known_bad(repo, base_commit)
+        if entry:
+            return f"known-bad commit ({entry['failure_class']}): {entry['reason']}"
+        if self.circuit_open(repo):
+            breaker = self.cache["repos"][repo]
+            return f"circuit open for {repo} after {breaker['consecutive_failures']} failures"
+        return None
+
+    def record_failure(self, repo, base_commit, failure_class, reason):
+        """Remember a failed (repo, commit) and trip the breaker if needed"""
+        now = time.time()
+        ttl = NEGATIVE_CACHE_TTL.get(failure_class, NEGATIVE_CACHE_TTL["unknown"])
+        self.cache["commits"][self._key(repo, base_commit)] = {
+            "repo": repo,
+            "base_commit": base_commit,
+            "failure_class": failure_class,
+            "reason": reason,
+            "timestamp": datetime.now().isoformat(),
+            "expires": now + ttl
+        }
+
+        breaker = self.cache["repos"].setdefault(repo, {"consecutive_failures": 0, "opened_at": None})
+        breaker["consecutive_failures"] += 1
+        breaker["last_failure_class"] = failure_class
+        # Auth failures will not fix themselves between instances of the same repo
+        if breaker["consecutive_failures"] >= CIRCUIT_BREAKER_THRESHOLD or failure_class == "auth":
+            breaker["opened_at"] = now
+        self.save_cache()
+
+    def record_success(self, repo, base_commit):
+        """Clear the failure entry and close the breaker for a repo"""
+        changed = self.cache["commits"].pop(self._key(repo, base_commit), None) is not None
+        if repo in self.cache["repos"]:
+            del self.cache["repos"][repo]
+            changed = True
+        if changed:
+            self.save_cache()
+
 # ========================== CLIPBOARD ==========================
 
 def copy_to_clipboard_windows(text):
@@ -184,6 +452,15 @@ def safe_rmtree(path):
     """Safely remove directory with retries."""
     if not os.path.exists(path):
         return True
+    if os.path.exists(os.path.join(path, ".git")):
+        # A running fsmonitor daemon would outlive the workspace and hold files open in it
+        try:
+            if _git_profiles is not None:
+                _git_profiles.forget(path)
+            else:
+                stop_fsmonitor(path)
+        except Exception:
+            pass
     
     max_retries = 3
     for attempt in range(max_retries):
@@ -202,8 +479,9 @@ def safe_rmtree(path):
 
 # ========================== GIT OPERATIONS ==========================
 
-def run_git_command(cmd, cwd, timeout=GIT_COMMAND_TIMEOUT, capture_output=True):
+def run_git_command(cmd, cwd, timeout=GIT_COMMAND_TIMEOUT, capture_output=True, input_text=None):
     """Run git command with timeout and better error handling."""
+    cmd = wrap_command(cmd)
     try:
         if capture_output:
             result = subprocess.run(
@@ -212,7 +490,8 @@ def run_git_command(cmd, cwd, timeout=GIT_COMMAND_TIMEOUT, capture_output=True):
                 capture_output=True,
                 text=True,
                 timeout=timeout,
-                errors='replace'
+                errors='replace',
+                input=input_text
             )
         else:
             result = subprocess.run(
@@ -231,8 +510,195 @@ def run_git_command(cmd, cwd, timeout=GIT_COMMAND_TIMEOUT, capture_output=True):
         return None
 
 
-def reset_git_repo(repo_path, base_commit):
-    """Reset git repository to base commit."""
+PROGRESS_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+RECEIVING_RE = re.compile(r"Receiving objects:\s+\d+% \((\d+)/\d+\)(?:,\s*([\d.]+) (bytes|KiB|MiB|GiB))?")
+PHASE_RE = re.compile(r"^(?:remote: )?([A-Za-z ]+):\s+\d+% \((\d+)/\d+\)")
+
+
+def format_bytes(num_bytes):
+    """Human readable byte count."""
+    for unit in ("B", "KiB", "MiB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GiB"
+
+
+class TransferProgress:
+    """Parses git --progress output and tracks bytes received"""
+
+    def __init__(self):
+        self.bytes_received = 0
+        self.phase_ticks = 0  # advances whenever a non-transfer phase reports progress
+        self.last_phase = None
+        self.messages = []
+        self.lock = Lock()
+
+    def feed_line(self, line):
+        """Consume one \\r or \\n terminated line of git stderr."""
+        line = line.strip()
+        if not line:
+            return
+        receiving = RECEIVING_RE.search(line)
+        phase = PHASE_RE.match(line)
+        with self.lock:
+            if receiving:
+                if receiving.group(2):
+                    size = float(receiving.group(2)) * PROGRESS_UNITS[receiving.group(3)]
+                    self.bytes_received = max(self.bytes_received, int(size))
+            elif phase:
+                key = (phase.group(1), phase.group(2))
+                if key != self.last_phase:
+                    self.last_phase = key
+                    self.phase_ticks += 1
+            else:
+                # Keep real messages (errors, hints) for failure classification
+                self.messages.append(line)
+
+    def snapshot(self):
+        with self.lock:
+            return self.bytes_received, self.phase_ticks
+
+    def read_stream(self, stream):
+        """Read a binary stream until EOF, splitting on both \\r and \\n."""
+        pending = b""
+        while True:
+            chunk = stream.read1(4096) if hasattr(stream, "read1") else stream.read(4096)
+            if not chunk:
+                break
+            pending += chunk
+            parts = re.split(rb"[\r\n]", pending)
+            pending = parts.pop()
+            for part in parts:
+                self.feed_line(part.decode("utf-8", errors="replace"))
+        if pending:
+            self.feed_line(pending.decode("utf-8", errors="replace"))
+
+
+def kill_process_tree(process):
+    """Kill a subprocess together with the transport helpers it spawned."""
+    try:
+        if sys.platform == "win32":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        else:
+            os.killpg(process.pid, 9)
+    except Exception:
+        process.kill()
+
+
+def run_git_transfer(cmd, cwd, timeout, metrics=None, label=None,
+                     stall_window=None, min_rate=None):
+    """Run a clone/fetch with --progress, aborting when throughput stalls.
+
+    The transfer is killed once fewer than min_rate bytes/s arrive over
+    stall_window seconds while no other phase (counting, resolving deltas)
+    advances. Returns a CompletedProcess with the non-progress stderr lines,
+    or None on hard timeout like run_git_command. A summary of the transfer
+    is appended to metrics["transfers"] when metrics is given.
+    """
+    stall_window = STALL_WINDOW if stall_window is None else stall_window
+    min_rate = STALL_MIN_RATE if min_rate is None else min_rate
+    label = label or cmd[1]
+    cmd = cmd[:2] + ["--progress"] + cmd[2:]
+
+    progress = TransferProgress()
+    start = time.time()
+    samples = deque([(start, 0, 0)])
+    peak_rate = 0.0
+    stalled = False
+    timed_out = False
+    showed_rate = False
+
+    try:
+        process = subprocess.Popen(
+            wrap_command(cmd),
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            start_new_session=(sys.platform != "win32")
+        )
+    except Exception as e:
+        print(f"{Fore.YELLOW}⚠️  Git command error: {e}{Style.RESET_ALL}")
+        return None
+
+    reader = Thread(target=progress.read_stream, args=(process.stderr,), daemon=True)
+    reader.start()
+
+    while True:
+        try:
+            process.wait(timeout=PROGRESS_POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        now = time.time()
+        received, ticks = progress.snapshot()
+        samples.append((now, received, ticks))
+
+        # Live rate over the last few seconds
+        recent = [sample for sample in samples if now - sample[0] <= 5]
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            rate = (recent[-1][1] - recent[0][1]) / (recent[-1][0] - recent[0][0])
+            peak_rate = max(peak_rate, rate)
+            if received:
+                print(f"\r{Fore.CYAN}  ↓ {format_bytes(received)} received, {format_bytes(rate)}/s   {Style.RESET_ALL}", end="", flush=True)
+                showed_rate = True
+
+        if now - start > timeout:
+            timed_out = True
+            kill_process_tree(process)
+            break
+
+        # Stall check over the configured window
+        while len(samples) > 1 and now - samples[1][0] >= stall_window:
+            samples.popleft()
+        window_start = samples[0]
+        if now - window_start[0] >= stall_window:
+            advanced = received - window_start[1]
+            if advanced < min_rate * stall_window and ticks == window_start[2]:
+                stalled = True
+                kill_process_tree(process)
+                break
+
+    process.wait()
+    reader.join(timeout=5)
+    elapsed = time.time() - start
+    if showed_rate:
+        print()
+
+    received, _ = progress.snapshot()
+    if metrics is not None:
+        metrics.setdefault("transfers", []).append({
+            "op": label,
+            "bytes": received,
+            "seconds": round(elapsed, 2),
+            "avg_rate": round(received / elapsed, 1) if elapsed > 0 else 0,
+            "peak_rate": round(peak_rate, 1),
+            "stalled": stalled,
+            "timed_out": timed_out,
+            "returncode": process.returncode
+        })
+
+    if timed_out:
+        print(f"{Fore.YELLOW}⏱️  Git command timed out after {timeout}s{Style.RESET_ALL}")
+        return None
+
+    stderr = "\n".join(progress.messages)
+    returncode = process.returncode
+    if stalled:
+        print(f"{Fore.YELLOW}⏱️  Transfer stalled: under {format_bytes(min_rate)}/s for {stall_window}s{Style.RESET_ALL}")
+        stderr += f"\nfatal: transfer stalled below {min_rate} bytes/s for {stall_window}s"
+        returncode = returncode if returncode else -1
+    return subprocess.CompletedProcess(cmd, returncode, "", stderr)
+
+
+def reset_git_repo(repo_path, base_commit, metrics=None, sparse=None):
+    """Reset git repository to base commit.
+
+    sparse: problem data to restrict the checkout to its directories, False to
+    restore a full checkout, None to leave the sparse setting alone.
+    """
     try:
         print(f"{Fore.CYAN}  → Resetting to base commit...{Style.RESET_ALL}")
         
@@ -241,12 +707,15 @@ def reset_git_repo(repo_path, base_commit):
         
         if result is None or result.returncode != 0:
             print(f"{Fore.CYAN}  → Fetching commit history...{Style.RESET_ALL}")
-            run_git_command(["git", "fetch", "origin", base_commit], repo_path, timeout=FETCH_TIMEOUT)
+            run_git_transfer(["git", "fetch", "origin", base_commit], repo_path, FETCH_TIMEOUT, metrics)
             
             result = run_git_command(["git", "cat-file", "-e", base_commit], repo_path, timeout=10)
             if result is None or result.returncode != 0:
                 print(f"{Fore.CYAN}  → Unshallowing repository...{Style.RESET_ALL}")
-                run_git_command(["git", "fetch", "--unshallow"], repo_path, timeout=FETCH_TIMEOUT)
+                run_git_transfer(["git", "fetch", "--unshallow"], repo_path, FETCH_TIMEOUT, metrics)
+        
+        if sparse is not None:
+            configure_sparse_checkout(repo_path, base_commit, sparse, metrics)
         
         # Checkout base commit
         result = run_git_command(["git", "checkout", "-f", base_commit], repo_path)
@@ -265,8 +734,262 @@ def reset_git_repo(repo_path, base_commit):
         return False
 
 
-def clone_repo_with_retry(repo, base_commit, target_folder, max_retries=MAX_CLONE_RETRIES):
-    """Clone repository with retry logic and Windows long path support."""
+def configure_sparse_checkout(repo_path, base_commit, problem_data, metrics=None):
+    """Limit the next checkout to the problem's directories, or restore a full one."""
+    try:
+        if not problem_data:
+            if sparse_workspace.is_sparse(repo_path):
+                sparse_workspace.disable_sparse(repo_path)
+            return None
+        start = time.time()
+        dirs = sparse_workspace.relevant_dirs(problem_data, repo_path, base_commit)
+        if dirs is None:
+            print(f"{Fore.CYAN}  → Relevant directories cover most of the tree, using a full checkout{Style.RESET_ALL}")
+            if sparse_workspace.is_sparse(repo_path):
+                sparse_workspace.disable_sparse(repo_path)
+        else:
+            sparse_workspace.set_sparse(repo_path, dirs)
+            print(f"{Fore.CYAN}  → Sparse checkout: {len(dirs)} directories + top-level files "
+                  f"({', '.join(dirs[:5])}{', ...' if len(dirs) > 5 else ''}){Style.RESET_ALL}")
+        if metrics is not None:
+            metrics["sparse_dirs"] = None if dirs is None else len(dirs)
+            metrics["sparse_select_seconds"] = round(time.time() - start, 3)
+        return dirs
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Sparse checkout unavailable, using the full tree: {e}{Style.RESET_ALL}")
+        sparse_workspace.disable_sparse(repo_path)
+        return None
+
+
+def start_sparse_expander(repo_path, base_commit, log_file=None):
+    """Watch a sparse workspace and add directories the agent reaches into."""
+    if not sparse_workspace.is_sparse(repo_path):
+        return None
+    try:
+        return sparse_workspace.SparseExpander(repo_path, base_commit, log_file).start()
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not watch sparse workspace: {e}{Style.RESET_ALL}")
+        return None
+
+
+def finish_sparse_expander(expander, metrics=None):
+    """Final expansion pass so git add -A sees every file the agent wrote."""
+    if expander is None:
+        return
+    try:
+        expander.stop()
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Final sparse expansion failed: {e}{Style.RESET_ALL}")
+    if expander.added:
+        print(f"{Fore.CYAN}  → Sparse checkout expanded with: {', '.join(expander.added)}{Style.RESET_ALL}")
+    if metrics is not None:
+        metrics["sparse_expansions"] = expander.added
+
+
+def restore_checkpoint(repo_path, instance_id, base_commit, metrics=None):
+    """Bring back edits checkpointed by an interrupted run of this instance."""
+    try:
+        commit = workspace_checkpoint.restore(repo_path, instance_id, base_commit)
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not restore checkpoint: {e}{Style.RESET_ALL}")
+        return None
+    if commit:
+        print(f"{Fore.GREEN}  ♻️  Restored in-progress edits: "
+              f"{workspace_checkpoint.describe(repo_path, commit)}{Style.RESET_ALL}")
+        if metrics is not None:
+            metrics["checkpoint_restored"] = commit
+    return commit
+
+
+def start_checkpointer(repo_path, base_commit, instance_id, interval=None):
+    """Checkpoint the workspace every interval seconds while the agent works."""
+    interval = CHECKPOINT_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+    try:
+        return workspace_checkpoint.Checkpointer(repo_path, base_commit, instance_id, interval).start()
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not start checkpoints: {e}{Style.RESET_ALL}")
+        return None
+
+
+def finish_checkpointer(checkpointer, metrics=None, final=False):
+    """Stop checkpointing (final=True: one last checkpoint, for interruptions)."""
+    if checkpointer is None:
+        return
+    stats = checkpointer.stop(final)
+    if metrics is not None:
+        metrics.update(stats)
+
+
+def discard_checkpoint(repo_path, instance_id):
+    try:
+        workspace_checkpoint.discard(repo_path, instance_id)
+    except Exception:
+        pass
+
+
+_git_profiles = None
+_git_profiles_lock = Lock()
+
+
+def apply_git_profile(repo, repo_path, metrics=None):
+    """Apply the repo's measured git profile to a workspace (measuring it on first use)."""
+    global _git_profiles
+    if GIT_PROFILE_MODE == "off":
+        return None
+    try:
+        with _git_profiles_lock:
+            if _git_profiles is None:
+                _git_profiles = GitProfiles(GIT_PROFILE_FILE)
+                atexit.register(_git_profiles.stop_daemons)  # workspaces kept after the session
+        profile, measured, not_applied = _git_profiles.ensure(
+            repo, repo_path, log=lambda msg: print(f"{Fore.CYAN}{msg}{Style.RESET_ALL}"))
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not apply git profile: {e}{Style.RESET_ALL}")
+        return None
+    if measured:
+        print(f"{Fore.GREEN}  ✓ Git profile for {repo}: {describe_git_profile(profile)}{Style.RESET_ALL}")
+    if not_applied:
+        print(f"{Fore.YELLOW}  ⚠️  Git settings did not stick: {', '.join(not_applied)}{Style.RESET_ALL}")
+    if metrics is not None:
+        metrics["git_profile"] = profile["kept"]
+    return profile
+
+
+def repo_cache_path(repo, cache_dir=None):
+    """Path of the bare cache repository for owner/name."""
+    return os.path.join(cache_dir or REPO_CACHE_DIR, repo.replace("/", "__") + ".git")
+
+
+_repo_cache_locks = {}
+_repo_cache_locks_lock = Lock()
+
+
+def repo_cache_lock(repo):
+    """Lock serializing pins and fetches on one repo's bare cache (headless workers share it)."""
+    cache_path = os.path.abspath(repo_cache_path(repo))
+    with _repo_cache_locks_lock:
+        return _repo_cache_locks.setdefault(cache_path, Lock())
+
+
+def pin_repo_cache_commit(cache_path, base_commit):
+    """Pin the commit in the cache so it can be fetched by ref; hold repo_cache_lock around it."""
+    result = run_git_command(["git", "update-ref", commit_ref(base_commit), base_commit], cache_path, timeout=10)
+    if result is None or result.returncode != 0:
+        error = result.stderr.strip() if result is not None else "timed out"
+        print(f"{Fore.YELLOW}  → Could not pin {base_commit[:12]} in the repo cache: {error}{Style.RESET_ALL}")
+        return False
+    return True
+
+
+def repo_cache_has_commit(repo, base_commit, cache_dir=None):
+    """Check whether the local repo cache holds base_commit."""
+    cache_path = repo_cache_path(repo, cache_dir)
+    if not os.path.isdir(cache_path):
+        return False
+    result = run_git_command(["git", "cat-file", "-e", f"{base_commit}^{{commit}}"], cache_path, timeout=10)
+    return result is not None and result.returncode == 0
+
+
+def make_fetch_planner():
+    """Planner filling the repo cache through the stall-aware transfer wrapper."""
+    return FetchPlanner(REPO_CACHE_DIR, depth=PREFETCH_DEPTH,
+                        transfer=lambda cmd, cwd: run_git_transfer(cmd, cwd, CLONE_TIMEOUT, label="prefetch"),
+                        log=lambda msg: print(f"{Fore.CYAN}{msg}{Style.RESET_ALL}"))
+
+
+def prefetch_base_commits(planner, problems):
+    """Fetch the base commits of problems into the repo cache, one request per repo."""
+    print(f"{Fore.CYAN}📥 Prefetching base commits for {len(problems)} instances...{Style.RESET_ALL}")
+    try:
+        unavailable = planner.prefetch(problems)
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Prefetch failed, instances will fetch on their own: {e}{Style.RESET_ALL}")
+        return None
+    for repo, commits in unavailable.items():
+        print(f"{Fore.YELLOW}  ⚠️  {repo}: {len(commits)} base commits not fetched{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}✓ {describe_fetch_plan(planner.stats)}{Style.RESET_ALL}\n")
+    return unavailable
+
+
+def fetch_from_repo_cache(repo, base_commit, repo_path):
+    """Bring base_commit into an existing workspace from the repo cache, if it has it."""
+    result = run_git_command(["git", "cat-file", "-e", f"{base_commit}^{{commit}}"], repo_path, timeout=10)
+    if result is not None and result.returncode == 0:
+        return True
+    if not repo_cache_has_commit(repo, base_commit):
+        return False
+    cache_path = os.path.abspath(repo_cache_path(repo))
+    with repo_cache_lock(repo):
+        if not pin_repo_cache_commit(cache_path, base_commit):
+            return False
+        result = run_git_command(["git", "fetch", "-q", "--no-tags", cache_path, commit_ref(base_commit)],
+                                 repo_path, timeout=FETCH_TIMEOUT)
+    return result is not None and result.returncode == 0
+
+
+def clone_from_repo_cache(repo, base_commit, target_folder, metrics=None, sparse=None):
+    """Create a workspace from the local repo cache without touching the network.
+
+    Returns False on a cache miss so the caller can fall back to GitHub.
+    """
+    if not repo_cache_has_commit(repo, base_commit):
+        if metrics is not None:
+            metrics["repo_cache"] = "miss"
+        return False
+    
+    cache_path = os.path.abspath(repo_cache_path(repo))
+    print(f"{Fore.CYAN}  → Using local repo cache: {cache_path}{Style.RESET_ALL}")
+    
+    result = run_git_command(["git", "init", "-q", target_folder], os.getcwd())
+    if result is None or result.returncode != 0:
+        return False
+    if sys.platform == "win32":
+        run_git_command(["git", "config", "core.longpaths", "true"], target_folder)
+    
+    # Keep origin pointing at GitHub so later fetches still work
+    run_git_command(["git", "remote", "add", "origin", f"https://github.com/{repo}.git"], target_folder)
+    
+    with repo_cache_lock(repo):
+        pinned = pin_repo_cache_commit(cache_path, base_commit)
+        result = run_git_transfer(
+            ["git", "fetch", "--no-tags", cache_path, commit_ref(base_commit)],
+            target_folder,
+            FETCH_TIMEOUT,
+            metrics,
+            label="cache-fetch"
+        ) if pinned else None
+    if result is None or result.returncode != 0:
+        print(f"{Fore.YELLOW}  → Repo cache fetch failed, falling back to remote{Style.RESET_ALL}")
+        safe_rmtree(target_folder)
+        if metrics is not None:
+            metrics["repo_cache"] = "miss"
+        return False
+    
+    if not reset_git_repo(target_folder, base_commit, metrics, sparse):
+        safe_rmtree(target_folder)
+        if metrics is not None:
+            metrics["repo_cache"] = "miss"
+        return False
+    
+    if metrics is not None:
+        metrics["repo_cache"] = "hit"
+    print(f"{Fore.GREEN}  ✓ Workspace created from repo cache{Style.RESET_ALL}")
+    return True
+
+
+def clone_repo_with_retry(repo, base_commit, target_folder, max_retries=MAX_CLONE_RETRIES, metrics=None,
+                          sparse_problem=None):
+    """Clone repository with retry logic and Windows long path support.
+
+    Raises CloneError tagged with a failure class. Only transient failures
+    (network/unknown) are retried; auth, long path and missing commit
+    errors fail fast since another attempt would hit the same wall.
+    With sparse_problem only the directories relevant to it are checked out;
+    without it a previously sparse workspace gets its full tree back.
+    """
+    sparse = sparse_problem or False
     
     for attempt in range(max_retries):
         try:
@@ -278,12 +1001,19 @@ def clone_repo_with_retry(repo, base_commit, target_folder, max_retries=MAX_CLON
             if os.path.exists(target_folder):
                 if os.path.exists(os.path.join(target_folder, ".git")):
                     print(f"{Fore.CYAN}  → Repository exists, attempting reset...{Style.RESET_ALL}")
-                    if reset_git_repo(target_folder, base_commit):
+                    fetch_from_repo_cache(repo, base_commit, target_folder)
+                    if reset_git_repo(target_folder, base_commit, metrics, sparse):
+                        apply_git_profile(repo, target_folder, metrics)
                         return target_folder
                     print(f"{Fore.YELLOW}  → Reset failed, removing and re-cloning...{Style.RESET_ALL}")
                 
                 if not safe_rmtree(target_folder):
-                    raise Exception("Could not remove existing directory")
+                    raise CloneError("Could not remove existing directory")
+            
+            # Prefer the local repo cache; only cache misses go to GitHub
+            if attempt == 0 and clone_from_repo_cache(repo, base_commit, target_folder, metrics, sparse):
+                apply_git_profile(repo, target_folder, metrics)
+                return target_folder
             
             # Clone fresh
             clone_url = f"https://github.com/{repo}.git"
@@ -305,113 +1035,247 @@ def clone_repo_with_retry(repo, base_commit, target_folder, max_retries=MAX_CLON
                 # Full clone on retry
                 print(f"{Fore.CYAN}  → Strategy: Full clone{Style.RESET_ALL}")
             
+            # A sparse workspace is checked out once its directory set is known
+            if sparse:
+                clone_cmd.append("--no-checkout")
+            
             clone_cmd.extend([clone_url, target_folder])
             
             # Show command for debugging
             if attempt > 0:
                 print(f"{Fore.CYAN}  → Command: {' '.join(clone_cmd)}{Style.RESET_ALL}")
             
-            result = run_git_command(
+            # Stream progress so stalls are caught early and failures can be classified
+            result = run_git_transfer(
                 clone_cmd,
                 os.getcwd(),
-                timeout=CLONE_TIMEOUT,
-                capture_output=False
+                CLONE_TIMEOUT,
+                metrics
             )
             
             if result is None:
-                raise Exception(f"Clone timeout after {CLONE_TIMEOUT}s")
+                raise CloneError(f"Clone timeout after {CLONE_TIMEOUT}s", "network")
             
             if result.returncode != 0:
+                failure_class = classify_git_error(result)
+                last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
                 # Check for specific errors
                 if result.returncode == 128:
-                    raise Exception(f"Git error 128 (may be network, auth, or long paths issue)")
-                raise Exception(f"Clone failed with code {result.returncode}")
+                    raise CloneError(f"Git error 128 [{failure_class}]: {last_line}", failure_class)
+                raise CloneError(f"Clone failed with code {result.returncode} [{failure_class}]: {last_line}", failure_class)
             
-            print(f"{Fore.GREEN}  ✓ Clone successful{Style.RESET_ALL}")
+            transfer = metrics["transfers"][-1] if metrics and metrics.get("transfers") else None
+            if transfer:
+                print(f"{Fore.GREEN}  ✓ Clone successful ({format_bytes(transfer['bytes'])} in {transfer['seconds']:.1f}s, {format_bytes(transfer['avg_rate'])}/s){Style.RESET_ALL}")
+            else:
+                print(f"{Fore.GREEN}  ✓ Clone successful{Style.RESET_ALL}")
             
             # Now fetch and checkout the specific commit
             print(f"{Fore.CYAN}  → Fetching base commit...{Style.RESET_ALL}")
             
             # Try to fetch the specific commit
-            run_git_command(["git", "fetch", "origin", base_commit], target_folder, timeout=FETCH_TIMEOUT)
+            fetch_result = run_git_transfer(["git", "fetch", "origin", base_commit], target_folder, FETCH_TIMEOUT, metrics)
             
             # Check if commit is accessible
             result = run_git_command(["git", "cat-file", "-e", base_commit], target_folder, timeout=10)
             if result is None or result.returncode != 0:
                 print(f"{Fore.CYAN}  → Commit not found, unshallowing...{Style.RESET_ALL}")
-                run_git_command(["git", "fetch", "--unshallow"], target_folder, timeout=FETCH_TIMEOUT)
+                run_git_transfer(["git", "fetch", "--unshallow"], target_folder, FETCH_TIMEOUT, metrics)
+                
+                result = run_git_command(["git", "cat-file", "-e", base_commit], target_folder, timeout=10)
+                if result is None or result.returncode != 0:
+                    failure_class = classify_git_error(fetch_result)
+                    if failure_class == "unknown":
+                        # The remote answered but does not have the commit
+                        failure_class = "missing_commit"
+                    raise CloneError(f"Base commit {base_commit[:12]} not available from origin", failure_class)
             
             # Reset to base commit
-            if not reset_git_repo(target_folder, base_commit):
-                raise Exception("Failed to reset to base commit")
+            if not reset_git_repo(target_folder, base_commit, metrics, sparse):
+                raise CloneError("Failed to reset to base commit")
             
+            apply_git_profile(repo, target_folder, metrics)
             return target_folder
             
         except Exception as e:
             error_msg = str(e)
+            failure_class = getattr(e, "failure_class", "unknown")
             print(f"{Fore.RED}  ✗ Attempt {attempt + 1} failed: {error_msg}{Style.RESET_ALL}")
             
             # Provide helpful error messages
-            if "128" in error_msg or "Filename too long" in error_msg:
+            if failure_class == "long_path":
                 print(f"{Fore.YELLOW}  💡 This might be a Windows long path issue.{Style.RESET_ALL}")
                 print(f"{Fore.YELLOW}     Run: git config --global core.longpaths true{Style.RESET_ALL}")
+            elif failure_class == "auth":
+                print(f"{Fore.YELLOW}  💡 Check that the repository is public and git credentials are not prompting.{Style.RESET_ALL}")
             
             # Clean up failed attempt
             if os.path.exists(target_folder):
                 safe_rmtree(target_folder)
             
-            # Last attempt failed
-            if attempt == max_retries - 1:
-                raise Exception(f"Clone failed after {max_retries} attempts: {error_msg}")
+            # Last attempt failed, or retrying cannot help
+            if attempt == max_retries - 1 or failure_class not in TRANSIENT_FAILURES:
+                raise CloneError(f"Clone failed after {attempt + 1} attempts: {error_msg}", failure_class)
             
             # Wait before retry
             time.sleep(2)
     
-    raise Exception("Clone failed - max retries exceeded")
+    raise CloneError("Clone failed - max retries exceeded")
 
 
-def get_git_diff(repo_path):
-    """Get git diff of changes in standard unified diff format."""
+class DiffCapture:
+    """A captured patch spooled to a temporary file"""
+
+    def __init__(self, path=None, size=0, sha256=None, truncated=False, aborted=False, files_dropped=0):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.truncated = truncated
+        self.aborted = aborted
+        self.files_dropped = files_dropped
+
+    @property
+    def has_changes(self):
+        return self.size > 0 and not self.aborted
+
+    def read_text(self):
+        """Load the whole patch (only for callers that really need a str)."""
+        if not self.has_changes:
+            return ""
+        with open(self.path, "rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+
+    def iter_text(self, chunk_size=DIFF_CHUNK_SIZE):
+        """Yield the patch as decoded text chunks."""
+        if not self.has_changes:
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield decoder.decode(chunk)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.path = None
+
+
+def capture_git_diff(repo_path, max_bytes=None, oversize_mode=None):
+    """Stream the staged diff of a workspace into a temp file.
+
+    Size and sha256 are computed while streaming. Above max_bytes the patch
+    is either truncated at the last whole-file boundary (so it still applies)
+    or, with oversize_mode="abort", git is stopped and nothing is kept.
+    """
+    max_bytes = MAX_PATCH_BYTES if max_bytes is None else max_bytes
+    oversize_mode = oversize_mode or OVERSIZE_PATCH_MODE
+    capture = DiffCapture()
+    process = None
+    done = False
     try:
         # Add all changes, excluding lockfiles to keep patches clean
-        run_git_command(["git", "add", "-A", "--", ":!package-lock.json", ":!yarn.lock", ":!pnpm-lock.yaml"], repo_path)
-        
-        # Check if there are changes
-        result = run_git_command(["git", "diff", "--cached", "--exit-code"], repo_path)
+        run_git_command(["git", "add", "-A", "--"] + LOCKFILE_PATHSPECS, repo_path)
         
+        # --quiet only sets the exit code, it never renders the diff
+        result = run_git_command(["git", "diff", "--cached", "--quiet"], repo_path)
         if result and result.returncode == 0:
-            # No changes
-            return ""
+            return capture
         
-        # Get the diff in unified format
-        result = run_git_command(["git", "diff", "--cached"], repo_path)
-        diff = result.stdout if result else ""
+        hasher = hashlib.sha256()
+        boundary = (0, hasher.copy())  # last "diff --git" offset and hash state before it
+        size = 0
+        at_line_start = True
         
-        # Reset staging area but keep working directory changes
-        run_git_command(["git", "reset", "HEAD"], repo_path)
+        fd, capture.path = tempfile.mkstemp(prefix="swe_patch_", suffix=".diff")
+        with os.fdopen(fd, "wb") as out:  # owns fd from here, whatever fails below
+            process = subprocess.Popen(
+                wrap_command(["git", "diff", "--cached"]),
+                cwd=repo_path,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+            while True:
+                # Bounded readline keeps huge minified lines from being buffered whole
+                chunk = process.stdout.readline(DIFF_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if at_line_start and chunk.startswith(b"diff --git "):
+                    boundary = (size, hasher.copy())
+                at_line_start = chunk.endswith(b"\n")
+                
+                if max_bytes and size + len(chunk) > max_bytes:
+                    if oversize_mode == "abort":
+                        capture.aborted = True
+                    else:
+                        capture.truncated = True
+                        out.truncate(boundary[0])
+                        size, hasher = boundary[0], boundary[1]
+                    break
+                
+                out.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
         
-        return diff
+        if capture.truncated:
+            # Count the files that did not make it in, without keeping them
+            capture.files_dropped = 1
+            for line in iter(lambda: process.stdout.readline(DIFF_CHUNK_SIZE), b""):
+                if line.startswith(b"diff --git "):
+                    capture.files_dropped += 1
+        
+        process.stdout.close()
+        if capture.aborted:
+            process.kill()
+        process.wait(timeout=GIT_COMMAND_TIMEOUT)
+        
+        if capture.truncated and size == 0:
+            # Even the first file is over the cap - nothing usable is left
+            capture.aborted = True
+        capture.size = 0 if capture.aborted else size
+        capture.sha256 = hasher.hexdigest() if capture.size else None
+        done = True
+        return capture
     except Exception as e:
         print(f"{Fore.RED}Error getting diff: {e}{Style.RESET_ALL}")
-        return ""
+        return DiffCapture()
+    finally:
+        if not done:
+            # Failed or interrupted: no git left running, no temp file left behind
+            if process and process.poll() is None:
+                process.kill()
+            capture.cleanup()
+        # Reset staging area but keep working directory changes
+        run_git_command(["git", "reset", "-q", "HEAD"], repo_path)
+
+
+def get_git_diff(repo_path):
+    """Get git diff of changes in standard unified diff format."""
+    capture = capture_git_diff(repo_path, max_bytes=0)
+    try:
+        return capture.read_text()
+    finally:
+        capture.cleanup()
 
 # ========================== DATASET OPERATIONS ==========================
 
-def load_dataset_swe_polybench():
-    """Load SWE-PolyBench dataset from HuggingFace."""
+def load_dataset_swe_polybench(positions=None):
+    """Load SWE-PolyBench from the local snapshot (only the given row positions if set)."""
     print(f"{Fore.YELLOW}📂 Loading SWE-PolyBench dataset...{Style.RESET_ALL}")
-    dataset = load_dataset("AmazonScience/SWE-PolyBench", split="test")
-    
-    # Convert to list of dicts
-    problems = []
-    for item in dataset:
-        problems.append(dict(item))
-    
-    return problems
+    # First use downloads from HuggingFace; refresh with dataset_snapshot.py
+    return load_problems(positions)
 
 
-def get_completed_instances(predictions_file):
-    """Get completed instance IDs and details."""
+def get_completed_instances(predictions_file, model_name=None):
+    """Get completed instance IDs and details (only for model_name when given)."""
     completed = {}
     if not os.path.exists(predictions_file):
         return completed
@@ -422,6 +1286,8 @@ def get_completed_instances(predictions_file):
                 try:
                     entry = json.loads(line)
                     instance_id = entry.get("instance_id")
+                    if model_name and entry.get("model_name_or_path") != model_name:
+                        continue
                     if instance_id:
                         completed[instance_id] = {
                             "model_patch": entry.get("model_patch", ""),
@@ -440,9 +1306,75 @@ def save_prediction(predictions_file, output):
         f.write(json.dumps(output) + "\n")
         f.flush()
 
+
+def save_prediction_streaming(predictions_file, entry, capture):
+    """Append a prediction whose model_patch is streamed from a DiffCapture.
+
+    Produces the same line json.dumps would, without holding the patch
+    as one string.
+    """
+    entry = {k: v for k, v in entry.items() if k != "model_patch"}
+    entry["model_patch"] = ""
+    head = json.dumps(entry)
+    if not head.endswith('""}'):
+        raise RuntimeError(f"Cannot stream model_patch into {head[-40:]!r}")
+    with open(predictions_file, "a", encoding="utf-8") as f:
+        f.write(head[:-2])
+        for text in capture.iter_text():
+            f.write(json.dumps(text)[1:-1])
+        f.write('"}\n')
+        f.flush()
+
+
+_metrics_file_lock = Lock()
+
+
+def save_instance_metrics(metrics_file, metrics, session_metrics=None):
+    """Append per-instance timing and transfer metrics (and fold them into the live session metrics)."""
+    if session_metrics is not None:
+        session_metrics.observe_instance(metrics)
+    try:
+        metrics["finished"] = datetime.now().isoformat()
+        transfers = metrics.get("transfers", [])
+        metrics["bytes_received"] = sum(t["bytes"] for t in transfers)
+        line = json.dumps(metrics) + "\n"
+        with _metrics_file_lock:  # headless workers finish concurrently
+            with open(metrics_file, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not save metrics: {e}{Style.RESET_ALL}")
+
+
+def save_skipped_metrics(metrics_file, metrics, reason, usage=None, session_metrics=None):
+    """Record an instance that ends without a prediction (outcome skipped:<reason>), unless already recorded."""
+    if metrics.get("outcome"):
+        return
+    metrics["outcome"] = f"skipped:{reason}"
+    if usage:
+        usage.record(metrics)
+    save_instance_metrics(metrics_file, metrics, session_metrics)
+
 # ========================== PROBLEM FORMATTING ==========================
 
-def format_problem(problem_data):
+def find_relevant_files(problem_data, repo_path, k=CODE_CONTEXT_FILES, metrics=None):
+    """Rank files of the base commit against the problem statement; [] on any failure."""
+    if k <= 0:
+        return []
+    start = time.time()
+    try:
+        index = index_for_commit(problem_data.get("repo", "unknown"), repo_path,
+                                 problem_data["base_commit"], CODE_INDEX_DIR)
+        hits = index.query(problem_data.get("problem_statement", ""), k)
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not search the code index: {e}{Style.RESET_ALL}")
+        return []
+    if metrics is not None:
+        metrics["code_index_seconds"] = round(time.time() - start, 3)
+        metrics["code_index_mode"] = index.data.get("mode")
+    return hits
+
+
+def format_problem(problem_data, relevant_files=None):
     """Format problem into prompt for AI agent."""
     problem_text = problem_data.get("problem_statement", "No problem statement available")
     hints = problem_data.get("hints_text", "")
@@ -461,6 +1393,14 @@ PROBLEM STATEMENT:
 HINTS:
 {hints}"""
     
+    if relevant_files:
+        lines = []
+        for hit in relevant_files:
+            symbols = f" ({', '.join(hit['symbols'])})" if hit["symbols"] else ""
+            lines.append(f"- {hit['path']}{symbols}")
+        prompt += "\n\nPOSSIBLY RELEVANT FILES (keyword search of the repository, may be incomplete):\n"
+        prompt += "\n".join(lines)
+    
     return prompt
 
 
@@ -476,74 +1416,104 @@ def save_prompt_to_file(prompt, filename="current_problem.txt"):
 # ========================== TRAJECTORY HANDLING ==========================
 
 def save_trajectory(instance_id, trajectories_dir, auto_mode=False):
-    """Save agent's reasoning trajectory."""
+    """Save agent's reasoning trajectory to the compressed archive in trajectories_dir.
+
+    Pasted lines are streamed into the archive as they are entered; export the
+    per-instance markdown files with: python trajectory_archive.py export
+    """
+    archive = TrajectoryArchive(trajectories_dir)
     if auto_mode:
-        trajectory_content = f"Automatic trajectory for {instance_id}\nAgent completed the task."
-    else:
-        print(f"\n{Fore.CYAN}{'─'*70}{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}📝 SAVE TRAJECTORY{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}{'─'*70}{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}Paste the agent's conversation/reasoning below.{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}Press ENTER twice on empty line to finish, or type 'skip' to skip.{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}{'─'*70}{Style.RESET_ALL}\n")
-        
-        lines = []
-        empty_line_count = 0
+        archive.add_auto(instance_id)
+        return archive.archive_file
+    
+    print(f"\n{Fore.CYAN}{'─'*70}{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}📝 SAVE TRAJECTORY{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}{'─'*70}{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}Paste the agent's conversation/reasoning below.{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}Press ENTER twice on empty line to finish, or type 'skip' to skip.{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}{'─'*70}{Style.RESET_ALL}\n")
+    
+    with archive.writer(instance_id) as writer:
+        wrote_any = False
+        held_blank_lines = []   # held back until more text follows
         
         while True:
             try:
                 line = input()
                 
-                if line.strip().lower() == 'skip' and not lines:
-                    trajectory_content = "Trajectory skipped by user."
+                if line.strip().lower() == 'skip' and not wrote_any:
+                    writer.write("Trajectory skipped by user.")
+                    wrote_any = True
                     break
                 
                 if line.strip() == "":
-                    empty_line_count += 1
-                    if empty_line_count >= 2:
-                        if lines and lines[-1] == "":
-                            lines.pop()
+                    held_blank_lines.append(line)
+                    if len(held_blank_lines) >= 2:
                         break
-                    lines.append(line)
                 else:
-                    empty_line_count = 0
-                    lines.append(line)
+                    pieces = held_blank_lines + [line]
+                    writer.write(("\n" if wrote_any else "") + "\n".join(pieces))
+                    held_blank_lines = []
+                    wrote_any = True
             except EOFError:
                 break
         
-        trajectory_content = '\n'.join(lines) if lines else "Agent solved the problem and made necessary code changes."
+        if not wrote_any:
+            writer.write("Agent solved the problem and made necessary code changes.")
     
-    # Save trajectory
-    traj_file = trajectories_dir / f"{instance_id}.md"
-    with open(traj_file, 'w', encoding='utf-8') as f:
-        f.write(f"# Trajectory: {instance_id}\n\n")
-        f.write(f"**Timestamp:** {datetime.now().isoformat()}\n\n")
-        f.write(trajectory_content)
+    print(f"\n{Fore.GREEN}✓ Trajectory saved to {archive.archive_file}{Style.RESET_ALL}")
     
-    if not auto_mode:
-        print(f"\n{Fore.GREEN}✓ Trajectory saved to {traj_file}{Style.RESET_ALL}")
-    
-    return traj_file
+    return archive.archive_file
 
 # ========================== VALIDATION ==========================
 
+def validate_patch_lines(lines):
+    """Validate diff format from an iterable of lines (strict single-pass parse)."""
+    return check_patch(lines)
+
+
 def validate_patch(patch_content):
     """Validate that the patch is in proper diff format."""
     if not patch_content or not patch_content.strip():
         return True, "Empty patch (no changes)"
     
-    lines = patch_content.split('\n')
-    has_diff_header = any(line.startswith('diff --git') for line in lines[:10])
-    has_hunks = any(line.startswith('@@') for line in lines)
-    
-    if not has_diff_header and not has_hunks:
-        return False, "Patch doesn't appear to be in valid diff format"
+    return check_patch(patch_content)
+
+
+def validate_patch_capture(capture):
+    """Validate a DiffCapture by streaming its temp file."""
+    if not capture.has_changes:
+        return True, "Empty patch (no changes)"
     
-    return True, "Valid diff format"
+    with open(capture.path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        return validate_patch_lines(f)
+
+
+def find_impacted_tests(problem_data, repo_path, capture, metrics=None):
+    """Test files that import (directly or not) what the patch touches; [] on any failure."""
+    if not capture.has_changes:
+        return []
+    start = time.time()
+    try:
+        index = impacted_tests.index_for_commit(problem_data.get("repo", "unknown"), repo_path,
+                                                problem_data["base_commit"], TEST_IMPACT_DIR)
+        with open(capture.path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            tests = index.tests_for_paths(impacted_tests.patch_paths(f))
+    except Exception as e:
+        print(f"{Fore.YELLOW}Warning: Could not look up impacted tests: {e}{Style.RESET_ALL}")
+        return []
+    if metrics is not None:
+        metrics["impacted_tests"] = len(tests)
+        metrics["test_impact_seconds"] = round(time.time() - start, 3)
+    return [test for test, _ in tests]
 
 # ========================== MAIN FUNCTION ==========================
 
 def main():
+    global STALL_WINDOW, STALL_MIN_RATE, MAX_PATCH_BYTES, OVERSIZE_PATCH_MODE, CODE_CONTEXT_FILES
+    global IMPACTED_TESTS_SHOWN, GIT_PROFILE_MODE, SPARSE_MODE, PREFETCH_WINDOW, RESOURCE_ACCOUNTING
+    global CHECKPOINT_INTERVAL
+    
     parser = argparse.ArgumentParser(
         description='SWE-PolyBench AI Runner v2.4 - Separate Instance Folders + Auto-Resume',
         formatter_class=argparse.RawDescriptionHelpFormatter
@@ -557,12 +1527,78 @@ def main():
     parser.add_argument('--resume', action='store_true')
     parser.add_argument('--reset-state', action='store_true')
     parser.add_argument('--skip-clone-errors', action='store_true')
+    parser.add_argument('--reset-clone-cache', action='store_true',
+                        help='Forget known-bad commits and close all repo circuit breakers')
+    parser.add_argument('--stall-window', type=int, default=STALL_WINDOW,
+                        help='Abort clone/fetch after this many seconds of low throughput')
+    parser.add_argument('--stall-min-rate', type=int, default=STALL_MIN_RATE,
+                        help='Bytes/s below which a clone/fetch counts as stalled')
+    parser.add_argument('--max-patch-bytes', type=int, default=MAX_PATCH_BYTES,
+                        help='Cap on captured patch size (0 = unlimited)')
+    parser.add_argument('--oversize-patch', choices=['truncate', 'abort'], default=OVERSIZE_PATCH_MODE,
+                        help='Drop trailing files or reject patches above the cap')
+    parser.add_argument('--patch-store', default=None, metavar='DIR',
+                        help='Save patches to a content-addressed store instead of predictions.jsonl '
+                             '(export with: python patch_store.py export)')
+    parser.add_argument('--where', default=None, metavar='EXPR',
+                        help='Only run instances matching e.g. "language=TypeScript,task_category=Bug Fix" '
+                             '(within --start/--end; see selection_index.py)')
+    parser.add_argument('--rebuild-selection-index', action='store_true',
+                        help='Rebuild the metadata selection index before applying --where')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve live session metrics on http://127.0.0.1:PORT/metrics (and /metrics.json)')
+    parser.add_argument('--metrics-textfile', default=None, metavar='PATH',
+                        help='Periodically write live session metrics to an OpenMetrics text file')
+    parser.add_argument('--code-context', type=int, default=CODE_CONTEXT_FILES, metavar='K',
+                        help='List the K files that best match the problem statement in the prompt (0 = off)')
+    parser.add_argument('--impacted-tests', type=int, default=IMPACTED_TESTS_SHOWN, metavar='N',
+                        help='After capture, list up to N test files that import the patched files (0 = off)')
+    parser.add_argument('--git-profile', choices=['auto', 'off'], default=GIT_PROFILE_MODE,
+                        help='Measure and apply faster git settings per repo (see git_tuning.py)')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Check out only directories relevant to each problem, expanding on demand')
+    parser.add_argument('--prefetch', type=int, default=PREFETCH_WINDOW, metavar='N',
+                        help='Fetch base commits of the next N instances together, one request per repo (0 = off)')
+    parser.add_argument('--resources', choices=['auto', 'cgroup', 'proc', 'psutil', 'off'], default=RESOURCE_ACCOUNTING,
+                        help='Per-instance CPU/memory/I/O/disk accounting backend (see resource_accounting.py)')
+    parser.add_argument('--checkpoint-interval', type=int, default=CHECKPOINT_INTERVAL, metavar='SECONDS',
+                        help='Checkpoint the agent\'s edits this often, restored after a crash (0 = off)')
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    
+    STALL_WINDOW = args.stall_window
+    STALL_MIN_RATE = args.stall_min_rate
+    MAX_PATCH_BYTES = args.max_patch_bytes
+    OVERSIZE_PATCH_MODE = args.oversize_patch
+    CODE_CONTEXT_FILES = args.code_context
+    IMPACTED_TESTS_SHOWN = args.impacted_tests
+    GIT_PROFILE_MODE = args.git_profile
+    SPARSE_MODE = args.sparse
+    PREFETCH_WINDOW = args.prefetch
+    RESOURCE_ACCOUNTING = args.resources
+    CHECKPOINT_INTERVAL = args.checkpoint_interval
     
     WORKING_FOLDER = "swe_polybench_workspace"
     PREDICTIONS_FILE = "predictions.jsonl"
     TRAJECTORIES_DIR = Path(WORKING_FOLDER) / "trajectories"
+    patch_store = PatchStore(args.patch_store) if args.patch_store else None
+    predictions_target = args.patch_store or PREDICTIONS_FILE
+    
+    # Live metrics are only collected when something will read them
+    session_metrics = None
+    metrics_exporters = []
+    if args.metrics_port is not None or args.metrics_textfile:
+        session_metrics = SessionMetrics(WORKING_FOLDER)
+        session_metrics.start_disk_sampler()
+        if args.metrics_port is not None:
+            server = MetricsServer(session_metrics, args.metrics_port)
+            metrics_exporters.append(server)
+            print(f"{Fore.CYAN}📈 Live metrics: {server.url}{Style.RESET_ALL}")
+        if args.metrics_textfile:
+            metrics_exporters.append(TextfileExporter(session_metrics, args.metrics_textfile))
+            print(f"{Fore.CYAN}📈 Live metrics file: {args.metrics_textfile}{Style.RESET_ALL}")
     
     # Initialize state manager
     state_mgr = StateManager()
@@ -572,6 +1608,11 @@ def main():
         state_mgr.state = StateManager().load_state()
         state_mgr.save_state()
     
+    clone_cache = CloneFailureCache()
+    if args.reset_clone_cache:
+        print(f"{Fore.YELLOW}Resetting clone failure cache...{Style.RESET_ALL}")
+        clone_cache.reset()
+    
     print(f"{Fore.CYAN}{'='*70}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}🤖 SWE-PolyBench AI Runner v2.4{Style.RESET_ALL}")
     print(f"{Fore.CYAN}📊 Model: {args.model_name}{Style.RESET_ALL}")
@@ -590,21 +1631,44 @@ def main():
     os.makedirs(WORKING_FOLDER, exist_ok=True)
     TRAJECTORIES_DIR.mkdir(exist_ok=True)
     
-    # Load dataset
+    # Load dataset (with --where only the metadata index now, selected rows later)
+    selection = None
     try:
-        dataset = load_dataset_swe_polybench()
-        total_instances = len(dataset)
-        print(f"{Fore.GREEN}✓ Loaded {total_instances} problems from SWE-PolyBench{Style.RESET_ALL}\n")
+        if args.where:
+            selection = SelectionIndex.load_or_build(SELECTION_INDEX_FILE, rebuild=args.rebuild_selection_index)
+            selection.select(args.where)  # fail fast on a bad expression
+            dataset = None
+            total_instances = selection.rows
+            print(f"{Fore.GREEN}✓ Loaded selection index for {total_instances} problems{Style.RESET_ALL}\n")
+        else:
+            dataset = load_dataset_swe_polybench()
+            total_instances = len(dataset)
+            print(f"{Fore.GREEN}✓ Loaded {total_instances} problems from SWE-PolyBench{Style.RESET_ALL}\n")
+    except ValueError as e:
+        print(f"{Fore.RED}❌ {e}{Style.RESET_ALL}")
+        return
     except Exception as e:
         print(f"{Fore.RED}❌ Failed to load dataset: {e}{Style.RESET_ALL}")
         traceback.print_exc()
         return
     
+    # Positions in the state belong to the dataset revision they were saved under
+    snapshot = DatasetSnapshot()
+    if snapshot.exists:
+        saved_revision = state_mgr.state.get("dataset_revision")
+        if remap_state(state_mgr.state, snapshot):
+            print(f"{Fore.YELLOW}🔁 State remapped from dataset revision {saved_revision} to "
+                  f"{snapshot.revision} (by instance_id){Style.RESET_ALL}")
+        state_mgr.save_state()
+    
     # Check for resume
+    resume_deferred = []
     if args.resume and state_mgr.can_resume():
         print(f"{Fore.YELLOW}📁 RESUME MODE{Style.RESET_ALL}")
         print(f"Last processed: {state_mgr.state['last_instance_id']}")
         print(f"Instance index: {state_mgr.state['last_instance_index'] + 1}/{total_instances}")
+        if state_mgr.resume_index() == state_mgr.state['last_instance_index']:
+            print(f"Interrupted before it was saved; starting with it again (its checkpointed edits are restored)")
         print(f"Total solved: {state_mgr.state['total_solved']}")
         
         if state_mgr.state['cloning_errors']:
@@ -618,19 +1682,26 @@ def main():
         
         # AUTO-RESUME: Skip prompt, go straight to work
         # Calculate new range
-        args.start = state_mgr.state['last_instance_index'] + 1
+        args.start = state_mgr.resume_index()
         args.end = state_mgr.state['range']['end'] if state_mgr.state['range']['end'] is not None else total_instances - 1
         args.loop = True
+        resume_deferred = list(state_mgr.state.get('deferred_instance_ids', []))
         
         # Show NEW adjusted range clearly
-        remaining = args.end - args.start + 1
+        remaining = max(args.end - args.start + 1, 0)
         print(f"{Fore.GREEN}✓ Auto-resuming from instance {args.start + 1}{Style.RESET_ALL}")
-        print(f"{Fore.GREEN}✓ NEW range: {args.start + 1} to {args.end + 1} ({remaining} instances remaining){Style.RESET_ALL}\n")
+        print(f"{Fore.GREEN}✓ NEW range: {args.start + 1} to {args.end + 1} ({remaining} instances remaining){Style.RESET_ALL}")
+        if resume_deferred:
+            print(f"{Fore.GREEN}✓ {len(resume_deferred)} deferred instance(s) re-queued at the end{Style.RESET_ALL}")
+        print()
     elif args.resume and not state_mgr.can_resume():
         print(f"{Fore.YELLOW}⚠️  Resume requested but no previous state found{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}Starting fresh...{Style.RESET_ALL}\n")
         args.resume = False
     
+    # Range done but deferred instances still wait for their retry
+    deferred_only = bool(resume_deferred) and args.start > args.end
+    
     # Interactive range selection if not provided and not resuming
     if not args.resume and (args.start is None or args.end is None):
         print(f"{Fore.CYAN}{'='*70}{Style.RESET_ALL}")
@@ -692,22 +1763,40 @@ def main():
                 return
     
     # Final validation (for both resume and non-resume)
-    if args.start < 0 or args.start >= total_instances:
+    if not deferred_only and (args.start < 0 or args.start >= total_instances):
         print(f"{Fore.RED}❌ Invalid start index after processing. Must be 1-{total_instances}{Style.RESET_ALL}")
         return
     
-    if args.end < args.start or args.end >= total_instances:
+    if (args.end < args.start and not deferred_only) or args.end >= total_instances:
         print(f"{Fore.RED}❌ Invalid end index after processing. Must be {args.start+1}-{total_instances}{Style.RESET_ALL}")
         return
     
     # Update state with range
     state_mgr.set_range(args.start, args.end)
     
-    # Filter dataset to range
-    dataset_range = dataset[args.start:args.end+1]
+    # Filter dataset to range: (dataset position, problem) pairs
+    if deferred_only:
+        work_list = []
+    elif selection:
+        positions = selection.select(args.where, args.start, args.end)
+        work_list = list(zip(positions, load_dataset_swe_polybench(positions))) if positions else []
+    else:
+        work_list = list(enumerate(dataset[args.start:args.end+1], args.start))
+    
+    # Deferred by the earlier session, which stopped before their retry: they go last, retried as deferred
+    queued_ids = {p["instance_id"] for _, p in work_list}
+    carried_ids = [i for i in resume_deferred if i not in queued_ids]
+    if carried_ids:
+        all_ids = selection.instance_ids if selection else [p["instance_id"] for p in dataset]
+        where = {iid: position for position, iid in enumerate(all_ids)}
+        positions = sorted(where[iid] for iid in carried_ids if iid in where)
+        problems = load_dataset_swe_polybench(positions) if selection else [dataset[i] for i in positions]
+        work_list += list(zip(positions, problems))
     
     # Show CURRENT working range (updated label for clarity)
-    print(f"{Fore.CYAN}📍 Working Range: {args.start+1} to {args.end+1} ({len(dataset_range)} instances){Style.RESET_ALL}")
+    print(f"{Fore.CYAN}📍 Working Range: {args.start+1} to {args.end+1} ({len(work_list)} instances){Style.RESET_ALL}")
+    if selection:
+        print(f"{Fore.CYAN}🔎 Selection: {args.where}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}🔄 Mode: {'Auto-loop' if args.loop else 'Manual (one at a time)'}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}📝 Trajectory: {'Auto-generate' if args.skip_trajectory else 'Manual input'}{Style.RESET_ALL}")
     if args.skip_clone_errors:
@@ -715,12 +1804,17 @@ def main():
     print()
     
     # Show existing predictions summary
-    completed = get_completed_instances(PREDICTIONS_FILE)
+    # Completion is per model, so another model can be run over the same range
+    if patch_store:
+        completed = patch_store.completed(args.model_name)
+    else:
+        completed = get_completed_instances(PREDICTIONS_FILE, args.model_name)
     if completed:
         completed_with_changes = sum(1 for v in completed.values() if v['has_changes'])
         completed_empty = len(completed) - completed_with_changes
-        print(f"{Fore.YELLOW}📊 Existing predictions: {len(completed)} total ({completed_with_changes} with changes, {completed_empty} empty){Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}📊 Existing predictions for {args.model_name}: {len(completed)} total ({completed_with_changes} with changes, {completed_empty} empty){Style.RESET_ALL}")
     
+    profiler.suspend()
     input(f"\n{Fore.GREEN}Press ENTER to start...{Style.RESET_ALL}")
     print()
     
@@ -730,10 +1824,28 @@ def main():
     instances_empty = 0
     instances_skipped = 0
     clone_errors = 0
+    instances_deferred = 0
     
-    for idx, problem in enumerate(dataset_range):
-        current_index = args.start + idx
+    # Work queue; known-bad instances are pushed to the back instead of stalling the session
+    queue = deque(work_list)
+    deferred_ids = set(carried_ids)
+    fetch_planner = make_fetch_planner() if PREFETCH_WINDOW > 0 else None
+    prefetched_ids = set()
+    accountant = ResourceAccountant(RESOURCE_ACCOUNTING) if RESOURCE_ACCOUNTING != "off" else None
+    usage = None
+    
+    while queue:
+        if usage:
+            usage.end()  # instance left early (skip/retry); don't leave a phase running
+            usage = None
+        profiler.begin("schedule")
+        if session_metrics:
+            session_metrics.set_queue_depth(len(queue))
+        current_index, problem = queue.popleft()
         instance_id = problem["instance_id"]
+        is_deferred = instance_id in deferred_ids
+        if is_deferred:
+            state_mgr.clear_deferred(instance_id)  # this is its retry; quitting during it puts it back
         
         # Skip if already completed
         if instance_id in completed:
@@ -743,6 +1855,44 @@ def main():
         
         repo = problem["repo"]
         base_commit = problem["base_commit"]
+        
+        # Reaching the end of the last prefetch window: plan the next one
+        if fetch_planner and instance_id not in prefetched_ids:
+            window = [problem] + [p for _, p in list(queue)
+                                  if p["instance_id"] not in completed and p["instance_id"] not in prefetched_ids]
+            window = window[:PREFETCH_WINDOW]
+            prefetched_ids.update(p["instance_id"] for p in window)
+            prefetch_base_commits(fetch_planner, window)
+        
+        # Defer instances whose clone is known to fail
+        defer_reason = clone_cache.should_defer(repo, base_commit)
+        if defer_reason:
+            if not is_deferred:
+                print(f"{Fore.YELLOW}⏩ Deferring {instance_id} to end of queue: {defer_reason}{Style.RESET_ALL}\n")
+                deferred_ids.add(instance_id)
+                state_mgr.mark_deferred(instance_id)
+                queue.append((current_index, problem))
+                instances_deferred += 1
+                continue
+            if args.skip_clone_errors:
+                print(f"{Fore.YELLOW}⏭️  Skipping {instance_id}: {defer_reason}{Style.RESET_ALL}\n")
+                save_skipped_metrics(METRICS_FILE, {"instance_id": instance_id, "index": current_index, "repo": repo},
+                                     "clone_blocked", session_metrics=session_metrics)
+                instances_skipped += 1
+                continue
+            print(f"{Fore.YELLOW}⚠️  {instance_id} still blocked: {defer_reason}{Style.RESET_ALL}")
+            choice = input(f"{Fore.YELLOW}Try cloning anyway? (y/n/q): {Style.RESET_ALL}").strip().lower()
+            if choice == 'q':
+                state_mgr.mark_interrupted(instance_id, is_deferred)
+                print(f"{Fore.YELLOW}Exiting... Progress saved.{Style.RESET_ALL}")
+                break
+            if choice != 'y':
+                print(f"{Fore.YELLOW}Skipping instance{Style.RESET_ALL}\n")
+                save_skipped_metrics(METRICS_FILE, {"instance_id": instance_id, "index": current_index, "repo": repo},
+                                     "clone_blocked", session_metrics=session_metrics)
+                instances_skipped += 1
+                continue
+        
         problem_lang = problem.get("language", "Unknown")
         task_category = problem.get("task_category", "Unknown")
         
@@ -756,27 +1906,65 @@ def main():
         print(f"{Fore.YELLOW}🏷️  Category: {task_category}{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}{'='*70}{Style.RESET_ALL}\n")
         
-        # Update state
-        state_mgr.update_progress(instance_id, current_index)
+        # Update state (deferred instances sit behind the resume point already)
+        if not is_deferred:
+            state_mgr.update_progress(instance_id, current_index)
+        
+        metrics = {
+            "instance_id": instance_id,
+            "index": current_index,
+            "repo": repo,
+            "started": datetime.now().isoformat()
+        }
+        usage = accountant.instance(instance_id, repo_path) if accountant else None
         
         try:
             # Prepare repository with retry
             print(f"{Fore.CYAN}🔧 Preparing repository...{Style.RESET_ALL}")
             
             try:
-                clone_repo_with_retry(repo, base_commit, repo_path)
+                clone_start = time.time()
+                if usage:
+                    usage.begin("clone")
+                profiler.begin("clone", instance_id)
+                clone_repo_with_retry(repo, base_commit, repo_path, metrics=metrics,
+                                      sparse_problem=problem if SPARSE_MODE else None)
+                metrics["clone_seconds"] = round(time.time() - clone_start, 2)
+                clone_cache.record_success(repo, base_commit)
                 print(f"{Fore.GREEN}✓ Repository ready at: {repo_path}{Style.RESET_ALL}\n")
             except Exception as clone_error:
                 clone_errors += 1
                 error_msg = str(clone_error)
-                print(f"{Fore.RED}❌ CLONE FAILED: {error_msg}{Style.RESET_ALL}\n")
+                failure_class = getattr(clone_error, "failure_class", "unknown")
+                print(f"{Fore.RED}❌ CLONE FAILED [{failure_class}]: {error_msg}{Style.RESET_ALL}\n")
                 
                 
                 # Track the error
                 state_mgr.mark_clone_error(repo, instance_id, error_msg)
                 state_mgr.mark_failed(instance_id, f"Clone error: {error_msg}")
+                clone_cache.record_failure(repo, base_commit, failure_class, error_msg)
+                metrics["clone_seconds"] = round(time.time() - clone_start, 2)
+                metrics["outcome"] = f"clone_error:{failure_class}"
+                if usage:
+                    usage.record(metrics)
+                    usage = None
+                save_instance_metrics(METRICS_FILE, metrics, session_metrics)
                 
-                # Always prompt user - don't auto-skip to prevent gaps
+                # First failure: move on and come back at the end of the queue
+                if not is_deferred:
+                    print(f"{Fore.YELLOW}⏩ Deferring {instance_id} to end of queue{Style.RESET_ALL}\n")
+                    deferred_ids.add(instance_id)
+                    state_mgr.mark_deferred(instance_id)
+                    queue.append((current_index, problem))
+                    instances_deferred += 1
+                    continue
+                
+                if args.skip_clone_errors:
+                    print(f"{Fore.YELLOW}Skipping instance (--skip-clone-errors){Style.RESET_ALL}\n")
+                    instances_skipped += 1
+                    continue
+                
+                # Already deferred once - let the user decide, don't auto-skip to prevent gaps
                 print(f"{Fore.CYAN}Options:{Style.RESET_ALL}")
                 print(f"{Fore.CYAN}  r - Retry this instance{Style.RESET_ALL}")
                 print(f"{Fore.CYAN}  s - Skip and continue{Style.RESET_ALL}")
@@ -787,13 +1975,16 @@ def main():
                 if choice == 'r':
                     try:
                         print(f"\n{Fore.CYAN}Retrying clone...{Style.RESET_ALL}")
-                        clone_repo_with_retry(repo, base_commit, repo_path, max_retries=2)
+                        clone_repo_with_retry(repo, base_commit, repo_path, max_retries=2, metrics=metrics,
+                                              sparse_problem=problem if SPARSE_MODE else None)
+                        clone_cache.record_success(repo, base_commit)
                         print(f"{Fore.GREEN}✓ Repository ready at: {repo_path}{Style.RESET_ALL}\n")
                     except:
                         print(f"{Fore.RED}❌ Retry failed. Skipping instance.{Style.RESET_ALL}\n")
                         instances_skipped += 1
                         continue
                 elif choice == 'q':
+                    state_mgr.mark_interrupted(instance_id, is_deferred)
                     print(f"{Fore.YELLOW}Exiting... Progress saved.{Style.RESET_ALL}")
                     break
                 else:
@@ -801,8 +1992,18 @@ def main():
                     instances_skipped += 1
                     continue
             
+            # Edits of an earlier, interrupted run of this instance
+            restore_checkpoint(repo_path, instance_id, base_commit, metrics)
+            
             # Format problem
-            prompt = format_problem(problem)
+            if usage:
+                usage.begin("prompt")
+            profiler.begin("prompt", instance_id)
+            relevant_files = find_relevant_files(problem, repo_path, CODE_CONTEXT_FILES, metrics)
+            if relevant_files:
+                print(f"{Fore.GREEN}✓ Added {len(relevant_files)} relevant files to the prompt "
+                      f"({metrics['code_index_seconds']}s, {metrics['code_index_mode']} index){Style.RESET_ALL}")
+            prompt = format_problem(problem, relevant_files)
             
             # Try to copy to clipboard
             print(f"{Fore.CYAN}📋 Copying problem to clipboard...{Style.RESET_ALL}")
@@ -831,6 +2032,15 @@ def main():
                 print(f"{Fore.CYAN}3. Open '{prompt_file}' and copy the problem to your agent{Style.RESET_ALL}")
             print(f"{Fore.CYAN}4. Let the agent solve the problem and make code changes{Style.RESET_ALL}")
             print(f"{Fore.CYAN}5. Press ENTER here when agent has finished{Style.RESET_ALL}")
+            expander = start_sparse_expander(repo_path, base_commit)
+            checkpointer = start_checkpointer(repo_path, base_commit, instance_id)
+            if usage:
+                # The agent runs outside the runner (IDE, terminal): sampled by workspace
+                usage.begin("agent", external=True)
+            profiler.suspend()  # nothing of ours runs while the agent works
+            if expander:
+                print(f"{Fore.CYAN}   Sparse checkout: new files outside it are picked up automatically; "
+                      f"run 'git sparse-checkout add <dir>' to see more of the tree{Style.RESET_ALL}")
             print(f"{Fore.CYAN}{'─'*70}{Style.RESET_ALL}\n")
             
             # Wait for user
@@ -838,22 +2048,43 @@ def main():
             try:
                 input(f"{Fore.GREEN}⏸️  Press ENTER when done (or Ctrl+C to quit): {Style.RESET_ALL}")
             except KeyboardInterrupt:
+                finish_checkpointer(checkpointer, final=True)
+                state_mgr.mark_interrupted(instance_id, is_deferred)
                 print(f"\n\n{Fore.YELLOW}🛑 Interrupted by user{Style.RESET_ALL}")
-                print(f"{Fore.CYAN}Progress saved. Run with --resume to continue from instance {current_index + 1}{Style.RESET_ALL}")
+                print(f"{Fore.CYAN}Progress saved. Run with --resume to continue from instance {state_mgr.resume_index() + 1}{Style.RESET_ALL}")
                 break
             
             time_taken = time.time() - start_time
             
             print(f"\n{Fore.YELLOW}⚙️  Processing results...{Style.RESET_ALL}")
             
-            # Get diff
-            diff = get_git_diff(repo_path)
+            if usage:
+                usage.begin("diff")
+            profiler.begin("diff", instance_id)
+            finish_checkpointer(checkpointer, metrics)
+            finish_sparse_expander(expander, metrics)
+            
+            # Get diff (spooled to a temp file, never fully held in memory)
+            diff_start = time.time()
+            capture = capture_git_diff(repo_path)
+            metrics["diff_seconds"] = round(time.time() - diff_start, 3)
+            
+            if capture.aborted:
+                print(f"{Fore.RED}❌ Patch exceeds {format_bytes(MAX_PATCH_BYTES)} (--max-patch-bytes), not saving{Style.RESET_ALL}")
+                capture.cleanup()
+                state_mgr.mark_failed(instance_id, f"Patch larger than {MAX_PATCH_BYTES} bytes")
+                reset_git_repo(repo_path, base_commit)
+                save_skipped_metrics(METRICS_FILE, metrics, "patch_too_large", usage, session_metrics)
+                instances_skipped += 1
+                if not args.loop:
+                    break
+                continue
             
             # Validate the diff
-            is_valid, validation_msg = validate_patch(diff)
+            is_valid, validation_msg = validate_patch_capture(capture)
             
             # Check if changes were made
-            has_changes = bool(diff and diff.strip())
+            has_changes = capture.has_changes
             
             if not has_changes:
                 print(f"{Fore.RED}❌ NO CHANGES DETECTED!{Style.RESET_ALL}")
@@ -872,30 +2103,36 @@ def main():
                     print(f"\n{Fore.YELLOW}Please make changes in the repository and press ENTER when ready...{Style.RESET_ALL}")
                     input(f"{Fore.GREEN}⏸️  Press ENTER when changes are made: {Style.RESET_ALL}")
                     
-                    diff = get_git_diff(repo_path)
-                    has_changes = bool(diff and diff.strip())
+                    capture = capture_git_diff(repo_path)
+                    has_changes = capture.has_changes
                     
                     if not has_changes:
+                        capture.cleanup()
+                        capture = DiffCapture()
                         print(f"{Fore.RED}❌ Still no changes detected.{Style.RESET_ALL}")
                         if not args.allow_empty:
                             print(f"{Fore.YELLOW}Skipping instance. Use --allow-empty to force save.{Style.RESET_ALL}")
                             state_mgr.mark_failed(instance_id, "No changes after retry")
                             reset_git_repo(repo_path, base_commit)
+                            save_skipped_metrics(METRICS_FILE, metrics, "no_changes", usage, session_metrics)
                             instances_skipped += 1
                             if not args.loop:
                                 break
                             continue
                     else:
-                        print(f"{Fore.GREEN}✓ Changes detected: {len(diff)} bytes{Style.RESET_ALL}")
+                        print(f"{Fore.GREEN}✓ Changes detected: {capture.size} bytes{Style.RESET_ALL}")
                 
                 elif choice == 'q':
+                    state_mgr.mark_interrupted(instance_id, is_deferred)
                     print(f"{Fore.YELLOW}Exiting... Progress saved.{Style.RESET_ALL}")
                     break
                 
                 elif choice == 's':
                     print(f"{Fore.YELLOW}Skipping this instance{Style.RESET_ALL}")
                     state_mgr.mark_failed(instance_id, "Skipped by user")
+                    discard_checkpoint(repo_path, instance_id)
                     reset_git_repo(repo_path, base_commit)
+                    save_skipped_metrics(METRICS_FILE, metrics, "by_user", usage, session_metrics)
                     instances_skipped += 1
                     if not args.loop:
                         break
@@ -903,31 +2140,57 @@ def main():
                 
                 elif choice == 'a' or args.allow_empty:
                     print(f"{Fore.YELLOW}Saving empty patch (agent couldn't solve)...{Style.RESET_ALL}")
-                    diff = ""
+                    capture = DiffCapture()
                     has_changes = False
                 
                 else:
                     print(f"{Fore.YELLOW}Invalid choice. Skipping instance.{Style.RESET_ALL}")
                     state_mgr.mark_failed(instance_id, "Invalid user choice")
                     reset_git_repo(repo_path, base_commit)
+                    save_skipped_metrics(METRICS_FILE, metrics, "by_user", usage, session_metrics)
                     instances_skipped += 1
                     if not args.loop:
                         break
                     continue
             else:
-                print(f"{Fore.GREEN}✓ Changes detected: {len(diff)} bytes{Style.RESET_ALL}")
+                print(f"{Fore.GREEN}✓ Changes detected: {capture.size} bytes (sha256 {capture.sha256[:12]}){Style.RESET_ALL}")
+                if capture.truncated:
+                    print(f"{Fore.YELLOW}⚠️  Patch over {format_bytes(MAX_PATCH_BYTES)}: dropped {capture.files_dropped} trailing file(s){Style.RESET_ALL}")
                 if not is_valid:
                     print(f"{Fore.YELLOW}⚠️  Warning: {validation_msg}{Style.RESET_ALL}")
+                if IMPACTED_TESTS_SHOWN > 0:
+                    tests = find_impacted_tests(problem, repo_path, capture, metrics)
+                    if tests:
+                        print(f"{Fore.CYAN}🧪 Tests exercising the patched files ({len(tests)}):{Style.RESET_ALL}")
+                        for test in tests[:IMPACTED_TESTS_SHOWN]:
+                            print(f"{Fore.CYAN}   {test}{Style.RESET_ALL}")
+                        if len(tests) > IMPACTED_TESTS_SHOWN:
+                            print(f"{Fore.CYAN}   ... and {len(tests) - IMPACTED_TESTS_SHOWN} more{Style.RESET_ALL}")
             
             # Save prediction
             prediction_entry = {
                 "instance_id": instance_id,
-                "model_name_or_path": args.model_name,
-                "model_patch": diff
+                "model_name_or_path": args.model_name
             }
             
-            save_prediction(PREDICTIONS_FILE, prediction_entry)
-            print(f"{Fore.GREEN}✓ Prediction saved to {PREDICTIONS_FILE}{Style.RESET_ALL}")
+            if patch_store:
+                patch_store.add_prediction_file(instance_id, args.model_name, capture.path if has_changes else None)
+            else:
+                save_prediction_streaming(PREDICTIONS_FILE, prediction_entry, capture)
+            capture.cleanup()
+            discard_checkpoint(repo_path, instance_id)
+            print(f"{Fore.GREEN}✓ Prediction saved to {predictions_target}{Style.RESET_ALL}")
+            
+            metrics["agent_seconds"] = round(time_taken, 2)
+            metrics["diff_bytes"] = capture.size
+            metrics["diff_sha256"] = capture.sha256
+            metrics["diff_truncated"] = capture.truncated
+            metrics["outcome"] = "solved" if has_changes else "empty"
+            if usage:
+                usage.record(metrics)
+                usage = None
+            save_instance_metrics(METRICS_FILE, metrics, session_metrics)
+            profiler.begin("cleanup", instance_id)
             
             # Update stats
             instances_processed += 1
@@ -955,12 +2218,13 @@ def main():
                 break
             
             # Small delay
-            if args.loop and idx < len(dataset_range) - 1:
+            if args.loop and queue:
                 time.sleep(0.5)
             
         except KeyboardInterrupt:
+            state_mgr.mark_interrupted(instance_id, is_deferred)
             print(f"\n\n{Fore.YELLOW}🛑 Interrupted by user{Style.RESET_ALL}")
-            print(f"{Fore.CYAN}Progress saved. Run with --resume to continue from instance {current_index + 1}{Style.RESET_ALL}")
+            print(f"{Fore.CYAN}Progress saved. Run with --resume to continue from instance {state_mgr.resume_index() + 1}{Style.RESET_ALL}")
             break
             
         except Exception as e:
@@ -970,15 +2234,19 @@ def main():
             state_mgr.mark_failed(instance_id, str(e))
             
             if args.allow_empty:
-                save_prediction(PREDICTIONS_FILE, {
-                    "instance_id": instance_id,
-                    "model_name_or_path": args.model_name,
-                    "model_patch": ""
-                })
+                if patch_store:
+                    patch_store.add_prediction(instance_id, args.model_name, "")
+                else:
+                    save_prediction(PREDICTIONS_FILE, {
+                        "instance_id": instance_id,
+                        "model_name_or_path": args.model_name,
+                        "model_patch": ""
+                    })
                 print(f"{Fore.YELLOW}⚠️  Saved empty prediction due to error{Style.RESET_ALL}")
                 instances_empty += 1
             else:
                 print(f"{Fore.YELLOW}⚠️  Not saving prediction (use --allow-empty to force){Style.RESET_ALL}")
+                save_skipped_metrics(METRICS_FILE, metrics, "error", usage, session_metrics)
                 instances_skipped += 1
             
             if args.loop:
@@ -989,6 +2257,7 @@ def main():
                 break
     
     # Final summary
+    profiler.begin("summary")
     print(f"\n{Fore.CYAN}{'='*70}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}📊 SESSION COMPLETE{Style.RESET_ALL}")
     print(f"{Fore.CYAN}{'='*70}{Style.RESET_ALL}")
@@ -997,9 +2266,22 @@ def main():
     print(f"{Fore.YELLOW}  - Empty patches: {instances_empty}{Style.RESET_ALL}")
     print(f"{Fore.RED}  - Skipped: {instances_skipped}{Style.RESET_ALL}")
     print(f"{Fore.RED}  - Clone errors: {clone_errors}{Style.RESET_ALL}")
+    if instances_deferred:
+        print(f"{Fore.YELLOW}  - Deferred (known-bad clones): {instances_deferred}{Style.RESET_ALL}")
+    if fetch_planner:
+        print(f"{Fore.CYAN}📥 Prefetch: {describe_fetch_plan(fetch_planner.stats)}{Style.RESET_ALL}")
+    if accountant:
+        if usage:
+            usage.end()
+        lines = accountant.summary_lines()
+        if lines:
+            print(f"\n{Fore.CYAN}🖥️  Resources per phase:{Style.RESET_ALL}")
+            for line in lines:
+                print(f"{Fore.CYAN}   {line}{Style.RESET_ALL}")
+        accountant.close()
     
-    final_completed = get_completed_instances(PREDICTIONS_FILE)
-    print(f"\n{Fore.CYAN}📁 Total in predictions file: {len(final_completed)}{Style.RESET_ALL}")
+    final_completed = patch_store.completed(args.model_name) if patch_store else get_completed_instances(PREDICTIONS_FILE, args.model_name)
+    print(f"\n{Fore.CYAN}📁 Total in {predictions_target}: {len(final_completed)}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}📂 Trajectories saved to: {TRAJECTORIES_DIR}{Style.RESET_ALL}")
     
     if state_mgr.state['failed_instances']:
@@ -1008,10 +2290,19 @@ def main():
     if state_mgr.state['cloning_errors']:
         print(f"{Fore.RED}⚠️  Cloning errors: {len(state_mgr.state['cloning_errors'])}{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}   Run 'git config --global core.longpaths true' if on Windows{Style.RESET_ALL}")
-    
+
+    if session_metrics:
+        session_metrics.set_queue_depth(len(queue))
+        snapshot = session_metrics.snapshot()
+        print(f"{Fore.CYAN}📈 Throughput: {snapshot['instances_per_hour']} instances/hour{Style.RESET_ALL}")
+        session_metrics.stop()
+        for exporter in metrics_exporters:
+            exporter.stop()
+
     print(f"\n{Fore.GREEN}{'='*70}{Style.RESET_ALL}")
     print(f"{Fore.GREEN}🎉 All done! Use --resume to continue if needed.{Style.RESET_ALL}")
     print(f"{Fore.GREEN}{'='*70}{Style.RESET_ALL}\n")
+    profiler.finish()
 
 
 if __name__ == "__main__":
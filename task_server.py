@@ -0,0 +1,529 @@
+"""
+Local task server: prepared instances handed to agents and operators on request
+
+Instead of pushing one problem at a time through the clipboard, the
+server keeps a queue of prepared instances (workspace cloned, prompt
+rendered) and any number of consumers pull from it:
+
+    POST /next       {"consumer": "alice", "wait": 30}
+                     -> {"lease": ..., "instance_id", "workspace", "prompt", "prompt_file", "expires"}
+                        204 when nothing is ready within wait, 410 once the run is over
+    POST /heartbeat  {"lease": ...}                 extend the lease
+    POST /done       {"lease": ..., "status": "completed" | "failed", "log": "optional trajectory"}
+                     -> the server captures the diff, saves the prediction, resets
+                        the workspace and answers with the outcome
+    POST /release    {"lease": ...}                 give the instance back untouched
+    GET  /status
+
+A lease that is neither renewed nor finished within --lease seconds
+expires: the lease is revoked (later heartbeats and /done get 409), then the
+instance's own runner thread resets the workspace and puts it back at the
+front of the queue, up to --attempts times. Diff capture, validation and saving are
+the HeadlessRunner's (headless_runner.py), so predictions, patch store,
+trajectories and metrics look the same as from the other runners.
+
+  python task_server.py serve --start 200 --end 299 --prepared 4 --lease 1800
+  python task_server.py serve --start 1 --end 50 --listen unix:/tmp/swe_tasks.sock
+  python task_server.py next --consumer alice          # prints the workspace and prompt
+  python task_server.py done <lease> --log agent.log
+  python task_server.py status
+  curl -s -X POST 127.0.0.1:8765/next -d '{"wait": 30}'
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import argparse
+import http.client
+from collections import deque
+from threading import Thread, Condition, Event
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse
+
+from colorama import Fore, Style
+
+from selection_index import SelectionIndex
+from headless_runner import AgentExecutor, HeadlessRunner, print_event
+from swe_polybench_tester import (reset_git_repo, load_dataset_swe_polybench, CODE_CONTEXT_FILES, CHECKPOINT_INTERVAL,
+                                  IMPACTED_TESTS_SHOWN)
+
+DEFAULT_LISTEN = "127.0.0.1:8765"
+LEASE_SECONDS = 1800
+MAX_ATTEMPTS = 3
+PREPARED_INSTANCES = 2
+REAPER_INTERVAL = 5
+DONE_WAIT = 600  # seconds a /done request waits for the diff to be saved
+
+
+# ========================== QUEUE ==========================
+
+class Task:
+    """One prepared instance waiting for, or leased to, a consumer"""
+
+    def __init__(self, problem, workspace, prompt_file, log_file):
+        self.problem = problem
+        self.instance_id = problem["instance_id"]
+        self.workspace = workspace
+        self.prompt_file = prompt_file
+        self.log_file = log_file
+        self.lease = None
+        self.consumer = None
+        self.deadline = None
+        self.attempts = 0
+        self.offered = time.time()
+        self.outcome = None      # what the consumer (or the reaper) reported
+        self.events = {}         # runner events after the agent step, by name
+        self.returned = Event()  # outcome is set
+        self.finished = Event()  # diff captured, prediction saved, workspace reset
+
+    def describe(self):
+        with open(self.prompt_file, "r", encoding="utf-8") as f:
+            prompt = f.read()
+        return {
+            "lease": self.lease,
+            "instance_id": self.instance_id,
+            "repo": self.problem["repo"],
+            "base_commit": self.problem["base_commit"],
+            "workspace": os.path.abspath(self.workspace),
+            "prompt_file": os.path.abspath(self.prompt_file),
+            "prompt": prompt,
+            "attempt": self.attempts,
+            "expires": self.deadline,
+        }
+
+
+class TaskQueue:
+    """Ready tasks plus leases; take() blocks until a task is ready or the queue closes"""
+
+    def __init__(self, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.closed = False
+        self.tasks = {}          # instance_id -> Task, until finished
+        self.counts = {"leased": 0, "done": 0, "expired": 0, "released": 0}
+        self._ready = deque()
+        self._leases = {}
+        self._cond = Condition()
+
+    def offer(self, task, front=False):
+        with self._cond:
+            if self.closed:
+                task.outcome = {"status": "cancelled"}
+                task.returned.set()
+                return
+            self.tasks[task.instance_id] = task
+            task.lease = task.consumer = task.deadline = None
+            if front:
+                self._ready.appendleft(task)
+            else:
+                self._ready.append(task)
+            self._cond.notify()
+
+    def take(self, consumer=None, wait=0):
+        """Lease the next ready task (None if none within wait seconds or the queue is closed)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready or self.closed, timeout=max(0, wait))
+            if not self._ready or self.closed:
+                return None
+            task = self._ready.popleft()
+            task.lease = uuid.uuid4().hex
+            task.consumer = consumer
+            task.attempts += 1
+            task.deadline = time.time() + self.lease_seconds
+            self._leases[task.lease] = task
+            self.counts["leased"] += 1
+            return task
+
+    def heartbeat(self, lease):
+        with self._cond:
+            task = self._leases.get(lease)
+            if task:
+                task.deadline = time.time() + self.lease_seconds
+            return task
+
+    def complete(self, lease, outcome):
+        with self._cond:
+            task = self._leases.pop(lease, None)
+            if task is None:
+                return None
+            task.outcome = outcome
+            self.counts["done"] += 1
+        task.returned.set()
+        return task
+
+    def release(self, lease):
+        """Take a task back from its consumer; the caller resets and re-offers it."""
+        with self._cond:
+            task = self._leases.pop(lease, None)
+            if task:
+                self.counts["released"] += 1
+            return task
+
+    def expired(self, now=None):
+        """Tasks whose lease ran out, removed from the leases."""
+        now = now or time.time()
+        with self._cond:
+            tasks = [task for task in self._leases.values() if task.deadline < now]
+            for task in tasks:
+                del self._leases[task.lease]
+                self.counts["expired"] += 1
+            return tasks
+
+    def get(self, instance_id):
+        with self._cond:
+            return self.tasks.get(instance_id)
+
+    def finish(self, task):
+        with self._cond:
+            self.tasks.pop(task.instance_id, None)
+
+    def close(self):
+        """No more tasks: waiting consumers get 410, open tasks are returned as cancelled."""
+        with self._cond:
+            self.closed = True
+            open_tasks = [task for task in self.tasks.values() if not task.returned.is_set()]
+            self._ready.clear()
+            self._leases.clear()
+            self._cond.notify_all()
+        for task in open_tasks:
+            task.outcome = {"status": "cancelled"}
+            task.returned.set()
+
+    def status(self):
+        with self._cond:
+            return {
+                "ready": [task.instance_id for task in self._ready],
+                "leased": [{"instance_id": task.instance_id, "consumer": task.consumer, "attempt": task.attempts,
+                            "expires_in": round(task.deadline - time.time())} for task in self._leases.values()],
+                "closed": self.closed,
+                "counts": dict(self.counts),
+            }
+
+
+# ========================== EXECUTOR ==========================
+
+class RemoteExecutor(AgentExecutor):
+    """Offers the prepared workspace on the task queue and waits for a consumer to finish it"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        Thread(target=self._reap, daemon=True).start()
+
+    def _reap(self):
+        while not self.queue.closed:
+            # The lease is already revoked; the task's runner thread resets and re-queues it
+            for task in self.queue.expired():
+                if task.attempts >= self.queue.max_attempts:
+                    print(f"{Fore.RED}⏱  {task.instance_id}: lease expired {task.attempts} times, giving up{Style.RESET_ALL}")
+                    task.outcome = {"status": "timeout"}
+                else:
+                    print(f"{Fore.YELLOW}⏱  {task.instance_id}: lease of {task.consumer} expired, re-queued{Style.RESET_ALL}")
+                    task.outcome = {"status": "expired"}
+                task.returned.set()
+            time.sleep(REAPER_INTERVAL)
+
+    def release(self, lease):
+        task = self.queue.release(lease)
+        if task:
+            task.outcome = {"status": "released"}
+            task.returned.set()
+        return task
+
+    def run(self, problem, workspace, prompt_file, log_file):
+        task = Task(problem, workspace, prompt_file, log_file)
+        start = time.time()
+        self.queue.offer(task)
+        while True:
+            task.returned.wait()
+            if task.outcome["status"] not in ("expired", "released"):
+                break
+            # Nobody holds a lease on the workspace any more: reset it here, then offer it again
+            task.returned.clear()
+            reset_git_repo(workspace, problem["base_commit"])
+            self.queue.offer(task, front=True)
+        status = task.outcome["status"]
+        return {
+            "status": status if status in ("completed", "timeout") else "failed",
+            # Half-done edits must not be saved as a prediction; the instance stays open and the
+            # runner checkpoints them before its reset, so they are restored when it is served again
+            "unsaved": status in ("cancelled", "timeout"),
+            "seconds": round(time.time() - start, 2),
+            "consumer": task.consumer,
+            "attempts": task.attempts,
+        }
+
+
+# ========================== HTTP ==========================
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)  # BaseHTTPRequestHandler expects a (host, port) address
+
+
+class TaskServer:
+    """HTTP (TCP or Unix socket) front end of a TaskQueue"""
+
+    def __init__(self, queue, executor, listen=DEFAULT_LISTEN):
+        self.queue = queue
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code, payload=None):
+                body = json.dumps(payload, indent=2).encode("utf-8") if payload is not None else b""
+                self.send_response(code)
+                if body:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/status":
+                    self._reply(200, queue.status())
+                else:
+                    self._reply(404, {"error": "unknown endpoint"})
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "body must be JSON"})
+                    return
+                endpoint = self.path.rstrip("/")
+                if endpoint == "/next":
+                    task = queue.take(body.get("consumer") or self.client_address[0],
+                                      float(body.get("wait", 0)))
+                    if task:
+                        self._reply(200, task.describe())
+                    else:
+                        self._reply(410 if queue.closed else 204)
+                    return
+                if endpoint not in ("/done", "/heartbeat", "/release"):
+                    self._reply(404, {"error": "unknown endpoint"})
+                    return
+                lease = body.get("lease")
+                if endpoint == "/heartbeat":
+                    task = queue.heartbeat(lease)
+                    reply = task and {"instance_id": task.instance_id, "expires": task.deadline}
+                elif endpoint == "/release":
+                    task = executor.release(lease)
+                    reply = task and {"instance_id": task.instance_id, "status": "re-queued"}
+                else:
+                    task = server.complete(lease, body)
+                    reply = task and server.outcome(task)
+                if task is None:
+                    self._reply(409, {"error": "unknown or expired lease"})
+                else:
+                    self._reply(200, reply)
+
+            def log_message(self, *args):
+                pass  # keep the runner console clean
+
+        if listen.startswith("unix:"):
+            self.path = listen[len("unix:"):]
+            if os.path.exists(self.path):
+                os.remove(self.path)  # left over by a server that was killed
+            self.server = UnixHTTPServer(self.path, Handler)
+            self.url = listen
+        else:
+            self.path = None
+            host, _, port = listen.rpartition(":")
+            self.server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+            self.url = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        # stop() waits for in-flight replies (long polls get their 410) instead of dropping them
+        self.server.daemon_threads = False
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def complete(self, lease, body):
+        """Record a consumer's /done; the runner then captures and saves the diff."""
+        task = self.queue.heartbeat(lease)
+        if task is None:
+            return None
+        if body.get("log"):
+            with open(task.log_file, "a", encoding="utf-8") as f:
+                f.write(body["log"])
+        status = body.get("status", "completed")
+        return self.queue.complete(lease, {"status": status if status in ("completed", "failed") else "failed"})
+
+    def outcome(self, task):
+        """Wait for the runner to save the instance, then summarize what was kept."""
+        task.finished.wait(DONE_WAIT)
+        diff = task.events.get("diff_captured", {})
+        finished = task.events.get("instance_finished", {})
+        return {
+            "instance_id": task.instance_id,
+            "status": finished.get("status", "pending"),
+            "saved": "prediction_saved" in task.events,
+            "diff_bytes": diff.get("size"),
+            "valid": diff.get("valid"),
+            "validation": diff.get("validation"),
+        }
+
+    def on_event(self, event, payload):
+        """Runner listener: attach post-agent events to the task and wake /done."""
+        task = self.queue.get(payload["instance_id"])
+        if task is None:
+            return
+        if event in ("diff_captured", "prediction_saved", "instance_failed", "instance_finished"):
+            task.events[event] = payload
+        if event == "instance_finished":
+            self.queue.finish(task)
+            task.finished.set()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ========================== CLIENT ==========================
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def call(server, method, path, payload=None, timeout=None):
+    """(status, JSON reply or None) from a task server at http://host:port or unix:/path."""
+    timeout = timeout or DONE_WAIT + 30
+    if server.startswith("unix:"):
+        conn = UnixHTTPConnection(server[len("unix:"):], timeout)
+    else:
+        url = urlparse(server if "://" in server else "http://" + server)
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, json.loads(data) if data else None
+
+
+# ========================== CLI ==========================
+
+def serve(args):
+    if args.where:
+        positions = SelectionIndex.load_or_build().select(args.where, args.start - 1, args.end - 1)
+        problems = load_dataset_swe_polybench(positions) if positions else []
+    else:
+        problems = load_dataset_swe_polybench()[args.start - 1:args.end]
+
+    queue = TaskQueue(args.lease, args.attempts)
+    executor = RemoteExecutor(queue)
+    server = TaskServer(queue, executor, args.listen)
+    # Workers are instances in flight: prepared and waiting, or leased
+    runner = HeadlessRunner(executor, model_name=args.model_name, patch_store=args.patch_store,
+                            max_workers=args.prepared, on_event=print_event, code_context=args.code_context,
+                            sparse=args.sparse, prefetch=args.prefetch, resources=args.resources,
+                            checkpoint_interval=args.checkpoint_interval, impacted_tests=args.impacted_tests)
+    runner.add_listener(server.on_event)
+    print(f"{Fore.CYAN}📡 Task server on {server.url}: {len(problems)} instances, "
+          f"{args.prepared} prepared at a time, lease {args.lease}s{Style.RESET_ALL}")
+
+    results = []
+    worker = Thread(target=lambda: results.extend(runner.run(problems)), daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}Stopping: open instances stay unsolved, their checkpointed edits are restored next run{Style.RESET_ALL}")
+        runner.stop()  # before close, so queued instances are not cloned just to be cancelled
+        queue.close()
+        worker.join()
+    queue.close()
+    server.stop()
+
+    by_status = {}
+    for result in results:
+        by_status[result["status"]] = by_status.get(result["status"], 0) + 1
+    print(f"\n{Fore.CYAN}📊 {len(results)} instances: {by_status}; leases {queue.counts}{Style.RESET_ALL}")
+    if runner.accountant:
+        runner.accountant.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local task server for agents and operators')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Prepare instances and hand them out')
+    serve_parser.add_argument('--start', type=int, required=True, help='First instance (1-indexed)')
+    serve_parser.add_argument('--end', type=int, required=True, help='Last instance (1-indexed)')
+    serve_parser.add_argument('--where', default=None, help='Metadata filter, e.g. "language=TypeScript"')
+    serve_parser.add_argument('--listen', default=DEFAULT_LISTEN, help='host:port or unix:/path/to.sock')
+    serve_parser.add_argument('--prepared', type=int, default=PREPARED_INSTANCES,
+                              help='Instances in flight (prepared or leased); at least the number of consumers')
+    serve_parser.add_argument('--lease', type=int, default=LEASE_SECONDS, help='Seconds before an unrenewed lease expires')
+    serve_parser.add_argument('--attempts', type=int, default=MAX_ATTEMPTS, help='Leases per instance before giving up')
+    serve_parser.add_argument('--model-name', default='cora')
+    serve_parser.add_argument('--patch-store', default=None)
+    serve_parser.add_argument('--code-context', type=int, default=CODE_CONTEXT_FILES)
+    serve_parser.add_argument('--sparse', action='store_true')
+    serve_parser.add_argument('--prefetch', action='store_true')
+    serve_parser.add_argument('--resources', choices=['auto', 'cgroup', 'proc', 'psutil', 'off'], default='auto')
+    serve_parser.add_argument('--checkpoint-interval', type=int, default=CHECKPOINT_INTERVAL,
+                              help='Seconds between checkpoints of leased workspaces (0 = off)')
+    serve_parser.add_argument('--impacted-tests', type=int, default=IMPACTED_TESTS_SHOWN,
+                              help='Find the test files that import the patched files (0 = off)')
+
+    client_parsers = {
+        'next': subparsers.add_parser('next', help='Lease the next instance'),
+        'done': subparsers.add_parser('done', help='Finish a lease; the server saves the diff'),
+        'heartbeat': subparsers.add_parser('heartbeat', help='Extend a lease'),
+        'release': subparsers.add_parser('release', help='Hand a lease back'),
+        'status': subparsers.add_parser('status', help='Queue and lease overview'),
+    }
+    for name, sub in client_parsers.items():
+        sub.add_argument('--server', default=DEFAULT_LISTEN, help='host:port or unix:/path/to.sock')
+        if name in ('done', 'heartbeat', 'release'):
+            sub.add_argument('lease')
+    client_parsers['next'].add_argument('--consumer', default=None)
+    client_parsers['next'].add_argument('--wait', type=float, default=30)
+    client_parsers['next'].add_argument('--json', action='store_true', help='Print the raw reply')
+    client_parsers['done'].add_argument('--failed', action='store_true', help='Agent gave up (a diff is still kept)')
+    client_parsers['done'].add_argument('--log', default=None, help='Trajectory file to attach')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+        return
+
+    if args.command == 'status':
+        status, reply = call(args.server, "GET", "/status")
+    elif args.command == 'next':
+        status, reply = call(args.server, "POST", "/next", {"consumer": args.consumer, "wait": args.wait})
+        if status == 200 and not args.json:
+            print(f"{Fore.CYAN}📋 {reply['instance_id']} (lease {reply['lease']}){Style.RESET_ALL}")
+            print(f"Workspace: {reply['workspace']}")
+            print(f"Prompt:    {reply['prompt_file']}")
+            print(f"Finish:    python task_server.py done {reply['lease']}")
+            return
+        if status in (204, 410):
+            print(f"{Fore.YELLOW}{'Nothing ready yet' if status == 204 else 'Run is over'}{Style.RESET_ALL}")
+            return
+    else:
+        payload = {"lease": args.lease}
+        if args.command == 'done':
+            payload["status"] = "failed" if args.failed else "completed"
+            if args.log:
+                with open(args.log, "r", encoding="utf-8", errors="replace") as f:
+                    payload["log"] = f.read()
+        status, reply = call(args.server, "POST", f"/{args.command}", payload)
+    color = Fore.GREEN if status == 200 else Fore.RED
+    print(f"{color}{json.dumps(reply, indent=2)}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
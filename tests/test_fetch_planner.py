@@ -0,0 +1,116 @@
+"""
+FetchPlanner against local bare repos served over file:// (no network)
+
+The planner's transfer hook is where the runner plugs in its stall-aware
+wrapper; here it counts the fetch commands and, for one test, plays a server
+that refuses fetch-by-sha for a commit it only serves through its branches.
+
+  python -m pytest tests/test_fetch_planner.py -q
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetch_planner import FetchPlanner, commit_ref, missing_commits
+
+UNKNOWN_COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+class FetchPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="fetch_planner_test_")
+        work = os.path.join(self.root, "work")
+        os.makedirs(work)
+        git(work, "init", "-q")
+        for n in range(6):
+            with open(os.path.join(work, "app.py"), "w") as f:
+                f.write(f"VERSION = {n}\n")
+            git(work, "add", "-A")
+            git(work, "-c", "user.name=test", "-c", "user.email=test@localhost", "commit", "-q", "-m", f"v{n}")
+        self.commits = git(work, "rev-list", "--reverse", "HEAD").split()
+        git(self.root, "clone", "-q", "--bare", work, os.path.join(self.root, "octo__proj.git"))
+        self.fetches = []
+        self.refused = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def transfer(self, cmd, cwd):
+        self.fetches.append(cmd)
+        refused = [c for c in self.refused if any(arg.startswith(f"+{c}:") for arg in cmd)]
+        if refused:
+            # What upload-pack answers for a want it will not serve by sha
+            return subprocess.CompletedProcess(cmd, 128, "",
+                                               f"fatal: remote error: upload-pack: not our ref {refused[0]}\n")
+        return subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+
+    def planner(self):
+        return FetchPlanner(os.path.join(self.root, "cache"),
+                            remote_template="file://" + self.root + "/{owner}__{name}.git",
+                            transfer=self.transfer, log=lambda msg: None)
+
+    def problems(self, commits):
+        return [{"repo": "octo/proj", "base_commit": c} for c in commits]
+
+    def test_missing_commits_are_fetched_in_one_request(self):
+        planner = self.planner()
+        wanted = self.commits[1:]
+        # Several instances share a base commit; each commit is asked for once
+        self.assertEqual(planner.prefetch(self.problems(wanted + wanted[:2])), {})
+
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(planner.stats["round_trips"], 1)
+        self.assertEqual(planner.stats["per_instance_round_trips"], len(wanted))
+        self.assertEqual(planner.stats["fetched"], len(wanted))
+        cache = planner.cache_path("octo/proj")
+        self.assertEqual(missing_commits(cache, wanted), [])
+        self.assertEqual(git(cache, "rev-parse", commit_ref(wanted[0])), wanted[0])
+
+        # Everything is cached now: no request at all
+        self.assertEqual(planner.prefetch(self.problems(wanted)), {})
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(planner.stats["present"], len(wanted))
+
+    def test_refused_sha_falls_back_to_branches(self):
+        planner = self.planner()
+        # Newest wanted commit, so the other fetches do not bring it along as history
+        self.refused = {self.commits[3]}
+        self.assertEqual(planner.prefetch(self.problems(self.commits[1:4])), {})
+
+        # The refused request, the retry without the refused sha, then all branches
+        self.assertEqual(len(self.fetches), 3)
+        self.assertNotIn(f"+{self.commits[3]}:{commit_ref(self.commits[3])}", self.fetches[1])
+        self.assertIn("+refs/heads/*:refs/heads/*", self.fetches[2])
+        self.assertEqual(planner.stats["fetched"], 2)
+        self.assertEqual(planner.stats["fallback"], 1)
+        self.assertEqual(planner.stats["unavailable"], 0)
+        cache = planner.cache_path("octo/proj")
+        self.assertEqual(git(cache, "rev-parse", commit_ref(self.commits[3])), self.commits[3])
+
+    def test_commit_the_server_does_not_have_is_unavailable(self):
+        planner = self.planner()
+        self.assertEqual(planner.prefetch(self.problems([self.commits[1], UNKNOWN_COMMIT])),
+                         {"octo/proj": [UNKNOWN_COMMIT]})
+        self.assertEqual(planner.stats["fetched"], 1)
+        self.assertEqual(planner.stats["unavailable"], 1)
+        self.assertEqual(planner.stats["failed"], 0)
+
+        # Given up on for the session: not requested again
+        fetches = len(self.fetches)
+        self.assertEqual(planner.prefetch(self.problems([UNKNOWN_COMMIT])), {"octo/proj": [UNKNOWN_COMMIT]})
+        self.assertEqual(len(self.fetches), fetches)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+run_git_transfer against a real git server behind a throttled proxy
+
+A local bare repo is served by `git daemon`; clones go through a TCP proxy
+that paces the server's bytes and can stop sending mid-pack, so the stall
+detection and the transfer metrics are checked end to end.
+
+  python -m pytest tests/test_git_transfer.py -q
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+from threading import Thread, Event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe_polybench_tester import run_git_transfer
+
+REPO_BYTES = 1024 * 1024   # incompressible content, so the pack is about this big
+RATE = 256 * 1024          # bytes/s the proxy lets through
+STALL_WINDOW = 2
+MIN_RATE = 1024
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+class ThrottledProxy:
+    """Forwards to upstream, pacing server->client bytes; stall_after stops them entirely"""
+
+    def __init__(self, upstream_port, rate, stall_after=None):
+        self.upstream_port = upstream_port
+        self.rate = rate
+        self.stall_after = stall_after
+        self.closed = Event()
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self.closed.is_set():
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port))
+            Thread(target=self._pump, args=(client, upstream, None), daemon=True).start()
+            Thread(target=self._pump, args=(upstream, client, self.rate), daemon=True).start()
+
+    def _pump(self, src, dst, rate):
+        sent = 0
+        start = time.time()
+        try:
+            while not self.closed.is_set():
+                data = src.recv(4096)
+                if not data:
+                    break
+                if rate is not None and self.stall_after is not None and sent + len(data) > self.stall_after:
+                    self.closed.wait()  # connection stays open, nothing more arrives
+                    break
+                dst.sendall(data)
+                sent += len(data)
+                if rate is not None:
+                    ahead = sent / rate - (time.time() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.closed.set()
+        self.server.close()
+
+
+class GitTransferTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp(prefix="git_transfer_test_")
+        work = os.path.join(cls.root, "work")
+        os.makedirs(work)
+        git(work, "init", "-q")
+        for i in range(4):
+            with open(os.path.join(work, f"blob{i}.bin"), "wb") as f:
+                f.write(os.urandom(REPO_BYTES // 4))
+        git(work, "add", "-A")
+        git(work, "-c", "user.name=test", "-c", "user.email=test@localhost", "commit", "-q", "-m", "data")
+        git(cls.root, "clone", "-q", "--bare", work, os.path.join(cls.root, "repo.git"))
+
+        cls.daemon_port = free_port()
+        cls.daemon = subprocess.Popen(
+            ["git", "daemon", "--export-all", "--reuseaddr", f"--base-path={cls.root}",
+             "--listen=127.0.0.1", f"--port={cls.daemon_port}", cls.root],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for_port(cls.daemon_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.daemon.terminate()
+        cls.daemon.wait()
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    def clone(self, proxy, name):
+        metrics = {}
+        dest = os.path.join(self.root, name)
+        start = time.time()
+        result = run_git_transfer(["git", "clone", f"git://127.0.0.1:{proxy.port}/repo.git", dest],
+                                  self.root, timeout=120, metrics=metrics, label="clone",
+                                  stall_window=STALL_WINDOW, min_rate=MIN_RATE)
+        return result, metrics["transfers"][-1], time.time() - start
+
+    def test_throttled_transfer_completes_and_records_rate(self):
+        proxy = ThrottledProxy(self.daemon_port, RATE)
+        try:
+            result, transfer, _ = self.clone(proxy, "complete")
+        finally:
+            proxy.close()
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertFalse(transfer["stalled"])
+        self.assertEqual(transfer["op"], "clone")
+        # git reports sizes with two decimals, so allow some rounding
+        self.assertGreaterEqual(transfer["bytes"], 0.9 * REPO_BYTES)
+        self.assertGreater(transfer["avg_rate"], 0)
+        self.assertLess(transfer["avg_rate"], 1.5 * RATE)
+        self.assertGreater(transfer["peak_rate"], 0)
+
+    def test_stalled_transfer_is_aborted_within_the_window(self):
+        stall_after = REPO_BYTES // 2
+        proxy = ThrottledProxy(self.daemon_port, RATE, stall_after=stall_after)
+        try:
+            result, transfer, elapsed = self.clone(proxy, "stalled")
+        finally:
+            proxy.close()
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("transfer stalled", result.stderr)
+        self.assertTrue(transfer["stalled"])
+        self.assertFalse(transfer["timed_out"])
+        self.assertGreater(transfer["bytes"], 0)
+        self.assertLessEqual(transfer["bytes"], stall_after)
+        self.assertGreater(transfer["avg_rate"], 0)
+        # Time to send stall_after bytes, then the window plus a poll interval and some slack
+        self.assertLess(elapsed, stall_after / RATE + STALL_WINDOW + 4)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "stalled", "blob0.bin")))
+
+
+if __name__ == "__main__":
+    unittest.main()
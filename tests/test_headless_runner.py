@@ -0,0 +1,169 @@
+"""
+HeadlessRunner end to end with SubprocessExecutor and a stub agent
+
+The workspace comes from a local bare repo in the repo cache (no network);
+the stub agent edits one file, so the saved prediction and the event
+sequence can be checked exactly.
+
+  python -m pytest tests/test_headless_runner.py -q
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless_runner
+import swe_polybench_tester
+from headless_runner import AgentExecutor, HeadlessRunner, SubprocessExecutor
+
+STUB_AGENT = """\
+import os, sys
+prompt = sys.stdin.read()
+if "{fail}" in prompt:
+    print("stub agent giving up")
+    sys.exit(3)
+with open(os.path.join(os.environ["SWE_WORKSPACE"], "src", "app.py"), "a") as f:
+    f.write("# fixed by " + os.environ["SWE_INSTANCE_ID"] + "\\n")
+print("stub agent read", len(prompt), "prompt chars")
+"""
+
+EXPECTED_EVENTS = [
+    "instance_started",
+    "workspace_ready",
+    "prompt_rendered",
+    "agent_started",
+    "agent_finished",
+    "diff_captured",
+    "prediction_saved",
+    "instance_finished",
+]
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+class HeadlessRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix="headless_runner_test_")
+        # The runner's files (repo cache, metrics, indexes) are relative to the working directory
+        os.chdir(self.root)
+        self.git_profile_mode = swe_polybench_tester.GIT_PROFILE_MODE
+        swe_polybench_tester.GIT_PROFILE_MODE = "off"
+
+        source = os.path.join(self.root, "source")
+        os.makedirs(os.path.join(source, "src"))
+        with open(os.path.join(source, "src", "app.py"), "w") as f:
+            f.write("def app():\n    return 1\n")
+        git(source, "init", "-q")
+        git(source, "add", "-A")
+        git(source, "-c", "user.name=test", "-c", "user.email=test@localhost", "commit", "-q", "-m", "base")
+        self.base_commit = git(source, "rev-parse", "HEAD")
+        git(self.root, "clone", "-q", "--bare", source, swe_polybench_tester.repo_cache_path("octo/proj"))
+
+        self.agent = os.path.join(self.root, "stub_agent.py")
+        with open(self.agent, "w") as f:
+            f.write(STUB_AGENT.replace("{fail}", "PLEASE FAIL"))
+        self.events = []
+
+    def tearDown(self):
+        swe_polybench_tester.GIT_PROFILE_MODE = self.git_profile_mode
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def problem(self, number, statement="Make app() return 2"):
+        return {
+            "instance_id": f"octo__proj-{number}", "repo": "octo/proj", "base_commit": self.base_commit,
+            "problem_statement": statement, "language": "Python", "task_category": "Bug Fix",
+            "hints_text": "", "created_at": "", "test_patch": "", "patch": "",
+        }
+
+    def runner(self, **options):
+        return HeadlessRunner(SubprocessExecutor([sys.executable, self.agent, "{prompt_file}"], timeout=60),
+                              model_name="stub", working_folder="workspace",
+                              predictions_file="predictions.jsonl", resources="off",
+                              on_event=lambda event, payload: self.events.append((event, payload)), **options)
+
+    def read_predictions(self):
+        if not os.path.exists("predictions.jsonl"):
+            return []
+        with open("predictions.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_agent_edit_is_saved_as_prediction(self):
+        results = self.runner().run([self.problem(1)])
+
+        self.assertEqual([r["status"] for r in results], ["solved"])
+        self.assertEqual(results[0]["agent"]["status"], "completed")
+        predictions = self.read_predictions()
+        self.assertEqual(len(predictions), 1)
+        self.assertEqual(predictions[0]["instance_id"], "octo__proj-1")
+        self.assertEqual(predictions[0]["model_name_or_path"], "stub")
+        patch = predictions[0]["model_patch"]
+        self.assertIn("diff --git a/src/app.py b/src/app.py", patch)
+        self.assertIn("+# fixed by octo__proj-1", patch)
+
+        self.assertEqual([event for event, _ in self.events], EXPECTED_EVENTS)
+        self.assertTrue(all(payload["instance_id"] == "octo__proj-1" for _, payload in self.events))
+        payloads = dict(self.events)
+        self.assertTrue(payloads["diff_captured"]["valid"])
+        self.assertTrue(payloads["prediction_saved"]["has_changes"])
+        self.assertEqual(payloads["instance_finished"]["status"], "solved")
+
+        # The agent's output is the trajectory; the workspace is back at the base commit
+        with open(os.path.join("workspace", "agent_logs", "octo__proj-1.log")) as f:
+            self.assertIn("stub agent read", f.read())
+        workspace = results[0]["workspace"]
+        self.assertEqual(git(workspace, "status", "--porcelain"), "")
+        self.assertEqual(git(workspace, "rev-parse", "HEAD"), self.base_commit)
+
+    def test_completed_instances_are_skipped(self):
+        self.runner().run([self.problem(1)])
+        self.events.clear()
+        self.assertEqual(self.runner().run([self.problem(1)]), [])
+        self.assertEqual(self.events, [])
+        self.assertEqual(len(self.read_predictions()), 1)
+
+    def test_failed_agent_without_changes_saves_nothing(self):
+        results = self.runner().run([self.problem(2, "PLEASE FAIL")])
+
+        self.assertEqual(results[0]["status"], "agent_failed")
+        self.assertEqual(results[0]["agent"]["returncode"], 3)
+        self.assertEqual(self.read_predictions(), [])
+        events = [event for event, _ in self.events]
+        self.assertIn("instance_failed", events)
+        self.assertNotIn("prediction_saved", events)
+        self.assertEqual(events[-1], "instance_finished")
+
+    def test_impacted_tests_off(self):
+        def unexpected(*args):
+            raise AssertionError("find_impacted_tests ran with --impacted-tests 0")
+
+        find_impacted_tests = headless_runner.find_impacted_tests
+        headless_runner.find_impacted_tests = unexpected
+        try:
+            results = self.runner(impacted_tests=0).run([self.problem(1)])
+        finally:
+            headless_runner.find_impacted_tests = find_impacted_tests
+        self.assertEqual(results[0]["status"], "solved")
+        self.assertEqual(results[0]["impacted_tests"], [])
+        self.assertEqual(dict(self.events)["diff_captured"]["impacted_tests"], 0)
+
+    def test_executor_must_implement_run(self):
+        class Incomplete(AgentExecutor):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+session_replay.py on a fixed metrics fixture (offline, no dataset)
+
+Four instances with round timings, small enough that the projected
+wall-clock time and disk peak of each policy can be worked out by hand.
+
+  python -m pytest tests/test_session_replay.py -q
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session_replay
+from session_replay import SessionSimulator, build_jobs, load_records, simulate_grid, synthetic_records
+
+
+def record(instance_id, repo, clone_seconds, pack_bytes, agent_seconds=None):
+    entry = {
+        "instance_id": instance_id, "repo": repo, "clone_seconds": clone_seconds,
+        "transfers": [{"op": "clone", "bytes": pack_bytes, "seconds": clone_seconds}],
+        "bytes_received": pack_bytes,
+    }
+    if agent_seconds is None:
+        entry["outcome"] = "clone_error:network"
+    else:
+        entry.update(agent_seconds=agent_seconds, diff_seconds=0, outcome="solved")
+    return entry
+
+
+# Reset after each agent run is DEFAULT_RESET_SECONDS (2s); workspaces are 2.5x the pack
+FIXTURE = [
+    record("one-1", "octo/one", 10, 1000, agent_seconds=100),
+    record("one-2", "octo/one", 10, 1000, agent_seconds=50),
+    record("two-1", "octo/two", 20, 2000, agent_seconds=30),
+    record("two-2", "octo/two", 5, 0),
+]
+
+
+class SessionReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="session_replay_test_")
+        self.metrics_file = os.path.join(self.root, "metrics.jsonl")
+        with open(self.metrics_file, "w", encoding="utf-8") as f:
+            for entry in FIXTURE:
+                f.write(json.dumps(entry) + "\n")
+        self.jobs = build_jobs(load_records(self.metrics_file))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_jobs_from_fixture(self):
+        self.assertEqual([job["instance_id"] for job in self.jobs], ["one-1", "one-2", "two-1", "two-2"])
+        self.assertEqual([job["clone_seconds"] for job in self.jobs], [10, 10, 20, 5])
+        self.assertEqual([job["workspace_bytes"] for job in self.jobs][:3], [2500, 2500, 5000])
+        self.assertEqual([job["clone_fails"] for job in self.jobs], [False, False, False, True])
+
+    def test_serial_session_keeping_workspaces(self):
+        # Clone, agent, reset one after another: 10+102, 10+52, 20+32, then the failing 5s clone
+        result = SessionSimulator(self.jobs, workers=1, prefetch=0, eviction="keep").run()
+        self.assertEqual(result["wall_seconds"], 231)
+        self.assertEqual(result["instances"], 4)
+        self.assertEqual(result["peak_disk_bytes"], 10000)  # all three workspaces kept
+        self.assertAlmostEqual(result["worker_utilization"], 180 / 231)
+
+    def test_prefetch_with_deleted_workspaces(self):
+        # Two clones start at 0; the next one starts when the first agent frees a slot at 112
+        result = SessionSimulator(self.jobs, workers=1, prefetch=1, eviction="delete").run()
+        self.assertEqual(result["wall_seconds"], 196)
+        self.assertEqual(result["instances"], 4)
+        self.assertEqual(result["peak_disk_bytes"], 7500)   # one-2 waiting while two-1 is prepared
+        self.assertAlmostEqual(result["instances_per_hour"], 4 / 196 * 3600)
+
+    def test_repo_cache_turns_repeat_clones_into_local_fetches(self):
+        result = SessionSimulator(self.jobs, workers=1, prefetch=0, cache_bytes=10 ** 6, eviction="keep").run()
+        local = 1000 / session_replay.LOCAL_FETCH_RATE + session_replay.LOCAL_SETUP_SECONDS
+        self.assertAlmostEqual(result["wall_seconds"], 231 - 10 + local)
+        self.assertEqual(result["cache_hit_rate"], 0.5)  # one-2 and two-2 find their repo cached
+        self.assertEqual(result["peak_disk_bytes"], 10000 + 3000)  # workspaces plus both cached packs
+
+    def test_grid_is_sorted_by_wall_clock(self):
+        results = simulate_grid(self.jobs, [1], [0, 1], ["dataset"], [0], ["keep", "delete"])
+        self.assertEqual(len(results), 4)
+        walls = [result["wall_seconds"] for _, result in results]
+        self.assertEqual(walls, sorted(walls))
+        self.assertEqual(results[0][0]["prefetch"], 1)
+
+    def test_synthetic_fixture_is_reproducible(self):
+        self.assertEqual(synthetic_records(50, seed=3), synthetic_records(50, seed=3))
+        jobs = build_jobs(synthetic_records(50, seed=3))
+        self.assertEqual(SessionSimulator(jobs).run(), SessionSimulator(jobs).run())
+
+
+if __name__ == "__main__":
+    unittest.main()
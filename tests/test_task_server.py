@@ -0,0 +1,173 @@
+"""
+Task server queue and executor against a local repo cache (no HTTP, no network)
+
+Consumers are threads that take leases from the TaskQueue directly; the
+RemoteExecutor and HeadlessRunner are the ones `task_server.py serve` uses.
+
+  python -m pytest tests/test_task_server.py -q
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import task_server
+import swe_polybench_tester
+import workspace_checkpoint
+from headless_runner import HeadlessRunner
+from task_server import TaskQueue, RemoteExecutor
+
+WORKSPACE_DIRS = {"prompts", "agent_logs", "trajectories"}
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+class TaskServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix="task_server_test_")
+        os.chdir(self.root)
+        self.git_profile_mode = swe_polybench_tester.GIT_PROFILE_MODE
+        swe_polybench_tester.GIT_PROFILE_MODE = "off"
+
+        source = os.path.join(self.root, "source")
+        os.makedirs(os.path.join(source, "src"))
+        with open(os.path.join(source, "src", "app.py"), "w") as f:
+            f.write("def app():\n    return 1\n")
+        git(source, "init", "-q")
+        git(source, "add", "-A")
+        git(source, "-c", "user.name=test", "-c", "user.email=test@localhost", "commit", "-q", "-m", "base")
+        self.base_commit = git(source, "rev-parse", "HEAD")
+        git(self.root, "clone", "-q", "--bare", source, swe_polybench_tester.repo_cache_path("octo/proj"))
+        self.queue = TaskQueue(lease_seconds=600)
+        self.events = []
+
+    def tearDown(self):
+        self.queue.close()
+        swe_polybench_tester.GIT_PROFILE_MODE = self.git_profile_mode
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def problems(self, count):
+        return [{
+            "instance_id": f"octo__proj-{n}", "repo": "octo/proj", "base_commit": self.base_commit,
+            "problem_statement": "Make app() return 2", "language": "Python", "task_category": "Bug Fix",
+            "hints_text": "", "created_at": "", "test_patch": "", "patch": "",
+        } for n in range(1, count + 1)]
+
+    def runner(self, workers=1, checkpoint_interval=0):
+        executor = RemoteExecutor(self.queue)
+        runner = HeadlessRunner(executor, model_name="remote", working_folder="workspace",
+                                predictions_file="predictions.jsonl", max_workers=workers, resources="off",
+                                checkpoint_interval=checkpoint_interval,
+                                on_event=lambda event, payload: self.events.append((event, payload)))
+        return runner, executor
+
+    def start(self, runner, problems):
+        results = []
+        worker = Thread(target=lambda: results.extend(runner.run(problems)), daemon=True)
+        worker.start()
+        return worker, results
+
+    def predictions(self):
+        if not os.path.exists("predictions.jsonl"):
+            return []
+        with open("predictions.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def edit(self, task, text):
+        with open(os.path.join(task.workspace, "src", "app.py"), "a") as f:
+            f.write(text)
+
+    def test_stop_prepares_no_more_workspaces(self):
+        runner, _ = self.runner(workers=2)
+        worker, results = self.start(runner, self.problems(5))
+        first = self.queue.take("alice", wait=60)
+        self.assertIsNotNone(first)
+
+        # What serve() does on Ctrl+C
+        runner.stop()
+        self.queue.close()
+        worker.join(60)
+        self.assertFalse(worker.is_alive())
+
+        prepared = set(os.listdir("workspace")) - WORKSPACE_DIRS
+        self.assertIn(first.instance_id, prepared)
+        self.assertLessEqual(len(prepared), 2)  # only the instances already in flight
+        self.assertEqual(len(results), len(prepared))
+        self.assertEqual(self.predictions(), [])
+
+    def test_expired_lease_is_revoked_and_requeued(self):
+        self.queue.lease_seconds = 0.2
+        reaper_interval = task_server.REAPER_INTERVAL
+        task_server.REAPER_INTERVAL = 0.1
+        try:
+            runner, _ = self.runner()
+            worker, results = self.start(runner, self.problems(1))
+            stale = self.queue.take("alice", wait=60)
+            stale_lease = stale.lease
+            self.edit(stale, "# half done by alice\n")
+            retry = self.queue.take("bob", wait=30)
+        finally:
+            task_server.REAPER_INTERVAL = reaper_interval
+        self.assertIs(retry, stale)
+        self.assertEqual(retry.consumer, "bob")
+        self.assertEqual(retry.attempts, 2)
+        self.assertIsNone(self.queue.heartbeat(stale_lease))
+        # The revoked lease's edits are gone before bob gets the workspace
+        self.assertEqual(git(retry.workspace, "status", "--porcelain"), "")
+
+        self.queue.lease_seconds = 600
+        self.queue.heartbeat(retry.lease)
+        self.edit(retry, "# fixed by bob\n")
+        self.queue.complete(retry.lease, {"status": "completed"})
+        worker.join(60)
+        self.assertEqual([r["status"] for r in results], ["solved"])
+        patch = self.predictions()[0]["model_patch"]
+        self.assertIn("+# fixed by bob", patch)
+        self.assertNotIn("alice", patch)
+
+    def test_cancelled_lease_is_checkpointed_and_restored(self):
+        runner, _ = self.runner(checkpoint_interval=3600)  # only the final checkpoint can catch the edit
+        worker, results = self.start(runner, self.problems(1))
+        task = self.queue.take("alice", wait=60)
+        self.edit(task, "# half done by alice\n")
+        runner.stop()
+        self.queue.close()
+        worker.join(60)
+
+        self.assertEqual([r["status"] for r in results], ["agent_failed"])
+        self.assertEqual(self.predictions(), [])
+        self.assertEqual(git(task.workspace, "status", "--porcelain"), "")
+        commit = workspace_checkpoint.find_checkpoint(task.workspace, task.instance_id, self.base_commit)
+        self.assertIsNotNone(commit)
+        self.assertIn("+# half done by alice", git(task.workspace, "diff", self.base_commit, commit))
+
+        # The next run serves the instance with alice's edits back in the workspace
+        self.queue = TaskQueue(lease_seconds=600)
+        runner, _ = self.runner(checkpoint_interval=3600)
+        worker, results = self.start(runner, self.problems(1))
+        task = self.queue.take("bob", wait=60)
+        self.assertIn("+# half done by alice", git(task.workspace, "diff"))
+        self.edit(task, "# finished by bob\n")
+        self.queue.complete(task.lease, {"status": "completed"})
+        worker.join(60)
+        self.assertEqual([r["status"] for r in results], ["solved"])
+        patch = self.predictions()[0]["model_patch"]
+        self.assertIn("+# half done by alice", patch)
+        self.assertIn("+# finished by bob", patch)
+        self.assertIsNone(workspace_checkpoint.find_checkpoint(task.workspace, task.instance_id, self.base_commit))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,293 @@
+"""
+Append-only compressed trajectory archive
+
+  trajectories/
+    trajectories.arc         concatenated gzip members, one per saved trajectory
+    trajectories.idx.jsonl   instance_id -> offset/length of its member (last line wins)
+
+Each trajectory is compressed while it is written, so long transcripts are
+never held in memory, and read back by seeking to its offset. Auto-mode
+placeholders are index-only entries. The per-instance markdown layout
+(<instance_id>.md) can be regenerated with export.
+
+  python trajectory_archive.py list --dir swe_polybench_workspace/trajectories
+  python trajectory_archive.py show sveltejs__svelte-605
+  python trajectory_archive.py export --out trajectories_md
+  python trajectory_archive.py ingest old_trajectories/      # import existing .md files
+"""
+
+import os
+import json
+import zlib
+import codecs
+import argparse
+from threading import Lock
+from datetime import datetime
+
+DEFAULT_ARCHIVE_DIR = os.path.join("swe_polybench_workspace", "trajectories")
+ARCHIVE_NAME = "trajectories.arc"
+INDEX_NAME = "trajectories.idx.jsonl"
+CHUNK_SIZE = 64 * 1024
+GZIP_WBITS = 31   # zlib container = gzip member, so the .arc file is also a valid .gz
+
+_archive_locks = {}
+_archive_locks_guard = Lock()
+
+
+def markdown_header(instance_id, timestamp):
+    return f"# Trajectory: {instance_id}\n\n**Timestamp:** {timestamp}\n\n"
+
+
+def auto_trajectory(instance_id):
+    return f"Automatic trajectory for {instance_id}\nAgent completed the task."
+
+
+class TrajectoryWriter:
+    """Streams one trajectory into the archive; the index entry is written on close"""
+
+    def __init__(self, archive, instance_id, kind, timestamp=None):
+        self.archive = archive
+        self.instance_id = instance_id
+        self.kind = kind
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.size = 0
+        self.lock = archive._lock
+        self.lock.acquire()
+        try:
+            self.f = open(archive.archive_file, "ab")
+            self.offset = self.f.seek(0, os.SEEK_END)
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+            self.write(markdown_header(instance_id, self.timestamp))
+        except Exception:
+            self.lock.release()
+            raise
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.size += len(data)
+        self.f.write(self.compressor.compress(data))
+
+    def close(self):
+        """Finish the gzip member and publish it in the index."""
+        try:
+            self.f.write(self.compressor.flush())
+            length = self.f.tell() - self.offset
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.f.close()
+            return self.archive._append_index({
+                "instance_id": self.instance_id,
+                "offset": self.offset,
+                "length": length,
+                "size": self.size,
+                "kind": self.kind,
+                "timestamp": self.timestamp
+            })
+        finally:
+            self.lock.release()
+
+    def abort(self):
+        """Drop the partial member (the bytes stay in the .arc but are never indexed)."""
+        try:
+            self.f.close()
+        finally:
+            self.lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class TrajectoryArchive:
+    """Random-access store of per-instance trajectories"""
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = str(archive_dir)
+        self.archive_file = os.path.join(self.archive_dir, ARCHIVE_NAME)
+        self.index_file = os.path.join(self.archive_dir, INDEX_NAME)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        # One lock per archive file, shared by every TrajectoryArchive pointing at it
+        with _archive_locks_guard:
+            self._lock = _archive_locks.setdefault(os.path.abspath(self.archive_file), Lock())
+        self._index = None
+        self._index_size = 0
+
+    # ----------------------------------------------------------------- writes
+
+    def writer(self, instance_id, kind="manual", timestamp=None):
+        return TrajectoryWriter(self, instance_id, kind, timestamp)
+
+    def add_text(self, instance_id, text, kind="manual"):
+        with self.writer(instance_id, kind) as w:
+            w.write(text)
+        return self.entry(instance_id)
+
+    def add_file(self, instance_id, path, kind="log"):
+        """Archive a text file (e.g. an agent log) without loading it whole."""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with self.writer(instance_id, kind) as w, open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                w.write(decoder.decode(chunk))
+            w.write(decoder.decode(b"", final=True))
+        return self.entry(instance_id)
+
+    def add_auto(self, instance_id):
+        """Index-only placeholder; export renders the auto-mode text."""
+        with self._lock:
+            return self._append_index({
+                "instance_id": instance_id,
+                "offset": None,
+                "length": 0,
+                "size": 0,
+                "kind": "auto",
+                "timestamp": datetime.now().isoformat()
+            })
+
+    def _append_index(self, entry):
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
+
+    # ------------------------------------------------------------------ reads
+
+    def index(self):
+        """Latest entry per instance_id; re-reads only lines appended since the last call."""
+        if self._index is None:
+            self._index = {}
+            self._index_size = 0
+        if not os.path.exists(self.index_file):
+            return self._index
+        with open(self.index_file, "rb") as f:
+            f.seek(self._index_size)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._index_size += len(raw)
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self._index[entry["instance_id"]] = entry
+        return self._index
+
+    def entry(self, instance_id):
+        return self.index().get(instance_id)
+
+    def __contains__(self, instance_id):
+        return instance_id in self.index()
+
+    def iter_text(self, instance_id):
+        """Yield the markdown of one trajectory as decoded text chunks."""
+        entry = self.entry(instance_id)
+        if entry is None:
+            raise KeyError(f"No trajectory for {instance_id} in {self.archive_dir}")
+        if entry["kind"] == "auto":
+            yield markdown_header(instance_id, entry["timestamp"]) + auto_trajectory(instance_id)
+            return
+
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        remaining = entry["length"]
+        with open(self.archive_file, "rb") as f:
+            f.seek(entry["offset"])
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(f"Trajectory archive truncated at {instance_id}")
+                remaining -= len(chunk)
+                yield decoder.decode(decompressor.decompress(chunk))
+        yield decoder.decode(decompressor.flush(), final=True)
+
+    def read_text(self, instance_id):
+        return "".join(self.iter_text(instance_id))
+
+    # ------------------------------------------------------------- transfers
+
+    def export_markdown(self, out_dir, instance_ids=None):
+        """Regenerate the <instance_id>.md layout; returns the number of files written."""
+        os.makedirs(out_dir, exist_ok=True)
+        count = 0
+        for instance_id in instance_ids or sorted(self.index()):
+            with open(os.path.join(out_dir, f"{instance_id}.md"), "w", encoding="utf-8", newline="") as f:
+                for text in self.iter_text(instance_id):
+                    f.write(text)
+            count += 1
+        return count
+
+    def ingest_markdown(self, md_dir):
+        """Import existing <instance_id>.md files (keeps their text as is)."""
+        count = 0
+        for name in sorted(os.listdir(md_dir)):
+            if not name.endswith(".md"):
+                continue
+            instance_id = name[:-3]
+            path = os.path.join(md_dir, name)
+            with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+                text = f.read()
+            # Strip the header save_trajectory wrote; the writer adds its own
+            timestamp = None
+            prefix = f"# Trajectory: {instance_id}\n\n**Timestamp:** "
+            if text.startswith(prefix):
+                timestamp, _, text = text[len(prefix):].partition("\n\n")
+            with self.writer(instance_id, "imported", timestamp) as w:
+                w.write(text)
+            count += 1
+        return count
+
+    def stats(self):
+        index = self.index()
+        return {
+            "trajectories": len(index),
+            "raw_bytes": sum(e["size"] for e in index.values()),
+            "archive_bytes": os.path.getsize(self.archive_file) if os.path.exists(self.archive_file) else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed trajectory archive')
+    parser.add_argument('--dir', default=DEFAULT_ARCHIVE_DIR, help='Archive directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List archived trajectories')
+
+    show_parser = subparsers.add_parser('show', help='Print one trajectory')
+    show_parser.add_argument('instance_id')
+
+    export_parser = subparsers.add_parser('export', help='Write <instance_id>.md files')
+    export_parser.add_argument('--out', default='trajectories_md')
+    export_parser.add_argument('instance_ids', nargs='*')
+
+    ingest_parser = subparsers.add_parser('ingest', help='Import a directory of <instance_id>.md files')
+    ingest_parser.add_argument('md_dir')
+
+    args = parser.parse_args()
+    archive = TrajectoryArchive(args.dir)
+
+    if args.command == 'list':
+        for instance_id, entry in sorted(archive.index().items()):
+            print(f"{instance_id:<45} {entry['kind']:<8} {entry['size']:>10} {entry['timestamp'][:19]}")
+        stats = archive.stats()
+        print(f"-- {stats['trajectories']} trajectories, {stats['raw_bytes']} bytes raw, "
+              f"{stats['archive_bytes']} bytes archived")
+    elif args.command == 'show':
+        for text in archive.iter_text(args.instance_id):
+            print(text, end="")
+        print()
+    elif args.command == 'export':
+        count = archive.export_markdown(args.out, args.instance_ids or None)
+        print(f"✓ Exported {count} trajectories to {args.out}")
+    else:
+        count = archive.ingest_markdown(args.md_dir)
+        print(f"✓ Ingested {count} trajectories into {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,601 @@
+"""
+Strict streaming parser for git / unified diffs
+
+Single pass over the patch lines, holding at most one hunk's counters in
+memory. Checks what `git apply` would trip over:
+
+  - hunk bodies match their @@ -a,b +c,d @@ line counts (no truncated or overlong hunks)
+  - hunks are in order and don't overlap
+  - file modes, new/deleted file and rename/copy headers are consistent
+  - binary sections ("Binary files ... differ" / "GIT binary patch") are well formed
+  - "\\ No newline at end of file" markers only follow hunk lines
+  - the patch ends with a newline and headers carry no CR (CRLF from pasted patches)
+
+The result is a PatchSet of FilePatch/Hunk objects other tools can use.
+
+  python unified_diff.py check some.patch
+  python unified_diff.py bench --mb 4
+"""
+
+import re
+import sys
+import time
+import argparse
+
+HUNK_RE = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)")
+GIT_HEADER_RE = re.compile(r'diff --git (?:"?a/)?(.+?)"? (?:"?b/)?(.+?)"?$')
+INDEX_RE = re.compile(r"index ([0-9a-f]+)\.\.([0-9a-f]+)(?: (\d{6}))?$")
+VALID_MODES = {"100644", "100755", "120000", "160000"}
+MAX_ERRORS = 20
+
+
+class PatchParseError(ValueError):
+    """Raised by parse_patch for a malformed patch"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(errors[0] if errors else "Malformed patch")
+
+
+class Hunk:
+    """One @@ section; line lists are only kept when the parser is asked to"""
+
+    def __init__(self, old_start, old_count, new_start, new_count, section, line_number):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.section = section.strip()
+        self.line_number = line_number
+        self.added = 0
+        self.removed = 0
+        self.context = 0
+        self.old_no_newline = False
+        self.new_no_newline = False
+        self.lines = None
+
+    def to_dict(self):
+        return {k: v for k, v in vars(self).items() if k != "lines"}
+
+
+class FilePatch:
+    """Headers and hunks for one file in a patch"""
+
+    def __init__(self, old_path=None, new_path=None, line_number=0):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.line_number = line_number
+        self.git = False
+        self.status = "modified"   # added / deleted / modified / renamed / copied
+        self.old_mode = None
+        self.new_mode = None
+        self.similarity = None
+        self.index = None
+        self.binary = False
+        self.hunks = []
+
+    @property
+    def path(self):
+        return self.new_path if self.status != "deleted" else self.old_path
+
+    @property
+    def added(self):
+        return sum(h.added for h in self.hunks)
+
+    @property
+    def removed(self):
+        return sum(h.removed for h in self.hunks)
+
+    def to_dict(self):
+        data = {k: v for k, v in vars(self).items() if k != "hunks"}
+        data["hunks"] = [h.to_dict() for h in self.hunks]
+        return data
+
+
+class PatchSet:
+    """Parsed patch: files, plus errors and warnings found on the way"""
+
+    def __init__(self):
+        self.files = []
+        self.errors = []
+        self.warnings = []
+        self.lines = 0
+
+    @property
+    def valid(self):
+        return not self.errors and bool(self.files)
+
+    @property
+    def hunk_count(self):
+        return sum(len(f.hunks) for f in self.files)
+
+    def summary(self):
+        added = sum(f.added for f in self.files)
+        removed = sum(f.removed for f in self.files)
+        return f"{len(self.files)} files, {self.hunk_count} hunks, +{added}/-{removed}"
+
+
+def strip_prefix(path):
+    """Drop the a/ or b/ prefix of a ---/+++ path (and any trailing timestamp)."""
+    path = path.split("\t")[0]
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    if path == "/dev/null":
+        return None
+    if path[:2] in ("a/", "b/"):
+        return path[2:]
+    return path
+
+
+class DiffParser:
+    """Incremental parser: feed() lines as they arrive, then close()"""
+
+    def __init__(self, keep_lines=False):
+        self.keep_lines = keep_lines
+        self.patch = PatchSet()
+        self.file = None
+        self.hunk = None
+        self.old_left = 0
+        self.new_left = 0
+        self.in_binary = False
+        self.in_trailer = False   # format-patch signature ("-- " line) up to the next file
+        self.expect_plus = False
+        self.last_body = None     # first character of the previous hunk body line
+        self.line_number = 0
+        self.last_line_complete = True
+
+    # ---------------------------------------------------------------- helpers
+
+    def error(self, message):
+        if len(self.patch.errors) < MAX_ERRORS:
+            self.patch.errors.append(f"line {self.line_number}: {message}")
+
+    def warn(self, message):
+        if len(self.patch.warnings) < MAX_ERRORS:
+            self.patch.warnings.append(f"line {self.line_number}: {message}")
+
+    def _finish_hunk(self):
+        if self.hunk is not None and (self.old_left or self.new_left):
+            self.error(f"truncated hunk starting at line {self.hunk.line_number} "
+                       f"({self.old_left} old / {self.new_left} new lines missing)")
+        self.hunk = None
+        self.old_left = self.new_left = 0
+
+    def _finish_file(self):
+        self._finish_hunk()
+        f = self.file
+        if f is not None:
+            if self.expect_plus:
+                self.error(f"{f.path}: '---' header without '+++'")
+            if f.status == "renamed" and (f.old_path is None or f.new_path is None):
+                self.error(f"rename of {f.path} is missing 'rename from' / 'rename to'")
+            if not f.git and not f.hunks:
+                self.error(f"{f.path}: file header without hunks")
+        self.file = None
+        self.expect_plus = False
+        self.in_binary = False
+        self.in_trailer = False
+
+    def _start_file(self, f):
+        self._finish_file()
+        self.file = f
+        self.patch.files.append(f)
+
+    # ------------------------------------------------------------------ input
+
+    def feed(self, line):
+        """Consume one line, with or without its line terminator."""
+        if line.endswith("\n"):
+            self._feed(line[:-1], True)
+        else:
+            self._feed(line, False)
+
+    def _feed(self, line, complete):
+        self.line_number += 1
+        if not self.last_line_complete:
+            self.error("line break missing inside patch")
+        self.last_line_complete = complete
+
+        # Hunk bodies first: the hot path for large patches
+        if self.old_left or self.new_left:
+            first = line[:1]
+            if first == " ":
+                self.old_left -= 1
+                self.new_left -= 1
+                self.hunk.context += 1
+            elif first == "-":
+                self.old_left -= 1
+                self.hunk.removed += 1
+            elif first == "+":
+                self.new_left -= 1
+                self.hunk.added += 1
+            elif first == "\\":
+                self._no_newline_marker()
+                return
+            elif line == "" or line == "\r":
+                # Context line whose single space was stripped (editors, pastes)
+                self.warn("empty line inside hunk treated as context")
+                self.old_left -= 1
+                self.new_left -= 1
+                self.hunk.context += 1
+                first = " "
+            else:
+                self._finish_hunk()
+                self._header(line)
+                return
+            if self.old_left < 0 or self.new_left < 0:
+                self.error(f"hunk starting at line {self.hunk.line_number} is longer than its header says")
+                self.old_left = max(self.old_left, 0)
+                self.new_left = max(self.new_left, 0)
+            self.last_body = first
+            if self.keep_lines:
+                self.hunk.lines.append(line)
+            return
+
+        if self.in_trailer and not line.startswith("diff --git "):
+            return
+        self._header(line)
+
+    def feed_lines(self, lines, stripped=False):
+        """Consume an iterable of lines; runs of ordinary hunk body lines are counted in a tight loop.
+
+        With stripped=True the lines carry no terminator and are all taken as complete.
+        """
+        keep_lines = self.keep_lines
+        feed = self.feed
+        if stripped:
+            feed = lambda line: self._feed(line, True)
+        lines = iter(lines)
+        for line in lines:
+            feed(line)
+            if not (self.old_left or self.new_left) or not self.last_line_complete:
+                continue
+
+            hunk = self.hunk
+            old_left = self.old_left
+            new_left = self.new_left
+            context = added = removed = count = 0
+            last_body = self.last_body
+            pending = None
+            for line in lines:
+                first = line[:1]
+                if not stripped and line[-1:] != "\n":
+                    pending = line
+                    break
+                if first == " " and old_left and new_left:
+                    old_left -= 1
+                    new_left -= 1
+                    context += 1
+                elif first == "-" and old_left:
+                    old_left -= 1
+                    removed += 1
+                elif first == "+" and new_left:
+                    new_left -= 1
+                    added += 1
+                else:
+                    # Markers, stripped context lines, overlong hunks, headers: full parser
+                    pending = line
+                    break
+                count += 1
+                last_body = first
+                if keep_lines:
+                    hunk.lines.append(line if stripped else line[:-1])
+                if not (old_left or new_left):
+                    break
+
+            self.old_left = old_left
+            self.new_left = new_left
+            hunk.context += context
+            hunk.added += added
+            hunk.removed += removed
+            self.line_number += count
+            self.last_body = last_body
+            if pending is not None:
+                feed(pending)
+
+    def _no_newline_marker(self):
+        if self.last_body == "-":
+            self.hunk.old_no_newline = True
+        elif self.last_body == "+":
+            self.hunk.new_no_newline = True
+        elif self.last_body == " ":
+            self.hunk.old_no_newline = self.hunk.new_no_newline = True
+        else:
+            self.error("'\\ No newline at end of file' not following a hunk line")
+        self.last_body = None
+
+    def _header(self, line):
+        if line.endswith("\r") and line.startswith(("diff ", "--- ", "+++ ", "@@ ", "index ")):
+            self.error("CR in header line (CRLF line endings, e.g. from a pasted patch)")
+            line = line[:-1]
+
+        if line.startswith("diff --git "):
+            match = GIT_HEADER_RE.match(line)
+            f = FilePatch(line_number=self.line_number)
+            f.git = True
+            if match:
+                f.old_path, f.new_path = match.group(1), match.group(2)
+            else:
+                self.error(f"unparseable diff --git header: {line[:80]}")
+            self._start_file(f)
+            return
+
+        if line.startswith("@@ "):
+            self._hunk_header(line)
+            return
+
+        if self.hunk is not None:
+            # Right after a complete hunk
+            if line[:1] == "\\":
+                self._no_newline_marker()
+                return
+            if line == "-- ":
+                self.in_trailer = True
+                return
+            if line[:1] in ("+", "-", " ") and not line.startswith(("--- ", "+++ ")):
+                self.error(f"hunk starting at line {self.hunk.line_number} is longer than its header says")
+                return
+
+        if line.startswith("--- ") and not self.expect_plus:
+            self._minus_header(strip_prefix(line[4:]))
+            return
+
+        if line.startswith("+++ "):
+            self._plus_header(strip_prefix(line[4:]))
+            return
+
+        f = self.file
+        if f is not None and f.git and not f.hunks and not self.expect_plus and self._extended_header(line):
+            return
+
+        if self.in_binary:
+            # base85 data lines start with a length character; blocks are separated by blank lines
+            if line == "" or line.startswith(("literal ", "delta ")) or line[:1].isalpha():
+                return
+            self.error(f"malformed GIT binary patch line: {line[:40]}")
+            return
+
+        if f is None:
+            if line.strip():
+                self.warn("text before the first diff header ignored")
+            return
+        if line.strip():
+            self.error(f"unexpected line outside a hunk: {line[:80]}")
+
+    def _minus_header(self, old_path):
+        f = self.file
+        if f is None or not f.git or f.hunks:
+            # Plain unified diff: every '---' opens a file
+            f = FilePatch(old_path, None, self.line_number)
+            if old_path is None:
+                f.status = "added"
+            self._start_file(f)
+        elif old_path is None and f.status != "added":
+            self.error(f"{f.path}: '--- /dev/null' without 'new file mode'")
+        elif old_path is not None and old_path != f.old_path:
+            self.warn(f"'---' path {old_path} differs from the diff --git header ({f.old_path})")
+        self.hunk = None
+        self.expect_plus = True
+
+    def _plus_header(self, new_path):
+        f = self.file
+        if not self.expect_plus:
+            self.error("'+++' header without preceding '---'")
+            return
+        if new_path is None:
+            if f.git and f.status != "deleted":
+                self.error(f"{f.path}: '+++ /dev/null' without 'deleted file mode'")
+            if not f.git:
+                f.status = "deleted"
+                f.new_path = None
+        elif not f.git:
+            f.new_path = new_path
+        elif new_path != f.new_path:
+            self.warn(f"'+++' path {new_path} differs from the diff --git header ({f.new_path})")
+        self.expect_plus = False
+
+    def _extended_header(self, line):
+        f = self.file
+        if line.startswith(("old mode ", "new mode ", "deleted file mode ", "new file mode ")):
+            mode = line.rsplit(" ", 1)[1]
+            if mode not in VALID_MODES:
+                self.error(f"invalid file mode {mode}")
+            if line.startswith("old mode "):
+                f.old_mode = mode
+            elif line.startswith("new mode "):
+                f.new_mode = mode
+            elif line.startswith("deleted file mode "):
+                f.status, f.old_mode = "deleted", mode
+            else:
+                f.status, f.new_mode = "added", mode
+            return True
+        if line.startswith("index "):
+            match = INDEX_RE.match(line)
+            if not match:
+                self.error(f"malformed index line: {line[:80]}")
+            else:
+                f.index = (match.group(1), match.group(2))
+                if match.group(3) and match.group(3) not in VALID_MODES:
+                    self.error(f"invalid file mode {match.group(3)}")
+            return True
+        if line.startswith(("similarity index ", "dissimilarity index ")):
+            f.similarity = line.rsplit(" ", 1)[1]
+            return True
+        if line.startswith(("rename from ", "copy from ")):
+            f.status = "renamed" if line.startswith("rename") else "copied"
+            f.old_path = line.split(" ", 2)[2]
+            return True
+        if line.startswith(("rename to ", "copy to ")):
+            f.new_path = line.split(" ", 2)[2]
+            return True
+        if line.startswith("Binary files ") and line.endswith(" differ"):
+            f.binary = True
+            return True
+        if line == "GIT binary patch":
+            f.binary = True
+            self.in_binary = True
+            return True
+        return False
+
+    def _hunk_header(self, line):
+        if self.file is None:
+            self.error("hunk before any file header")
+            self._start_file(FilePatch(line_number=self.line_number))
+        if self.expect_plus:
+            self.error("hunk after '---' without '+++'")
+            self.expect_plus = False
+        match = HUNK_RE.match(line)
+        if not match:
+            self.error(f"malformed hunk header: {line[:80]}")
+            return
+        old_start, old_count, new_start, new_count, section = match.groups()
+        hunk = Hunk(int(old_start), int(old_count if old_count is not None else 1),
+                    int(new_start), int(new_count if new_count is not None else 1), section, self.line_number)
+        if (hunk.old_start == 0 and hunk.old_count) or (hunk.new_start == 0 and hunk.new_count):
+            self.error(f"hunk range starts at line 0 but is not empty: {line[:80]}")
+        if not hunk.old_count and not hunk.new_count:
+            self.error(f"empty hunk: {line[:80]}")
+        previous = self.file.hunks[-1] if self.file.hunks else None
+        if previous and hunk.old_start < previous.old_start + previous.old_count:
+            self.error("hunk overlaps or precedes the previous hunk")
+        if self.file.status == "added" and hunk.old_count:
+            self.error(f"{self.file.path}: new file with removed lines")
+        if self.file.status == "deleted" and hunk.new_count:
+            self.error(f"{self.file.path}: deleted file with added lines")
+        if self.keep_lines:
+            hunk.lines = []
+        self.file.hunks.append(hunk)
+        self.hunk = hunk
+        self.old_left = hunk.old_count
+        self.new_left = hunk.new_count
+        self.last_body = None
+
+    def close(self):
+        """Finish parsing and return the PatchSet."""
+        self._finish_file()
+        if self.line_number and not self.last_line_complete:
+            self.error("patch does not end with a newline")
+        if not self.patch.files and not self.patch.errors:
+            self.patch.errors.append("no diff headers or hunks found")
+        return self.patch
+
+
+def iter_patch_lines(text):
+    """Split patch text on LF only, keeping terminators (CR and form feeds stay in the line)."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+
+def parse_lines(lines, keep_lines=False):
+    """Parse an iterable of lines (e.g. a file opened with newline='')."""
+    parser = DiffParser(keep_lines)
+    parser.feed_lines(lines)
+    return parser.close()
+
+
+def parse_patch(text, keep_lines=False, strict=True):
+    """Parse patch text; with strict=True a malformed patch raises PatchParseError."""
+    parser = DiffParser(keep_lines)
+    lines = text.split("\n")
+    tail = lines.pop()   # "" when the patch ends with a newline
+    parser.feed_lines(lines, stripped=True)
+    if tail:
+        parser.feed(tail)
+    patch = parser.close()
+    if strict and patch.errors:
+        raise PatchParseError(patch.errors)
+    return patch
+
+
+def check_patch(lines):
+    """Validate patch text or a stream of lines; returns (is_valid, message)."""
+    patch = parse_patch(lines, strict=False) if isinstance(lines, str) else parse_lines(lines)
+    if patch.errors:
+        extra = f" (+{len(patch.errors) - 1} more)" if len(patch.errors) > 1 else ""
+        return False, f"Malformed patch: {patch.errors[0]}{extra}"
+    return True, f"Valid diff ({patch.summary()})"
+
+
+# ========================== BENCHMARK ==========================
+
+def synthetic_patch(target_bytes):
+    """A multi-file git diff of roughly target_bytes."""
+    parts = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        body = []
+        for h in range(8):
+            start = 10 + h * 40
+            body.append(f"@@ -{start},7 +{start},27 @@ def function_{h}(self):\n")
+            body.append("     context line one\n     context line two\n     context line three\n")
+            body.append(f"-    value = compute({h})\n+    value = compute({h}, strict=True)\n")
+            body.append("".join(f"+    check(value, {i})\n" for i in range(20)))
+            body.append("     context line four\n     context line five\n     context line six\n")
+        text = (f"diff --git a/src/module_{n}.py b/src/module_{n}.py\n"
+                f"index 1234567..89abcde 100644\n--- a/src/module_{n}.py\n+++ b/src/module_{n}.py\n"
+                + "".join(body))
+        parts.append(text)
+        size += len(text)
+        n += 1
+    return "".join(parts)
+
+
+def benchmark(megabytes=4, repeat=5):
+    text = synthetic_patch(int(megabytes * 1024 * 1024))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        patch = parse_patch(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    mib = len(text) / 1024 / 1024
+    patch_lines = text.count("\n")
+    print(f"Patch: {mib:.1f} MiB, {patch.summary()}")
+    print(f"Parse: {best * 1000:.1f} ms ({mib / best:.0f} MiB/s, {patch_lines / best / 1e6:.1f}M lines/s)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Strict unified diff parser')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser('check', help='Validate patch files')
+    check_parser.add_argument('patch_files', nargs='+')
+    check_parser.add_argument('--verbose', action='store_true', help='Print per-file details')
+
+    bench_parser = subparsers.add_parser('bench', help='Parse a synthetic patch')
+    bench_parser.add_argument('--mb', type=float, default=4)
+
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        benchmark(args.mb)
+        return
+
+    failed = 0
+    for patch_file in args.patch_files:
+        with open(patch_file, "r", encoding="utf-8", errors="replace", newline="") as f:
+            patch = parse_lines(f)
+        status = "✓" if patch.valid else "✗"
+        print(f"{status} {patch_file}: {patch.summary()}")
+        for message in patch.errors:
+            print(f"    error: {message}")
+        for message in patch.warnings:
+            print(f"    warning: {message}")
+        if args.verbose:
+            for f in patch.files:
+                print(f"    {f.status:<8} {f.path} +{f.added}/-{f.removed} ({len(f.hunks)} hunks)")
+        failed += not patch.valid
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Periodic checkpoints of an agent's in-progress edits
+
+While an agent works, a background thread snapshots the working tree
+every CHECKPOINT_INTERVAL seconds into the workspace's own object store:
+
+  - `git add -A` into a private index (.git/swe_checkpoint.index), never the
+    real one, seeded from the real index so its stat cache is warm: only
+    files edited since the last pass are hashed, only their blobs written
+  - `git write-tree` (only trees along changed paths are new objects)
+  - a commit of that tree on top of the base commit under
+    refs/swe-checkpoints/<instance_id>; a pass that finds nothing new
+    writes nothing
+
+git runs at low CPU/IO priority, off the runner's main thread. If the
+runner, the machine or the agent dies mid-instance, the next run of the
+instance restores the checkpoint after preparing the workspace instead of
+starting from a clean base commit (reset_git_repo leaves refs alone). The
+checkpoint is dropped once the instance's prediction is saved.
+
+  python workspace_checkpoint.py show    /path/to/workspace <instance_id>
+  python workspace_checkpoint.py restore /path/to/workspace <instance_id> <base_commit>
+  python workspace_checkpoint.py bench   /path/to/large/repo --edits 20 --rounds 5
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from threading import Thread, Event, Lock
+
+import sparse_workspace
+
+CHECKPOINT_INTERVAL = 60
+CHECKPOINT_REF_PREFIX = "refs/swe-checkpoints/"
+INDEX_NAME = "swe_checkpoint.index"
+GIT_TIMEOUT = 600
+# Workspaces usually have no user.name/user.email configured
+CHECKPOINT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "swe-checkpoint", "GIT_AUTHOR_EMAIL": "swe-checkpoint@localhost",
+    "GIT_COMMITTER_NAME": "swe-checkpoint", "GIT_COMMITTER_EMAIL": "swe-checkpoint@localhost",
+}
+
+
+def low_priority(cmd):
+    """Prefix cmd with nice/ionice where available, so checkpoints yield to the agent."""
+    if sys.platform == "win32":
+        return cmd
+    if shutil.which("ionice"):
+        cmd = ["ionice", "-c", "3"] + cmd
+    if shutil.which("nice"):
+        cmd = ["nice", "-n", "10"] + cmd
+    return cmd
+
+
+def git(path, *args, env=None, background=False, timeout=GIT_TIMEOUT):
+    cmd = ["git", *args]
+    return subprocess.run(low_priority(cmd) if background else cmd, cwd=path, env=env, capture_output=True,
+                          text=True, errors="replace", timeout=timeout)
+
+
+def safe_name(text):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in text)
+
+
+def checkpoint_ref(instance_id):
+    return CHECKPOINT_REF_PREFIX + safe_name(instance_id)
+
+
+def git_dir(repo_path):
+    result = git(repo_path, "rev-parse", "--absolute-git-dir")
+    if result.returncode != 0:
+        raise RuntimeError(f"not a git workspace: {repo_path}")
+    return result.stdout.strip()
+
+
+def rev_parse(repo_path, rev):
+    result = git(repo_path, "rev-parse", "--verify", "-q", rev)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+class Checkpointer:
+    """Snapshots a workspace's working tree into a private ref while an agent edits it"""
+
+    def __init__(self, repo_path, base_commit, instance_id, interval=CHECKPOINT_INTERVAL):
+        self.repo_path = repo_path
+        self.base_commit = rev_parse(repo_path, f"{base_commit}^{{commit}}") or base_commit
+        self.instance_id = instance_id
+        self.interval = interval
+        self.ref = checkpoint_ref(instance_id)
+        git_path = git_dir(repo_path)
+        self.index_file = os.path.join(git_path, INDEX_NAME)
+        # The real index was just written by the checkout: its stat data says nothing changed yet
+        if os.path.exists(os.path.join(git_path, "index")):
+            shutil.copyfile(os.path.join(git_path, "index"), self.index_file)
+        self.env = dict(os.environ, GIT_INDEX_FILE=self.index_file, **CHECKPOINT_IDENTITY)
+        self.base_tree = rev_parse(repo_path, self.base_commit + "^{tree}")
+        self.last_tree = rev_parse(repo_path, self.ref + "^{tree}") or self.base_tree
+        self.written = 0
+        self.passes = 0
+        self.seconds = []
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                pass
+
+    def checkpoint(self):
+        """One pass; returns the new checkpoint commit, or None when nothing changed."""
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                result = git(self.repo_path, "add", "-A", env=self.env, background=True)
+                if result.returncode != 0:
+                    raise RuntimeError(f"git add failed: {result.stderr.strip()}")
+                tree = git(self.repo_path, "write-tree", env=self.env, background=True).stdout.strip()
+                # A clean tree (e.g. the workspace was just reset) never replaces real edits
+                if not tree or tree in (self.last_tree, self.base_tree):
+                    return None
+                message = f"checkpoint {self.instance_id} {datetime.now().isoformat(timespec='seconds')}"
+                result = git(self.repo_path, "commit-tree", tree, "-p", self.base_commit, "-m", message,
+                             env=self.env, background=True)
+                commit = result.stdout.strip()
+                if result.returncode != 0 or git(self.repo_path, "update-ref", self.ref, commit).returncode != 0:
+                    raise RuntimeError(f"could not record the checkpoint: {result.stderr.strip()}")
+                self.last_tree = tree
+                self.written += 1
+                return commit
+            finally:
+                self.passes += 1
+                self.seconds.append(time.perf_counter() - start)
+
+    def stop(self, final=False):
+        """Stop the thread; final=True takes one last checkpoint (e.g. on Ctrl+C)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if final:
+            try:
+                self.checkpoint()
+            except Exception:
+                pass
+        return self.stats()
+
+    def stats(self):
+        return {
+            "checkpoints": self.written,
+            "checkpoint_passes": self.passes,
+            "checkpoint_seconds_total": round(sum(self.seconds), 3),
+            "checkpoint_seconds_max": round(max(self.seconds), 3) if self.seconds else 0,
+        }
+
+    def discard(self):
+        """Forget the checkpoint once the instance's result is safely stored."""
+        discard(self.repo_path, self.instance_id)
+
+
+def discard(repo_path, instance_id):
+    git(repo_path, "update-ref", "-d", checkpoint_ref(instance_id))
+    try:
+        os.remove(os.path.join(git_dir(repo_path), INDEX_NAME))
+    except OSError:
+        pass
+
+
+def find_checkpoint(repo_path, instance_id, base_commit):
+    """Checkpoint commit of instance_id made on top of base_commit, or None."""
+    commit = rev_parse(repo_path, checkpoint_ref(instance_id))
+    if commit is None:
+        return None
+    if rev_parse(repo_path, commit + "^") != rev_parse(repo_path, f"{base_commit}^{{commit}}"):
+        return None  # made against another base commit: of no use here
+    return commit
+
+
+def restore(repo_path, instance_id, base_commit):
+    """Bring the latest checkpoint's edits back into a workspace reset to base_commit.
+
+    The files end up modified in the working tree with the index at HEAD, as
+    if the agent had just made the edits. Returns the checkpoint commit or None.
+    """
+    commit = find_checkpoint(repo_path, instance_id, base_commit)
+    if commit is None:
+        return None
+    if sparse_workspace.is_sparse(repo_path):
+        # Edits outside the current cone would not be written out otherwise
+        changed = git(repo_path, "diff", "--name-only", "-z", base_commit, commit).stdout.split("\0")
+        sparse_workspace.expand(repo_path, [p for p in changed if p])
+    result = git(repo_path, "read-tree", "-u", "--reset", commit)
+    if result.returncode != 0:
+        raise RuntimeError(f"git read-tree failed: {result.stderr.strip()}")
+    git(repo_path, "reset", "-q")
+    return commit
+
+
+def describe(repo_path, commit):
+    result = git(repo_path, "log", "-1", "--format=%s", commit)
+    files = git(repo_path, "diff", "--shortstat", f"{commit}^", commit).stdout.strip()
+    return f"{result.stdout.strip()} ({files or 'no changes'})"
+
+
+# ========================== BENCHMARK ==========================
+
+def loose_objects(repo_path):
+    for line in git(repo_path, "count-objects", "-v").stdout.splitlines():
+        if line.startswith("count:"):
+            return int(line.split()[1])
+    return 0
+
+
+def edit_files(repo_path, files, round_no):
+    for path in files:
+        with open(os.path.join(repo_path, path), "a", encoding="utf-8") as f:
+            f.write(f"\n// checkpoint bench edit {round_no}\n")
+
+
+def bench(repo_path, edits=20, rounds=5):
+    """Per-checkpoint cost on a throwaway clone: warm private index vs a fresh index each time."""
+    work = tempfile.mkdtemp(prefix="swe_checkpoint_bench_")
+    try:
+        clone = os.path.join(work, "repo")
+        start = time.perf_counter()
+        if git(work, "clone", "-q", "--shared", os.path.abspath(repo_path), clone).returncode != 0:
+            raise RuntimeError(f"could not clone {repo_path}")
+        head = rev_parse(clone, "HEAD")
+        files = [p for p in git(clone, "ls-files", "-z").stdout.split("\0") if p]
+        print(f"{len(files)} tracked files, clone {time.perf_counter() - start:.1f}s")
+        step = max(1, len(files) // edits)
+        targets = files[::step][:edits]
+
+        checkpointer = Checkpointer(clone, head, "bench", interval=0)
+        print(f"{'round':<8} {'warm s':>8} {'objects':>8} {'fresh s':>8}")
+        for round_no in range(rounds + 1):
+            if round_no:
+                edit_files(clone, targets, round_no)
+            before = loose_objects(clone)
+            checkpointer.checkpoint()
+            warm = checkpointer.seconds[-1]
+            written = loose_objects(clone) - before
+            # Baseline: a new index every time, so every file is hashed again
+            fresh_index = os.path.join(work, "fresh.index")
+            env = dict(os.environ, GIT_INDEX_FILE=fresh_index)
+            start = time.perf_counter()
+            git(clone, "read-tree", head, env=env)
+            git(clone, "add", "-A", env=env)
+            git(clone, "write-tree", env=env)
+            fresh = time.perf_counter() - start
+            os.remove(fresh_index)
+            label = "idle" if not round_no else f"{len(targets)} edits"
+            print(f"{label:<8} {warm:>8.3f} {written:>8} {fresh:>8.3f}")
+        idle_start = time.perf_counter()
+        checkpointer.checkpoint()
+        print(f"no-change pass: {time.perf_counter() - idle_start:.3f}s; "
+              f"{checkpointer.written} checkpoints written in {checkpointer.passes} passes")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checkpoints of in-progress workspace edits')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help='Latest checkpoint of an instance')
+    show_parser.add_argument('workspace')
+    show_parser.add_argument('instance_id')
+    restore_parser = subparsers.add_parser('restore', help='Restore the latest checkpoint into the workspace')
+    restore_parser.add_argument('workspace')
+    restore_parser.add_argument('instance_id')
+    restore_parser.add_argument('base_commit')
+    bench_parser = subparsers.add_parser('bench', help='Measure checkpoint cost on a clone of a repo')
+    bench_parser.add_argument('repo')
+    bench_parser.add_argument('--edits', type=int, default=20, help='Files edited between checkpoints')
+    bench_parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        commit = rev_parse(args.workspace, checkpoint_ref(args.instance_id))
+        print(f"{commit}: {describe(args.workspace, commit)}" if commit else "No checkpoint")
+    elif args.command == 'restore':
+        commit = restore(args.workspace, args.instance_id, args.base_commit)
+        print(f"Restored {commit}: {describe(args.workspace, commit)}" if commit
+              else "No checkpoint for this instance at that base commit")
+    else:
+        bench(args.repo, args.edits, args.rounds)
+
+
+if __name__ == "__main__":
+    main()